@@ -0,0 +1,117 @@
+"""
+Admission control for evaluation requests
+Bounds the prompts admitted and not yet finished, in total, in the bulk lane
+and per client, so overload turns into fast 429s with a Retry-After estimate
+instead of an unbounded scheduler queue and ever-growing latency.
+"""
+
+import math
+from collections import defaultdict
+from typing import Dict, Optional
+
+from config import ADMISSION_BULK_SHARE, ADMISSION_CLIENT_SHARE, ADMISSION_MAX_PROMPTS, CLIENT_WEIGHTS
+from metrics import ADMISSION_REJECTED
+from scheduler import BULK, LANES
+
+# Retry-After bounds (seconds); the fallback is used before any throughput is known
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+DEFAULT_RETRY_AFTER = 5
+
+
+class Overloaded(Exception):
+    """A request that would exceed an admission limit"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Prompt budgets for admitted requests, for one event loop
+
+    A request is charged one prompt per professor from admit() until
+    release(). A limit only rejects a request when other requests already
+    hold part of it, so a single oversized request still runs on an idle
+    server instead of being rejected forever.
+    """
+
+    def __init__(
+        self,
+        max_prompts: int = ADMISSION_MAX_PROMPTS,
+        bulk_share: float = ADMISSION_BULK_SHARE,
+        client_share: float = ADMISSION_CLIENT_SHARE,
+        weights: Optional[Dict[str, float]] = None
+    ):
+        self.max_prompts = max(0, max_prompts)
+        self.bulk_share = bulk_share
+        self.client_share = client_share
+        self.weights = CLIENT_WEIGHTS if weights is None else weights
+        self.admitted = 0
+        self._lanes: Dict[str, int] = dict.fromkeys(LANES, 0)
+        self._clients: Dict[str, int] = defaultdict(int)
+        self.rejected: Dict[str, int] = dict.fromkeys(LANES, 0)
+
+    def client_limit(self, client: str) -> int:
+        """Prompts one client may have admitted at once"""
+        share = min(1.0, self.client_share * self.weights.get(client, 1.0))
+        return max(1, int(self.max_prompts * share))
+
+    def _limits(self, lane: str, client: str):
+        """(name, held, limit) of each bound a request of this lane and client is charged to"""
+        yield "server", self.admitted, self.max_prompts
+        if lane == BULK:
+            yield "bulk lane", self._lanes[BULK], max(1, int(self.max_prompts * self.bulk_share))
+        yield f"client {client}", self._clients.get(client, 0), self.client_limit(client)
+
+    def admit(self, lane: str, client: str, prompts: int, throughput: float = 0.0) -> None:
+        """
+        Charge a request's prompts to its lane and client
+
+        Args:
+            lane: Scheduler lane of the request
+            client: Client id
+            prompts: Prompts the request may submit
+            throughput: Recent prompts/sec, used to estimate Retry-After
+
+        Raises:
+            Overloaded: If the request would exceed a limit
+        """
+        if self.max_prompts:
+            for name, held, limit in self._limits(lane, client):
+                if held and held + prompts > limit:
+                    self.rejected[lane] += 1
+                    ADMISSION_REJECTED.labels(lane=lane).inc()
+                    raise Overloaded(
+                        f"Too many prompts in flight for {name} ({held} + {prompts} > {limit})",
+                        self.retry_after(held + prompts - limit, throughput)
+                    )
+        self.admitted += prompts
+        self._lanes[lane] += prompts
+        self._clients[client] += prompts
+
+    def release(self, lane: str, client: str, prompts: int) -> None:
+        """Return an admitted request's prompts"""
+        self.admitted -= prompts
+        self._lanes[lane] -= prompts
+        self._clients[client] -= prompts
+        if self._clients[client] <= 0:
+            del self._clients[client]
+
+    @staticmethod
+    def retry_after(excess: int, throughput: float) -> int:
+        """Seconds until ``excess`` prompts should have finished at ``throughput`` prompts/sec"""
+        if throughput <= 0:
+            return DEFAULT_RETRY_AFTER
+        return min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(excess / throughput)))
+
+    def status(self) -> Dict:
+        """Admitted prompts in total, per lane and per client, and rejections per lane"""
+        return {
+            "max_prompts": self.max_prompts,
+            "admitted": self.admitted,
+            "lanes": dict(self._lanes),
+            "clients": dict(self._clients),
+            "rejected": dict(self.rejected)
+        }
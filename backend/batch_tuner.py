@@ -0,0 +1,299 @@
+"""
+Adaptive batch sizing
+Tunes the scheduler's batch size limit per model from the throughput,
+latency and memory headroom of the batches it runs, backs off after
+out-of-memory failures, and keeps the best settings across restarts.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from config import (
+    BATCH_TUNER_GROWTH, BATCH_TUNER_INITIAL_SIZE, BATCH_TUNER_MAX_BATCH_SECONDS, BATCH_TUNER_MIN_GAIN,
+    BATCH_TUNER_MIN_HEADROOM, BATCH_TUNER_PROBE_WINDOWS, BATCH_TUNER_WINDOW, BATCH_TUNING_PATH
+)
+from metrics import BATCH_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Error messages of allocation failures (CUDA, CPU allocator, vLLM startup)
+_OOM_MARKERS = (
+    "out of memory", "outofmemory", "can't allocate memory", "cannot allocate memory",
+    "no available memory for the cache blocks", "less than desired gpu memory utilization"
+)
+
+
+def is_out_of_memory(error: BaseException) -> bool:
+    """Check whether an engine error was an allocation failure"""
+    if isinstance(error, MemoryError):
+        return True
+    text = f"{type(error).__name__}: {error}".lower()
+    return any(marker in text for marker in _OOM_MARKERS)
+
+
+class TuningStore:
+    """
+    Tuned settings per model, kept in a JSON file
+
+    Every update re-reads the file before replacing it atomically, so the
+    server and engine worker processes can each write their own fields.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path or None
+        self._lock = threading.Lock()
+        self._settings: Dict[str, Dict] = self._read()
+
+    def _read(self) -> Dict[str, Dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                settings = json.load(f)
+            return settings if isinstance(settings, dict) else {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable batch tuning file {self.path}: {e}")
+            return {}
+
+    def get(self, model_id: str) -> Dict:
+        """Remembered settings of a model (empty if none)"""
+        with self._lock:
+            return dict(self._settings.get(model_id, {}))
+
+    def all(self) -> Dict[str, Dict]:
+        """Remembered settings of every model"""
+        with self._lock:
+            return {model_id: dict(settings) for model_id, settings in self._settings.items()}
+
+    def update(self, model_id: str, **fields) -> None:
+        """Merge fields into a model's settings and persist them"""
+        with self._lock:
+            if self.path:
+                self._settings = self._read()
+            settings = self._settings.setdefault(model_id, {})
+            settings.update(fields, updated_at=round(time.time(), 1))
+            if not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._settings, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f"❌ Could not save batch tuning to {self.path}: {e}")
+
+
+# Shared by every scheduler of this process and by the vLLM loader
+tuning_store = TuningStore(BATCH_TUNING_PATH)
+
+
+class _ModelTuning:
+    """Tuning state of one model"""
+
+    def __init__(self, model_id: str, batch_size: int, token_cap: Optional[int]):
+        self.model_id = model_id
+        self.batch_size = batch_size  # Current limit
+        self.best_size = batch_size  # Size with the best measured throughput
+        self.best_rate = 0.0  # Prompts/sec at best_size (0 = not measured yet)
+        self.token_cap: Optional[int] = token_cap  # Learned token budget (None = catalog budget)
+        self.settled = False  # Growth stopped paying off; only probe now and then
+        self.fallback: Optional[tuple] = None  # (batch size, token cap) measured before the last growth
+        self.idle_windows = 0  # Windows since the last probe
+        self.failures = 0
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self.window_batches = 0
+        self.window_prompts = 0
+        self.window_seconds = 0.0
+        self.window_slowest = 0.0
+        self.window_headroom: Optional[float] = None
+
+
+class BatchTuner:
+    """
+    Hill-climbing batch size limit for the model loaded on one engine
+
+    Only batches that were cut off by the limit say anything about it, so
+    the tuner ignores batches that left the queue empty. After every
+    ``BATCH_TUNER_WINDOW`` full batches it compares prompts/sec with the
+    best size so far: it grows the limit while throughput improves and
+    memory and latency allow, and otherwise returns to the best size. An
+    out-of-memory failure halves the limit and caps the batch token budget
+    below the failed batch.
+    """
+
+    def __init__(
+        self,
+        engine,
+        max_batch_size: int,
+        store: Optional[TuningStore] = None,
+        initial_size: int = BATCH_TUNER_INITIAL_SIZE
+    ):
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.store = tuning_store if store is None else store
+        self.initial_size = min(self.max_batch_size, max(1, initial_size))
+        self._state: Optional[_ModelTuning] = None
+
+    def _current(self) -> Optional[_ModelTuning]:
+        """Tuning state of the loaded model, restored from the store on first use"""
+        model_id = self.engine.get_current_model()
+        if model_id is None:
+            return None
+        if self._state is None or self._state.model_id != model_id:
+            saved = self.store.get(model_id)
+            batch_size = min(self.max_batch_size, max(1, int(saved.get("batch_size") or self.initial_size)))
+            self._state = _ModelTuning(model_id, batch_size, saved.get("max_batch_tokens"))
+            BATCH_LIMIT.labels(model=model_id).set(batch_size)
+            if saved:
+                logger.info(f"🎛️ Restored batch tuning for {model_id}: batch size {batch_size}")
+        return self._state
+
+    def batch_limit(self) -> int:
+        """Prompts the next batch may hold"""
+        state = self._current()
+        return state.batch_size if state is not None else self.initial_size
+
+    def token_limit(self, budget: Optional[int]) -> Optional[int]:
+        """Token budget of the next batch, given the model's catalog budget"""
+        state = self._current()
+        if state is None or state.token_cap is None:
+            return budget
+        return min(budget, state.token_cap) if budget else state.token_cap
+
+    def observe(self, prompts: int, seconds: float, full: bool, headroom: Optional[float] = None) -> None:
+        """
+        Record a batch that finished without failing
+
+        Args:
+            prompts: Outputs the batch generated
+            seconds: Wall time of the batch
+            full: Whether the batch was cut off by the size or token limit
+            headroom: Lowest free fraction of engine memory during the batch (None = unknown)
+        """
+        state = self._current()
+        if state is None or not full or prompts <= 0 or seconds <= 0:
+            return
+        state.window_batches += 1
+        state.window_prompts += prompts
+        state.window_seconds += seconds
+        state.window_slowest = max(state.window_slowest, seconds)
+        if headroom is not None:
+            state.window_headroom = headroom if state.window_headroom is None else min(state.window_headroom, headroom)
+        if state.window_batches >= max(1, BATCH_TUNER_WINDOW):
+            self._adjust(state)
+
+    def _adjust(self, state: _ModelTuning) -> None:
+        """Move the limit after a full window of batches"""
+        rate = state.window_prompts / state.window_seconds
+        too_slow = BATCH_TUNER_MAX_BATCH_SECONDS > 0 and state.window_slowest > BATCH_TUNER_MAX_BATCH_SECONDS
+        low_memory = state.window_headroom is not None and state.window_headroom < BATCH_TUNER_MIN_HEADROOM
+        state._reset_window()
+
+        if too_slow and state.batch_size > 1:
+            # Latency bound beats throughput: step back regardless of the rate
+            self._set(state, max(1, math.floor(state.batch_size / BATCH_TUNER_GROWTH)), "batches too slow")
+            self._undo_probe(state)
+            state.best_size, state.best_rate, state.settled = state.batch_size, 0.0, True
+            self._save(state)
+            return
+
+        if state.batch_size == state.best_size:
+            # Re-measure the best size so an old peak does not block growth forever
+            state.best_rate = rate
+            improved = not state.settled
+            if state.settled:
+                state.idle_windows += 1
+                improved = state.idle_windows >= BATCH_TUNER_PROBE_WINDOWS
+        elif rate > state.best_rate * (1 + BATCH_TUNER_MIN_GAIN):
+            state.best_size, state.best_rate = state.batch_size, rate
+            self._save(state)
+            improved = True
+        else:
+            state.settled, state.idle_windows = True, 0
+            self._set(state, state.best_size, f"{rate:.1f} prompts/sec is no better than {state.best_rate:.1f}")
+            self._undo_probe(state)
+            return
+
+        if improved and not low_memory and state.batch_size < self.max_batch_size:
+            state.idle_windows = 0
+            state.fallback = (state.batch_size, state.token_cap)
+            grown = min(self.max_batch_size, max(state.batch_size + 1, math.ceil(state.batch_size * BATCH_TUNER_GROWTH)))
+            if state.token_cap is not None:
+                # Memory may have been freed since the cap was learned; probe above it too
+                state.token_cap = math.ceil(state.token_cap * BATCH_TUNER_GROWTH)
+            self._set(state, grown, f"{rate:.1f} prompts/sec")
+
+    def _undo_probe(self, state: _ModelTuning) -> None:
+        """Return to the token cap from before the last growth, which did not pay off"""
+        if state.fallback is not None:
+            state.token_cap = state.fallback[1]
+            state.fallback = None
+
+    def record_failure(self, prompts: int, tokens: int, error: BaseException) -> None:
+        """
+        Record a batch that failed on the engine
+
+        Only out-of-memory failures move the limits. One above the size that
+        last ran fine returns to that size and its token budget; one at or
+        below it halves the batch size limit and caps the token budget at
+        half the failed batch's tokens. Other failures leave the limits alone
+        (the batch is split and retried either way).
+        """
+        state = self._current()
+        if state is None or not is_out_of_memory(error):
+            return
+        state.failures += 1
+        state._reset_window()
+        state.settled, state.idle_windows = True, 0
+        if state.fallback is not None and prompts > state.fallback[0]:
+            batch_size, state.token_cap = state.fallback
+            state.best_size = batch_size
+        else:
+            batch_size = max(1, prompts // 2)
+            if tokens:
+                cap = max(1, tokens // 2)
+                state.token_cap = cap if state.token_cap is None else min(state.token_cap, cap)
+            state.best_size, state.best_rate = min(state.best_size, batch_size), 0.0
+        state.fallback = None
+        self._set(state, min(state.batch_size, batch_size), "out of memory", warn=True)
+        self._save(state)
+
+    def _set(self, state: _ModelTuning, batch_size: int, reason: str, warn: bool = False) -> None:
+        if batch_size == state.batch_size:
+            return
+        message = f"🎛️ Batch size for {state.model_id}: {state.batch_size} -> {batch_size} ({reason})"
+        if warn:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        state.batch_size = batch_size
+        BATCH_LIMIT.labels(model=state.model_id).set(batch_size)
+
+    def _save(self, state: _ModelTuning) -> None:
+        fields = {"batch_size": state.best_size, "max_batch_tokens": state.token_cap}
+        if state.best_rate:
+            fields["prompts_per_second"] = round(state.best_rate, 2)
+        self.store.update(state.model_id, **fields)
+
+    def status(self) -> Optional[Dict]:
+        """Current limits and best measured size of the loaded model (None if no model)"""
+        state = self._current()
+        if state is None:
+            return None
+        return {
+            "model": state.model_id,
+            "batch_size": state.batch_size,
+            "best_batch_size": state.best_size,
+            "best_prompts_per_second": round(state.best_rate, 2),
+            "max_batch_tokens": state.token_cap,
+            "settled": state.settled,
+            "oom_failures": state.failures
+        }
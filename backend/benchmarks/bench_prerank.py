@@ -0,0 +1,56 @@
+"""
+Micro-benchmark: lexical pre-ranking over a full scan
+
+Pre-ranks every professor in public/data/professors-*.json (or synthetic
+professors) against a few research directions and reports the time per
+10k professors and the share of professors that would skip the LLM.
+
+Usage (from backend/):
+    python benchmarks/bench_prerank.py [--professors 10000] [--min-score 0.0] [--top-k 0]
+"""
+
+import argparse
+import json
+
+from common import synthetic_professors, time_per_run
+from load_test import DATA_DIR, load_professors
+from models import Professor
+from prerank import prerank
+
+DIRECTIONS = [
+    "Efficient inference and serving systems for large language models",
+    "Computer vision and 3D scene understanding",
+    "Formal verification of distributed protocols",
+    "Quantum computing",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--professors", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-score", type=float, default=0.0)
+    parser.add_argument("--top-k", type=int, default=0, help="0 = no cap")
+    parser.add_argument("--synthetic", action="store_true", help="Use synthetic professors instead of the datasets")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        professors = synthetic_professors(args.professors)
+    else:
+        professors = [Professor(**p) for p in load_professors(DATA_DIR)][:args.professors]
+
+    scale = 10000 / len(professors)
+    report = {"professors": len(professors), "min_score": args.min_score, "top_k": args.top_k, "directions": {}}
+    for direction in DIRECTIONS:
+        selection = prerank(professors, direction, args.top_k or None, args.min_score)
+        timing = time_per_run(lambda: prerank(professors, direction, args.top_k or None, args.min_score), args.repeat)
+        report["directions"][direction] = {
+            "ms_per_10k_professors": round(timing["best_ms"] * scale, 1),
+            "kept": len(selection.kept),
+            "skipped_fraction": round(len(selection.skipped) / len(professors), 3)
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
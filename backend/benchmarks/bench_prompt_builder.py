@@ -0,0 +1,70 @@
+"""
+Micro-benchmark: prompt build cost per 1k professors
+
+Compares the original per-professor builder (two file reads and five
+chained str.replace passes per prompt) with the compiled template registry.
+
+Usage (from backend/):
+    python benchmarks/bench_prompt_builder.py [--professors 1000] [--repeat 5]
+"""
+
+import argparse
+import json
+
+from common import synthetic_professors, time_per_run
+from legacy import legacy_build_evaluation_prompt
+from prompt_builder import build_evaluation_prompt, build_evaluation_prompts
+
+DIRECTION = "Efficient inference and serving systems for large language models"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--professors", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scheme", default="original", choices=["original", "decision_tree"])
+    args = parser.parse_args()
+    
+    professors = synthetic_professors(args.professors)
+    
+    before = [legacy_build_evaluation_prompt(p, DIRECTION, True, args.scheme) for p in professors]
+    after = build_evaluation_prompts(professors, DIRECTION, True, args.scheme, layout="standard")
+    if before != after:
+        raise SystemExit("❌ Compiled templates produce different prompts than the original builder")
+    
+    scale = 1000 / args.professors
+    results = {
+        "legacy_per_professor": time_per_run(
+            lambda: [legacy_build_evaluation_prompt(p, DIRECTION, True, args.scheme) for p in professors],
+            args.repeat
+        ),
+        "compiled_per_professor": time_per_run(
+            lambda: [build_evaluation_prompt(p, DIRECTION, True, args.scheme, "standard") for p in professors],
+            args.repeat
+        ),
+        "compiled_batch": time_per_run(
+            lambda: build_evaluation_prompts(professors, DIRECTION, True, args.scheme, "standard"),
+            args.repeat
+        ),
+        "compiled_batch_prefix_layout": time_per_run(
+            lambda: build_evaluation_prompts(professors, DIRECTION, True, args.scheme, "prefix"),
+            args.repeat
+        ),
+    }
+    
+    report = {
+        "professors": args.professors,
+        "scheme": args.scheme,
+        "ms_per_1k_professors": {
+            name: round(timing["best_ms"] * scale, 3) for name, timing in results.items()
+        },
+        "speedup_vs_legacy": {
+            name: round(results["legacy_per_professor"]["best_ms"] / timing["best_ms"], 2)
+            for name, timing in results.items()
+        }
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
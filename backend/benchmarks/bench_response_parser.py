@@ -0,0 +1,97 @@
+"""
+Benchmark and regression check for LLM response parsing
+
+Runs every output in a corpus through the original validate/parse pair and
+the single-pass parser, fails if any verdict, error message or parsed result
+differs, then reports parsing throughput for both.
+
+Usage (from backend/):
+    python benchmarks/bench_response_parser.py [--corpus PATH] [--repeat 200]
+
+The default corpus (benchmarks/corpus/synthetic_outputs.jsonl) is written
+by hand to imitate model outputs, not captured from a model. It holds one
+{"category": ..., "text": ...} object per line. A capture written with
+ENGINE_RECORD_PATH has a "text" field too and can be passed as --corpus.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+import common  # noqa: F401  (puts the backend on sys.path)
+from legacy import legacy_parse_llm_response, legacy_validate_llm_response
+from response_parser import orjson, parse_and_validate
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "synthetic_outputs.jsonl")
+
+
+def legacy_evaluate(text):
+    """Original server flow: validate, then parse valid outputs"""
+    is_valid, error = legacy_validate_llm_response(text)
+    return is_valid, error, legacy_parse_llm_response(text) if is_valid else None
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def throughput(fn, texts, repeat):
+    # Discard the legacy parser's error prints so both sides time parsing only
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                fn(text)
+        elapsed = time.perf_counter() - start
+    return len(texts) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    
+    # The legacy parser prints on errors; keep the report readable
+    logging.disable(logging.WARNING)
+    
+    corpus = load_corpus(args.corpus)
+    texts = [entry["text"] for entry in corpus]
+    
+    mismatches = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        checked = [(entry, legacy_evaluate(entry["text"]), parse_and_validate(entry["text"])) for entry in corpus]
+    for entry, expected, actual in checked:
+        if expected != actual:
+            mismatches.append({"text": entry["text"][:120], "legacy": expected, "fast": actual})
+    if mismatches:
+        print(json.dumps(mismatches, indent=2, default=str))
+        raise SystemExit(f"❌ {len(mismatches)}/{len(corpus)} outputs parsed differently")
+    
+    legacy_rate = throughput(legacy_evaluate, texts, args.repeat)
+    fast_rate = throughput(parse_and_validate, texts, args.repeat)
+    
+    report = {
+        "corpus": os.path.relpath(args.corpus),
+        "outputs": len(corpus),
+        "categories": dict(Counter(entry.get("category", "unknown") for entry in corpus)),
+        "valid_outputs": sum(1 for text in texts if parse_and_validate(text)[0]),
+        "identical_results": True,
+        "fast_json_library": "orjson" if orjson is not None else None,
+        "outputs_per_sec": {
+            "legacy": round(legacy_rate),
+            "single_pass": round(fast_rate)
+        },
+        "speedup": round(fast_rate / legacy_rate, 2)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: request decode + validate cost per 1k professors
+
+Encodes one synthetic /evaluate_batch body in every supported wire format
+(JSON or msgpack, uncompressed, gzip or zstd), checks each parses to the
+same request as the original FastAPI path, then reports the body size, the
+decode time and the decode + validate time per 1k professors. Formats whose
+library is not installed are skipped.
+
+Usage (from backend/):
+    python benchmarks/bench_wire_format.py [--professors 1000] [--repeat 20]
+"""
+
+import argparse
+import gzip
+import json
+
+from common import synthetic_professors, time_per_run
+from legacy import legacy_parse_evaluate_request
+from models import EvaluateRequest
+import wire_format
+from wire_format import decode, decompress, msgpack, orjson, parse_model, zstandard
+
+DIRECTION = "Efficient inference and serving systems for large language models"
+
+
+def bodies(payload):
+    """(name, body, content type, content encoding) for every available format"""
+    json_body = json.dumps(payload).encode("utf-8")
+    formats = [("json", json_body, wire_format.JSON, None)]
+    formats.append(("json+gzip", gzip.compress(json_body), wire_format.JSON, "gzip"))
+    if zstandard is not None:
+        formats.append(("json+zstd", zstandard.ZstdCompressor(level=3).compress(json_body), wire_format.JSON, "zstd"))
+    if msgpack is not None:
+        msgpack_body = msgpack.packb(payload)
+        formats.append(("msgpack", msgpack_body, wire_format.MSGPACK, None))
+        formats.append(("msgpack+gzip", gzip.compress(msgpack_body), wire_format.MSGPACK, "gzip"))
+        if zstandard is not None:
+            formats.append((
+                "msgpack+zstd", zstandard.ZstdCompressor(level=3).compress(msgpack_body), wire_format.MSGPACK, "zstd"
+            ))
+    return formats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--professors", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    
+    payload = {
+        "research_direction": DIRECTION,
+        "professors": [professor.model_dump() for professor in synthetic_professors(args.professors)]
+    }
+    formats = bodies(payload)
+    expected = legacy_parse_evaluate_request(formats[0][1])
+    for name, body, content_type, content_encoding in formats:
+        if parse_model(EvaluateRequest, body, content_type, content_encoding) != expected:
+            raise SystemExit(f"❌ {name} parsed to a different request")
+    
+    scale = 1000 / args.professors
+    report = {
+        "professors": args.professors,
+        "fast_json_library": "orjson" if orjson is not None else None,
+        "identical_requests": True,
+        "legacy_json_ms_per_1k": round(
+            time_per_run(lambda: legacy_parse_evaluate_request(formats[0][1]), args.repeat)["best_ms"] * scale, 2
+        ),
+        "formats": {}
+    }
+    for name, body, content_type, content_encoding in formats:
+        decode_ms = time_per_run(lambda: decode(decompress(body, content_encoding), content_type), args.repeat)
+        parse_ms = time_per_run(lambda: parse_model(EvaluateRequest, body, content_type, content_encoding), args.repeat)
+        report["formats"][name] = {
+            "kb_per_1k": round(len(body) * scale / 1024, 1),
+            "decode_ms_per_1k": round(decode_ms["best_ms"] * scale, 2),
+            "decode_validate_ms_per_1k": round(parse_ms["best_ms"] * scale, 2),
+            "speedup_vs_legacy": round(report["legacy_json_ms_per_1k"] / (parse_ms["best_ms"] * scale), 2)
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
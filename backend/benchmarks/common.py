@@ -0,0 +1,55 @@
+"""
+Shared helpers for the backend benchmarks
+"""
+
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+# Make the backend modules importable when running `python benchmarks/<script>.py`
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from models import Professor, Publication  # noqa: E402
+
+VENUES = ["icml", "neurips", "iclr", "cvpr", "acl", "sigmod", "osdi", "chi", "kdd", "icra"]
+WORDS = [
+    "learning", "graph", "neural", "efficient", "robust", "distributed", "language",
+    "vision", "systems", "optimization", "privacy", "retrieval", "reinforcement",
+    "scalable", "models", "inference", "benchmark", "adaptive", "secure", "networks"
+]
+
+
+def synthetic_professors(count: int, seed: int = 0) -> List[Professor]:
+    """Deterministic professors with 5-40 publications each"""
+    rng = random.Random(seed)
+    professors = []
+    for i in range(count):
+        publications = [
+            Publication(
+                title=" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 10))).capitalize(),
+                year=rng.randint(2015, 2025),
+                venue=rng.choice(VENUES)
+            )
+            for _ in range(rng.randint(5, 40))
+        ]
+        professors.append(Professor(
+            name=f"Professor {i}",
+            affiliation=f"University {i % 97}",
+            areas=rng.sample(VENUES, rng.randint(1, 4)),
+            publicationList=publications
+        ))
+    return professors
+
+
+def time_per_run(fn: Callable[[], object], repeat: int = 5) -> Dict[str, float]:
+    """Run fn `repeat` times and report best/mean wall time in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"best_ms": min(timings), "mean_ms": sum(timings) / len(timings)}
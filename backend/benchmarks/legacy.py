@@ -0,0 +1,174 @@
+"""
+Frozen copies of earlier backend implementations
+Used by the benchmarks as the "before" side of before/after comparisons
+"""
+
+from prompt_builder import load_prompt_file
+
+
+def legacy_build_evaluation_prompt(professor, research_direction: str, use_strict_prompts: bool = True, scoring_scheme: str = 'original') -> str:
+    """Original build_evaluation_prompt: two file reads and five str.replace passes per prompt"""
+    if use_strict_prompts:
+        if scoring_scheme == 'decision_tree':
+            system_prompt = load_prompt_file('local-decision-tree-system-prompt.txt')
+            user_template = load_prompt_file('local-decision-tree-user-prompt.txt')
+        else:
+            system_prompt = load_prompt_file('local-system-prompt.txt')
+            user_template = load_prompt_file('local-user-prompt.txt')
+    else:
+        if scoring_scheme == 'decision_tree':
+            system_prompt = load_prompt_file('decision-tree-system-prompt.txt')
+            user_template = load_prompt_file('decision-tree-user-prompt.txt')
+        else:
+            system_prompt = load_prompt_file('basic-system-prompt.txt')
+            user_template = load_prompt_file('basic-user-prompt.txt')
+    
+    papers_text = ""
+    if professor.publicationList and len(professor.publicationList) > 0:
+        recent_papers = [
+            p for p in professor.publicationList 
+            if p.year >= 2020
+        ][:20]
+        
+        if recent_papers:
+            papers_text = "\n".join([
+                f"{p.title} ({p.venue}, {p.year})"
+                for p in recent_papers
+            ])
+        else:
+            papers_text = "No recent publications (2020-2025)"
+    else:
+        papers_text = "Publication data not available"
+    
+    user_prompt = user_template
+    user_prompt = user_prompt.replace('{{professor.name}}', professor.name)
+    user_prompt = user_prompt.replace('{{professor.affiliation}}', professor.affiliation)
+    user_prompt = user_prompt.replace('{{professor.areas}}', ", ".join(professor.areas) if professor.areas else "Not specified")
+    user_prompt = user_prompt.replace('{{publications}}', papers_text)
+    user_prompt = user_prompt.replace('{{researchDirection}}', research_direction)
+    
+    return f"{system_prompt}\n\n{user_prompt}"
+
+
+def legacy_validate_llm_response(text: str) -> tuple[bool, str]:
+    """Original validate_llm_response: imports re and compiles every pattern per call"""
+    import re
+    
+    if not text or not isinstance(text, str):
+        return False, "Empty or invalid response"
+    
+    text_stripped = text.strip()
+    
+    # Check minimum length
+    if len(text_stripped) < 20:
+        return False, "Output too short"
+    
+    # Check for invalid patterns
+    invalid_patterns = [
+        (r'^\s*$', "Empty/whitespace only"),
+        (r'^\*+$', "Only asterisks"),
+        (r'^[^\w\s]{10,}', "Too many special characters"),
+        (r'(.)\1{20,}', "Repeated characters"),
+        (r'^(Error|Failed|Unable|Invalid)', "Error message output"),
+    ]
+    
+    for pattern, desc in invalid_patterns:
+        if re.search(pattern, text_stripped):
+            return False, f"Invalid pattern: {desc}"
+    
+    # Check if it looks like valid output (has score or JSON)
+    has_score = bool(re.search(r'(?:score|Score)[:\s]*[0-9.]+', text_stripped))
+    has_json = bool(re.search(r'\{.*"score".*\}', text_stripped, re.DOTALL))
+    
+    if not (has_score or has_json):
+        return False, "No score found in output"
+    
+    return True, None
+
+
+def legacy_parse_llm_response(response_text: str) -> dict:
+    """Original parse_llm_response: regex JSON extraction, then regex field fallback"""
+    try:
+        import re
+        import json
+        
+        # Step 1: Remove markdown code blocks
+        cleaned = re.sub(r'```(?:json)?\s*', '', response_text)
+        cleaned = re.sub(r'```', '', cleaned).strip()
+        
+        # Step 2: Try JSON parsing first
+        json_match = re.search(r'\{[^{}]*"score"[^{}]*\}', cleaned, re.DOTALL)
+        if json_match:
+            try:
+                data = json.loads(json_match.group(0))
+                score = float(data.get("score", 0.0))
+                if score > 1.0:
+                    score = score / 10.0
+                score = max(0.0, min(1.0, score))
+                
+                reasoning = str(data.get("reasoning", ""))
+                summary = str(data.get("research_summary", data.get("researchSummary", reasoning)))
+                
+                # Clean JSON artifacts
+                reasoning = re.sub(r'["{}\[\]]', '', reasoning).strip()
+                summary = re.sub(r'["{}\[\]]', '', summary).strip()
+                
+                return {
+                    "score": score,
+                    "reasoning": reasoning[:200] if reasoning else "No reasoning provided",
+                    "researchSummary": summary[:200] if summary else reasoning[:200]
+                }
+            except (json.JSONDecodeError, ValueError, KeyError):
+                pass  # Fallback to regex
+        
+        # Step 3: Regex fallback
+        score = 0.0
+        reasoning = ""
+        research_summary = ""
+        
+        score_match = re.search(r'(?:Score|score)[:\s]+([0-9.]+)', cleaned, re.IGNORECASE)
+        if score_match:
+            score = float(score_match.group(1))
+            if score > 1.0:
+                score = score / 10.0
+            score = max(0.0, min(1.0, score))
+        
+        reason_match = re.search(r'(?:Reason|reasoning)[:\s]+(.+?)(?:\n\n|Research Summary:|research_summary:|$)', cleaned, re.IGNORECASE | re.DOTALL)
+        if reason_match:
+            reasoning = reason_match.group(1).strip()
+        
+        summary_match = re.search(r'(?:Research Summary|research_summary)[:\s]+(.+?)(?:\n\n|$)', cleaned, re.IGNORECASE | re.DOTALL)
+        if summary_match:
+            research_summary = summary_match.group(1).strip()
+        else:
+            research_summary = reasoning
+        
+        # Clean up artifacts
+        reasoning = re.sub(r'["{}\[\]]', '', reasoning).strip()
+        research_summary = re.sub(r'["{}\[\]]', '', research_summary).strip()
+        
+        reasoning = reasoning[:200] if reasoning else "No reasoning provided"
+        research_summary = research_summary[:200] if research_summary else reasoning
+        
+        return {
+            "score": score,
+            "reasoning": reasoning,
+            "researchSummary": research_summary
+        }
+    
+    except Exception as e:
+        print(f"❌ Parse error: {e}")
+        print(f"Raw response: {response_text[:300]}")
+        return {
+            "score": 0.0,
+            "reasoning": "Parse error occurred",
+            "researchSummary": "Failed to extract response"
+        }
+
+
+def legacy_parse_evaluate_request(body: bytes):
+    """Original /evaluate_batch body handling (FastAPI): stdlib json, then validation with the collector running"""
+    import json
+    from models import EvaluateRequest
+    
+    return EvaluateRequest.model_validate(json.loads(body), from_attributes=True)
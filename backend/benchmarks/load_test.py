@@ -0,0 +1,327 @@
+"""
+End-to-end load test for /evaluate_batch
+
+Turns the region datasets in public/data/professors-*.json into
+EvaluateRequest payloads and sends them at a fixed concurrency, then writes
+latency percentiles, professors/sec and the error rate as a JSON report.
+
+Against a running server:
+    python benchmarks/load_test.py --url http://localhost:8000
+
+Self-contained on a CPU-only box (starts the server with the stub engine):
+    python benchmarks/load_test.py --start-server --engine stub
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from common import BACKEND_DIR
+
+DATA_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "public", "data")
+
+
+def professor_payload(entry: Dict) -> Dict:
+    """
+    Convert a region dataset entry into an EvaluateRequest professor
+
+    The datasets only hold per-venue, per-year paper counts (titles are fetched
+    from DBLP by the frontend), so each venue/year becomes one publication with
+    a placeholder title. That keeps prompt sizes close to enriched professors.
+    """
+    publications = [
+        {"title": f"{venue.upper()} {year} paper", "year": int(year), "venue": venue}
+        for venue, years in (entry.get("publications") or {}).items()
+        for year in years
+    ]
+    publications.sort(key=lambda p: p["year"], reverse=True)
+    return {
+        "name": entry["name"],
+        "affiliation": entry.get("affiliation", ""),
+        "areas": entry.get("areas") or [],
+        "publicationList": publications
+    }
+
+
+def load_professors(data_dir: str, regions: Optional[List[str]] = None) -> List[Dict]:
+    """Read professors from every (or the selected) region file"""
+    professors = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "professors-*.json"))):
+        region = os.path.basename(path)[len("professors-"):-len(".json")]
+        if regions and region not in regions:
+            continue
+        with open(path, encoding="utf-8") as f:
+            professors.extend(professor_payload(p) for p in json.load(f)["professors"])
+    return professors
+
+
+def build_requests(
+    professors: List[Dict],
+    num_requests: int,
+    batch_size: int,
+    research_direction: str,
+    scoring_scheme: str,
+    prerank: Optional[bool] = None
+) -> List[Dict]:
+    """Slice professors into num_requests payloads, wrapping around the dataset"""
+    requests = []
+    for r in range(num_requests):
+        start = (r * batch_size) % len(professors)
+        batch = [professors[(start + i) % len(professors)] for i in range(batch_size)]
+        requests.append({
+            "professors": batch,
+            "research_direction": research_direction,
+            "scoring_scheme": scoring_scheme,
+            "prerank": prerank
+        })
+    return requests
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_load(client: httpx.AsyncClient, requests: List[Dict], concurrency: int, timeout: float) -> Dict:
+    """Send every request with at most `concurrency` in flight"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for payload in requests:
+        queue.put_nowait(payload)
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    evaluated = 0
+    invalid = 0
+    skipped = 0
+
+    async def worker():
+        nonlocal evaluated, invalid, skipped
+        while not queue.empty():
+            payload = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post("/evaluate_batch", json=payload, timeout=timeout)
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    key = f"HTTP {response.status_code}"
+                    errors[key] = errors.get(key, 0) + 1
+                    continue
+                body = response.json()
+                latencies.append(elapsed)
+                evaluated += len(body["results"])
+                skipped += body.get("prerank_skipped", 0)
+                invalid += sum(
+                    1 for r in body["results"] if r["reasoning"].startswith("Invalid model output")
+                )
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+                errors[key] = errors.get(key, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    failed = sum(errors.values())
+    return {
+        "wall_time_s": wall,
+        "requests": len(requests),
+        "failed_requests": failed,
+        "error_rate": failed / len(requests) if requests else 0.0,
+        "errors": errors,
+        "professors_evaluated": evaluated,
+        "professors_per_sec": evaluated / wall if wall > 0 else 0.0,
+        "requests_per_sec": len(latencies) / wall if wall > 0 else 0.0,
+        "invalid_outputs": invalid,
+        "prerank_skipped": skipped,
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": latencies[-1] if latencies else None
+        }
+    }
+
+
+async def prepare_server(client: httpx.AsyncClient, model_id: str, keep_cache: bool) -> Dict:
+    """Load the model if needed and clear the result cache"""
+    health = (await client.get("/health")).json()
+    if health.get("current_model") != model_id:
+        print(f"Loading {model_id}...", file=sys.stderr)
+        response = await client.post("/load_model", json={"model_id": model_id, "wait": True}, timeout=1800)
+        response.raise_for_status()
+    if not keep_cache:
+        await client.post("/clear_cache")
+    return (await client.get("/health")).json()
+
+
+def replay_coverage(pool: Dict) -> Optional[Dict]:
+    """Capture hits and misses of replayed models (None unless the server replays)"""
+    coverage = {m["model"]: m["replay"] for m in pool.get("models", []) if m.get("replay")}
+    for model_id, stats in coverage.items():
+        total = stats["hits"] + stats["misses"]
+        if stats["misses"]:
+            print(
+                f"⚠️ Replay of {model_id}: {stats['misses']}/{total} prompts missed the capture "
+                f"({stats['token_count_misses']} texts without recorded token counts); "
+                f"results are not a faithful replay",
+                file=sys.stderr
+            )
+    return coverage or None
+
+
+def _free_port() -> int:
+    """Pick an unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(engine: str, port: int, log_path: str) -> subprocess.Popen:
+    """Start uvicorn for server:app with the chosen engine (result cache in memory)"""
+    env = dict(os.environ, INFERENCE_ENGINE=engine, RESULT_CACHE_PATH="")
+    with open(log_path, "ab") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+             "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, process: subprocess.Popen, timeout: float = 120) -> None:
+    """Poll /health until the started server answers"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Server did not become healthy in time")
+
+
+async def main_async(args) -> Dict:
+    """Run the load test and build the report"""
+    professors = load_professors(args.data_dir, args.regions)
+    if not professors:
+        raise SystemExit(f"No professors found in {args.data_dir}")
+    requests = build_requests(
+        professors, args.requests, args.batch_size, args.research_direction, args.scoring_scheme,
+        True if args.prerank else None
+    )
+
+    process = None
+    url = args.url
+    if args.start_server:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        process = start_server(args.engine, port, args.server_log)
+
+    try:
+        async with httpx.AsyncClient(
+            base_url=url,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.concurrency + 2)
+        ) as client:
+            if process is not None:
+                await wait_until_healthy(client, process)
+            health = await prepare_server(client, args.model, args.keep_cache)
+
+            if args.warmup:
+                await run_load(client, requests[:args.warmup], args.concurrency, args.timeout)
+                if not args.keep_cache:
+                    await client.post("/clear_cache")
+
+            results = await run_load(client, requests, args.concurrency, args.timeout)
+            replay = replay_coverage((await client.get("/pool")).json())
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    return {
+        "config": {
+            "url": url,
+            "engine": args.engine if args.start_server else None,
+            "model": health.get("current_model"),
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "dataset_professors": len(professors),
+            "regions": args.regions or "all",
+            "research_direction": args.research_direction,
+            "scoring_scheme": args.scoring_scheme,
+            "prerank": args.prerank,
+            "result_cache_cleared": not args.keep_cache
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        },
+        "results": results,
+        "replay": replay
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend base URL")
+    parser.add_argument("--start-server", action="store_true", help="Start a local server for the run")
+    parser.add_argument("--engine", default="stub", choices=["stub", "replay", "cpu", "vllm"],
+                        help="INFERENCE_ENGINE for --start-server")
+    parser.add_argument("--server-log", default=os.devnull, help="Log file for --start-server")
+    parser.add_argument("--model", default="qwen-0.5b", help="Model to load before the run")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory with professors-*.json")
+    parser.add_argument("--regions", nargs="*", help="Region files to use, e.g. canada europe")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--batch-size", type=int, default=20, help="Professors per request")
+    parser.add_argument("--requests", type=int, default=50, help="Requests to send")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests sent first")
+    parser.add_argument("--research-direction", default="machine learning systems and efficient inference")
+    parser.add_argument("--scoring-scheme", default="original", choices=["original", "decision_tree"])
+    parser.add_argument("--prerank", action="store_true",
+                        help="Keep professors without lexical overlap away from the LLM (pre-ranking)")
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="Do not clear the result cache (measures cache hits, not generation)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", default="load_test_report.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    results = report["results"]
+    latency = results["latency_s"]
+    print(
+        f"{results['requests']} requests x {args.batch_size} professors @ concurrency {args.concurrency}: "
+        f"{results['professors_per_sec']:.1f} professors/sec | "
+        f"p50 {latency['p50'] or 0:.3f}s p95 {latency['p95'] or 0:.3f}s p99 {latency['p99'] or 0:.3f}s | "
+        f"error rate {results['error_rate']:.1%}"
+    )
+    print(f"Report written to {args.output}")
+    return 1 if results["failed_requests"] == results["requests"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
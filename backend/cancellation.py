@@ -0,0 +1,139 @@
+"""
+Cancellation of running evaluation requests
+Runs a request's evaluation as a task that is cancelled when its deadline
+passes, its client disconnects or DELETE /evaluations/{request_id} names
+it. Cancelling the task cancels its scheduler futures, which drops queued
+prompts and aborts the sequences already on the engine.
+"""
+
+import asyncio
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+# How often a running request checks whether its client is still connected (seconds)
+DISCONNECT_POLL_INTERVAL = 0.25
+
+T = TypeVar("T")
+
+
+class RequestAborted(Exception):
+    """An evaluation stopped before it finished"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        # "cancelled", "deadline" or "disconnected"
+        self.reason = reason
+
+
+class _ActiveRequest:
+    """A running request and the step it is waiting on"""
+
+    __slots__ = ("task", "reason")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.reason: Optional[str] = None  # Set once the request is cancelled
+
+
+class ActiveRequests:
+    """Running evaluation requests by id, for one event loop"""
+
+    def __init__(self):
+        self._requests: Dict[str, _ActiveRequest] = {}
+
+    def __contains__(self, request_id: str) -> bool:
+        return request_id in self._requests
+
+    def ids(self) -> List[str]:
+        """Ids of the running requests"""
+        return list(self._requests)
+
+    def add(self, request_id: Optional[str] = None) -> str:
+        """
+        Register a request; remove() it when it ends
+
+        Args:
+            request_id: Client-chosen id (None = generate one)
+
+        Returns:
+            The request id
+
+        Raises:
+            ValueError: If a request with this id is already running
+        """
+        request_id = request_id or uuid.uuid4().hex[:12]
+        if request_id in self._requests:
+            raise ValueError(f"Request {request_id} is already running")
+        self._requests[request_id] = _ActiveRequest()
+        return request_id
+
+    def remove(self, request_id: str) -> None:
+        """Forget a finished request"""
+        self._requests.pop(request_id, None)
+
+    def cancel(self, request_id: str) -> None:
+        """
+        Cancel a running request
+
+        Raises:
+            ValueError: If no request with this id is running
+        """
+        active = self._requests.get(request_id)
+        if active is None:
+            raise ValueError(f"Request {request_id} is not running")
+        active.reason = "cancelled"
+        if active.task is not None:
+            active.task.cancel()
+
+    async def run(
+        self,
+        request_id: str,
+        step: Awaitable[T],
+        deadline: Optional[float] = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> T:
+        """
+        Await one step of a registered request, cancelling it if the request is aborted
+
+        Args:
+            request_id: Id from add()
+            step: Coroutine doing the work
+            deadline: loop.time() by which the request must finish (None = no deadline)
+            is_disconnected: Checked every DISCONNECT_POLL_INTERVAL (None = not checked)
+
+        Raises:
+            RequestAborted: If the request was cancelled, missed its deadline or lost its client
+        """
+        active = self._requests[request_id]
+        if active.reason is not None:
+            step.close()
+            raise RequestAborted(active.reason)
+        loop = asyncio.get_running_loop()
+        task = active.task = asyncio.ensure_future(step)
+        try:
+            while True:
+                timeout = DISCONNECT_POLL_INTERVAL if is_disconnected is not None else None
+                if deadline is not None:
+                    remaining = deadline - loop.time()
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                if timeout is None or timeout > 0:
+                    await asyncio.wait([task], timeout=timeout)
+                if task.done():
+                    break
+                if deadline is not None and loop.time() >= deadline:
+                    active.reason = "deadline"
+                elif is_disconnected is not None and await is_disconnected():
+                    active.reason = "disconnected"
+                else:
+                    continue
+                task.cancel()
+                await asyncio.wait([task])
+                break
+        finally:
+            active.task = None
+            if not task.done():
+                # The caller itself was cancelled
+                task.cancel()
+        if task.cancelled() and active.reason is not None:
+            raise RequestAborted(active.reason)
+        return task.result()
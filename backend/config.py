@@ -0,0 +1,268 @@
+"""
+Runtime configuration for the vLLM backend
+Every setting can be overridden with an environment variable of the same name
+"""
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_weights(name: str) -> dict:
+    """Read a "key=weight,key=weight" setting from the environment"""
+    weights = {}
+    for part in os.environ.get(name, "").split(","):
+        key, _, value = part.partition("=")
+        if key.strip() and value.strip():
+            weights[key.strip()] = float(value)
+    return weights
+
+
+# Micro-batching scheduler
+# Prompts from concurrent /evaluate_batch calls are merged into one engine batch
+# of at most SCHEDULER_MAX_BATCH_SIZE prompts. The worker waits up to
+# SCHEDULER_MAX_WAIT_MS after the first queued prompt for more work to arrive.
+SCHEDULER_MAX_BATCH_SIZE = _env_int("SCHEDULER_MAX_BATCH_SIZE", 256)
+SCHEDULER_MAX_WAIT_MS = _env_float("SCHEDULER_MAX_WAIT_MS", 20.0)
+
+# Batch autotuning
+# Each model's batches start at its remembered batch size (else
+# BATCH_TUNER_INITIAL_SIZE) and, while batches are full, grow by
+# BATCH_TUNER_GROWTH after every BATCH_TUNER_WINDOW batches for as long as
+# prompts/sec improves by more than BATCH_TUNER_MIN_GAIN, the engine keeps
+# BATCH_TUNER_MIN_HEADROOM of its memory free and a batch takes less than
+# BATCH_TUNER_MAX_BATCH_SECONDS (0 = no latency bound). Once growth stops
+# paying off the best size is kept and re-probed every
+# BATCH_TUNER_PROBE_WINDOWS windows. An out-of-memory failure halves the
+# batch size and token budget; any failed batch is split in half and
+# retried instead of failing its requests. The tuned settings of each model
+# are kept in BATCH_TUNING_PATH ("" = memory only). SCHEDULER_MAX_BATCH_SIZE
+# stays the upper bound.
+BATCH_TUNER_ENABLED = _env_int("BATCH_TUNER_ENABLED", 1) == 1
+BATCH_TUNER_INITIAL_SIZE = _env_int("BATCH_TUNER_INITIAL_SIZE", 64)
+BATCH_TUNER_WINDOW = _env_int("BATCH_TUNER_WINDOW", 4)
+BATCH_TUNER_GROWTH = _env_float("BATCH_TUNER_GROWTH", 1.5)
+BATCH_TUNER_MIN_GAIN = _env_float("BATCH_TUNER_MIN_GAIN", 0.05)
+BATCH_TUNER_MIN_HEADROOM = _env_float("BATCH_TUNER_MIN_HEADROOM", 0.05)
+BATCH_TUNER_MAX_BATCH_SECONDS = _env_float("BATCH_TUNER_MAX_BATCH_SECONDS", 60.0)
+BATCH_TUNER_PROBE_WINDOWS = _env_int("BATCH_TUNER_PROBE_WINDOWS", 50)
+BATCH_TUNING_PATH = os.environ.get(
+    "BATCH_TUNING_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "batch_tuning.json")
+)
+
+# GPU memory
+# vLLM claims the GPU memory free at load time minus GPU_MEMORY_RESERVE_GB
+# (at most GPU_MEMORY_MAX_UTILIZATION of the device, scaled by the model's
+# pool share). A load that runs out of memory is retried up to
+# MODEL_LOAD_OOM_RETRIES times with 15% less, and the reduction that worked
+# is remembered with the model's batch tuning.
+GPU_MEMORY_RESERVE_GB = _env_float("GPU_MEMORY_RESERVE_GB", 1.5)
+GPU_MEMORY_MAX_UTILIZATION = _env_float("GPU_MEMORY_MAX_UTILIZATION", 0.9)
+MODEL_LOAD_OOM_RETRIES = _env_int("MODEL_LOAD_OOM_RETRIES", 2)
+
+# Admission control and priority lanes
+# Requests of more than INTERACTIVE_MAX_PROFESSORS professors (or with
+# "priority": "bulk"), and evaluation jobs, go to the bulk lane; the rest are
+# interactive and fill batches first. While bulk prompts wait, at least
+# SCHEDULER_BULK_MIN_SHARE of each batch goes to them. A request is rejected
+# with 429 and Retry-After when admitting it would put more than
+# ADMISSION_MAX_PROMPTS prompts in flight (0 = no limit), more than
+# ADMISSION_BULK_SHARE of that in the bulk lane, or more than
+# ADMISSION_CLIENT_SHARE of it on one client (X-Client-Id header, else the
+# client address). CLIENT_WEIGHTS ("client=weight,...") scales a client's
+# share of the batches and of the queue (default weight 1).
+ADMISSION_MAX_PROMPTS = _env_int("ADMISSION_MAX_PROMPTS", 2048)
+ADMISSION_BULK_SHARE = _env_float("ADMISSION_BULK_SHARE", 0.75)
+ADMISSION_CLIENT_SHARE = _env_float("ADMISSION_CLIENT_SHARE", 0.5)
+INTERACTIVE_MAX_PROFESSORS = _env_int("INTERACTIVE_MAX_PROFESSORS", 100)
+SCHEDULER_BULK_MIN_SHARE = _env_float("SCHEDULER_BULK_MIN_SHARE", 0.1)
+CLIENT_WEIGHTS = _env_weights("CLIENT_WEIGHTS")
+
+# Request bodies
+# /evaluate_batch rejects a body with 413 when it, or what it decompresses
+# to, exceeds MAX_REQUEST_BODY_BYTES (0 = no limit). A 1k-professor JSON body
+# is about 2.5 MB.
+MAX_REQUEST_BODY_BYTES = _env_int("MAX_REQUEST_BODY_BYTES", 64 * 1024 * 1024)
+
+# Deadlines
+# An evaluation still running REQUEST_TIMEOUT_S seconds after it arrived is
+# aborted with 504 and its prompts are dropped (0 = no deadline); requests
+# can set their own "timeout". Client disconnects abort requests the same way.
+REQUEST_TIMEOUT_S = _env_float("REQUEST_TIMEOUT_S", 0.0)
+
+# Evaluation result cache
+# Parsed results are cached by (model, sampling params, scoring scheme, prompt hash).
+# Set RESULT_CACHE_PATH to an empty string to keep the cache in memory only.
+# The SQLite tier keeps at most RESULT_CACHE_MAX_ENTRIES results (oldest
+# evicted first, 0 = no cap) and drops results older than RESULT_CACHE_TTL_S
+# seconds (0 = never).
+RESULT_CACHE_ENABLED = _env_int("RESULT_CACHE_ENABLED", 1) == 1
+RESULT_CACHE_MEMORY_SIZE = _env_int("RESULT_CACHE_MEMORY_SIZE", 10000)
+RESULT_CACHE_MAX_ENTRIES = _env_int("RESULT_CACHE_MAX_ENTRIES", 200000)
+RESULT_CACHE_TTL_S = _env_float("RESULT_CACHE_TTL_S", 30 * 24 * 3600.0)
+RESULT_CACHE_PATH = os.environ.get(
+    "RESULT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "results.sqlite3")
+)
+
+# Single-flight coalescing
+# A prompt identical to one already queued or generating (same model, sampling,
+# scoring scheme and prompt) waits for that sequence instead of submitting another
+COALESCE_PROMPTS = _env_int("COALESCE_PROMPTS", 1) == 1
+
+# Prompt layout: "standard" keeps the templates' original order; "prefix"
+# (opt-in) puts the system prompt and research direction before the
+# per-professor block so prompts share a long cacheable prefix
+PROMPT_LAYOUT = os.environ.get("PROMPT_LAYOUT", "standard")
+
+# Let vLLM reuse KV cache blocks for shared prompt prefixes
+ENABLE_PREFIX_CACHING = _env_int("ENABLE_PREFIX_CACHING", 1) == 1
+
+# Token budgets
+# Every prompt must fit in MAX_MODEL_LEN together with MAX_NEW_TOKENS of output
+# and PROMPT_TOKEN_MARGIN tokens of slack; longer prompts get their publication
+# list trimmed. Engine batches are capped by the model's "max_batch_tokens".
+MAX_MODEL_LEN = _env_int("MAX_MODEL_LEN", 4096)
+MAX_NEW_TOKENS = _env_int("MAX_NEW_TOKENS", 128)
+PROMPT_TOKEN_MARGIN = _env_int("PROMPT_TOKEN_MARGIN", 16)
+
+# Lexical pre-ranking
+# Professors are scored against the research direction with BM25 over their
+# publication titles, venues and areas before any prompt is built. Only those
+# whose normalized score (0-1) exceeds PRERANK_MIN_SCORE, and at most
+# PRERANK_TOP_K of them (0 = no cap), are sent to the LLM; the others come
+# back not evaluated (no score). The filter is lossy, so it is off unless
+# PRERANK_ENABLED=1 or a request asks for it. A cutoff of 0 only skips
+# professors sharing no term with the research direction. Requests can
+# override all three.
+PRERANK_ENABLED = _env_int("PRERANK_ENABLED", 0) == 1
+PRERANK_MIN_SCORE = _env_float("PRERANK_MIN_SCORE", 0.0)
+PRERANK_TOP_K = _env_int("PRERANK_TOP_K", 0)
+
+# Model pool
+# Loaded models stay resident until loading another would exceed
+# MODEL_POOL_MEMORY_GB; the least recently used idle model is evicted first.
+# A model's footprint is its catalog "vram" ("ram" for CPU models), and on
+# vLLM each model gets that fraction of the GPU memory budget. 0 keeps a
+# single model resident, so every load replaces the previous model.
+MODEL_POOL_MEMORY_GB = _env_float("MODEL_POOL_MEMORY_GB", 0.0)
+
+# Engine replicas
+# ENGINE_REPLICAS > 1 runs each loaded model in that many worker processes
+# and sends every engine batch to the one with the fewest outstanding
+# prompts, with one batch in flight per replica. ENGINE_REPLICA_DEVICES pins replica i to the i-th
+# CUDA device of a comma-separated list (default 0..N-1 for vLLM; CPU, stub
+# and replay replicas are not pinned). Crashed workers are restarted and
+# their unfinished prompts re-sent to another replica.
+ENGINE_REPLICAS = max(1, _env_int("ENGINE_REPLICAS", 1))
+ENGINE_REPLICA_DEVICES = os.environ.get("ENGINE_REPLICA_DEVICES", "")
+
+# Model loading
+# /load_model returns a job right away and loads in the background. Before a
+# model is marked ready it generates one warmup batch of MODEL_WARMUP_PROMPTS
+# sample prompts (0 skips warmup). Evaluation requests for a model that is
+# still loading wait up to MODEL_LOAD_WAIT_S for it, then fail with 503.
+MODEL_WARMUP_PROMPTS = _env_int("MODEL_WARMUP_PROMPTS", 4)
+MODEL_LOAD_WAIT_S = _env_float("MODEL_LOAD_WAIT_S", 900.0)
+
+# Cascade evaluation
+# With CASCADE_MODEL set (e.g. "qwen-7b"), cascade requests are scored by the
+# loaded model first and only professors whose score lies within CASCADE_BAND
+# of the request threshold (or whose output stayed invalid) are re-scored by
+# CASCADE_MODEL, which is loaded next to the first model on first use. On vLLM
+# the cascade model gets CASCADE_GPU_SHARE of the usual GPU memory budget and
+# the loaded model the rest. Requests cascade by default when CASCADE_MODEL is
+# set; they can opt out with "cascade": false or change the band.
+CASCADE_MODEL = os.environ.get("CASCADE_MODEL", "")
+CASCADE_BAND = _env_float("CASCADE_BAND", 0.15)
+CASCADE_GPU_SHARE = _env_float("CASCADE_GPU_SHARE", 0.7)
+
+# Vector index
+# scripts/build-vector-index.py writes the professor vectors (professors.npy)
+# and their id map (professors.json); the server memory-maps them at startup
+# and serves /retrieve. The default matches the ./cache volume in Docker.
+VECTOR_INDEX_DIR = os.environ.get(
+    "VECTOR_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "vector-index")
+)
+
+# Professor store
+# The region files in PROFESSOR_DATA_DIR (the frontend's public/data) are
+# loaded once at startup, so requests and jobs can name professors by id
+# ("<region>:<hash of name and affiliation>") instead of sending them. Publication lists posted
+# to /professors/publications are appended to PROFESSOR_PUBLICATIONS_PATH
+# and reloaded at startup ("" keeps them in memory only).
+PROFESSOR_DATA_DIR = os.environ.get(
+    "PROFESSOR_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "public", "data")
+)
+PROFESSOR_PUBLICATIONS_PATH = os.environ.get(
+    "PROFESSOR_PUBLICATIONS_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "publications.jsonl")
+)
+
+# Evaluation jobs
+# POST /jobs evaluates every professor of some regions on the server. Jobs
+# run JOB_BATCH_SIZE professors at a time and append each finished batch to a
+# checkpoint under JOB_DIR, so unfinished jobs resume after a restart.
+# JOB_CONCURRENCY jobs run at once; the JOB_HISTORY most recent finished jobs
+# are kept.
+JOB_DIR = os.environ.get(
+    "JOB_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "jobs")
+)
+JOB_BATCH_SIZE = _env_int("JOB_BATCH_SIZE", 64)
+JOB_CONCURRENCY = _env_int("JOB_CONCURRENCY", 1)
+JOB_HISTORY = _env_int("JOB_HISTORY", 100)
+
+# Invalid outputs are re-generated with stricter (greedy, JSON-only) sampling
+# up to MAX_REPAIR_ATTEMPTS times before falling back to a 0.0 score
+MAX_REPAIR_ATTEMPTS = _env_int("MAX_REPAIR_ATTEMPTS", 2)
+
+# Inference engine
+# Each model runs on the backend named by its "backend" entry in
+# model_catalog.py ("vllm" on GPU, "cpu" via transformers). INFERENCE_ENGINE
+# forces every model onto one backend: "vllm", "cpu", "replay" (see below) or
+# "stub" (a deterministic CPU stand-in for load tests and CI whose outputs
+# depend only on the prompt). The stub simulates batched decoding at
+# STUB_SECONDS_PER_TOKEN per step, and STUB_INVALID_RATE of its outputs are
+# degenerate to exercise the repair path. STUB_LOAD_SECONDS simulates a
+# slow model load, and batches of more than STUB_MEMORY_TOKENS prompt and
+# output tokens fail with an out-of-memory error (0 = never).
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "auto")
+STUB_SECONDS_PER_TOKEN = _env_float("STUB_SECONDS_PER_TOKEN", 0.01)
+STUB_INVALID_RATE = _env_float("STUB_INVALID_RATE", 0.0)
+STUB_LOAD_SECONDS = _env_float("STUB_LOAD_SECONDS", 0.0)
+STUB_MEMORY_TOKENS = _env_int("STUB_MEMORY_TOKENS", 0)
+
+# CPU backend
+# CPU_WORKERS micro-batches of CPU_MICRO_BATCH_SIZE prompts are generated at
+# once, each with CPU_INTRA_OP_THREADS torch threads (0 = cores / workers).
+# CPU_QUANTIZE applies dynamic INT8 quantization to models marked "int8".
+CPU_WORKERS = _env_int("CPU_WORKERS", 2)
+CPU_INTRA_OP_THREADS = _env_int("CPU_INTRA_OP_THREADS", 0)
+CPU_MICRO_BATCH_SIZE = _env_int("CPU_MICRO_BATCH_SIZE", 8)
+CPU_QUANTIZE = _env_int("CPU_QUANTIZE", 1) == 1
+
+# Record and replay
+# ENGINE_RECORD_PATH appends every engine output (text, token counts,
+# latency; prompts only as hashes) to a JSONL file. INFERENCE_ENGINE=replay
+# serves outputs from REPLAY_PATH instead of running a model. REPLAY_TIMING
+# is "none", "tokens" (REPLAY_SECONDS_PER_TOKEN per batched decode step) or
+# "recorded"; REPLAY_MISSING is "stub" (deterministic fallback) or "error".
+ENGINE_RECORD_PATH = os.environ.get("ENGINE_RECORD_PATH", "")
+REPLAY_PATH = os.environ.get("REPLAY_PATH", "")
+REPLAY_TIMING = os.environ.get("REPLAY_TIMING", "none")
+REPLAY_SECONDS_PER_TOKEN = _env_float("REPLAY_SECONDS_PER_TOKEN", 0.01)
+REPLAY_MISSING = os.environ.get("REPLAY_MISSING", "stub")
@@ -0,0 +1,347 @@
+"""
+CPU inference backend
+Runs batched generation with Hugging Face transformers on commodity CPUs:
+prompts are split into length-sorted micro-batches that a thread pool
+generates concurrently, each with its own set of intra-op threads
+"""
+
+import asyncio
+import gc
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from config import CPU_INTRA_OP_THREADS, CPU_MICRO_BATCH_SIZE, CPU_QUANTIZE, CPU_WORKERS, MAX_NEW_TOKENS
+from engine_base import Aborted, CompletionOutput, EngineOutput, InferenceEngine, LoadProgress, download_model
+from model_catalog import AVAILABLE_MODELS
+
+logger = logging.getLogger(__name__)
+
+
+class CPUSamplingParams(NamedTuple):
+    """Generation settings for the CPU backend (subset of vLLM SamplingParams)"""
+    temperature: float
+    top_p: float = 1.0
+    max_tokens: int = MAX_NEW_TOKENS
+    repetition_penalty: float = 1.0
+    stop: Tuple[str, ...] = ()  # Output is cut after the first stop string
+
+
+class CPUEngine(InferenceEngine):
+    """
+    transformers-based engine for machines without a GPU
+
+    Models are loaded in float32 and, when the catalog entry asks for int8
+    and CPU_QUANTIZE is on, dynamically quantized (int8 Linear layers) which
+    roughly halves memory and speeds up matmuls. ``workers`` micro-batches
+    run at once and share the model weights; each uses ``intra_op_threads``
+    torch threads, so workers x threads should not exceed the core count.
+    """
+
+    def __init__(
+        self,
+        workers: int = CPU_WORKERS,
+        intra_op_threads: int = CPU_INTRA_OP_THREADS,
+        micro_batch_size: int = CPU_MICRO_BATCH_SIZE,
+        quantize: bool = CPU_QUANTIZE
+    ):
+        super().__init__()
+        self.workers = max(1, workers)
+        self.intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.micro_batch_size = max(1, micro_batch_size)
+        self.quantize = quantize
+        self.model = None
+        self.tokenizer = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Fast tokenizers are not safe to call from several threads at once
+        self._tokenizer_lock = threading.Lock()
+        # Stop strings -> StopStringCriteria (building one scans the vocabulary)
+        self._stop_criteria: Dict[Tuple[str, ...], Any] = {}
+        self._request_counter = itertools.count()
+
+    def is_loaded(self) -> bool:
+        """Check if model is loaded"""
+        return self.model is not None
+
+    async def load_model(self, model_id: str, progress: Optional[LoadProgress] = None) -> None:
+        """
+        Load a model from the catalog onto the CPU
+
+        Raises:
+            ValueError: If model_id is not recognized
+            RuntimeError: If model loading fails
+        """
+        if model_id not in AVAILABLE_MODELS:
+            raise ValueError(
+                f"Unknown model: {model_id}. "
+                f"Available: {list(AVAILABLE_MODELS.keys())}"
+            )
+        if self.model is not None:
+            await self.unload_model()
+
+        try:
+            if progress is not None:
+                progress("downloading")
+            await asyncio.to_thread(download_model, AVAILABLE_MODELS[model_id]["model_path"])
+            if progress is not None:
+                progress("initializing")
+            await asyncio.to_thread(self._load, model_id, AVAILABLE_MODELS[model_id])
+        except Exception as e:
+            logger.error(f"❌ Failed to load model {model_id}: {e}")
+            self.model = None
+            self.tokenizer = None
+            raise RuntimeError(f"Model loading failed: {str(e)}")
+
+    def _load(self, model_id: str, model_config: Dict) -> None:
+        """Blocking part of load_model"""
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        model_path = model_config["model_path"]
+        logger.info(
+            f"Loading model on CPU: {model_path} "
+            f"({self.workers} workers x {self.intra_op_threads} threads)"
+        )
+        torch.set_num_threads(self.intra_op_threads)
+
+        tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        # Decoder-only models must be left-padded for batched generation
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+
+        model = AutoModelForCausalLM.from_pretrained(
+            model_path, torch_dtype=torch.float32, trust_remote_code=True
+        )
+        model.eval()
+        if self.quantize and model_config.get("quantization") == "int8":
+            logger.info(f"Applying dynamic INT8 quantization for {model_id}")
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        self.tokenizer = tokenizer
+        self.model = model
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu-gen")
+        self.current_model = model_id
+        self.sampling_params = CPUSamplingParams(temperature=0.2, top_p=0.8, repetition_penalty=1.1)
+        # Greedy and stopped at the first closing brace (no guided decoding on CPU)
+        self.retry_sampling_params = CPUSamplingParams(temperature=0.0, repetition_penalty=1.1, stop=("}",))
+        logger.info(f"✅ Model loaded on CPU: {model_id}")
+
+    async def unload_model(self) -> None:
+        """Unload current model and free memory"""
+        if self.model is not None:
+            logger.info(f"Unloading model: {self.current_model}")
+            executor, self._executor = self._executor, None
+            self.model = None
+            self.tokenizer = None
+            self._stop_criteria = {}
+            self.current_model = None
+            self.sampling_params = None
+            self.retry_sampling_params = None
+            # Let in-flight micro-batches finish before releasing the weights
+            if executor is not None:
+                await asyncio.to_thread(executor.shutdown, True)
+            gc.collect()
+            logger.info("✅ Model unloaded")
+
+    def generate_batch(
+        self,
+        prompts: List[str],
+        sampling_params: Optional[List[Optional[CPUSamplingParams]]] = None
+    ) -> List[EngineOutput]:
+        """
+        Generate responses for a batch of prompts
+
+        Args:
+            prompts: List of prompt strings
+            sampling_params: Per-prompt sampling parameters (None entries use the default)
+
+        Returns:
+            List of outputs in prompt order
+        """
+        outputs: List[Optional[EngineOutput]] = [None] * len(prompts)
+
+        def collect(index: int, output: EngineOutput) -> None:
+            outputs[index] = output
+
+        self.generate_stream(prompts, collect, sampling_params)
+        return outputs
+
+    def generate_stream(
+        self,
+        prompts: List[str],
+        on_output: Callable[[int, EngineOutput], None],
+        sampling_params: Optional[List[Optional[CPUSamplingParams]]] = None,
+        aborted: Optional[Aborted] = None
+    ) -> None:
+        """
+        Generate responses and report each micro-batch as soon as it finishes
+
+        A micro-batch whose prompts are all aborted is skipped, or stopped
+        at the next decode step if it is already generating.
+
+        Raises:
+            RuntimeError: If model is not loaded or generation fails
+        """
+        model, executor = self.model, self._executor
+        if model is None or executor is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+
+        logger.info(f"CPU generation for batch of {len(prompts)} prompts")
+        start_time = time.time()
+
+        try:
+            chunks = self._plan_chunks(prompts, self._resolve_sampling(prompts, sampling_params))
+            futures = {
+                executor.submit(self._generate_chunk, model, encoded, params, indices, aborted):
+                    (indices, encoded, params)
+                for indices, encoded, params in chunks
+            }
+            for future in as_completed(futures):
+                indices, encoded, params = futures[future]
+                generated = future.result()
+                if generated is None:
+                    continue
+                outputs = self._decode_chunk(prompts, indices, encoded, params, generated)
+                for index, output in zip(indices, outputs):
+                    on_output(index, output)
+        except Exception as e:
+            logger.error(f"❌ CPU generation failed: {e}")
+            raise RuntimeError(f"Generation failed: {str(e)}")
+
+        elapsed = time.time() - start_time
+        rate = len(prompts) / elapsed if elapsed > 0 else 0.0
+        logger.info(f"✅ CPU batch complete: {len(prompts)} prompts in {elapsed:.2f}s ({rate:.2f} prompts/sec)")
+
+    def _plan_chunks(
+        self,
+        prompts: List[str],
+        params: List[CPUSamplingParams]
+    ) -> List[Tuple[List[int], Any, CPUSamplingParams]]:
+        """
+        Group prompts into micro-batches and tokenize them
+
+        Prompts sharing sampling parameters are sorted by length before
+        slicing, so each micro-batch pads as little as possible.
+        """
+        groups: Dict[CPUSamplingParams, List[int]] = {}
+        for index, p in enumerate(params):
+            groups.setdefault(p, []).append(index)
+
+        chunks = []
+        for p, indices in groups.items():
+            indices.sort(key=lambda i: len(prompts[i]))
+            for start in range(0, len(indices), self.micro_batch_size):
+                chunk = indices[start:start + self.micro_batch_size]
+                with self._tokenizer_lock:
+                    encoded = self.tokenizer(
+                        [prompts[i] for i in chunk], return_tensors="pt",
+                        padding=True, add_special_tokens=False
+                    )
+                chunks.append((chunk, encoded, p))
+        return chunks
+
+    def _stop_string_criteria(self, stop: Tuple[str, ...]):
+        """Stopping criterion that ends a sequence once it ends with one of the stop strings"""
+        criteria = self._stop_criteria.get(stop)
+        if criteria is None:
+            from transformers import StopStringCriteria
+
+            with self._tokenizer_lock:
+                criteria = StopStringCriteria(self.tokenizer, list(stop))
+            self._stop_criteria[stop] = criteria
+        return criteria
+
+    def _generate_chunk(
+        self,
+        model,
+        encoded,
+        params: CPUSamplingParams,
+        indices: List[int],
+        aborted: Optional[Aborted] = None
+    ):
+        """Run model.generate for one micro-batch (worker thread); None if all its prompts were aborted"""
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        def chunk_aborted() -> bool:
+            return aborted is not None and all(aborted(i) for i in indices)
+
+        class _StopWhenAborted(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs) -> bool:
+                return chunk_aborted()
+
+        if chunk_aborted():
+            return None
+        # Stop strings end each sequence as soon as they are generated, so
+        # a retry does not decode a full MAX_NEW_TOKENS tail that gets cut off
+        criteria = [self._stop_string_criteria(params.stop)] if params.stop else []
+        if aborted is not None:
+            criteria.append(_StopWhenAborted())
+        sample = params.temperature > 0
+        with torch.inference_mode():
+            output_ids = model.generate(
+                input_ids=encoded["input_ids"],
+                attention_mask=encoded["attention_mask"],
+                max_new_tokens=params.max_tokens,
+                do_sample=sample,
+                temperature=params.temperature if sample else None,
+                top_p=params.top_p if sample else None,
+                repetition_penalty=params.repetition_penalty,
+                pad_token_id=self.tokenizer.pad_token_id,
+                stopping_criteria=StoppingCriteriaList(criteria) if criteria else None
+            )
+        if chunk_aborted():
+            return None
+        # Keep only the generated continuation
+        return output_ids[:, encoded["input_ids"].shape[1]:]
+
+    def _decode_chunk(
+        self,
+        prompts: List[str],
+        indices: List[int],
+        encoded,
+        params: CPUSamplingParams,
+        generated
+    ) -> List[EngineOutput]:
+        """Turn the generated token ids of one micro-batch into outputs"""
+        # Sequences that finished before the longest one in the micro-batch
+        # are padded after their end, which is not generated output
+        ends = {self.tokenizer.eos_token_id, self.tokenizer.pad_token_id}
+        outputs = []
+        for row, (index, mask) in enumerate(zip(indices, encoded["attention_mask"])):
+            token_ids = generated[row].tolist()
+            token_ids = token_ids[:next((i for i, t in enumerate(token_ids) if t in ends), len(token_ids))]
+            with self._tokenizer_lock:
+                text = self.tokenizer.decode(token_ids, skip_special_tokens=True)
+            for stop in params.stop:
+                cut = text.find(stop)
+                if cut != -1:
+                    text = text[:cut + len(stop)]
+            prompt_tokens = int(mask.sum())
+            outputs.append(EngineOutput(
+                f"cpu-{next(self._request_counter)}",
+                prompts[index],
+                encoded["input_ids"][row, -prompt_tokens:].tolist(),
+                CompletionOutput(text, token_ids)
+            ))
+        return outputs
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Count tokens for each text with the loaded model's tokenizer
+
+        Raises:
+            RuntimeError: If model is not loaded
+        """
+        if self.tokenizer is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        if not texts:
+            return []
+        with self._tokenizer_lock:
+            encoded = self.tokenizer(texts, add_special_tokens=False)
+        return [len(ids) for ids in encoded["input_ids"]]
@@ -0,0 +1,241 @@
+"""
+Inference engine interface
+Every backend (vLLM, CPU, stub) implements InferenceEngine; outputs follow
+the shape of vLLM's RequestOutput so callers never depend on the backend
+"""
+
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from model_catalog import AVAILABLE_MODELS
+
+# Called with the loading stage ("downloading", "initializing") as a load advances
+LoadProgress = Callable[[str], None]
+
+# Polled with a prompt index during generation; True once nobody wants that
+# prompt's output any more, so the engine may drop the sequence
+Aborted = Callable[[int], bool]
+
+# How often simulated backends check for aborted sequences while they sleep (seconds)
+ABORT_POLL_INTERVAL = 0.05
+
+# Weight and tokenizer files fetched before a model is initialized
+_DOWNLOAD_PATTERNS = ["*.json", "*.safetensors", "*.txt", "*.model", "*.tiktoken", "*.py"]
+
+
+def download_model(model_path: str, cache_dir: Optional[str] = None) -> None:
+    """
+    Fetch a model's files from the Hugging Face Hub into the local cache (blocking)
+
+    Files already cached are not downloaded again. Without huggingface_hub
+    this does nothing and the loader downloads the model itself.
+    """
+    try:
+        from huggingface_hub import snapshot_download
+    except ImportError:
+        return
+    snapshot_download(model_path, cache_dir=cache_dir, allow_patterns=_DOWNLOAD_PATTERNS)
+
+
+def sleep_unless_aborted(seconds: float, indices: Iterable[int], aborted: Optional[Aborted]) -> bool:
+    """
+    Sleep through a simulated decode step, stopping early once every sequence is aborted
+
+    Returns:
+        True if every sequence in ``indices`` was aborted
+    """
+    indices = list(indices)
+    end = time.monotonic() + seconds
+    while True:
+        if aborted is not None and all(aborted(i) for i in indices):
+            return True
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(remaining, ABORT_POLL_INTERVAL) if aborted is not None else remaining)
+
+# Output shape enforced when re-generating invalid outputs
+EVALUATION_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number", "minimum": 0, "maximum": 1},
+        "reasoning": {"type": "string"},
+        "research_summary": {"type": "string"}
+    },
+    "required": ["score", "reasoning", "research_summary"]
+}
+
+
+class CompletionOutput:
+    """Generated sequence (mirrors vLLM CompletionOutput)"""
+
+    __slots__ = ("text", "token_ids")
+
+    def __init__(self, text: str, token_ids: List[int]):
+        self.text = text
+        self.token_ids = token_ids
+
+
+class EngineOutput:
+    """Finished request (mirrors vLLM RequestOutput)"""
+
+    __slots__ = ("request_id", "prompt", "prompt_token_ids", "outputs", "finished", "num_cached_tokens")
+
+    def __init__(
+        self,
+        request_id: str,
+        prompt: str,
+        prompt_token_ids: List[int],
+        completion: CompletionOutput,
+        num_cached_tokens: Optional[int] = None
+    ):
+        self.request_id = request_id
+        self.prompt = prompt
+        self.prompt_token_ids = prompt_token_ids
+        self.outputs = [completion]
+        self.finished = True
+        self.num_cached_tokens = num_cached_tokens
+
+
+class InferenceEngine(ABC):
+    """
+    Model lifecycle and batched generation for one backend
+
+    Subclasses implement loading, generation and tokenization; the shared
+    methods here only rely on the output shape above.
+    """
+
+    # Whether a freshly loaded model should generate a warmup batch first
+    needs_warmup = True
+
+    def __init__(self):
+        self.current_model: Optional[str] = None
+        self.sampling_params: Any = None  # Set when a model is loaded
+        self.retry_sampling_params: Any = None  # Stricter settings for repairing invalid outputs
+
+    @abstractmethod
+    def is_loaded(self) -> bool:
+        """Check if model is loaded"""
+
+    def get_current_model(self) -> Optional[str]:
+        """Get currently loaded model ID"""
+        return self.current_model
+
+    @abstractmethod
+    async def load_model(self, model_id: str, progress: Optional[LoadProgress] = None) -> None:
+        """
+        Load a model into memory without blocking the event loop
+
+        Args:
+            model_id: Model identifier from AVAILABLE_MODELS
+            progress: Told when the load moves to another stage
+
+        Raises:
+            RuntimeError: If model loading fails
+        """
+
+    @abstractmethod
+    async def unload_model(self) -> None:
+        """Unload current model and free memory"""
+
+    @abstractmethod
+    def generate_batch(self, prompts: List[str], sampling_params: Optional[List[Any]] = None) -> List[Any]:
+        """
+        Generate responses for a batch of prompts
+
+        Args:
+            prompts: List of prompt strings
+            sampling_params: Per-prompt sampling parameters (None entries use the default)
+
+        Returns:
+            One output per prompt, in order
+        """
+
+    def generate_stream(
+        self,
+        prompts: List[str],
+        on_output: Callable[[int, Any], None],
+        sampling_params: Optional[List[Any]] = None,
+        aborted: Optional[Aborted] = None
+    ) -> None:
+        """
+        Generate responses and report each one as soon as it finishes
+
+        The default runs the whole batch (minus sequences already aborted)
+        and then reports every output; backends that can finish sequences
+        early override it. Backends that can stop a sequence mid-generation
+        drop it once ``aborted`` returns True and never report it.
+
+        Args:
+            prompts: List of prompt strings
+            on_output: Called with (prompt index, output) for every finished sequence
+            sampling_params: Per-prompt sampling parameters (None entries use the default)
+            aborted: Polled during generation with a prompt index
+        """
+        kept = [i for i in range(len(prompts)) if aborted is None or not aborted(i)]
+        if len(kept) < len(prompts):
+            prompts = [prompts[i] for i in kept]
+            sampling_params = [sampling_params[i] for i in kept] if sampling_params is not None else None
+        if not prompts:
+            return
+        for index, output in zip(kept, self.generate_batch(prompts, sampling_params)):
+            on_output(index, output)
+
+    @abstractmethod
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Count tokens for each text with the loaded model's tokenizer"""
+
+    def _resolve_sampling(self, prompts: List[str], sampling_params: Optional[List[Any]]) -> List[Any]:
+        """Fill in the default sampling parameters for prompts without their own"""
+        if sampling_params is None:
+            return [self.sampling_params] * len(prompts)
+        return [params or self.sampling_params for params in sampling_params]
+
+    def max_concurrent_batches(self) -> int:
+        """Engine batches that can run at once (one per replica)"""
+        return 1
+
+    def max_batch_tokens(self) -> Optional[int]:
+        """Token budget (prompt + generation) for one engine batch of the loaded model"""
+        if self.current_model is None:
+            return None
+        return AVAILABLE_MODELS[self.current_model].get("max_batch_tokens")
+
+    def memory_headroom(self) -> Optional[float]:
+        """Lowest free fraction of the engine's memory budget during the last batch (None = unknown)"""
+        return None
+
+    def generated_tokens(self, output) -> int:
+        """Number of tokens generated for one output"""
+        return len(output.outputs[0].token_ids) if output.outputs else 0
+
+    def prefix_cache_usage(self, output) -> Tuple[int, Optional[int]]:
+        """
+        Prompt token usage for one output
+
+        Returns:
+            (prompt tokens, prompt tokens served from the prefix cache); the
+            cached count is None when the backend does not report it
+        """
+        prompt_tokens = len(output.prompt_token_ids or [])
+        return prompt_tokens, getattr(output, "num_cached_tokens", None)
+
+    def prefix_cache_hit_rate(self, outputs: List[Any]) -> Optional[float]:
+        """Fraction of prompt tokens served from the prefix cache, or None if unknown"""
+        total = cached = 0
+        for output in outputs:
+            prompt_tokens, cached_tokens = self.prefix_cache_usage(output)
+            if cached_tokens is None:
+                return None
+            total += prompt_tokens
+            cached += cached_tokens
+        return cached / total if total else None
+
+    def sampling_fingerprint(self) -> str:
+        """Stable description of the active sampling parameters (used in cache keys)"""
+        return repr(self.sampling_params)
+
+    def extract_text(self, output) -> str:
+        """Extract generated text from an output"""
+        return output.outputs[0].text
@@ -0,0 +1,427 @@
+"""
+Server-side evaluation jobs
+A job evaluates every professor of some regions that passes the request's
+filters. The server selects them from the professor store, evaluates the
+selection in batches and appends each finished batch to a checkpoint on
+disk, so a job survives client disconnects and resumes after a crash or
+restart. Professor ids are stable across region file refreshes, so a
+resumed job evaluates the same people.
+
+Layout of JOB_DIR/<job id>/:
+    job.json       Request, selected professor ids and state (rewritten atomically)
+    results.jsonl  One line per finished professor (appended and fsynced per batch)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models import EvaluateRequest, EvaluationJobRequest, EvaluationOptions, EvaluationResult, Professor
+from professor_store import ProfessorStore
+
+logger = logging.getLogger(__name__)
+
+JOB_FILE = "job.json"
+RESULTS_FILE = "results.jsonl"
+
+# Job states; unfinished jobs are picked up again on startup
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled")
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+# Evaluates one batch of professors (no pre-ranking; the job does that once)
+BatchEvaluator = Callable[[EvaluateRequest], Awaitable[List[EvaluationResult]]]
+# Results decided without the LLM for a whole selection (blocking)
+Prescreener = Callable[[EvaluateRequest], Dict[int, EvaluationResult]]
+
+
+class EvaluationJob:
+    """One evaluation job and its checkpoint"""
+
+    def __init__(
+        self,
+        job_id: str,
+        spec: EvaluationJobRequest,
+        model: str,
+        professor_ids: List[str],
+        directory: str
+    ):
+        self.id = job_id
+        self.spec = spec
+        self.model = model
+        self.professor_ids = professor_ids
+        self.directory = directory
+        self.state = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.resumed = 0
+        self.results: Dict[int, Dict] = {}  # Selection index -> result record
+        self.matched = 0
+        self.missing = 0  # Selected professors no longer in the professor store
+        self.cancel_requested = False
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def touch(self) -> None:
+        """Record a change and wake everyone watching the job"""
+        self.updated_at = time.time()
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def advance(self, state: str, error: Optional[str] = None) -> None:
+        """Move to another state"""
+        self.state = state
+        self.error = error
+        logger.info(
+            f"🗂️ Evaluation job {self.id}: {state} ({len(self.results)}/{len(self.professor_ids)})"
+            + (f": {error}" if error else "")
+        )
+        self.touch()
+
+    def add_results(self, records: List[Dict]) -> None:
+        """Count checkpointed result records"""
+        for record in records:
+            score = record["result"]["score"]
+            if record["index"] not in self.results and score is not None and score >= self.spec.threshold:
+                self.matched += 1
+            self.results[record["index"]] = record
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """Set on the next progress or state change"""
+        return self._changed
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "model": self.model,
+            "research_direction": self.spec.research_direction,
+            "regions": self.spec.regions,
+            "total": len(self.professor_ids),
+            "completed": len(self.results),
+            "matched": self.matched,
+            "missing": self.missing,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "resumed": self.resumed
+        }
+
+    # Checkpoint files (blocking)
+
+    def save(self) -> None:
+        """Write job.json atomically"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, JOB_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "job_id": self.id,
+                "state": self.state,
+                "error": self.error,
+                "model": self.model,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+                "resumed": self.resumed,
+                "spec": self.spec.model_dump(),
+                "professor_ids": self.professor_ids
+            }, f)
+        os.replace(path + ".tmp", path)
+
+    def append(self, records: List[Dict]) -> None:
+        """Append result records to the checkpoint and flush them to disk"""
+        with open(os.path.join(self.directory, RESULTS_FILE), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @classmethod
+    def restore(cls, directory: str) -> "EvaluationJob":
+        """Read a job and its checkpointed results from disk"""
+        with open(os.path.join(directory, JOB_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        job = cls(
+            data["job_id"], EvaluationJobRequest(**data["spec"]), data["model"],
+            data["professor_ids"], directory
+        )
+        job.state = data["state"]
+        job.error = data["error"]
+        job.created_at = data["created_at"]
+        job.updated_at = data["updated_at"]
+        job.resumed = data["resumed"]
+
+        records = []
+        try:
+            with open(os.path.join(directory, RESULTS_FILE), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Torn last line from a crash mid-write; that batch is redone
+                        logger.warning(f"⚠️ Skipping a damaged checkpoint line in job {job.id}")
+        except FileNotFoundError:
+            pass
+        job.add_results(records)
+        return job
+
+
+class JobManager:
+    """Queue, runner and checkpoint store of evaluation jobs"""
+
+    def __init__(
+        self,
+        directory: str,
+        store: ProfessorStore,
+        evaluate: BatchEvaluator,
+        prescreen: Prescreener,
+        batch_size: int,
+        concurrency: int = 1,
+        history: int = 100
+    ):
+        """
+        Args:
+            directory: Checkpoint directory (one subdirectory per job)
+            store: Professors by id, with their uploaded publication lists
+            evaluate: Evaluates one batch of professors
+            prescreen: Results decided without the LLM (pre-ranking)
+            batch_size: Professors evaluated and checkpointed together
+            concurrency: Jobs run at once
+            history: Finished jobs kept on disk
+        """
+        self.directory = directory
+        self.store = store
+        self.evaluate = evaluate
+        self.prescreen = prescreen
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.history = history
+        self.jobs: "OrderedDict[str, EvaluationJob]" = OrderedDict()  # Oldest first
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        """Restore jobs from disk, re-queue unfinished ones and start the runners"""
+        self._queue = asyncio.Queue()
+        restored = await asyncio.to_thread(self._restore_all)
+        for job in restored:
+            self.jobs[job.id] = job
+            if not job.done:
+                job.resumed += 1
+                job.state = "queued"
+                self._queue.put_nowait(job.id)
+        unfinished = sum(1 for job in restored if not job.done)
+        if restored:
+            logger.info(f"🗂️ Restored {len(restored)} evaluation jobs ({unfinished} resuming)")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Stop the runners; running jobs keep their checkpoint and resume on the next start"""
+        for task in self._workers:
+            task.cancel()
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._running.values(), return_exceptions=True)
+        self._workers = []
+
+    def _restore_all(self) -> List[EvaluationJob]:
+        """Read every job under the checkpoint directory, oldest first (blocking)"""
+        jobs = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return jobs
+        for name in names:
+            directory = os.path.join(self.directory, name)
+            try:
+                jobs.append(EvaluationJob.restore(directory))
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.error(f"❌ Could not restore evaluation job {name}: {e}")
+        jobs.sort(key=lambda job: job.created_at)
+        return jobs
+
+    async def submit(self, spec: EvaluationJobRequest, model: str) -> EvaluationJob:
+        """
+        Select the professors and queue a job
+
+        Raises:
+            ValueError: If a region does not exist
+        """
+        professor_ids = await asyncio.to_thread(
+            self.store.select, spec.regions, spec.venues, spec.year_start, spec.year_end,
+            spec.min_papers, spec.affiliation
+        )
+        job_id = uuid.uuid4().hex[:12]
+        job = EvaluationJob(job_id, spec, model, professor_ids, os.path.join(self.directory, job_id))
+        await asyncio.to_thread(job.save)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+        logger.info(
+            f"🗂️ Evaluation job {job.id} queued: {len(professor_ids)} professors "
+            f"in {', '.join(spec.regions)} on {model}"
+        )
+        return job
+
+    async def cancel(self, job: EvaluationJob) -> None:
+        """Stop a queued or running job; its results so far are kept"""
+        if job.done:
+            return
+        job.cancel_requested = True
+        task = self._running.get(job.id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        else:
+            job.advance("cancelled")
+            await asyncio.to_thread(job.save)
+
+    async def resume(self, job: EvaluationJob) -> None:
+        """Queue a failed or cancelled job again; finished professors are not re-evaluated"""
+        if job.state not in ("failed", "cancelled"):
+            return
+        job.cancel_requested = False
+        job.resumed += 1
+        job.advance("queued")
+        await asyncio.to_thread(job.save)
+        self._queue.put_nowait(job.id)
+
+    def page(
+        self,
+        job: EvaluationJob,
+        offset: int,
+        limit: int,
+        order: str = "score",
+        min_score: Optional[float] = None
+    ) -> Tuple[int, List[Dict]]:
+        """
+        One page of a job's results
+
+        Args:
+            order: "score" (best first, professors that were not evaluated last)
+                or "index" (selection order)
+            min_score: Only results scoring at least this
+
+        Returns:
+            (results matching the query, records on this page)
+        """
+        records = list(job.results.values())
+        if min_score is not None:
+            records = [
+                record for record in records
+                if record["result"]["score"] is not None and record["result"]["score"] >= min_score
+            ]
+        if order == "score":
+            records.sort(key=lambda record: (
+                record["result"]["score"] is None, -(record["result"]["score"] or 0.0), record["index"]
+            ))
+        else:
+            records.sort(key=lambda record: record["index"])
+        return len(records), records[offset:offset + limit]
+
+    async def watch(self, job: EvaluationJob) -> AsyncIterator[Dict]:
+        """Yield the job's progress now and after every change until it finishes"""
+        while True:
+            changed = job.changed
+            yield job.to_dict()
+            if job.done:
+                return
+            await changed.wait()
+
+    async def _worker(self) -> None:
+        """Run queued jobs one at a time"""
+        while True:
+            job = self.jobs.get(await self._queue.get())
+            if job is None or job.state != "queued":
+                continue
+            task = asyncio.create_task(self._run(job))
+            self._running[job.id] = task
+            try:
+                # wait() does not raise when only the job task is cancelled
+                await asyncio.wait([task])
+            finally:
+                self._running.pop(job.id, None)
+            await self._prune()
+
+    async def _run(self, job: EvaluationJob) -> None:
+        """Evaluate the professors of a job that have no checkpointed result"""
+        job.advance("running")
+        await asyncio.to_thread(job.save)
+        try:
+            # A professor dropped from the region files since the job was
+            # submitted (and a restart) can no longer be evaluated
+            known = [i for i, professor_id in enumerate(job.professor_ids) if professor_id in self.store]
+            job.missing = len(job.professor_ids) - len(known)
+            if job.missing:
+                logger.warning(f"⚠️ Evaluation job {job.id}: {job.missing} selected professors are no longer in the data")
+            selected = await asyncio.to_thread(self.store.professors, [job.professor_ids[i] for i in known])
+            professors = dict(zip(known, selected))
+            options = job.spec.model_dump(include=set(EvaluationOptions.model_fields))
+            options["model"] = job.model
+
+            # Pre-ranking looks at the whole selection once, like a single request would
+            prescreened = await asyncio.to_thread(self.prescreen, EvaluateRequest(professors=selected, **options))
+            decided = {known[position]: result for position, result in prescreened.items()}
+            pending = [i for i in known if i not in job.results]
+            await self._checkpoint(job, professors, [(i, decided[i]) for i in pending if i in decided])
+            todo = [i for i in pending if i not in decided]
+
+            options["prerank"] = False
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                results = await self.evaluate(
+                    EvaluateRequest(professors=[professors[i] for i in batch], **options)
+                )
+                await self._checkpoint(job, professors, list(zip(batch, results)))
+
+            job.advance("completed")
+        except asyncio.CancelledError:
+            if not job.cancel_requested:
+                # Server shutdown: leave the job unfinished so the next start resumes it
+                raise
+            job.advance("cancelled")
+        except Exception as e:
+            logger.error(f"❌ Evaluation job {job.id} failed: {e}", exc_info=True)
+            job.advance("failed", str(e) or type(e).__name__)
+        await asyncio.to_thread(job.save)
+
+    async def _checkpoint(
+        self,
+        job: EvaluationJob,
+        professors: Dict[int, Professor],
+        results: List[Tuple[int, EvaluationResult]]
+    ) -> None:
+        """Persist finished results, then count them"""
+        if not results:
+            return
+        records = [
+            {
+                "index": index,
+                "id": job.professor_ids[index],
+                "name": professors[index].name,
+                "affiliation": professors[index].affiliation,
+                "result": result.model_dump()
+            }
+            for index, result in results
+        ]
+        await asyncio.to_thread(job.append, records)
+        job.add_results(records)
+        job.touch()
+
+    async def _prune(self) -> None:
+        """Delete the oldest finished jobs beyond the history limit"""
+        finished = [job for job in self.jobs.values() if job.done]
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job.id]
+            await asyncio.to_thread(shutil.rmtree, job.directory, True)
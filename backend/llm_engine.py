@@ -1,69 +1,115 @@
 """
-vLLM Engine wrapper for batch inference
-Handles model lifecycle, batch processing, and error handling
+Inference engine router
+Loads each model on the backend named in its catalog entry and forwards
+every call to that backend. Backends are imported on first use, so vLLM is
+only required when a vLLM model is loaded.
 """
 
-import asyncio
-import time
-from typing import List, Dict, Optional
-from vllm import LLM, SamplingParams
-from vllm.outputs import RequestOutput
 import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import ENGINE_RECORD_PATH, ENGINE_REPLICAS, INFERENCE_ENGINE
+from engine_base import Aborted, InferenceEngine, LoadProgress
+from metrics import MODEL_LOAD_SECONDS
+from model_catalog import AVAILABLE_MODELS
 
 logger = logging.getLogger(__name__)
 
+ENGINE_BACKENDS = ("vllm", "cpu", "stub", "replay")
+
+# Capture file writer shared by every engine router
+_recorder = None
+
+
+def backend_for(model_id: str) -> str:
+    """Backend that serves a model (INFERENCE_ENGINE overrides the catalog)"""
+    if INFERENCE_ENGINE != "auto":
+        return INFERENCE_ENGINE
+    return AVAILABLE_MODELS[model_id].get("backend", "vllm")
+
 
-# Available models mapping
-AVAILABLE_MODELS = {
-    "qwen-0.5b": {
-        "model_path": "Qwen/Qwen2.5-0.5B-Instruct",
-        "name": "Qwen2.5-0.5B-Instruct",
-        "size": "0.5B",
-        "vram": "4GB",
-        "recommended_batch_size": 20
-    },
-    "qwen-1.5b": {
-        "model_path": "Qwen/Qwen2.5-1.5B-Instruct",
-        "name": "Qwen2.5-1.5B-Instruct",
-        "size": "1.5B",
-        "vram": "8GB",
-        "recommended_batch_size": 15
-    },
-    "qwen-7b": {
-        "model_path": "Qwen/Qwen2.5-7B-Instruct",
-        "name": "Qwen2.5-7B-Instruct",
-        "size": "7B",
-        "vram": "16GB",
-        "recommended_batch_size": 8
-    }
-}
+def create_engine(backend: str, gpu_memory_share: float = 1.0, replicas: int = ENGINE_REPLICAS) -> InferenceEngine:
+    """
+    Instantiate an inference backend
+
+    Args:
+        backend: One of ENGINE_BACKENDS
+        gpu_memory_share: Fraction of the usual GPU memory budget (vLLM only)
+        replicas: Worker processes to run the backend in (1 = in this process)
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend not in ENGINE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}. Available: {list(ENGINE_BACKENDS)}")
+    if replicas > 1:
+        from replica_engine import ReplicaEngine
+        return ReplicaEngine(backend, replicas, gpu_memory_share)
+    if backend == "vllm":
+        from vllm_engine import VLLMEngine
+        return VLLMEngine(gpu_memory_share)
+    if backend == "cpu":
+        from cpu_engine import CPUEngine
+        return CPUEngine()
+    if backend == "stub":
+        from stub_engine import StubEngine
+        return StubEngine()
+    from replay_engine import ReplayEngine
+    return ReplayEngine()
+
+
+def output_recorder():
+    """Shared output recorder, or None unless ENGINE_RECORD_PATH is set"""
+    global _recorder
+    if _recorder is None and ENGINE_RECORD_PATH:
+        from replay_engine import OutputRecorder
+        _recorder = OutputRecorder(ENGINE_RECORD_PATH)
+    return _recorder
 
 
 class LLMEngine:
-    """vLLM inference engine wrapper"""
-    
-    def __init__(self):
-        self.llm: Optional[LLM] = None
-        self.current_model: Optional[str] = None
-        self.sampling_params = None  # Will be set when model is loaded
-    
+    """Front for whichever inference backend holds the loaded model"""
+
+    def __init__(self, gpu_memory_share: float = 1.0):
+        self.engine: Optional[InferenceEngine] = None
+        self.backend: Optional[str] = None
+        self.gpu_memory_share = gpu_memory_share
+        self.recorder = output_recorder()
+
+    def _active(self) -> InferenceEngine:
+        if self.engine is None or not self.engine.is_loaded():
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        return self.engine
+
+    @property
+    def sampling_params(self) -> Any:
+        """Default sampling parameters of the loaded model"""
+        return self.engine.sampling_params if self.engine is not None else None
+
+    @property
+    def retry_sampling_params(self) -> Any:
+        """Stricter sampling parameters for repairing invalid outputs"""
+        return self.engine.retry_sampling_params if self.engine is not None else None
+
     def is_loaded(self) -> bool:
         """Check if model is loaded"""
-        return self.llm is not None
-    
+        return self.engine is not None and self.engine.is_loaded()
+
     def get_current_model(self) -> Optional[str]:
         """Get currently loaded model ID"""
-        return self.current_model
-    
-    async def load_model(self, model_id: str) -> None:
+        return self.engine.get_current_model() if self.engine is not None else None
+
+    async def load_model(self, model_id: str, progress: Optional[LoadProgress] = None) -> None:
         """
-        Load a model into memory
-        
+        Load a model on its backend, replacing the current model
+
         Args:
             model_id: Model identifier (e.g., 'qwen-0.5b')
-        
+            progress: Told when the load moves to another stage
+
         Raises:
-            ValueError: If model_id is not recognized
+            ValueError: If model_id or its backend is not recognized
             RuntimeError: If model loading fails
         """
         if model_id not in AVAILABLE_MODELS:
@@ -71,141 +117,121 @@ class LLMEngine:
                 f"Unknown model: {model_id}. "
                 f"Available: {list(AVAILABLE_MODELS.keys())}"
             )
-        
-        # Unload existing model if any
-        if self.llm is not None:
-            logger.info(f"Unloading current model: {self.current_model}")
-            await self.unload_model()
-        
-        model_config = AVAILABLE_MODELS[model_id]
-        model_path = model_config["model_path"]
-        
-        logger.info(f"Loading model: {model_path}")
-        
-        try:
-            # Initialize vLLM with optimized settings
-            # Auto-adjust GPU memory utilization based on available VRAM
-            # This ensures compatibility across different GPUs and usage scenarios
-            import torch
-            if torch.cuda.is_available():
-                total_mem = torch.cuda.get_device_properties(0).total_memory / (1024**3)  # GB
-                free_mem = (torch.cuda.get_device_properties(0).total_memory - torch.cuda.memory_allocated(0)) / (1024**3)
-                
-                # Calculate safe utilization ratio
-                # Leave at least 1.5GB buffer for system and CUDA overhead
-                if total_mem <= 6:  # Small GPU (4-6GB)
-                    gpu_util = 0.65
-                elif total_mem <= 12:  # Medium GPU (8-12GB)
-                    gpu_util = 0.75
-                else:  # Large GPU (16GB+)
-                    gpu_util = 0.85
-                
-                logger.info(f"GPU: Total {total_mem:.1f}GB, Free {free_mem:.1f}GB, Using {gpu_util*100}% utilization")
-            else:
-                gpu_util = 0.75  # Default for CPU fallback
-            
-            # Enable INT8 quantization for large models (7B+)
-            use_quantization = "7b" in model_id or "14b" in model_id
-            
-            if use_quantization:
-                logger.info(f"Enabling INT8 quantization for {model_id}")
-                self.llm = LLM(
-                    model=model_path,
-                    quantization="bitsandbytes",
-                    load_format="bitsandbytes",
-                    gpu_memory_utilization=gpu_util,
-                    max_model_len=4096,
-                    trust_remote_code=True,
-                    download_dir="/root/.cache/huggingface"
-                )
-            else:
-                self.llm = LLM(
-                    model=model_path,
-                    gpu_memory_utilization=gpu_util,
-                    max_model_len=4096,
-                    trust_remote_code=True,
-                    download_dir="/root/.cache/huggingface"
-                )
-            
-            self.current_model = model_id
-            
-            # Set sampling parameters based on model size
-            # Larger models benefit from lower temperature for more focused outputs
-            temperature = 0.1 if "7b" in model_id or "14b" in model_id else 0.2
-            self.sampling_params = SamplingParams(
-                temperature=temperature,
-                top_p=0.8,
-                max_tokens=128,
-                repetition_penalty=1.1
-            )
-            
-            logger.info(f"✅ Model loaded successfully: {model_id} (temp={temperature})")
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to load model {model_id}: {e}")
-            self.llm = None
-            self.current_model = None
-            raise RuntimeError(f"Model loading failed: {str(e)}")
-    
+        backend = backend_for(model_id)
+
+        if self.engine is not None and self.backend != backend:
+            await self.engine.unload_model()
+            self.engine = None
+        if self.engine is None:
+            self.engine = create_engine(backend, self.gpu_memory_share)
+            self.backend = backend
+
+        load_start = time.perf_counter()
+        await self.engine.load_model(model_id, progress)
+        load_seconds = time.perf_counter() - load_start
+        MODEL_LOAD_SECONDS.labels(model=model_id).observe(load_seconds)
+        logger.info(f"Model {model_id} ready on the {backend} backend after {load_seconds:.1f}s")
+
     async def unload_model(self) -> None:
         """Unload current model and free memory"""
-        if self.llm is not None:
-            logger.info(f"Unloading model: {self.current_model}")
-            # vLLM doesn't have explicit unload, set to None for GC
-            self.llm = None
-            self.current_model = None
-            # Give time for GPU memory cleanup
-            await asyncio.sleep(1)
-            logger.info("✅ Model unloaded")
-    
-    def generate_batch(self, prompts: List[str]) -> List[RequestOutput]:
-        """
-        Generate responses for a batch of prompts
-        
-        Args:
-            prompts: List of prompt strings
-        
-        Returns:
-            List of vLLM outputs
-        
-        Raises:
-            RuntimeError: If model is not loaded
-        """
-        if self.llm is None:
-            raise RuntimeError("No model loaded. Call load_model() first.")
-        
-        logger.info(f"Generating for batch of {len(prompts)} prompts")
-        start_time = time.time()
-        
-        try:
-            outputs = self.llm.generate(prompts, self.sampling_params)
-            
-            elapsed = time.time() - start_time
-            rate = len(prompts) / elapsed
-            logger.info(
-                f"✅ Batch complete: {len(prompts)} prompts in {elapsed:.2f}s "
-                f"({rate:.2f} prompts/sec)"
-            )
-            
-            return outputs
-        
-        except Exception as e:
-            logger.error(f"❌ Batch generation failed: {e}")
-            raise RuntimeError(f"Generation failed: {str(e)}")
-    
-    def extract_text(self, output: RequestOutput) -> str:
-        """Extract generated text from vLLM output"""
-        return output.outputs[0].text
-    
+        if self.engine is not None:
+            await self.engine.unload_model()
+
+    def generate_batch(self, prompts: List[str], sampling_params: Optional[List[Any]] = None) -> List[Any]:
+        """Generate responses for a batch of prompts (see InferenceEngine.generate_batch)"""
+        engine = self._active()
+        if self.recorder is None:
+            return engine.generate_batch(prompts, sampling_params)
+        record = self.recorder.wrap(engine, prompts, sampling_params, lambda index, output: None)
+        outputs = engine.generate_batch(prompts, sampling_params)
+        # Outputs arrive together, so each is recorded with the full batch time
+        for index, output in enumerate(outputs):
+            record(index, output)
+        return outputs
+
+    def needs_warmup(self) -> bool:
+        """Whether the loaded backend benefits from a warmup batch"""
+        return self.engine is not None and self.engine.needs_warmup
+
+    def warm_up(self, prompts: List[str]) -> None:
+        """Generate a throwaway batch (not recorded) so lazy initialization happens before real traffic"""
+        self._active().generate_batch(prompts)
+
+    def generate_stream(
+        self,
+        prompts: List[str],
+        on_output: Callable[[int, Any], None],
+        sampling_params: Optional[List[Any]] = None,
+        aborted: Optional[Aborted] = None
+    ) -> None:
+        """Generate and report each output as it finishes (see InferenceEngine.generate_stream)"""
+        engine = self._active()
+        if self.recorder is not None:
+            on_output = self.recorder.wrap(engine, prompts, sampling_params, on_output)
+        engine.generate_stream(prompts, on_output, sampling_params, aborted)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Count tokens for each text with the loaded model's tokenizer"""
+        engine = self._active()
+        counts = engine.count_tokens(texts)
+        if self.recorder is not None:
+            try:
+                self.recorder.record_token_counts(engine.get_current_model(), texts, counts)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not record token counts: {e}")
+        return counts
+
+    def max_batch_tokens(self) -> Optional[int]:
+        """Token budget (prompt + generation) for one engine batch of the loaded model"""
+        return self.engine.max_batch_tokens() if self.engine is not None else None
+
+    def max_concurrent_batches(self) -> int:
+        """Engine batches that can run at once (one per replica)"""
+        return self.engine.max_concurrent_batches() if self.engine is not None else 1
+
+    def memory_headroom(self) -> Optional[float]:
+        """Lowest free fraction of the engine's memory budget during the last batch (None = unknown)"""
+        return self.engine.memory_headroom() if self.engine is not None else None
+
+    def replica_status(self) -> Optional[List[Dict]]:
+        """Per-replica state when the model runs in worker processes, else None"""
+        status = getattr(self.engine, "replica_status", None)
+        return status() if status is not None else None
+
+    def replay_stats(self) -> Optional[Dict]:
+        """Capture hits and misses when the model runs on the replay backend, else None"""
+        from replay_engine import ReplayEngine
+        return self.engine.stats() if isinstance(self.engine, ReplayEngine) else None
+
+    # Outputs only exist once a backend was created, so these never see None
+    def generated_tokens(self, output) -> int:
+        """Number of tokens generated for one output"""
+        return self.engine.generated_tokens(output)
+
+    def prefix_cache_usage(self, output) -> Tuple[int, Optional[int]]:
+        """Prompt tokens and prefix-cached prompt tokens for one output"""
+        return self.engine.prefix_cache_usage(output)
+
+    def prefix_cache_hit_rate(self, outputs: List[Any]) -> Optional[float]:
+        """Fraction of prompt tokens served from the prefix cache, or None if unknown"""
+        if self.engine is None:
+            return None
+        return self.engine.prefix_cache_hit_rate(outputs)
+
+    def sampling_fingerprint(self) -> str:
+        """Stable description of the active sampling parameters (used in cache keys)"""
+        return self.engine.sampling_fingerprint() if self.engine is not None else repr(None)
+
+    def extract_text(self, output) -> str:
+        """Extract generated text from an output"""
+        return self.engine.extract_text(output)
+
     def get_model_info(self) -> Dict:
         """Get information about available and loaded models"""
         return {
             "available_models": AVAILABLE_MODELS,
-            "current_model": self.current_model,
+            "current_model": self.get_current_model(),
+            "backend": self.backend if self.is_loaded() else None,
             "is_loaded": self.is_loaded()
         }
 
-
-# Global engine instance
-llm_engine = LLMEngine()
-
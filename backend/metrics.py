@@ -0,0 +1,174 @@
+"""
+Prometheus metrics
+Latency histograms and throughput counters for the evaluation pipeline,
+served in the Prometheus text format by the /metrics endpoint
+"""
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    ProcessCollector, generate_latest
+)
+
+# Dedicated registry so only backend metrics (plus process stats) are exported
+REGISTRY = CollectorRegistry()
+ProcessCollector(registry=REGISTRY)
+
+# Seconds; spans a cached single-professor request up to a multi-minute batch
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REQUEST_SECONDS = Histogram(
+    "csprof_request_duration_seconds",
+    "Total evaluation request time",
+    ["endpoint"],
+    buckets=_LATENCY_BUCKETS,
+    registry=REGISTRY
+)
+
+STAGE_SECONDS = Histogram(
+    "csprof_stage_duration_seconds",
+    "Per-request time spent in each evaluation stage",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+    registry=REGISTRY
+)
+# Label children bound once so the hot path skips the label lookup
+PRERANK_SECONDS = STAGE_SECONDS.labels(stage="prerank")
+PROMPT_BUILD_SECONDS = STAGE_SECONDS.labels(stage="prompt_build")
+GENERATION_SECONDS = STAGE_SECONDS.labels(stage="generation")
+PARSE_SECONDS = STAGE_SECONDS.labels(stage="parse")
+REPAIR_SECONDS = STAGE_SECONDS.labels(stage="repair")
+
+ENGINE_BATCH_SECONDS = Histogram(
+    "csprof_engine_batch_duration_seconds",
+    "Wall time of one engine batch",
+    buckets=_LATENCY_BUCKETS,
+    registry=REGISTRY
+)
+
+BATCH_SIZE = Histogram(
+    "csprof_engine_batch_size",
+    "Prompts per engine batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+    registry=REGISTRY
+)
+
+BATCH_LIMIT = Gauge(
+    "csprof_engine_batch_limit",
+    "Current tuned batch size limit of each model",
+    ["model"],
+    registry=REGISTRY
+)
+
+BATCH_SPLITS = Counter(
+    "csprof_engine_batch_splits_total",
+    "Failed engine batches split in half and retried",
+    ["reason"],
+    registry=REGISTRY
+)
+
+QUEUE_DEPTH = Gauge(
+    "csprof_scheduler_queue_depth",
+    "Prompts waiting for an engine batch slot",
+    registry=REGISTRY
+)
+
+# Throughput: use rate() over these for prompts/sec and tokens/sec
+PROMPTS_GENERATED = Counter(
+    "csprof_prompts_generated",
+    "Prompts completed by the engine",
+    registry=REGISTRY
+)
+
+GENERATED_TOKENS = Counter(
+    "csprof_generated_tokens",
+    "Tokens generated by the engine",
+    registry=REGISTRY
+)
+
+PRERANK_SKIPPED = Counter(
+    "csprof_prerank_skipped",
+    "Professors not sent to the LLM by lexical pre-ranking",
+    registry=REGISTRY
+)
+
+OUTPUTS = Counter(
+    "csprof_outputs",
+    "Parsed model outputs by model and validity",
+    ["model", "status"],
+    registry=REGISTRY
+)
+
+COALESCED_PROMPTS = Counter(
+    "csprof_coalesced_prompts",
+    "Prompts served by an identical prompt already in flight for another request",
+    ["model"],
+    registry=REGISTRY
+)
+
+ABORTED_PROMPTS = Counter(
+    "csprof_aborted_prompts",
+    "Prompts dropped because their request was cancelled, disconnected or timed out",
+    ["stage"],
+    registry=REGISTRY
+)
+# Dropped while waiting in the scheduler / while on the engine
+ABORTED_QUEUED = ABORTED_PROMPTS.labels(stage="queued")
+ABORTED_GENERATING = ABORTED_PROMPTS.labels(stage="generating")
+
+ADMISSION_REJECTED = Counter(
+    "csprof_admission_rejected",
+    "Evaluation requests rejected with 429 by admission control",
+    ["lane"],
+    registry=REGISTRY
+)
+
+MODEL_LOAD_SECONDS = Histogram(
+    "csprof_model_load_duration_seconds",
+    "Time to load a model into the engine",
+    ["model"],
+    buckets=(1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0),
+    registry=REGISTRY
+)
+
+
+MODEL_POOL_EVENTS = Counter(
+    "csprof_model_pool_events",
+    "Model loads, evictions and unloads in the model pool",
+    ["event", "model"],
+    registry=REGISTRY
+)
+
+MODEL_RESIDENT_GB = Gauge(
+    "csprof_model_resident_gb",
+    "Estimated memory held by each resident model (GB)",
+    ["model"],
+    registry=REGISTRY
+)
+
+REPLICA_INFLIGHT = Gauge(
+    "csprof_engine_replica_inflight_prompts",
+    "Prompts dispatched to each engine replica and not yet finished",
+    ["replica"],
+    registry=REGISTRY
+)
+
+REPLICA_RESTARTS = Counter(
+    "csprof_engine_replica_restarts_total",
+    "Engine replica processes restarted after a crash",
+    ["replica"],
+    registry=REGISTRY
+)
+
+def record_output(model_id: str, is_valid: bool) -> None:
+    """Count one parsed output for the invalid-output rate"""
+    OUTPUTS.labels(model=model_id or "none", status="valid" if is_valid else "invalid").inc()
+
+
+def render_metrics():
+    """
+    Render every metric in the Prometheus text format
+
+    Returns:
+        (payload bytes, content type)
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,47 @@
+"""
+Model catalog
+Models the backend can serve, shared by every inference engine
+"""
+
+# Available models mapping; "backend" picks the inference engine
+# ("vllm" or "cpu", see llm_engine.py)
+AVAILABLE_MODELS = {
+    "qwen-0.5b": {
+        "model_path": "Qwen/Qwen2.5-0.5B-Instruct",
+        "name": "Qwen2.5-0.5B-Instruct",
+        "size": "0.5B",
+        "vram": "4GB",
+        "recommended_batch_size": 20,
+        "max_batch_tokens": 65536,
+        "backend": "vllm"
+    },
+    "qwen-1.5b": {
+        "model_path": "Qwen/Qwen2.5-1.5B-Instruct",
+        "name": "Qwen2.5-1.5B-Instruct",
+        "size": "1.5B",
+        "vram": "8GB",
+        "recommended_batch_size": 15,
+        "max_batch_tokens": 49152,
+        "backend": "vllm"
+    },
+    "qwen-7b": {
+        "model_path": "Qwen/Qwen2.5-7B-Instruct",
+        "name": "Qwen2.5-7B-Instruct",
+        "size": "7B",
+        "vram": "16GB",
+        "recommended_batch_size": 8,
+        "max_batch_tokens": 32768,
+        "backend": "vllm"
+    },
+    "qwen-0.5b-cpu": {
+        "model_path": "Qwen/Qwen2.5-0.5B-Instruct",
+        "name": "Qwen2.5-0.5B-Instruct (CPU, INT8)",
+        "size": "0.5B",
+        "vram": "0GB",
+        "ram": "2GB",
+        "recommended_batch_size": 8,
+        "max_batch_tokens": 16384,
+        "backend": "cpu",
+        "quantization": "int8"
+    }
+}
@@ -0,0 +1,472 @@
+"""
+Resident model pool
+Keeps several models loaded within a memory budget and routes each request
+to its model's runtime. Loading a model that does not fit evicts the least
+recently used idle models first; models serving requests are never evicted.
+Loads run as background jobs that requests for the model wait on. The pool
+lock covers eviction and bookkeeping only, not the load itself, so one slow
+load does not hold up other loads and unloads.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from config import MODEL_WARMUP_PROMPTS
+from llm_engine import LLMEngine, backend_for
+from metrics import MODEL_POOL_EVENTS, MODEL_RESIDENT_GB
+from model_catalog import AVAILABLE_MODELS
+from model_runtime import ModelRuntime
+from result_cache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Load / evict / unload events kept for /pool
+EVENT_HISTORY = 100
+# Finished load jobs kept for /load_jobs
+JOB_HISTORY = 50
+
+# Load job states, in order
+LOAD_STATES = ("queued", "downloading", "initializing", "warming", "ready", "failed")
+
+
+class PoolFullError(RuntimeError):
+    """A model does not fit the memory budget without evicting busy models"""
+
+
+def model_memory_gb(model_id: str) -> float:
+    """Estimated memory of a model: catalog "vram", or "ram" for CPU models"""
+    model_config = AVAILABLE_MODELS[model_id]
+    size = model_config.get("ram" if model_config.get("backend") == "cpu" else "vram")
+    if not size:
+        return 0.0
+    return float(str(size).upper().removesuffix("GB"))
+
+
+class LoadJob:
+    """Background load of one model"""
+
+    def __init__(self, model_id: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.model = model_id
+        self.state = "queued"
+        self.error: Optional[str] = None
+        self.exception: Optional[BaseException] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.stage_seconds: Dict[str, float] = {}  # Time spent in each finished state
+        self.finished = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.finished.is_set()
+
+    def advance(self, state: str) -> None:
+        """Move to the next state"""
+        now = time.time()
+        self.stage_seconds[self.state] = round(now - self.updated_at, 3)
+        self.state = state
+        self.updated_at = now
+        logger.info(f"⏳ Load job {self.id}: {self.model} {state}")
+        if state in ("ready", "failed"):
+            self.finished.set()
+
+    def fail(self, exception: BaseException) -> None:
+        """Mark the job failed"""
+        self.error = str(exception)
+        self.exception = exception
+        self.advance("failed")
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "model": self.model,
+            "state": self.state,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "stage_seconds": dict(self.stage_seconds)
+        }
+
+
+class ResidentModel:
+    """A loaded model and its usage (handed to requests by ModelPool.acquire)"""
+
+    __slots__ = ("runtime", "memory_gb", "loaded_at", "last_used", "in_use", "requests")
+
+    def __init__(self, runtime: ModelRuntime, memory_gb: float):
+        self.runtime = runtime
+        self.memory_gb = memory_gb
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.in_use = 0  # Requests currently holding the model
+        self.requests = 0
+
+
+class ModelPool:
+    """Resident models in least recently used order"""
+
+    def __init__(
+        self,
+        memory_budget_gb: float,
+        result_cache: Optional[ResultCache] = None,
+        gpu_memory_share: float = 1.0
+    ):
+        """
+        Args:
+            memory_budget_gb: Total estimated memory of resident models (0 = one model at a time)
+            result_cache: Result cache shared by every model's runtime
+            gpu_memory_share: Part of the GPU memory budget the pool may use
+                (the rest is left to models outside the pool)
+        """
+        self.memory_budget_gb = memory_budget_gb
+        self.result_cache = result_cache
+        self.gpu_memory_share = gpu_memory_share
+        self.models: "OrderedDict[str, ResidentModel]" = OrderedDict()
+        # Model used by requests that do not name one (the last /load_model that succeeded)
+        self.default_model: Optional[str] = None
+        # Model of the latest /load_model, until its job finishes
+        self._pending_default: Optional[str] = None
+        self.events: deque = deque(maxlen=EVENT_HISTORY)
+        self.jobs: "OrderedDict[str, LoadJob]" = OrderedDict()  # Oldest first
+        self._loading: Dict[str, LoadJob] = {}  # Model -> unfinished job
+        # Models being loaded outside the lock -> (memory reserved, set when done)
+        self._reserved: Dict[str, Tuple[float, asyncio.Event]] = {}
+        self._lock = asyncio.Lock()  # Eviction plans and pool changes, one at a time
+        self._running = False
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self.models
+
+    def memory_used_gb(self) -> float:
+        """Estimated memory of every resident model"""
+        return sum(entry.memory_gb for entry in self.models.values())
+
+    def queue_depth(self) -> int:
+        """Prompts waiting for a batch slot on any resident model"""
+        return sum(entry.runtime.scheduler.queue_depth() for entry in self.models.values())
+
+    def throughput(self) -> float:
+        """Recent prompts/sec across resident models"""
+        return sum(entry.runtime.scheduler.throughput() for entry in self.models.values())
+
+    def queue_status(self) -> List[Dict]:
+        """Scheduler queue of each resident model"""
+        return [
+            {"model": model_id, **entry.runtime.scheduler.status()}
+            for model_id, entry in self.models.items()
+        ]
+
+    async def start(self) -> None:
+        """Start the batching workers of resident models (and of models loaded later)"""
+        self._running = True
+        for entry in self.models.values():
+            await entry.runtime.start()
+
+    async def stop(self) -> None:
+        """Stop every batching worker"""
+        self._running = False
+        for entry in self.models.values():
+            await entry.runtime.stop()
+
+    def _record(self, event: str, model_id: str, memory_gb: float, seconds: Optional[float] = None) -> None:
+        """Log a pool event and update the metrics"""
+        self.events.append({
+            "time": time.time(),
+            "event": event,
+            "model": model_id,
+            "memory_gb": memory_gb,
+            "seconds": round(seconds, 3) if seconds is not None else None
+        })
+        MODEL_POOL_EVENTS.labels(event=event, model=model_id).inc()
+        if event == "load":
+            MODEL_RESIDENT_GB.labels(model=model_id).set(memory_gb)
+        else:
+            MODEL_RESIDENT_GB.remove(model_id)
+
+    def _gpu_memory_share(self, memory_gb: float) -> float:
+        """Fraction of the GPU memory budget for a model of this size"""
+        if self.memory_budget_gb <= 0:
+            return self.gpu_memory_share
+        return self.gpu_memory_share * min(1.0, memory_gb / self.memory_budget_gb)
+
+    def _eviction_plan(self, model_id: str, memory_gb: float) -> List[str]:
+        """
+        Idle models to evict, least recently used first, so that model_id fits
+
+        Raises:
+            PoolFullError: If model_id does not fit even after evicting every idle model
+        """
+        if self.memory_budget_gb <= 0:
+            # Single slot: the loaded model makes way for the new one
+            busy = [m for m, entry in self.models.items() if entry.in_use]
+            if busy:
+                raise PoolFullError(f"Cannot load {model_id}: {', '.join(busy)} is still serving requests")
+            return list(self.models)
+
+        if memory_gb > self.memory_budget_gb:
+            raise PoolFullError(
+                f"{model_id} needs {memory_gb:.1f}GB, more than MODEL_POOL_MEMORY_GB "
+                f"({self.memory_budget_gb:.1f}GB)"
+            )
+        reserved = sum(reserved_gb for reserved_gb, _ in self._reserved.values())
+        free = self.memory_budget_gb - self.memory_used_gb() - reserved
+        victims = []
+        for resident_id, entry in self.models.items():
+            if free >= memory_gb:
+                break
+            if entry.in_use:
+                continue
+            victims.append(resident_id)
+            free += entry.memory_gb
+        if free < memory_gb:
+            raise PoolFullError(
+                f"Cannot load {model_id} ({memory_gb:.1f}GB): only {free:.1f}GB can be freed "
+                f"while the other models serve requests"
+            )
+        return victims
+
+    async def _remove(self, model_ids: List[str], event: str) -> None:
+        """Unload models (taken out of the pool before the first await)"""
+        entries = [(model_id, self.models.pop(model_id)) for model_id in model_ids]
+        for model_id, entry in entries:
+            logger.info(f"📤 {'Evicting' if event == 'evict' else 'Unloading'} {model_id} ({entry.memory_gb:.1f}GB)")
+            await entry.runtime.stop()
+            await entry.runtime.engine.unload_model()
+            self._record(event, model_id, entry.memory_gb)
+
+    async def load(self, model_id: str, job: Optional[LoadJob] = None) -> ModelRuntime:
+        """
+        Make a model resident, evicting least recently used idle models if it does not fit
+
+        The model is warmed up with MODEL_WARMUP_PROMPTS sample prompts before
+        requests can use it.
+
+        Args:
+            model_id: Model identifier (e.g., 'qwen-0.5b')
+            job: Job to report progress to
+
+        Returns:
+            The model's runtime
+
+        Raises:
+            ValueError: If model_id is not recognized
+            PoolFullError: If the model does not fit the memory budget
+            RuntimeError: If model loading fails
+        """
+        if model_id not in AVAILABLE_MODELS:
+            raise ValueError(
+                f"Unknown model: {model_id}. "
+                f"Available: {list(AVAILABLE_MODELS.keys())}"
+            )
+
+        memory_gb = model_memory_gb(model_id)
+        while True:
+            async with self._lock:
+                entry = self.models.get(model_id)
+                if entry is not None:
+                    self.models.move_to_end(model_id)
+                    return entry.runtime
+                # The same model loading, or any load in a single-slot pool, goes first
+                conflicts = [
+                    done for loading_id, (_, done) in self._reserved.items()
+                    if loading_id == model_id or self.memory_budget_gb <= 0
+                ]
+                if not conflicts:
+                    await self._remove(self._eviction_plan(model_id, memory_gb), "evict")
+                    done = asyncio.Event()
+                    self._reserved[model_id] = (memory_gb, done)
+                    break
+            await conflicts[0].wait()
+
+        try:
+            runtime = ModelRuntime(LLMEngine(gpu_memory_share=self._gpu_memory_share(memory_gb)), self.result_cache)
+            load_start = time.perf_counter()
+            await runtime.engine.load_model(model_id, job.advance if job is not None else None)
+            if job is not None:
+                job.advance("warming")
+            try:
+                await runtime.warm_up(MODEL_WARMUP_PROMPTS)
+            except Exception as e:
+                await runtime.engine.unload_model()
+                raise RuntimeError(f"Warmup failed: {e}")
+            if self._running:
+                await runtime.start()
+            self.models[model_id] = ResidentModel(runtime, memory_gb)
+        finally:
+            self._reserved.pop(model_id, None)
+            done.set()
+        self._record("load", model_id, memory_gb, time.perf_counter() - load_start)
+        logger.info(
+            f"📦 {model_id} resident on {backend_for(model_id)} "
+            f"({self.memory_used_gb():.1f}/{self.memory_budget_gb:.1f}GB, {len(self.models)} models)"
+        )
+        return runtime
+
+    async def unload(self, model_id: Optional[str] = None) -> List[str]:
+        """
+        Unload one model, or every model if model_id is None
+
+        Returns:
+            The models that were unloaded
+        """
+        async with self._lock:
+            model_ids = list(self.models) if model_id is None else [m for m in [model_id] if m in self.models]
+            await self._remove(model_ids, "unload")
+            if self.default_model in model_ids or model_id is None:
+                self.default_model = None
+            return model_ids
+
+    def start_load(self, model_id: str, make_default: bool = False) -> LoadJob:
+        """
+        Load a model in the background
+
+        Args:
+            model_id: Model identifier (e.g., 'qwen-0.5b')
+            make_default: Make it the default model once it is ready (if no
+                later call asked for another default meanwhile); a failed
+                load leaves the current default in place
+
+        Returns:
+            The model's unfinished job if it is already loading, otherwise a
+            new job (finished right away if the model is resident)
+
+        Raises:
+            ValueError: If model_id is not recognized
+        """
+        if model_id not in AVAILABLE_MODELS:
+            raise ValueError(
+                f"Unknown model: {model_id}. "
+                f"Available: {list(AVAILABLE_MODELS.keys())}"
+            )
+        if make_default:
+            self._pending_default = model_id
+        job = self._loading.get(model_id)
+        if job is not None:
+            return job
+
+        job = LoadJob(model_id)
+        self.jobs[job.id] = job
+        while len(self.jobs) > JOB_HISTORY:
+            oldest = next(iter(self.jobs.values()))
+            if not oldest.done:
+                break
+            self.jobs.popitem(last=False)
+
+        if model_id in self.models:
+            self.models.move_to_end(model_id)
+            job.advance("ready")
+            self._settle_default(job)
+            return job
+        self._loading[model_id] = job
+        asyncio.create_task(self._run_job(job))
+        return job
+
+    async def _run_job(self, job: LoadJob) -> None:
+        """Body of a background load"""
+        try:
+            await self.load(job.model, job)
+            job.advance("ready")
+        except Exception as e:
+            logger.error(f"❌ Load job {job.id} for {job.model} failed: {e}")
+            job.fail(e)
+        finally:
+            self._loading.pop(job.model, None)
+            self._settle_default(job)
+
+    def _settle_default(self, job: LoadJob) -> None:
+        """Make a finished job's model the default if it was the latest requested default"""
+        if self._pending_default != job.model:
+            return
+        self._pending_default = None
+        if job.state == "ready":
+            self.default_model = job.model
+        elif self.default_model is not None:
+            logger.warning(f"⚠️ {job.model} failed to load; {self.default_model} stays the default model")
+
+    def request_model(self) -> Optional[str]:
+        """Model for requests that do not name one: the default, or the first model while it loads"""
+        return self.default_model or self._pending_default
+
+    async def wait_ready(self, job: LoadJob, timeout: Optional[float] = None) -> None:
+        """
+        Wait for a load job to finish
+
+        Raises:
+            asyncio.TimeoutError: If it is still running after timeout seconds
+            The job's exception: If it failed
+        """
+        await asyncio.wait_for(job.finished.wait(), timeout)
+        if job.exception is not None:
+            raise job.exception
+
+    async def acquire(self, model_id: str, timeout: Optional[float] = None) -> ResidentModel:
+        """
+        Reserve a model for one request, waiting for it to load if it is not resident
+
+        The model cannot be evicted until the returned entry is passed to release().
+
+        Returns:
+            The resident model (its runtime serves the request)
+
+        Raises:
+            ValueError, PoolFullError, RuntimeError: As for load()
+            asyncio.TimeoutError: If the model is not ready after timeout seconds
+        """
+        entry = self.models.get(model_id)
+        while entry is None:
+            await self.wait_ready(self.start_load(model_id), timeout)
+            entry = self.models.get(model_id)
+        entry.in_use += 1
+        entry.requests += 1
+        self.models.move_to_end(model_id)
+        return entry
+
+    def release(self, entry: ResidentModel) -> None:
+        """
+        End a reservation made by acquire()
+
+        Only the acquired entry is touched: if the model was unloaded (and
+        perhaps loaded again) meanwhile, the new entry's count is not.
+        """
+        entry.in_use = max(0, entry.in_use - 1)
+        entry.last_used = time.time()
+
+    def model_state(self, model_id: Optional[str]) -> Optional[str]:
+        """Load state of a model: "ready" if resident, else its latest job's state (None if never loaded)"""
+        if model_id is None:
+            return None
+        if model_id in self.models:
+            return "ready"
+        if model_id in self._loading:
+            return self._loading[model_id].state
+        for job in reversed(self.jobs.values()):
+            if job.model == model_id:
+                return job.state if job.state == "failed" else None
+        return None
+
+    def status(self) -> Dict:
+        """Budget, resident models (least recently used first) and recent events"""
+        return {
+            "memory_budget_gb": self.memory_budget_gb,
+            "memory_used_gb": self.memory_used_gb(),
+            "default_model": self.default_model,
+            "models": [
+                {
+                    "model": model_id,
+                    "backend": entry.runtime.engine.backend,
+                    "memory_gb": entry.memory_gb,
+                    "in_use": entry.in_use,
+                    "requests": entry.requests,
+                    "loaded_at": entry.loaded_at,
+                    "last_used": entry.last_used,
+                    "replicas": entry.runtime.engine.replica_status(),
+                    "replay": entry.runtime.engine.replay_stats()
+                }
+                for model_id, entry in self.models.items()
+            ],
+            "events": list(self.events)
+        }
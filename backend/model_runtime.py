@@ -0,0 +1,512 @@
+"""
+Per-model evaluation pipeline
+A ModelRuntime bundles an engine router with its own batching scheduler and
+token planner, and runs the prompt -> cache -> generate -> parse -> repair
+pipeline for a list of professors on that model
+"""
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from config import COALESCE_PROMPTS, MAX_REPAIR_ATTEMPTS
+from llm_engine import LLMEngine
+from metrics import (
+    COALESCED_PROMPTS, GENERATION_SECONDS, PARSE_SECONDS, PROMPT_BUILD_SECONDS, REPAIR_SECONDS, record_output
+)
+from models import EvaluateRequest, EvaluationResult, Professor, Publication
+from prompt_builder import REPAIR_INSTRUCTION, build_evaluation_prompts, build_repair_prompt
+from response_parser import parse_and_validate
+from result_cache import ResultCache, make_cache_key
+from scheduler import BatchScheduler
+from single_flight import InFlightResults
+from token_planner import PromptPlan, TokenBudgetPlanner
+
+logger = logging.getLogger(__name__)
+
+# Sample request for warmup batches; shaped like real traffic so prompt
+# lengths and the shared prefix match what the model will see
+_WARMUP_REQUEST = EvaluateRequest(professors=[], research_direction="Efficient machine learning systems")
+_WARMUP_PROFESSOR = Professor(
+    name="Warmup",
+    affiliation="Warmup University",
+    areas=["mlsys", "osdi", "icml"],
+    publicationList=[
+        Publication(title="Serving large language models with paged attention", year=2024, venue="osdi"),
+        Publication(title="Learned cost models for query optimization", year=2023, venue="sigmod")
+    ]
+)
+
+
+def overflow_result() -> EvaluationResult:
+    """Fallback result for a prompt that cannot fit the context window"""
+    return EvaluationResult(
+        score=0.0,
+        reasoning="Invalid model output: prompt exceeds the model context window",
+        researchSummary="Unable to analyze due to invalid model response"
+    )
+
+
+class EvaluationStats:
+    """Counters for one evaluation pass"""
+
+    __slots__ = (
+        "cache_hits", "coalesced_count", "trimmed_count", "retry_count", "repaired_count", "invalid_count", "outputs"
+    )
+
+    def __init__(self):
+        self.cache_hits = 0
+        self.coalesced_count = 0  # Prompts served by another request's in-flight sequence
+        self.trimmed_count = 0
+        self.retry_count = 0  # Sequences re-generated to repair invalid outputs
+        self.repaired_count = 0
+        self.invalid_count = 0  # Results that are fallbacks after repair
+        self.outputs: List = []  # Engine outputs, for the prefix cache hit rate
+
+
+class ModelRuntime:
+    """Evaluation pipeline for the model loaded in one engine router"""
+
+    def __init__(self, engine: LLMEngine, result_cache: Optional[ResultCache] = None):
+        self.engine = engine
+        # Merges prompts across concurrent requests for this engine
+        self.scheduler = BatchScheduler(engine)
+        # Fits prompts into this model's context window
+        self.planner = TokenBudgetPlanner(engine)
+        # Parsed evaluation results, shared by every runtime (keys include the model)
+        self.result_cache = result_cache
+        # Results being generated, so identical prompts share one sequence
+        self.in_flight = InFlightResults(COALESCE_PROMPTS)
+
+    async def start(self) -> None:
+        """Start the batching worker"""
+        await self.scheduler.start()
+
+    async def stop(self) -> None:
+        """Stop the batching worker"""
+        await self.scheduler.stop()
+
+    async def warm_up(self, count: int) -> None:
+        """
+        Generate one batch of sample evaluation prompts on the loaded model
+
+        Runs engine lazy initialization (kernel compilation, CUDA graph
+        capture, tokenizer caches) before real requests arrive.
+        """
+        if count <= 0 or not self.engine.needs_warmup():
+            return
+        # Distinct names so the batch is not served from the prefix cache
+        professors = [_WARMUP_PROFESSOR.model_copy(update={"name": f"Warmup {i}"}) for i in range(count)]
+        plan = await asyncio.to_thread(self.plan_prompts, _WARMUP_REQUEST, professors)
+        overflow = set(plan.overflow)
+        prompts = [prompt for i, prompt in enumerate(plan.prompts) if i not in overflow]
+        warmup_start = time.perf_counter()
+        await asyncio.to_thread(self.engine.warm_up, prompts)
+        logger.info(f"🔥 Warmed up {self.engine.get_current_model()} with {len(prompts)} prompts in {time.perf_counter() - warmup_start:.1f}s")
+
+    def build_prompts(
+        self,
+        request: EvaluateRequest,
+        professors: List[Professor],
+        omitted: Optional[List[int]] = None
+    ) -> List[str]:
+        """Build evaluation prompts for the given professors (omitted: publications trimmed from each)"""
+        return build_evaluation_prompts(
+            professors,
+            request.research_direction,
+            use_strict_prompts=True, scoring_scheme=request.scoring_scheme,
+            layout=request.prompt_layout, omitted=omitted
+        )
+
+    def plan_prompts(self, request: EvaluateRequest, professors: List[Professor]) -> PromptPlan:
+        """Build prompts and fit them into the token budget (blocking, run in a thread)"""
+        return self.planner.plan(professors, lambda subset, omitted=None: self.build_prompts(request, subset, omitted))
+
+    def lookup_cached(self, prompts: List[str], scoring_scheme: str) -> Tuple[List[str], Dict[str, dict]]:
+        """
+        Compute cache keys for prompts and fetch any cached results (blocking, run in a thread)
+
+        Returns:
+            (keys, cached) - one key per prompt and a key -> result mapping of hits
+        """
+        model_id = self.engine.get_current_model()
+        fingerprint = self.engine.sampling_fingerprint()
+        keys = [make_cache_key(model_id, fingerprint, scoring_scheme, prompt) for prompt in prompts]
+        cached = self.result_cache.get_many(keys) if self.result_cache is not None else {}
+        return keys, cached
+
+    def evaluate_output(self, index: int, output) -> Tuple[EvaluationResult, bool]:
+        """
+        Validate and parse a single engine output
+
+        Returns:
+            (result, is_valid) - invalid outputs get a 0.0 fallback result
+        """
+        text = self.engine.extract_text(output)
+
+        # Validate output quality and parse it in one pass
+        is_valid, error_msg, parsed = parse_and_validate(text)
+        record_output(self.engine.get_current_model(), is_valid)
+
+        if not is_valid:
+            logger.warning(f"⚠️ Invalid output for professor {index}: {error_msg}")
+            logger.warning(f"   Raw output (first 200 chars): {text[:200]}")
+
+            # Use fallback response for invalid output
+            parsed = {
+                "score": 0.0,
+                "reasoning": f"Invalid model output: {error_msg}",
+                "researchSummary": "Unable to analyze due to invalid model response"
+            }
+
+        return EvaluationResult(**parsed), is_valid
+
+    async def repair_invalid(
+        self,
+        indices: List[int],
+        prompts: List[str],
+        token_counts: List[int]
+    ) -> Tuple[Dict[int, EvaluationResult], int]:
+        """
+        Re-generate only the invalid outputs with stricter sampling
+
+        Each round re-submits the still-invalid prompts with a JSON-only
+        instruction and the engine's retry sampling parameters, up to
+        MAX_REPAIR_ATTEMPTS rounds.
+
+        Returns:
+            (repaired results by prompt index, number of sequences re-generated)
+        """
+        if not indices or MAX_REPAIR_ATTEMPTS <= 0:
+            return {}, 0
+
+        suffix_tokens = self.engine.count_tokens([REPAIR_INSTRUCTION])[0]
+        pending = [i for i in indices if self.planner.fits(token_counts[i] + suffix_tokens)]
+        repaired: Dict[int, EvaluationResult] = {}
+        retry_count = 0
+
+        for attempt in range(1, MAX_REPAIR_ATTEMPTS + 1):
+            if not pending:
+                break
+
+            logger.info(f"🔁 Repair attempt {attempt}/{MAX_REPAIR_ATTEMPTS}: re-generating {len(pending)} invalid outputs")
+            retry_count += len(pending)
+            outputs = await self.scheduler.generate(
+                [build_repair_prompt(prompts[i]) for i in pending],
+                [token_counts[i] + suffix_tokens for i in pending],
+                sampling_params=self.engine.retry_sampling_params
+            )
+
+            still_invalid = []
+            for i, output in zip(pending, outputs):
+                result, is_valid = self.evaluate_output(i, output)
+                if is_valid:
+                    repaired[i] = result
+                else:
+                    still_invalid.append(i)
+            pending = still_invalid
+
+        logger.info(f"🔁 Repaired {len(repaired)}/{len(indices)} invalid outputs with {retry_count} retries")
+        return repaired, retry_count
+
+    async def evaluate(
+        self,
+        request: EvaluateRequest,
+        professors: List[Professor]
+    ) -> Tuple[List[EvaluationResult], List[bool], EvaluationStats]:
+        """
+        Score professors on this runtime's model
+
+        Returns:
+            (results, valid, stats) - one result and validity flag per professor, in order
+        """
+        stats = EvaluationStats()
+
+        # Build prompts, trimmed to the token budget
+        with PROMPT_BUILD_SECONDS.time():
+            plan = await asyncio.to_thread(self.plan_prompts, request, professors)
+        prompts = plan.prompts
+        overflow = set(plan.overflow)
+        stats.trimmed_count = len(plan.trimmed)
+
+        # Reuse results evaluated earlier with the same model and prompt
+        keys, cached = await asyncio.to_thread(self.lookup_cached, prompts, request.scoring_scheme)
+        results: List[EvaluationResult] = [None] * len(prompts)
+        valid = [True] * len(prompts)
+        miss_indices = []
+        for i, key in enumerate(keys):
+            if key in cached:
+                results[i] = EvaluationResult(**cached[key])
+            elif i in overflow:
+                results[i] = overflow_result()
+                valid[i] = False
+            else:
+                miss_indices.append(i)
+        stats.cache_hits = len(prompts) - len(miss_indices) - len(overflow)
+
+        # Prompts already in flight for another request are not generated again;
+        # if that request gives up, they are claimed again
+        pending = miss_indices
+        while pending:
+            owned, followed = self.in_flight.claim(keys, pending)
+            try:
+                await self.generate_owned(owned, prompts, plan.token_counts, keys, results, valid, stats)
+            finally:
+                for i, future in owned.items():
+                    self.in_flight.release(keys[i], future)
+            pending = []
+            for i, future in followed.items():
+                settled = await self.in_flight.wait(future)
+                if settled is None:
+                    pending.append(i)
+                    continue
+                results[i], valid[i] = settled
+                stats.coalesced_count += 1
+        self.record_coalesced(stats)
+        stats.invalid_count = valid.count(False)
+
+        if stats.invalid_count > 0:
+            logger.warning(f"⚠️ {stats.invalid_count}/{len(prompts)} outputs were invalid and replaced with fallback")
+
+        return results, valid, stats
+
+    async def generate_owned(
+        self,
+        owned: Dict[int, "asyncio.Future"],
+        prompts: List[str],
+        token_counts: List[int],
+        keys: List[str],
+        results: List[EvaluationResult],
+        valid: List[bool],
+        stats: EvaluationStats
+    ) -> None:
+        """
+        Generate, parse and repair the prompts a request owns, filling in results and valid
+
+        Each final result is cached and handed to the requests waiting on it.
+        """
+        indices = list(owned)
+        if not indices:
+            return
+
+        # Batch inference through the shared scheduler, which merges these
+        # prompts with those of other in-flight requests
+        logger.info(
+            f"🚀 Queueing batch inference on {self.engine.get_current_model()} "
+            f"({len(indices)} prompts, {stats.cache_hits} cache hits)"
+        )
+        with GENERATION_SECONDS.time():
+            outputs = await self.scheduler.generate(
+                [prompts[i] for i in indices],
+                [token_counts[i] for i in indices]
+            )
+        stats.outputs.extend(outputs)
+
+        # Parse and validate results
+        logger.info(f"📝 Parsing {len(outputs)} outputs")
+        invalid_indices = []
+        new_entries = []
+
+        with PARSE_SECONDS.time():
+            for i, output in zip(indices, outputs):
+                result, is_valid = self.evaluate_output(i, output)
+                results[i] = result
+                if is_valid:
+                    new_entries.append((keys[i], result.model_dump()))
+                    self.in_flight.settle(keys[i], owned[i], result, True)
+                else:
+                    invalid_indices.append(i)
+                    valid[i] = False
+
+        # Re-generate just the invalid outputs and merge them back in order
+        if invalid_indices:
+            with REPAIR_SECONDS.time():
+                repaired, retry_count = await self.repair_invalid(invalid_indices, prompts, token_counts)
+            stats.retry_count += retry_count
+        else:
+            repaired = {}
+        for i, result in repaired.items():
+            results[i] = result
+            valid[i] = True
+            new_entries.append((keys[i], result.model_dump()))
+        stats.repaired_count += len(repaired)
+        for i in invalid_indices:
+            self.in_flight.settle(keys[i], owned[i], results[i], valid[i])
+
+        if self.result_cache is not None:
+            self.result_cache.put_many(new_entries)
+
+    def record_coalesced(self, stats: EvaluationStats) -> None:
+        """Count the prompts a pass took from other requests' sequences"""
+        if stats.coalesced_count:
+            COALESCED_PROMPTS.labels(model=self.engine.get_current_model() or "none").inc(stats.coalesced_count)
+            logger.info(f"🔗 {stats.coalesced_count} prompts shared another request's in-flight sequence")
+
+    async def evaluate_as_completed(
+        self,
+        request: EvaluateRequest,
+        professors: List[Professor],
+        stats: EvaluationStats
+    ) -> AsyncIterator[Tuple[int, EvaluationResult, bool]]:
+        """
+        Score professors on this runtime's model, yielding each result as soon as it is final
+
+        Cached results and prompts too long to evaluate come first, then
+        generated results in completion order; invalid outputs are held back
+        until the repair pass. Prompts in flight for another request come
+        when that request's result is final. ``stats`` is filled in as the
+        pass runs.
+
+        Yields:
+            (professor index, result, is_valid)
+        """
+        with PROMPT_BUILD_SECONDS.time():
+            plan = await asyncio.to_thread(self.plan_prompts, request, professors)
+        prompts = plan.prompts
+        overflow = set(plan.overflow)
+        stats.trimmed_count = len(plan.trimmed)
+        keys, cached = await asyncio.to_thread(self.lookup_cached, prompts, request.scoring_scheme)
+        miss_indices = [i for i, key in enumerate(keys) if key not in cached and i not in overflow]
+        stats.cache_hits = len(prompts) - len(miss_indices) - len(overflow)
+        stats.invalid_count = len(overflow)
+
+        for index, key in enumerate(keys):
+            if key in cached:
+                yield index, EvaluationResult(**cached[key]), True
+            elif index in overflow:
+                yield index, overflow_result(), False
+
+        pending = miss_indices
+        try:
+            while pending:
+                owned, followed = self.in_flight.claim(keys, pending)
+                pending = []
+                owned_results = self.stream_owned(owned, prompts, plan.token_counts, keys, stats)
+                async for index, settled in self.with_followed(owned_results, followed):
+                    if settled is None:
+                        # The request generating it gave up; claim it again
+                        pending.append(index)
+                        continue
+                    result, is_valid = settled
+                    if index in followed:
+                        stats.coalesced_count += 1
+                        if not is_valid:
+                            stats.invalid_count += 1
+                    yield index, result, is_valid
+        finally:
+            self.record_coalesced(stats)
+
+    async def stream_owned(
+        self,
+        owned: Dict[int, "asyncio.Future"],
+        prompts: List[str],
+        token_counts: List[int],
+        keys: List[str],
+        stats: EvaluationStats
+    ) -> AsyncIterator[Tuple[int, EvaluationResult, bool]]:
+        """
+        Generate, parse and repair the prompts a request owns, yielding each final result
+
+        Each final result is cached and handed to the requests waiting on it;
+        owned prompts left without a result are released.
+        """
+        indices = list(owned)
+        try:
+            invalid_results: Dict[int, EvaluationResult] = {}
+            parse_seconds = 0.0
+            generation_start = time.perf_counter()
+            async for local_index, output in self.scheduler.generate_as_completed(
+                [prompts[i] for i in indices],
+                [token_counts[i] for i in indices]
+            ):
+                index = indices[local_index]
+                stats.outputs.append(output)
+                parse_start = time.perf_counter()
+                result, is_valid = self.evaluate_output(index, output)
+                parse_seconds += time.perf_counter() - parse_start
+                if not is_valid:
+                    # Held back until the repair pass below
+                    invalid_results[index] = result
+                    continue
+                if self.result_cache is not None:
+                    # Queued for the cache's writer thread, which commits results in batches
+                    self.result_cache.put(keys[index], result.model_dump())
+                self.in_flight.settle(keys[index], owned[index], result, True)
+                yield index, result, True
+
+            # Wall time until the last output arrived, less the time spent parsing
+            if indices:
+                GENERATION_SECONDS.observe(time.perf_counter() - generation_start - parse_seconds)
+                PARSE_SECONDS.observe(parse_seconds)
+
+            if invalid_results:
+                with REPAIR_SECONDS.time():
+                    repaired, retry_count = await self.repair_invalid(
+                        list(invalid_results), prompts, token_counts
+                    )
+                stats.retry_count += retry_count
+            else:
+                repaired = {}
+            stats.repaired_count += len(repaired)
+            for index, fallback in invalid_results.items():
+                result = repaired.get(index)
+                if result is None:
+                    stats.invalid_count += 1
+                    self.in_flight.settle(keys[index], owned[index], fallback, False)
+                    yield index, fallback, False
+                    continue
+                if self.result_cache is not None:
+                    self.result_cache.put(keys[index], result.model_dump())
+                self.in_flight.settle(keys[index], owned[index], result, True)
+                yield index, result, True
+        finally:
+            for index in indices:
+                self.in_flight.release(keys[index], owned[index])
+
+    async def with_followed(
+        self,
+        owned_results: AsyncIterator[Tuple[int, EvaluationResult, bool]],
+        followed: Dict[int, "asyncio.Future"]
+    ) -> AsyncIterator[Tuple[int, Optional[Tuple[EvaluationResult, bool]]]]:
+        """
+        Interleave a request's own results with the ones it waits on, each as it arrives
+
+        Yields:
+            (index, (result, is_valid)), or (index, None) for a followed
+            prompt whose request gave up on it
+        """
+        if not followed:
+            async for index, result, is_valid in owned_results:
+                yield index, (result, is_valid)
+            return
+
+        arrivals: asyncio.Queue = asyncio.Queue()
+
+        async def pump_owned():
+            try:
+                async for index, result, is_valid in owned_results:
+                    arrivals.put_nowait((index, (result, is_valid)))
+            except Exception as e:
+                arrivals.put_nowait(e)
+                return
+            arrivals.put_nowait(None)
+
+        async def follow(index: int, future: "asyncio.Future"):
+            arrivals.put_nowait((index, await self.in_flight.wait(future)))
+
+        tasks = [asyncio.create_task(pump_owned())]
+        tasks += [asyncio.create_task(follow(index, future)) for index, future in followed.items()]
+        try:
+            remaining = len(tasks)
+            while remaining:
+                arrival = await arrivals.get()
+                if isinstance(arrival, Exception):
+                    raise arrival
+                if arrival is None or arrival[0] in followed:
+                    remaining -= 1
+                if arrival is not None:
+                    yield arrival
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -2,8 +2,8 @@
 Pydantic data models for API requests and responses
 """
 
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Literal, Optional
 
 
 class Publication(BaseModel):
@@ -21,19 +21,50 @@ class Professor(BaseModel):
     publicationList: Optional[List[Publication]] = []
 
 
-class EvaluateRequest(BaseModel):
-    """Batch evaluation request"""
-    professors: List[Professor]
+class EvaluationOptions(BaseModel):
+    """Research direction and evaluation settings shared by batch requests and jobs"""
     research_direction: str
-    batch_size: int = 20
     threshold: float = 0.6
+    scoring_scheme: str = "original"
+    prompt_layout: Optional[Literal["standard", "prefix"]] = None  # None = server default
+    model: Optional[str] = None  # Model to evaluate with, loaded if not resident (None = default model)
+    prerank: Optional[bool] = None  # Lexical pre-ranking on/off (None = server default)
+    prerank_top_k: Optional[int] = None  # Send at most this many professors to the LLM (0 = no cap)
+    prerank_min_score: Optional[float] = None  # Normalized BM25 score (0-1) a professor must exceed
+    cascade: Optional[bool] = None  # Re-score uncertain professors on CASCADE_MODEL (None = on when it is set)
+    cascade_band: Optional[float] = None  # Scores within this distance of the threshold are uncertain
+
+
+class ProfessorOverride(BaseModel):
+    """Fields replacing a stored professor's data for one request"""
+    affiliation: Optional[str] = None
+    areas: Optional[List[str]] = None
+    publicationList: Optional[List[Publication]] = None
+
+
+class EvaluateRequest(EvaluationOptions):
+    """Batch evaluation request: full professors, or ids from the professor store"""
+    professors: List[Professor] = []
+    professor_ids: Optional[List[str]] = None  # "<region>:<hash>" ids (instead of professors)
+    overrides: Optional[Dict[str, ProfessorOverride]] = None  # Per-id replacements for stored fields
+    priority: Optional[Literal["interactive", "bulk"]] = None  # Scheduler lane (None = by request size)
+    timeout: Optional[float] = Field(None, ge=0)  # Seconds until the request is aborted (None = REQUEST_TIMEOUT_S, 0 = none)
+    # Deprecated and ignored: engine batches are sized by the scheduler's token budget
+    batch_size: int = Field(20, json_schema_extra={"deprecated": True})
+
+
+class PublicationsUpload(BaseModel):
+    """Publication lists to keep in the professor store"""
+    publications: Dict[str, List[Publication]]  # Professor id -> publications
 
 
 class EvaluationResult(BaseModel):
     """Single professor evaluation result"""
-    score: float
+    score: Optional[float]  # None if the professor was not evaluated
     reasoning: str
     researchSummary: str
+    evaluated: bool = True  # False if pre-ranking kept the professor away from the LLM
+    decided_by: Optional[str] = None  # Model (or "prerank") that decided the score, cascade mode only
 
 
 class EvaluateResponse(BaseModel):
@@ -43,6 +74,67 @@ class EvaluateResponse(BaseModel):
     results: List[EvaluationResult]
     processing_time: float
     model_name: str
+    cache_hits: int = 0
+    coalesced_count: int = 0  # Professors scored by an identical prompt in flight for another request
+    prefix_cache_hit_rate: Optional[float] = None
+    trimmed_count: int = 0  # Prompts whose publication list was shortened to fit
+    retry_count: int = 0  # Sequences re-generated to repair invalid outputs
+    repaired_count: int = 0  # Invalid outputs recovered by a retry
+    prerank_skipped: int = 0  # Professors not sent to the LLM by lexical pre-ranking
+    cascade_model: Optional[str] = None  # Model that re-scored uncertain professors
+    cascade_count: int = 0  # Professors re-scored by the cascade model
+
+
+class EvaluationStreamResult(BaseModel):
+    """Streamed result frame for a single professor"""
+    type: str = "result"
+    index: int
+    result: EvaluationResult
+
+
+class EvaluationStreamSummary(BaseModel):
+    """Final frame of a streamed evaluation"""
+    model_config = {"protected_namespaces": ()}  # Fix Pydantic warning
+    
+    type: str = "summary"
+    count: int
+    invalid_count: int
+    cache_hits: int = 0
+    coalesced_count: int = 0
+    trimmed_count: int = 0
+    retry_count: int = 0
+    repaired_count: int = 0
+    prerank_skipped: int = 0
+    cascade_model: Optional[str] = None
+    cascade_count: int = 0
+    processing_time: float
+    time_to_first_result: Optional[float] = None
+    prefix_cache_hit_rate: Optional[float] = None
+    model_name: str
+
+
+class RetrieveRequest(BaseModel):
+    """Nearest-professor retrieval request"""
+    research_direction: str
+    top_n: int = Field(100, ge=1, le=10000)
+    regions: Optional[List[str]] = None  # None = all regions
+
+
+class RetrievedProfessor(BaseModel):
+    """One professor from the vector index"""
+    id: str  # "<region>:<hash of name and affiliation>" (professor_data.professor_id)
+    name: str
+    affiliation: str
+    region: str
+    score: float  # Cosine similarity to the research direction
+
+
+class RetrieveResponse(BaseModel):
+    """Nearest professors, best first"""
+    results: List[RetrievedProfessor]
+    query_time_ms: float
+    index_size: int
+    encoder: str
 
 
 class LoadModelRequest(BaseModel):
@@ -50,20 +142,177 @@ class LoadModelRequest(BaseModel):
     model_config = {"protected_namespaces": ()}  # Fix Pydantic warning
     
     model_id: str
+    wait: bool = False  # Respond only once the model is ready (or failed)
 
 
 class LoadModelResponse(BaseModel):
     """Model loading response"""
-    status: str
+    status: str  # "loading" or "loaded"
     model: str
+    job_id: Optional[str] = None  # Poll /load_jobs/{job_id} for progress
+    state: Optional[str] = None
     message: Optional[str] = None
 
 
+class LoadJobResponse(BaseModel):
+    """Background model load"""
+    job_id: str
+    model: str
+    state: Literal["queued", "downloading", "initializing", "warming", "ready", "failed"]
+    error: Optional[str] = None
+    created_at: float  # Unix time
+    updated_at: float  # When the job entered its current state
+    stage_seconds: Dict[str, float] = {}  # Time spent in each finished state
+
+
+class UnloadModelRequest(BaseModel):
+    """Model unloading request"""
+    model_config = {"protected_namespaces": ()}  # Fix Pydantic warning
+    
+    model_id: Optional[str] = None  # None = every resident model
+
+
+class EngineReplicaInfo(BaseModel):
+    """One engine worker process of a resident model"""
+    replica: int
+    device: Optional[str] = None  # CUDA device, None if not pinned
+    state: Literal["loading", "ready", "failed", "stopped"]
+    pid: Optional[int] = None
+    outstanding: int  # Prompts dispatched and not yet finished
+    restarts: int
+
+
+class ReplayStats(BaseModel):
+    """How well a replay capture covered the prompts served since the model was loaded"""
+    recorded_outputs: int
+    hits: int  # Prompts answered from the capture
+    misses: int  # Prompts that got the fallback output
+    token_count_misses: int  # Texts counted approximately (no recorded tokenizer count)
+
+
+class ResidentModelInfo(BaseModel):
+    """A model resident in the pool"""
+    model: str
+    backend: Optional[str] = None
+    memory_gb: float  # Catalog estimate
+    in_use: int  # Requests currently holding the model
+    requests: int  # Requests served since it was loaded
+    loaded_at: float  # Unix time
+    last_used: float
+    replicas: Optional[List[EngineReplicaInfo]] = None  # Set when ENGINE_REPLICAS > 1
+    replay: Optional[ReplayStats] = None  # Set on the in-process replay backend
+
+
+class ModelPoolEvent(BaseModel):
+    """Model load, eviction or unload"""
+    time: float
+    event: Literal["load", "evict", "unload"]
+    model: str
+    memory_gb: float
+    seconds: Optional[float] = None  # Load time
+
+
+class ModelPoolResponse(BaseModel):
+    """Model pool state"""
+    memory_budget_gb: float  # 0 = one model at a time
+    memory_used_gb: float
+    default_model: Optional[str] = None
+    models: List[ResidentModelInfo]  # Least recently used first
+    events: List[ModelPoolEvent]  # Oldest first
+
+
+class AdmissionInfo(BaseModel):
+    """Prompts admitted and not yet finished"""
+    max_prompts: int  # 0 = no limit
+    admitted: int
+    lanes: Dict[str, int]  # Lane -> admitted prompts
+    clients: Dict[str, int]  # Client -> admitted prompts
+    rejected: Dict[str, int]  # Lane -> requests rejected with 429 since startup
+
+
+class BatchTuningInfo(BaseModel):
+    """Batch size autotuning state of one model"""
+    model: str
+    batch_size: int  # Current limit
+    best_batch_size: int  # Size with the best measured throughput
+    best_prompts_per_second: float  # 0 until measured
+    max_batch_tokens: Optional[int] = None  # Learned token budget after out-of-memory failures
+    settled: bool  # Growth stopped paying off; only probing now and then
+    oom_failures: int
+
+
+class SchedulerQueueInfo(BaseModel):
+    """Scheduler queue of one model"""
+    model: str
+    queued: Dict[str, int]  # Lane -> prompts waiting for a batch
+    clients: Dict[str, Dict[str, int]]  # Lane -> client -> prompts waiting
+    running_batches: int
+    throughput: float  # Recent prompts/sec
+    batch_limit: int  # Prompts the next batch may hold
+    tuning: Optional[BatchTuningInfo] = None  # None when autotuning is off
+
+
+class QueueResponse(BaseModel):
+    """Admission and scheduler queue state"""
+    admission: AdmissionInfo
+    schedulers: List[SchedulerQueueInfo]
+
+
 class HealthResponse(BaseModel):
     """Health check response"""
     model_config = {"protected_namespaces": ()}  # Fix Pydantic warning
     
     status: str
-    model_loaded: bool
+    model_loaded: bool  # The default model is ready
     current_model: Optional[str] = None
+    model_state: Optional[str] = None  # Load state of current_model (see LoadJobResponse)
+    resident_models: List[str] = []
+    cascade_model: Optional[str] = None  # Loaded cascade model, if any
+
+
+class EvaluationJobRequest(EvaluationOptions):
+    """Server-side evaluation of every professor in some regions that passes the filters"""
+    regions: List[str] = Field(..., min_length=1)
+    venues: Optional[List[str]] = None  # Only professors publishing in these venues (None = any)
+    year_start: Optional[int] = None  # Publication year range for the paper count
+    year_end: Optional[int] = None
+    min_papers: float = 0.0  # Papers (in the venues and years) a professor needs
+    affiliation: Optional[str] = None  # Case-insensitive substring of the affiliation
+
+
+class EvaluationJobResponse(BaseModel):
+    """Progress of an evaluation job"""
+    model_config = {"protected_namespaces": ()}  # Fix Pydantic warning
+    
+    job_id: str
+    state: Literal["queued", "running", "completed", "failed", "cancelled"]
+    model: str
+    research_direction: str
+    regions: List[str]
+    total: int  # Professors selected by the filters
+    completed: int  # Professors with a checkpointed result
+    matched: int  # Completed professors scoring at least the threshold
+    missing: int = 0  # Selected professors no longer in the region files (not evaluated)
+    error: Optional[str] = None
+    created_at: float  # Unix time
+    updated_at: float
+    resumed: int = 0  # Times the job was picked up again after a restart or failure
+
+
+class EvaluationJobResult(BaseModel):
+    """One professor's result in an evaluation job"""
+    index: int  # Position in the job's selection
+    id: str  # "<region>:<hash of name and affiliation>" (professor_data.professor_id)
+    name: str
+    affiliation: str
+    result: EvaluationResult
+
 
+class EvaluationJobResults(BaseModel):
+    """One page of an evaluation job's results"""
+    job_id: str
+    state: str
+    total: int  # Results matching the query (across all pages)
+    offset: int
+    limit: int
+    results: List[EvaluationJobResult]
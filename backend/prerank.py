@@ -0,0 +1,251 @@
+"""
+Lexical pre-ranking
+Scores professors against the research direction with BM25 over their
+publication titles, venues and areas, so professors without any lexical
+evidence of a match can skip the LLM
+"""
+
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import Professor
+
+# CSRankings venue -> research area (mirrors src/utils/areaConfig.js), so a
+# direction like "computer vision" also matches professors publishing at CVPR
+_AREA_VENUES = {
+    "artificial intelligence": "aaai ijcai",
+    "computer vision": "cvpr eccv iccv",
+    "machine learning": "iclr icml nips neurips kdd",
+    "natural language processing": "acl emnlp naacl",
+    "web information retrieval": "sigir www",
+    "computer architecture": "asplos isca micro hpca",
+    "computer networks": "sigcomm nsdi",
+    "computer security": "ccs oakland usenixsec ndss",
+    "databases": "sigmod vldb icde pods",
+    "design automation": "dac iccad",
+    "embedded real time systems": "emsoft rtas rtss",
+    "high performance computing": "hpdc ics sc",
+    "mobile computing": "mobicom mobisys sensys",
+    "measurement performance analysis": "imc sigmetrics",
+    "operating systems": "osdi sosp eurosys fast usenixatc",
+    "programming languages": "pldi popl icfp oopsla",
+    "software engineering": "fse icse ase issta",
+    "algorithms complexity theory": "focs soda stoc",
+    "cryptography": "crypto eurocrypt",
+    "logic verification": "cav lics",
+    "computational biology bioinformatics": "ismb recomb",
+    "computer graphics": "siggraph siggraph-asia eurographics",
+    "computer science education": "sigcse",
+    "economics computation": "ec wine",
+    "human computer interaction": "chiconf chi ubicomp uist",
+    "robotics robots": "icra iros rss",
+    "visualization": "vis vr",
+}
+VENUE_AREAS: Dict[str, str] = {
+    venue: area for area, venues in _AREA_VENUES.items() for venue in venues.split()
+}
+
+# Common abbreviations, expanded on both the query and the document side
+ABBREVIATIONS = {
+    "ai": "artificial intelligence",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "rl": "reinforcement learning",
+    "nlp": "natural language processing",
+    "llm": "large language model",
+    "llms": "large language models",
+    "cv": "computer vision",
+    "hci": "human computer interaction",
+    "hpc": "high performance computing",
+    "os": "operating systems",
+    "db": "databases",
+    "pl": "programming languages",
+    "se": "software engineering",
+    "iot": "internet of things",
+    "gnn": "graph neural network",
+    "gnns": "graph neural networks",
+}
+
+# English function words plus filler that research directions are written with
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be been being
+between both but by can could do does for from had has have how i if in into is
+it its like me more most my new not of on or other our over such than that the
+their them then there these they this those through to toward towards under
+using via want was we were what when where which while who will with within
+would you your
+approach approaches area areas based field fields focus focused including
+interest interested interests method methods problem problems related research
+researcher researchers study studies topic topics work working
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    """Strip common English suffixes so plurals and verb forms match"""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 6 and token.endswith("ing"):
+        return token[:-3]
+    if len(token) > 5 and token.endswith("ed"):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+@lru_cache(maxsize=65536)
+def _terms(token: str) -> Tuple[str, ...]:
+    """Index terms for one lowercase token (cached: vocabularies are small)"""
+    expansion = ABBREVIATIONS.get(token)
+    words = expansion.split() if expansion else (token,)
+    return tuple(_stem(word) for word in words if word not in STOPWORDS and len(word) > 1)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split, expand abbreviations, drop stopwords and stem"""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.extend(_terms(token))
+    return tokens
+
+
+def professor_tokens(professor: Professor) -> List[str]:
+    """
+    Terms indexed for one professor
+
+    Every publication title counts; each distinct venue and area is added
+    once (with its research area name) so prolific venues do not drown out
+    the titles.
+    """
+    text = [pub.title for pub in professor.publicationList or []]
+    venues = {pub.venue.lower() for pub in professor.publicationList or []}
+    venues.update(area.lower() for area in professor.areas or [])
+    for venue in sorted(venues):
+        text.append(venue)
+        if venue in VENUE_AREAS:
+            text.append(VENUE_AREAS[venue])
+    return tokenize(" ".join(text))
+
+
+class LexicalIndex:
+    """
+    BM25 index over one set of candidates
+
+    Postings are stored column-wise (term -> documents) in flat numpy arrays,
+    so scoring a query is one gather over its terms' postings plus a bincount.
+    """
+
+    def __init__(self, documents: Sequence[List[str]], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.num_docs = len(documents)
+        self.vocabulary: Dict[str, int] = {}
+
+        doc_ids: List[int] = []
+        term_ids: List[int] = []
+        term_freqs: List[int] = []
+        lengths = np.zeros(self.num_docs, dtype=np.float64)
+        for doc_id, tokens in enumerate(documents):
+            lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                doc_ids.append(doc_id)
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                term_freqs.append(tf)
+
+        terms = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(terms, kind="stable")
+        self._doc_ids = np.asarray(doc_ids, dtype=np.int64)[order]
+        self._tfs = np.asarray(term_freqs, dtype=np.float64)[order]
+        df = np.bincount(terms, minlength=len(self.vocabulary))
+        self._term_ptr = np.concatenate(([0], np.cumsum(df)))
+
+        self.doc_lengths = lengths
+        self.idf = np.log1p((self.num_docs - df + 0.5) / (df + 0.5))
+        # idf of a term no document contains (upper bound for any term)
+        self.max_idf = math.log1p((self.num_docs + 0.5) / 0.5)
+        avg_length = lengths.mean() if self.num_docs and lengths.any() else 1.0
+        self._length_norm = k1 * (1 - b + b * lengths / avg_length)
+
+    def score(self, query_tokens: List[str]) -> np.ndarray:
+        """BM25 score of every document for a tokenized query"""
+        scores = np.zeros(self.num_docs, dtype=np.float64)
+        terms = [self.vocabulary[t] for t in set(query_tokens) if t in self.vocabulary]
+        if not terms:
+            return scores
+
+        spans = [(self._term_ptr[t], self._term_ptr[t + 1]) for t in terms]
+        postings = np.concatenate([np.arange(start, end) for start, end in spans])
+        idf = np.repeat(self.idf[terms], [end - start for start, end in spans])
+        docs = self._doc_ids[postings]
+        tf = self._tfs[postings]
+        weights = idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return np.bincount(docs, weights=weights, minlength=self.num_docs)
+
+    def max_score(self, query_tokens: List[str]) -> float:
+        """Score a document would approach by containing every query term many times"""
+        return sum(
+            (self.idf[self.vocabulary[t]] if t in self.vocabulary else self.max_idf) * (self.k1 + 1)
+            for t in set(query_tokens)
+        )
+
+
+class PrerankResult(NamedTuple):
+    """Outcome of pre-ranking one request"""
+    kept: List[int]  # Indices forwarded to the LLM, in request order
+    skipped: List[int]  # Indices that skip the LLM
+    scores: List[float]  # Normalized score (0-1) per professor
+
+
+def prerank(
+    professors: List[Professor],
+    research_direction: str,
+    top_k: Optional[int] = None,
+    min_score: float = 0.0
+) -> PrerankResult:
+    """
+    Pick the professors worth sending to the LLM
+
+    Scores are BM25 divided by the query's maximum attainable score, so the
+    cutoff means the same thing for any request size. A professor is kept if
+    their score is above ``min_score`` (0 keeps everyone sharing at least one
+    term with the direction); ``top_k`` then caps the number kept, best
+    first. Professors with nothing to index are always kept, as are all
+    professors when the direction has no searchable terms.
+
+    Args:
+        professors: Candidates in request order
+        research_direction: Free-text research direction
+        top_k: Keep at most this many professors (None = no cap)
+        min_score: Normalized score a professor must exceed
+
+    Returns:
+        PrerankResult with kept and skipped indices
+    """
+    query = tokenize(research_direction)
+    documents = [professor_tokens(p) for p in professors]
+    if not query or not professors:
+        return PrerankResult(list(range(len(professors))), [], [1.0] * len(professors))
+
+    index = LexicalIndex(documents)
+    scores = index.score(query) / index.max_score(query)
+    empty = index.doc_lengths == 0
+
+    candidates = np.flatnonzero((scores > min_score) & ~empty)
+    if top_k is not None and len(candidates) > top_k:
+        best_first = np.argsort(-scores[candidates], kind="stable")
+        candidates = candidates[best_first[:max(0, top_k)]]
+    keep = np.zeros(len(professors), dtype=bool)
+    keep[candidates] = True
+    keep |= empty
+
+    return PrerankResult(
+        np.flatnonzero(keep).tolist(),
+        np.flatnonzero(~keep).tolist(),
+        scores.tolist()
+    )
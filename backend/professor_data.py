@@ -0,0 +1,71 @@
+"""
+Professor region files
+Reads public/data/professors-<region>.json (the files the frontend loads) so
+the server can select and evaluate professors without a client sending them.
+A professor's id is "<region>:<hash of name and affiliation>", so it names
+the same person after the region files are refreshed; the vector index uses
+the same ids.
+"""
+
+import hashlib
+import json
+import math
+import os
+from typing import Dict, List
+
+from config import PROFESSOR_DATA_DIR
+
+
+def professor_id(region: str, entry: Dict) -> str:
+    """Stable id of a region file entry"""
+    material = f"{entry['name']}\x1f{entry.get('affiliation', '')}"
+    return f"{region}:{hashlib.sha1(material.encode('utf-8')).hexdigest()[:12]}"
+
+
+def placeholder_title(venue: str, year: int) -> str:
+    """Title of a publication known only from the per-venue, per-year counts"""
+    return f"Publication in {venue.upper()} {year}"
+
+
+def publication_records(publications: Dict[str, Dict[str, float]]) -> List[Dict]:
+    """
+    Publication records for a region file entry's paper counts
+
+    The region files only hold per-venue, per-year paper counts, so each
+    venue/year becomes ceil(count) placeholder publications, newest first,
+    the same records the frontend builds when DBLP has nothing better.
+    """
+    records = [
+        {"title": placeholder_title(venue, int(year)), "year": int(year), "venue": venue}
+        for venue, years in (publications or {}).items()
+        for year, count in years.items()
+        for _ in range(math.ceil(float(count)))
+    ]
+    records.sort(key=lambda record: record["year"], reverse=True)
+    return records
+
+
+def available_regions(data_dir: str = PROFESSOR_DATA_DIR) -> List[str]:
+    """Regions with a professors-<region>.json file"""
+    try:
+        names = os.listdir(data_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        name[len("professors-"):-len(".json")]
+        for name in names
+        if name.startswith("professors-") and name.endswith(".json")
+    )
+
+
+def load_region(region: str, data_dir: str = PROFESSOR_DATA_DIR) -> List[Dict]:
+    """
+    Professors of one region, in file order (blocking)
+
+    Raises:
+        ValueError: If there is no file for the region
+    """
+    if region not in available_regions(data_dir):
+        raise ValueError(f"Unknown region: {region}. Available: {available_regions(data_dir)}")
+    with open(os.path.join(data_dir, f"professors-{region}.json"), encoding="utf-8") as f:
+        return json.load(f)["professors"]
@@ -0,0 +1,277 @@
+"""
+In-memory professor store
+Holds every professor of the region files, with their per-venue, per-year
+paper counts, plus the publication lists clients uploaded, so requests can
+name professors by id instead of sending them and jobs can select them
+without re-reading the files. Names, affiliations and venues are interned
+and counts and publications live in flat arrays, so the whole dataset costs
+a few MB. Professors are built for a request without re-validating them.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from models import Professor, Publication
+from professor_data import available_regions, load_region, professor_id, publication_records
+
+logger = logging.getLogger(__name__)
+
+
+class ProfessorStore:
+    """Professors by id ("<region>:<hash of name and affiliation>", see professor_data.professor_id)"""
+
+    def __init__(self, publications_path: str = ""):
+        """
+        Args:
+            publications_path: JSONL file of uploaded publication lists ("" = memory only)
+        """
+        self.publications_path = publications_path
+        self._rows: Dict[str, int] = {}  # Id -> row
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.affiliations: List[str] = []
+        self.areas: List[Tuple[str, ...]] = []
+        self.regions: Dict[str, Tuple[int, int]] = {}  # Region -> (first row, end row)
+        # Paper counts of row i are count_start[i] .. count_start[i] + count_len[i]
+        self.count_start = array("I")
+        self.count_len = array("H")
+        self.count_venues = array("H")  # Index into venue_names
+        self.count_years = array("H")
+        self.count_values = array("f")  # Papers (fractional, as in CSRankings)
+        # Uploaded publications of row i are pub_start[i] .. pub_start[i] + pub_count[i];
+        # replaced lists are appended and the old records left unused
+        self.pub_start = array("I")
+        self.pub_count = array("H")
+        self.titles: List[str] = []
+        self.years = array("H")
+        self.venues = array("H")  # Index into venue_names
+        self.venue_names: List[str] = []
+        self._venue_codes: Dict[str, int] = {}
+        self.uploaded = bytearray()  # 1 where the row has an uploaded publication list
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, professor_id: str) -> bool:
+        return professor_id in self._rows
+
+    def load(self, data_dir: str) -> None:
+        """Load every region file and the uploaded publication lists (blocking)"""
+        duplicates = 0
+        for region in available_regions(data_dir):
+            start = len(self.ids)
+            for entry in load_region(region, data_dir):
+                if not self._add(professor_id(region, entry), entry):
+                    duplicates += 1
+            self.regions[region] = (start, len(self.ids))
+        uploaded = self._load_publications()
+        logger.info(
+            f"📇 Professor store: {len(self.ids)} professors in {len(self.regions)} regions, "
+            f"{len(self.count_values)} venue/year counts, {uploaded} uploaded publication lists"
+            + (f", {duplicates} duplicate entries skipped" if duplicates else "")
+        )
+
+    def _add(self, professor_id: str, entry: Dict) -> bool:
+        """Append one region file entry; False if its id is already taken"""
+        if professor_id in self._rows:
+            return False
+        self._rows[professor_id] = len(self.ids)
+        self.ids.append(professor_id)
+        self.names.append(sys.intern(entry["name"]))
+        self.affiliations.append(sys.intern(entry.get("affiliation", "")))
+        self.areas.append(tuple(sys.intern(area) for area in entry.get("areas") or []))
+        self.count_start.append(len(self.count_values))
+        counts = [
+            (venue, int(year), float(papers))
+            for venue, years in (entry.get("publications") or {}).items()
+            for year, papers in years.items()
+        ]
+        for venue, year, papers in counts:
+            self.count_venues.append(self._venue_code(venue))
+            self.count_years.append(year)
+            self.count_values.append(papers)
+        self.count_len.append(len(counts))
+        self.pub_start.append(0)
+        self.pub_count.append(0)
+        self.uploaded.append(0)
+        return True
+
+    def _venue_code(self, venue: str) -> int:
+        code = self._venue_codes.get(venue)
+        if code is None:
+            code = self._venue_codes[venue] = len(self.venue_names)
+            self.venue_names.append(sys.intern(venue))
+        return code
+
+    def _store_publications(self, row: int, publications: List[Dict]) -> None:
+        """Point a row at a new publication list (lock held)"""
+        start = len(self.titles)
+        for publication in publications:
+            self.titles.append(publication["title"])
+            self.years.append(int(publication["year"]))
+            self.venues.append(self._venue_code(publication["venue"]))
+        self.pub_start[row] = start
+        self.pub_count[row] = len(publications)
+        self.uploaded[row] = 1
+
+    def _load_publications(self) -> int:
+        """Read the uploaded publication lists; later lines win (blocking)"""
+        if not self.publications_path:
+            return 0
+        loaded = set()
+        try:
+            with open(self.publications_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    row = self._rows.get(record["id"])
+                    if row is not None:
+                        self._store_publications(row, record["publications"])
+                        loaded.add(row)
+        except FileNotFoundError:
+            pass
+        return len(loaded)
+
+    def set_publications(self, publications: Dict[str, List[Publication]]) -> int:
+        """
+        Replace professors' publication lists and persist them (blocking)
+
+        Returns:
+            Lists stored
+
+        Raises:
+            ValueError: If an id is unknown (nothing is stored then)
+        """
+        unknown = [professor_id for professor_id in publications if professor_id not in self._rows]
+        if unknown:
+            raise ValueError(f"Unknown professor ids: {', '.join(unknown[:10])}")
+        records = [
+            {"id": professor_id, "publications": [publication.model_dump() for publication in entries]}
+            for professor_id, entries in publications.items()
+        ]
+        with self._lock:
+            for record in records:
+                self._store_publications(self._rows[record["id"]], record["publications"])
+            if self.publications_path:
+                os.makedirs(os.path.dirname(self.publications_path) or ".", exist_ok=True)
+                with open(self.publications_path, "a", encoding="utf-8") as f:
+                    for record in records:
+                        f.write(json.dumps(record) + "\n")
+        return len(records)
+
+    def _counts(self, row: int) -> Dict[str, Dict[int, float]]:
+        """Paper counts of a row by venue and year"""
+        counts: Dict[str, Dict[int, float]] = {}
+        start = self.count_start[row]
+        for i in range(start, start + self.count_len[row]):
+            counts.setdefault(self.venue_names[self.count_venues[i]], {})[self.count_years[i]] = self.count_values[i]
+        return counts
+
+    def professor(self, professor_id: str) -> Professor:
+        """
+        Professor for an id, with its uploaded publication list
+
+        Professors without an uploaded list get placeholder publications
+        built from their region file paper counts.
+
+        Raises:
+            ValueError: If the id is unknown
+        """
+        row = self._rows.get(professor_id)
+        if row is None:
+            raise ValueError(f"Unknown professor id: {professor_id}")
+        with self._lock:
+            uploaded, start, count = self.uploaded[row], self.pub_start[row], self.pub_count[row]
+        if uploaded:
+            publications = [
+                Publication.model_construct(
+                    title=self.titles[i],
+                    year=self.years[i],
+                    venue=self.venue_names[self.venues[i]]
+                )
+                for i in range(start, start + count)
+            ]
+        else:
+            publications = [
+                Publication.model_construct(**record) for record in publication_records(self._counts(row))
+            ]
+        # Built from data validated on the way in, so construction skips validation
+        return Professor.model_construct(
+            name=self.names[row],
+            affiliation=self.affiliations[row],
+            areas=list(self.areas[row]),
+            publicationList=publications
+        )
+
+    def professors(self, professor_ids: List[str]) -> List[Professor]:
+        """
+        Professors for several ids, in order
+
+        Raises:
+            ValueError: Naming the unknown ids (up to 10)
+        """
+        unknown = [professor_id for professor_id in professor_ids if professor_id not in self._rows]
+        if unknown:
+            raise ValueError(f"Unknown professor ids: {', '.join(unknown[:10])}")
+        return [self.professor(professor_id) for professor_id in professor_ids]
+
+    def select(
+        self,
+        regions: List[str],
+        venues: Optional[List[str]] = None,
+        year_start: Optional[int] = None,
+        year_end: Optional[int] = None,
+        min_papers: float = 0.0,
+        affiliation: Optional[str] = None
+    ) -> List[str]:
+        """
+        Ids of the professors in the regions that pass the filters
+
+        A professor needs publications in one of the venues (when given), more
+        than min_papers of them in the year range, and an affiliation containing
+        the affiliation filter (case-insensitive), as in the frontend filters.
+
+        Raises:
+            ValueError: If a region is not loaded
+        """
+        unknown = [region for region in regions if region not in self.regions]
+        if unknown:
+            raise ValueError(f"Unknown region: {unknown[0]}. Available: {sorted(self.regions)}")
+        query = affiliation.lower().strip() if affiliation else ""
+        venue_codes = {self._venue_codes[venue] for venue in venues or [] if venue in self._venue_codes}
+        ids = []
+        for region in regions:
+            for row in range(*self.regions[region]):
+                if venues and not any(area in venues for area in self.areas[row]):
+                    continue
+                if query and query not in self.affiliations[row].lower():
+                    continue
+                papers = 0.0
+                start = self.count_start[row]
+                for i in range(start, start + self.count_len[row]):
+                    if venues and self.count_venues[i] not in venue_codes:
+                        continue
+                    year = self.count_years[i]
+                    if (year_start is None or year >= year_start) and (year_end is None or year <= year_end):
+                        papers += self.count_values[i]
+                if papers <= 0 or papers < min_papers:
+                    continue
+                ids.append(self.ids[row])
+        return ids
+
+    def stats(self) -> Dict:
+        """Professor, uploaded publication, venue/year count and venue counts"""
+        return {
+            "professors": len(self.ids),
+            "publications": int(sum(self.pub_count)),
+            "paper_counts": len(self.count_values),
+            "venues": len(self.venue_names)
+        }
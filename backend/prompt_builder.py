@@ -3,16 +3,39 @@ Prompt building for LLM evaluation
 Uses same prompts as cloud models for consistency
 """
 
-from typing import List, Dict
-from models import Professor
+from typing import FrozenSet, List, Dict, Optional, Tuple
+from models import Professor, Publication
+from config import PROMPT_LAYOUT
+from response_parser import parse_response, validate_response
 import os
+import re
+import threading
+import time
 
 
-def load_prompt_file(filename: str) -> str:
+# Prompts are in parent directory's public/prompts/
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'public', 'prompts')
+
+# Matches template variables such as {{professor.name}}
+_PLACEHOLDER_RE = re.compile(r'(\{\{\s*[\w.]+\s*\}\})')
+
+# How often (seconds) a cached template re-checks its file's mtime
+_MTIME_CHECK_INTERVAL = 1.0
+
+# Template variables that differ for every professor
+PROFESSOR_VARIABLES = frozenset({'professor.name', 'professor.affiliation', 'professor.areas', 'publications'})
+
+# Prompt layouts
+#   standard: system prompt, then the user template as written (professor first)
+#   prefix:   system prompt and every professor-independent paragraph of the user
+#             template first, the professor block last, so all prompts for one
+#             research direction share the longest possible token prefix
+PROMPT_LAYOUTS = ('standard', 'prefix')
+
+
+def load_prompt_file(filename: str, prompts_dir: str = PROMPTS_DIR) -> str:
     """Load prompt from file"""
-    # Prompts are in parent directory's public/prompts/
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    prompt_path = os.path.join(base_dir, 'public', 'prompts', filename)
+    prompt_path = os.path.join(prompts_dir, filename)
     
     try:
         with open(prompt_path, 'r', encoding='utf-8') as f:
@@ -23,6 +46,101 @@ def load_prompt_file(filename: str) -> str:
         return get_fallback_prompt(filename)
 
 
+class CompiledTemplate:
+    """
+    Prompt template pre-split into literal text and variable slots
+    
+    Rendering is a single pass over the slots joined into one string,
+    instead of one str.replace scan of the whole template per variable.
+    Unknown variables are left in place, like str.replace would.
+    """
+    
+    __slots__ = ('source', '_literals', '_tokens', '_names', '_partitions')
+    
+    def __init__(self, source: str):
+        self.source = source
+        parts = _PLACEHOLDER_RE.split(source)
+        self._literals = parts[0::2]
+        self._tokens = parts[1::2]
+        self._names = [token[2:-2].strip() for token in self._tokens]
+        self._partitions: Dict[FrozenSet[str], Tuple['CompiledTemplate', 'CompiledTemplate']] = {}
+    
+    def partition(self, variables: FrozenSet[str]) -> Tuple['CompiledTemplate', 'CompiledTemplate']:
+        """
+        Split the template into (shared, specific) templates by paragraph
+        
+        Paragraphs (separated by blank lines) that reference any of ``variables``
+        go to the specific part, all others to the shared part. Paragraph order
+        is preserved within each part.
+        """
+        split = self._partitions.get(variables)
+        if split is None:
+            shared, specific = [], []
+            for paragraph in self.source.strip().split('\n\n'):
+                names = {token[2:-2].strip() for token in _PLACEHOLDER_RE.findall(paragraph)}
+                (specific if names & variables else shared).append(paragraph)
+            split = (CompiledTemplate('\n\n'.join(shared)), CompiledTemplate('\n\n'.join(specific)))
+            self._partitions[variables] = split
+        return split
+    
+    def render(self, values: Dict[str, str]) -> str:
+        """Substitute template variables in one pass"""
+        literals = self._literals
+        out = [literals[0]]
+        for i, name in enumerate(self._names):
+            value = values.get(name)
+            out.append(self._tokens[i] if value is None else value)
+            out.append(literals[i + 1])
+        return ''.join(out)
+
+
+class PromptTemplateRegistry:
+    """
+    Loads and compiles each prompt file once
+    
+    A cached template is reloaded when its file's mtime changes, checked at
+    most once per ``_MTIME_CHECK_INTERVAL`` seconds per file.
+    """
+    
+    def __init__(self, prompts_dir: str = PROMPTS_DIR):
+        self.prompts_dir = prompts_dir
+        # filename -> (mtime_ns or None, last check time, compiled template)
+        self._entries: Dict[str, Tuple[Optional[int], float, CompiledTemplate]] = {}
+        self._lock = threading.Lock()
+    
+    def _mtime(self, filename: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.prompts_dir, filename)).st_mtime_ns
+        except OSError:
+            return None
+    
+    def get(self, filename: str) -> CompiledTemplate:
+        """Get the compiled template for a prompt file"""
+        now = time.monotonic()
+        entry = self._entries.get(filename)
+        if entry is not None and now - entry[1] < _MTIME_CHECK_INTERVAL:
+            return entry[2]
+        
+        with self._lock:
+            entry = self._entries.get(filename)
+            mtime = self._mtime(filename)
+            if entry is not None and entry[0] == mtime:
+                template = entry[2]
+            else:
+                template = CompiledTemplate(load_prompt_file(filename, self.prompts_dir))
+            self._entries[filename] = (mtime, now, template)
+            return template
+    
+    def clear(self) -> None:
+        """Forget all compiled templates"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global template registry
+template_registry = PromptTemplateRegistry()
+
+
 def get_fallback_prompt(filename: str) -> str:
     """Fallback prompts if files not accessible"""
     if 'system' in filename:
@@ -52,101 +170,163 @@ Evaluate match score (0.0-1.0) and provide reasoning.
 Be STRICT in scoring. Most matches should be 0.3-0.7."""
 
 
-def build_evaluation_prompt(professor: Professor, research_direction: str, use_strict_prompts: bool = True, scoring_scheme: str = 'original') -> str:
+def select_prompt_files(use_strict_prompts: bool = True, scoring_scheme: str = 'original') -> Tuple[str, str]:
     """
-    Build evaluation prompt for a professor
+    Choose (system prompt, user prompt) file names
     
     Args:
-        professor: Professor data
-        research_direction: Target research direction
         use_strict_prompts: If True, use stricter local-model prompts. If False, use basic prompts.
         scoring_scheme: 'original' for basic method, 'decision_tree' for decision tree method
     """
-    # Choose prompt files based on model type and scoring scheme
     if use_strict_prompts:
         # Use STRICT prompts for local models (more demanding criteria)
         if scoring_scheme == 'decision_tree':
-            system_prompt = load_prompt_file('local-decision-tree-system-prompt.txt')
-            user_template = load_prompt_file('local-decision-tree-user-prompt.txt')
-        else:  # original/basic
-            system_prompt = load_prompt_file('local-system-prompt.txt')
-            user_template = load_prompt_file('local-user-prompt.txt')
-    else:
-        # Use basic prompts for cloud models (balanced criteria)
-        if scoring_scheme == 'decision_tree':
-            system_prompt = load_prompt_file('decision-tree-system-prompt.txt')
-            user_template = load_prompt_file('decision-tree-user-prompt.txt')
-        else:  # original/basic
-            system_prompt = load_prompt_file('basic-system-prompt.txt')
-            user_template = load_prompt_file('basic-user-prompt.txt')
-    
-    # Extract recent publications
-    papers_text = ""
+            return 'local-decision-tree-system-prompt.txt', 'local-decision-tree-user-prompt.txt'
+        return 'local-system-prompt.txt', 'local-user-prompt.txt'  # original/basic
+    
+    # Use basic prompts for cloud models (balanced criteria)
+    if scoring_scheme == 'decision_tree':
+        return 'decision-tree-system-prompt.txt', 'decision-tree-user-prompt.txt'
+    return 'basic-system-prompt.txt', 'basic-user-prompt.txt'  # original/basic
+
+
+def recent_publications(professor: Professor) -> List[Publication]:
+    """Publications that make it into the prompt (2020+, at most 20)"""
+    if not professor.publicationList:
+        return []
+    return [
+        p for p in professor.publicationList 
+        if p.year >= 2020
+    ][:20]  # Use 20 papers like cloud models
+
+
+def format_publication(publication: Publication) -> str:
+    """Render one publication line"""
+    return f"{publication.title} ({publication.venue}, {publication.year})"
+
+
+def format_publications(professor: Professor, omitted: int = 0) -> str:
+    """
+    Render the recent publication block for a professor
+    
+    Args:
+        professor: Professor data
+        omitted: Recent publications left out to fit the context window; the
+            block says so instead of implying the professor has none
+    """
+    if omitted:
+        lines = [format_publication(p) for p in recent_publications(professor)]
+        if lines:
+            lines.append(f"({omitted} more recent publications omitted to fit the context)")
+            return "\n".join(lines)
+        return f"{omitted} recent publications omitted to fit the context"
     if professor.publicationList and len(professor.publicationList) > 0:
-        recent_papers = [
-            p for p in professor.publicationList 
-            if p.year >= 2020
-        ][:20]  # Use 20 papers like cloud models
+        recent_papers = recent_publications(professor)
         
         if recent_papers:
-            papers_text = "\n".join([
-                f"{p.title} ({p.venue}, {p.year})"
-                for p in recent_papers
-            ])
-        else:
-            papers_text = "No recent publications (2020-2025)"
-    else:
-        papers_text = "Publication data not available"
-    
-    # Render user prompt with template variables
-    user_prompt = user_template
-    user_prompt = user_prompt.replace('{{professor.name}}', professor.name)
-    user_prompt = user_prompt.replace('{{professor.affiliation}}', professor.affiliation)
-    user_prompt = user_prompt.replace('{{professor.areas}}', ", ".join(professor.areas) if professor.areas else "Not specified")
-    user_prompt = user_prompt.replace('{{publications}}', papers_text)
-    user_prompt = user_prompt.replace('{{researchDirection}}', research_direction)
-    
-    # Combine system and user prompts
-    return f"{system_prompt}\n\n{user_prompt}"
+            return "\n".join([format_publication(p) for p in recent_papers])
+        return "No recent publications (2020-2025)"
+    return "Publication data not available"
 
 
-def validate_llm_response(text: str) -> tuple[bool, str]:
-    """
-    Validate LLM output quality
-    Returns (is_valid, error_message)
+def _professor_values(professor: Professor, omitted: int = 0) -> Dict[str, str]:
+    """Template variables for one professor"""
+    return {
+        'professor.name': professor.name,
+        'professor.affiliation': professor.affiliation,
+        'professor.areas': ", ".join(professor.areas) if professor.areas else "Not specified",
+        'publications': format_publications(professor, omitted),
+    }
+
+
+def build_evaluation_prompts(
+    professors: List[Professor],
+    research_direction: str,
+    use_strict_prompts: bool = True,
+    scoring_scheme: str = 'original',
+    layout: Optional[str] = None,
+    omitted: Optional[List[int]] = None
+) -> List[str]:
     """
-    import re
-    
-    if not text or not isinstance(text, str):
-        return False, "Empty or invalid response"
+    Build evaluation prompts for a batch of professors
     
-    text_stripped = text.strip()
+    Templates are looked up once per batch and the system prompt prefix is
+    shared by every prompt in the batch.
     
-    # Check minimum length
-    if len(text_stripped) < 20:
-        return False, "Output too short"
-    
-    # Check for invalid patterns
-    invalid_patterns = [
-        (r'^\s*$', "Empty/whitespace only"),
-        (r'^\*+$', "Only asterisks"),
-        (r'^[^\w\s]{10,}', "Too many special characters"),
-        (r'(.)\1{20,}', "Repeated characters"),
-        (r'^(Error|Failed|Unable|Invalid)', "Error message output"),
-    ]
+    Args:
+        professors: Professor data
+        research_direction: Target research direction
+        use_strict_prompts: If True, use stricter local-model prompts. If False, use basic prompts.
+        scoring_scheme: 'original' for basic method, 'decision_tree' for decision tree method
+        layout: 'standard' or 'prefix' (see PROMPT_LAYOUTS); defaults to PROMPT_LAYOUT
+        omitted: Per professor, recent publications trimmed to fit the context window
+    """
+    layout = layout or PROMPT_LAYOUT
+    omitted = omitted or [0] * len(professors)
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout: {layout}. Available: {list(PROMPT_LAYOUTS)}")
     
-    for pattern, desc in invalid_patterns:
-        if re.search(pattern, text_stripped):
-            return False, f"Invalid pattern: {desc}"
+    system_file, user_file = select_prompt_files(use_strict_prompts, scoring_scheme)
+    system_prompt = template_registry.get(system_file).source
+    user_template = template_registry.get(user_file)
     
-    # Check if it looks like valid output (has score or JSON)
-    has_score = bool(re.search(r'(?:score|Score)[:\s]*[0-9.]+', text_stripped))
-    has_json = bool(re.search(r'\{.*"score".*\}', text_stripped, re.DOTALL))
+    if layout == 'prefix':
+        # Render everything that does not depend on the professor once
+        shared, profile = user_template.partition(PROFESSOR_VARIABLES)
+        prefix = (
+            f"{system_prompt}\n\n"
+            f"{shared.render({'researchDirection': research_direction})}\n\n"
+            f"PROFESSOR TO EVALUATE:\n"
+        )
+        return [
+            prefix + profile.render(_professor_values(professor, count))
+            for professor, count in zip(professors, omitted)
+        ]
     
-    if not (has_score or has_json):
-        return False, "No score found in output"
+    prefix = system_prompt + "\n\n"
+    prompts = []
+    for professor, count in zip(professors, omitted):
+        # Render user prompt with template variables
+        values = _professor_values(professor, count)
+        values['researchDirection'] = research_direction
+        # Combine system and user prompts
+        prompts.append(prefix + user_template.render(values))
+    return prompts
+
+
+def build_evaluation_prompt(professor: Professor, research_direction: str, use_strict_prompts: bool = True, scoring_scheme: str = 'original', layout: Optional[str] = None) -> str:
+    """
+    Build evaluation prompt for a professor
     
-    return True, None
+    Args:
+        professor: Professor data
+        research_direction: Target research direction
+        use_strict_prompts: If True, use stricter local-model prompts. If False, use basic prompts.
+        scoring_scheme: 'original' for basic method, 'decision_tree' for decision tree method
+        layout: 'standard' or 'prefix' (see PROMPT_LAYOUTS); defaults to PROMPT_LAYOUT
+    """
+    return build_evaluation_prompts([professor], research_direction, use_strict_prompts, scoring_scheme, layout)[0]
+
+
+# Appended to a prompt when re-generating an invalid output
+REPAIR_INSTRUCTION = (
+    "\n\nIMPORTANT: Your previous answer could not be read. "
+    "Respond with ONLY this JSON object and nothing else:\n"
+    '{"score": <number 0.0-1.0>, "reasoning": "<30-50 words>", "research_summary": "<30-50 words>"}'
+)
+
+
+def build_repair_prompt(prompt: str) -> str:
+    """Prompt used to re-generate an invalid output (shares the original prompt's prefix)"""
+    return prompt + REPAIR_INSTRUCTION
+
+
+def validate_llm_response(text: str) -> Tuple[bool, Optional[str]]:
+    """
+    Validate LLM output quality
+    Returns (is_valid, error_message)
+    """
+    return validate_response(text)
 
 
 def parse_llm_response(response_text: str) -> dict:
@@ -160,79 +340,4 @@ def parse_llm_response(response_text: str) -> dict:
     Returns:
         Dict with score, reasoning, researchSummary
     """
-    try:
-        import re
-        import json
-        
-        # Step 1: Remove markdown code blocks
-        cleaned = re.sub(r'```(?:json)?\s*', '', response_text)
-        cleaned = re.sub(r'```', '', cleaned).strip()
-        
-        # Step 2: Try JSON parsing first
-        json_match = re.search(r'\{[^{}]*"score"[^{}]*\}', cleaned, re.DOTALL)
-        if json_match:
-            try:
-                data = json.loads(json_match.group(0))
-                score = float(data.get("score", 0.0))
-                if score > 1.0:
-                    score = score / 10.0
-                score = max(0.0, min(1.0, score))
-                
-                reasoning = str(data.get("reasoning", ""))
-                summary = str(data.get("research_summary", data.get("researchSummary", reasoning)))
-                
-                # Clean JSON artifacts
-                reasoning = re.sub(r'["{}\[\]]', '', reasoning).strip()
-                summary = re.sub(r'["{}\[\]]', '', summary).strip()
-                
-                return {
-                    "score": score,
-                    "reasoning": reasoning[:200] if reasoning else "No reasoning provided",
-                    "researchSummary": summary[:200] if summary else reasoning[:200]
-                }
-            except (json.JSONDecodeError, ValueError, KeyError):
-                pass  # Fallback to regex
-        
-        # Step 3: Regex fallback
-        score = 0.0
-        reasoning = ""
-        research_summary = ""
-        
-        score_match = re.search(r'(?:Score|score)[:\s]+([0-9.]+)', cleaned, re.IGNORECASE)
-        if score_match:
-            score = float(score_match.group(1))
-            if score > 1.0:
-                score = score / 10.0
-            score = max(0.0, min(1.0, score))
-        
-        reason_match = re.search(r'(?:Reason|reasoning)[:\s]+(.+?)(?:\n\n|Research Summary:|research_summary:|$)', cleaned, re.IGNORECASE | re.DOTALL)
-        if reason_match:
-            reasoning = reason_match.group(1).strip()
-        
-        summary_match = re.search(r'(?:Research Summary|research_summary)[:\s]+(.+?)(?:\n\n|$)', cleaned, re.IGNORECASE | re.DOTALL)
-        if summary_match:
-            research_summary = summary_match.group(1).strip()
-        else:
-            research_summary = reasoning
-        
-        # Clean up artifacts
-        reasoning = re.sub(r'["{}\[\]]', '', reasoning).strip()
-        research_summary = re.sub(r'["{}\[\]]', '', research_summary).strip()
-        
-        reasoning = reasoning[:200] if reasoning else "No reasoning provided"
-        research_summary = research_summary[:200] if research_summary else reasoning
-        
-        return {
-            "score": score,
-            "reasoning": reasoning,
-            "researchSummary": research_summary
-        }
-    
-    except Exception as e:
-        print(f"❌ Parse error: {e}")
-        print(f"Raw response: {response_text[:300]}")
-        return {
-            "score": 0.0,
-            "reasoning": "Parse error occurred",
-            "researchSummary": "Failed to extract response"
-        }
+    return parse_response(response_text)
@@ -0,0 +1,353 @@
+"""
+Record-and-replay inference
+OutputRecorder appends every engine output (text, token counts, latency)
+to a JSONL file during real runs; ReplayEngine serves those outputs back by
+prompt hash so the whole server stack runs without a GPU and gives
+repeatable numbers
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from config import REPLAY_MISSING, REPLAY_PATH, REPLAY_SECONDS_PER_TOKEN, REPLAY_TIMING
+from engine_base import Aborted, CompletionOutput, EngineOutput, InferenceEngine, LoadProgress, sleep_unless_aborted
+from model_catalog import AVAILABLE_MODELS
+from stub_engine import approx_tokens, stub_text
+
+logger = logging.getLogger(__name__)
+
+RECORD_VERSION = 1
+REPLAY_TIMINGS = ("none", "tokens", "recorded")
+
+
+def prompt_hash(prompt: str) -> str:
+    """Key under which a prompt's output is recorded"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class OutputRecorder:
+    """
+    Appends engine outputs to a JSONL capture file
+
+    Only the prompt hash is stored, never the prompt itself. Each output
+    record holds the generated text, prompt/generated/prefix-cached token
+    counts and the time from the start of the engine batch until the output
+    finished. Token counts from count_tokens go in "tokens" records (once per
+    model and text), so replay trims prompts to the token budget exactly as
+    the recorded run did.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Line buffered: a crash loses at most the record being written
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+        self.records = 0
+        self._counted: Set[Tuple[Optional[str], str]] = set()  # (model, text hash) already recorded
+        logger.info(f"Recording engine outputs to {path}")
+
+    def record_token_counts(self, model: Optional[str], texts: List[str], counts: List[int]) -> None:
+        """Append the tokenizer's counts for texts not recorded before"""
+        lines = []
+        with self._lock:
+            for text, count in zip(texts, counts):
+                key = (model, prompt_hash(text))
+                if key in self._counted:
+                    continue
+                self._counted.add(key)
+                lines.append(json.dumps({
+                    "v": RECORD_VERSION,
+                    "type": "tokens",
+                    "model": model,
+                    "text_sha256": key[1],
+                    "tokens": count
+                }))
+            if lines:
+                self._file.write("\n".join(lines) + "\n")
+                self.records += len(lines)
+
+    def record(self, engine: InferenceEngine, prompt: str, output: Any, retry: bool, latency: float, batch_size: int) -> None:
+        """Append one output"""
+        prompt_tokens, cached_tokens = engine.prefix_cache_usage(output)
+        line = json.dumps({
+            "v": RECORD_VERSION,
+            "model": engine.get_current_model(),
+            "prompt_sha256": prompt_hash(prompt),
+            "retry": retry,
+            "text": engine.extract_text(output),
+            "prompt_tokens": prompt_tokens,
+            "generated_tokens": engine.generated_tokens(output),
+            "cached_tokens": cached_tokens,
+            "latency_s": round(latency, 6),
+            "batch_size": batch_size
+        })
+        with self._lock:
+            self._file.write(line + "\n")
+            self.records += 1
+
+    def wrap(
+        self,
+        engine: InferenceEngine,
+        prompts: List[str],
+        sampling_params: Optional[List[Any]],
+        on_output: Callable[[int, Any], None]
+    ) -> Callable[[int, Any], None]:
+        """Return an on_output callback that records each output before forwarding it"""
+        start = time.perf_counter()
+        retry_params = engine.retry_sampling_params
+
+        def recording_on_output(index: int, output: Any) -> None:
+            retry = sampling_params is not None and retry_params is not None and sampling_params[index] is retry_params
+            try:
+                self.record(engine, prompts[index], output, retry, time.perf_counter() - start, len(prompts))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not record engine output: {e}")
+            on_output(index, output)
+
+        return recording_on_output
+
+    def close(self) -> None:
+        """Flush and close the capture file"""
+        with self._lock:
+            self._file.close()
+
+
+class _Recorded:
+    """One replayable output"""
+
+    __slots__ = ("text", "prompt_tokens", "generated_tokens", "cached_tokens", "latency")
+
+    def __init__(self, record: Dict):
+        self.text = record["text"]
+        self.prompt_tokens = record.get("prompt_tokens") or 0
+        self.generated_tokens = record.get("generated_tokens") or 0
+        self.cached_tokens = record.get("cached_tokens")
+        self.latency = record.get("latency_s") or 0.0
+
+
+class ReplayEngine(InferenceEngine):
+    """
+    Serves recorded outputs instead of running a model
+
+    Outputs are looked up by (prompt hash, retry); captures from the loaded
+    model win over captures from other models. Prompts that were never
+    recorded get the deterministic stub output (REPLAY_MISSING=stub) or fail
+    the batch (REPLAY_MISSING=error). count_tokens returns the recorded
+    tokenizer counts, falling back to an approximation for unrecorded texts.
+
+    Timing modes:
+        none: return immediately (measures the Python side alone)
+        tokens: batched decode at ``seconds_per_token`` per step, like the stub
+        recorded: each output arrives after its recorded latency
+    """
+
+    # Nothing to warm, and warmup prompts are never in a capture
+    needs_warmup = False
+
+    def __init__(
+        self,
+        path: str = REPLAY_PATH,
+        timing: str = REPLAY_TIMING,
+        seconds_per_token: float = REPLAY_SECONDS_PER_TOKEN,
+        missing: str = REPLAY_MISSING
+    ):
+        super().__init__()
+        if timing not in REPLAY_TIMINGS:
+            raise ValueError(f"Unknown replay timing: {timing}. Available: {list(REPLAY_TIMINGS)}")
+        self.path = path
+        self.timing = timing
+        self.seconds_per_token = max(0.0, seconds_per_token)
+        self.missing = missing
+        self._outputs: Dict[Tuple[str, bool], _Recorded] = {}
+        self._token_counts: Dict[str, int] = {}
+        self._request_counter = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.token_count_misses = 0
+
+    def is_loaded(self) -> bool:
+        """Check if model is loaded"""
+        return self.current_model is not None
+
+    async def load_model(self, model_id: str, progress: Optional[LoadProgress] = None) -> None:
+        """
+        Load the capture file for a model
+
+        Raises:
+            ValueError: If model_id is not recognized
+            RuntimeError: If the capture file cannot be read
+        """
+        if model_id not in AVAILABLE_MODELS:
+            raise ValueError(
+                f"Unknown model: {model_id}. "
+                f"Available: {list(AVAILABLE_MODELS.keys())}"
+            )
+        if not self.path:
+            raise RuntimeError("Model loading failed: REPLAY_PATH is not set")
+        if progress is not None:
+            progress("initializing")
+        try:
+            self._outputs, self._token_counts = await asyncio.to_thread(self._read, self.path, model_id)
+        except (OSError, ValueError, KeyError) as e:
+            raise RuntimeError(f"Model loading failed: could not read {self.path}: {e}")
+
+        self.current_model = model_id
+        self.sampling_params = {"engine": "replay", "mode": "default", "source": os.path.basename(self.path)}
+        self.retry_sampling_params = {"engine": "replay", "mode": "retry", "source": os.path.basename(self.path)}
+        self.hits = self.misses = self.token_count_misses = 0
+        logger.info(
+            f"✅ Replay loaded: {len(self._outputs)} recorded outputs and {len(self._token_counts)} "
+            f"token counts for {model_id} (timing={self.timing})"
+        )
+        if not self._token_counts:
+            logger.warning(
+                "⚠️ The capture has no token counts; prompts near the token budget may be trimmed "
+                "differently than when they were recorded and miss their outputs"
+            )
+
+    @staticmethod
+    def _read(path: str, model_id: str) -> Tuple[Dict[Tuple[str, bool], _Recorded], Dict[str, int]]:
+        """Index a capture file's outputs and token counts, preferring records made with model_id"""
+        outputs: Dict[Tuple[str, bool], _Recorded] = {}
+        token_counts: Dict[str, int] = {}
+        from_model = set()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                matches_model = record.get("model") == model_id
+                if record.get("type") == "tokens":
+                    key = ("tokens", record["text_sha256"])
+                    if key not in from_model or matches_model:
+                        token_counts[key[1]] = record["tokens"]
+                else:
+                    key = (record["prompt_sha256"], bool(record.get("retry")))
+                    if key not in from_model or matches_model:
+                        outputs[key] = _Recorded(record)
+                if matches_model:
+                    from_model.add(key)
+        return outputs, token_counts
+
+    async def unload_model(self) -> None:
+        """Drop the recorded outputs, logging how much of the workload they covered"""
+        if self.current_model is not None:
+            self._log_coverage()
+        self._outputs = {}
+        self._token_counts = {}
+        self.current_model = None
+        self.sampling_params = None
+        self.retry_sampling_params = None
+        await asyncio.sleep(0)
+
+    def _lookup(self, prompts: List[str], sampling_params: Optional[List[Any]]) -> List[Tuple[EngineOutput, float]]:
+        """Build outputs and their recorded latencies for a batch"""
+        if self.current_model is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        results = []
+        for i, prompt in enumerate(prompts):
+            retry = sampling_params is not None and sampling_params[i] is self.retry_sampling_params
+            digest = prompt_hash(prompt)
+            recorded = self._outputs.get((digest, retry)) or self._outputs.get((digest, not retry))
+            if recorded is None:
+                self.misses += 1
+                if self.missing == "error":
+                    raise RuntimeError(f"No recorded output for prompt {digest[:12]}")
+                text = stub_text(prompt, strict=retry)
+                recorded = _Recorded({
+                    "text": text,
+                    "prompt_tokens": approx_tokens(prompt),
+                    "generated_tokens": approx_tokens(text)
+                })
+            else:
+                self.hits += 1
+            output = EngineOutput(
+                f"replay-{next(self._request_counter)}",
+                prompt,
+                list(range(recorded.prompt_tokens)),
+                CompletionOutput(recorded.text, list(range(recorded.generated_tokens))),
+                recorded.cached_tokens
+            )
+            results.append((output, recorded.latency))
+        return results
+
+    def _arrival(self, output: EngineOutput, latency: float) -> float:
+        """Seconds after the batch start at which an output is delivered"""
+        if self.timing == "recorded":
+            return latency
+        if self.timing == "tokens":
+            return self.generated_tokens(output) * self.seconds_per_token
+        return 0.0
+
+    def generate_batch(self, prompts: List[str], sampling_params: Optional[List[Any]] = None) -> List[EngineOutput]:
+        """Return recorded outputs once the slowest one would have finished"""
+        results = self._lookup(prompts, sampling_params)
+        delay = max((self._arrival(output, latency) for output, latency in results), default=0.0)
+        if delay > 0:
+            time.sleep(delay)
+        return [output for output, _ in results]
+
+    def generate_stream(
+        self,
+        prompts: List[str],
+        on_output: Callable[[int, EngineOutput], None],
+        sampling_params: Optional[List[Any]] = None,
+        aborted: Optional[Aborted] = None
+    ) -> None:
+        """Deliver recorded outputs in arrival order; stop once all are aborted"""
+        results = self._lookup(prompts, sampling_params)
+        arrivals = sorted(
+            (self._arrival(output, latency), index) for index, (output, latency) in enumerate(results)
+        )
+        start = time.perf_counter()
+        for position, (arrival, index) in enumerate(arrivals):
+            if aborted is not None and aborted(index):
+                continue
+            wait = arrival - (time.perf_counter() - start)
+            if wait > 0 and sleep_unless_aborted(wait, (i for _, i in arrivals[position:]), aborted):
+                return
+            on_output(index, results[index][0])
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Recorded tokenizer counts (approximate for texts the capture does not hold)"""
+        if self.current_model is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        counts = []
+        for text in texts:
+            count = self._token_counts.get(prompt_hash(text))
+            if count is None:
+                self.token_count_misses += 1
+                count = approx_tokens(text)
+            counts.append(count)
+        return counts
+
+    def stats(self) -> Dict:
+        """Recorded output hits and misses since the model was loaded"""
+        return {
+            "recorded_outputs": len(self._outputs),
+            "hits": self.hits,
+            "misses": self.misses,
+            "token_count_misses": self.token_count_misses
+        }
+
+    def _log_coverage(self) -> None:
+        """Log the share of prompts that missed the capture (a replay that is not repeatable)"""
+        total = self.hits + self.misses
+        if not total:
+            return
+        message = (
+            f"Replay of {self.current_model}: {self.misses}/{total} prompts missed the capture "
+            f"({self.misses / total:.1%}), {self.token_count_misses} texts without recorded token counts"
+        )
+        if self.misses:
+            logger.warning(f"⚠️ {message}")
+        else:
+            logger.info(message)
@@ -0,0 +1,587 @@
+"""
+Multi-process engine replicas
+Runs one model in ENGINE_REPLICAS worker processes (one per GPU, or CPU
+replicas) and sends each engine batch to the replica with the shortest
+queue. The HTTP process keeps scheduling, parsing and caching; workers only
+hold the model. Crashed workers are restarted and their unfinished prompts
+re-sent to another replica. The worker processes run replica_worker.py.
+"""
+
+import asyncio
+import atexit
+import itertools
+import logging
+import multiprocessing
+# Imported before our exit hook is registered: atexit runs hooks last-in
+# first-out, and multiprocessing's own hook waits for non-daemon workers
+import multiprocessing.util  # noqa: F401
+import queue
+import sys
+import threading
+import time
+import types
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from config import ENGINE_REPLICA_DEVICES
+from engine_base import ABORT_POLL_INTERVAL, Aborted, InferenceEngine, LoadProgress
+from metrics import REPLICA_INFLIGHT, REPLICA_RESTARTS
+from model_catalog import AVAILABLE_MODELS
+from replica_worker import DEFAULT_SAMPLING, RETRY_SAMPLING, worker_main
+
+logger = logging.getLogger(__name__)
+
+# Backends that run on a GPU and get one device per replica
+GPU_BACKENDS = ("vllm",)
+# How often the supervisor checks worker liveness (seconds)
+SUPERVISE_INTERVAL = 0.5
+# Times a prompt is re-sent after its replica crashed before the batch fails
+MAX_REDISPATCH = 2
+# How long every replica may take to load a model (seconds)
+LOAD_TIMEOUT = 3600.0
+# How long a batch waits for a live replica, or a token count for its answer (seconds)
+RESTART_WAIT = 600.0
+
+# Every live ReplicaEngine, so worker processes are stopped on exit
+_engines: "weakref.WeakSet[ReplicaEngine]" = weakref.WeakSet()
+
+
+def replica_devices(backend: str, replicas: int) -> List[Optional[str]]:
+    """CUDA device for each replica (None = not pinned)"""
+    if ENGINE_REPLICA_DEVICES:
+        devices = [d.strip() for d in ENGINE_REPLICA_DEVICES.split(",") if d.strip()]
+        return [devices[i % len(devices)] for i in range(replicas)]
+    if backend in GPU_BACKENDS:
+        return [str(i) for i in range(replicas)]
+    return [None] * replicas
+
+
+@contextmanager
+def _main_module_hidden() -> Iterator[None]:
+    """
+    Keep __main__ out of the spawn preparation data while a worker starts
+
+    A spawned child re-imports the parent's __main__ (as __mp_main__), which
+    for `python server.py` would build a whole server in every replica. The
+    worker entry point lives in replica_worker, so the child needs nothing
+    from __main__.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class _Replica:
+    """One worker process and its queues"""
+
+    __slots__ = (
+        "index", "device", "process", "commands", "token_requests", "aborts", "responses",
+        "state", "outstanding", "batches", "restarts", "generation"
+    )
+
+    def __init__(self, index: int, device: Optional[str]):
+        self.index = index
+        self.device = device
+        self.process = None
+        self.commands = None
+        self.token_requests = None
+        self.aborts = None
+        self.responses = None
+        # "loading", "ready", "failed" or "stopped"
+        self.state = "stopped"
+        self.outstanding = 0  # Prompts dispatched and not finished
+        self.batches: Dict[int, "_TaggingQueue"] = {}  # Batch id -> caller's event queue
+        self.restarts = 0
+        self.generation = 0  # Bumped per process, so stale readers exit
+
+
+class ReplicaEngine(InferenceEngine):
+    """
+    Inference engine that fans batches out to worker processes
+
+    Each worker runs the configured backend on its own device and works
+    through its command queue one batch at a time. Every batch goes to the
+    ready replica with the fewest outstanding prompts; outputs stream back as
+    each sequence finishes.
+    """
+
+    def __init__(self, backend: str, replicas: int, gpu_memory_share: float = 1.0):
+        super().__init__()
+        self.backend = backend
+        self.gpu_memory_share = gpu_memory_share
+        self.replicas = [
+            _Replica(i, device) for i, device in enumerate(replica_devices(backend, replicas))
+        ]
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)  # Replica state changes
+        self._batch_ids = itertools.count(1)
+        self._token_waiters: Dict[int, "queue.Queue"] = {}
+        self._fingerprint: Optional[str] = None
+        self._supervisor: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._progress: Optional[Callable[[str], None]] = None
+        self._load_errors: List[str] = []
+        # Replayed outputs need no warmup; real backends do
+        self.needs_warmup = backend != "replay"
+        _engines.add(self)
+
+    def is_loaded(self) -> bool:
+        """Check if model is loaded on at least one replica"""
+        return self.current_model is not None and any(r.state == "ready" for r in self.replicas)
+
+    def max_concurrent_batches(self) -> int:
+        """One engine batch per replica"""
+        return len(self.replicas)
+
+    def sampling_fingerprint(self) -> str:
+        """Fingerprint reported by the replicas (matches a single-process engine)"""
+        return self._fingerprint or repr(None)
+
+    def replica_status(self) -> List[Dict]:
+        """State, device, outstanding prompts and restarts of each replica"""
+        with self._lock:
+            return [
+                {
+                    "replica": r.index,
+                    "device": r.device,
+                    "state": r.state,
+                    "pid": r.process.pid if r.process is not None else None,
+                    "outstanding": r.outstanding,
+                    "restarts": r.restarts
+                }
+                for r in self.replicas
+            ]
+
+    # Process lifecycle
+
+    def _spawn(self, replica: _Replica) -> None:
+        """Start a worker process for a replica and tell it to load the current model (lock held)"""
+        replica.generation += 1
+        replica.commands = self._context.Queue()
+        replica.token_requests = self._context.Queue()
+        replica.aborts = self._context.Queue()
+        replica.responses = self._context.Queue()
+        # Never block shutdown on commands a dead worker will not read
+        replica.commands.cancel_join_thread()
+        replica.token_requests.cancel_join_thread()
+        replica.aborts.cancel_join_thread()
+        # Not a daemon: vLLM starts its own child processes
+        replica.process = self._context.Process(
+            target=worker_main,
+            args=(
+                replica.index, self.backend, self.gpu_memory_share, replica.device,
+                replica.commands, replica.token_requests, replica.aborts, replica.responses
+            ),
+            name=f"engine-replica-{replica.index}"
+        )
+        with _main_module_hidden():
+            replica.process.start()
+        replica.state = "loading"
+        replica.commands.put(("load", self.current_model))
+        threading.Thread(
+            target=self._read_responses, args=(replica, replica.generation),
+            name=f"replica-{replica.index}-reader", daemon=True
+        ).start()
+        logger.info(
+            f"Started engine replica {replica.index} (pid {replica.process.pid}, "
+            f"device {replica.device if replica.device is not None else 'any'})"
+        )
+
+    def _stop_process(self, replica: _Replica) -> None:
+        """Stop a worker process (lock held)"""
+        process = replica.process
+        replica.generation += 1
+        replica.state = "stopped"
+        replica.process = None
+        if process is None:
+            return
+        if process.is_alive():
+            replica.commands.put(("stop",))
+            process.join(timeout=30)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+
+    def _supervise(self) -> None:
+        """Restart replicas whose process died"""
+        while not self._stopping.wait(SUPERVISE_INTERVAL):
+            with self._lock:
+                for replica in self.replicas:
+                    if replica.state in ("stopped", "failed") or replica.process is None:
+                        continue
+                    if replica.process.is_alive():
+                        continue
+                    if replica.state == "loading":
+                        # Died before it could serve; restarting would likely loop
+                        logger.error(f"❌ Engine replica {replica.index} died while loading; leaving it down")
+                        replica.state = "failed"
+                        self._changed.notify_all()
+                        continue
+                    logger.error(
+                        f"❌ Engine replica {replica.index} died (exit code {replica.process.exitcode}); restarting"
+                    )
+                    REPLICA_RESTARTS.labels(replica=str(replica.index)).inc()
+                    replica.restarts += 1
+                    # Callers re-send these prompts to another replica
+                    for events in replica.batches.values():
+                        events.put(("crashed", None, None))
+                    replica.batches.clear()
+                    replica.outstanding = 0
+                    REPLICA_INFLIGHT.labels(replica=str(replica.index)).set(0)
+                    self._spawn(replica)
+                    self._changed.notify_all()
+
+    def _read_responses(self, replica: _Replica, generation: int) -> None:
+        """Route one worker process's messages to the waiting callers"""
+        responses = replica.responses
+        while replica.generation == generation:
+            try:
+                message = responses.get(timeout=SUPERVISE_INTERVAL)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            kind = message[0]
+            with self._lock:
+                if replica.generation != generation:
+                    return
+                if kind in ("output", "done"):
+                    events = replica.batches.get(message[1])
+                    if events is not None:
+                        if kind == "output":
+                            replica.outstanding -= 1
+                            events.put(("output", message[2], message[3]))
+                        else:
+                            replica.outstanding -= message[3]
+                            replica.batches.pop(message[1], None)
+                            events.put(("done", None, message[2]))
+                    REPLICA_INFLIGHT.labels(replica=str(replica.index)).set(replica.outstanding)
+                elif kind == "tokens":
+                    waiter = self._token_waiters.pop(message[1], None)
+                    if waiter is not None:
+                        waiter.put((message[2], message[3]))
+                elif kind == "progress":
+                    if replica.index == 0 and self._progress is not None:
+                        self._progress(message[1])
+                elif kind == "loaded":
+                    replica.state = "ready"
+                    self._fingerprint = message[1]
+                    self._changed.notify_all()
+                elif kind == "load_failed":
+                    replica.state = "failed"
+                    logger.error(f"❌ Engine replica {replica.index} failed to load {self.current_model}: {message[1]}")
+                    self._load_errors.append(message[1])
+                    self._changed.notify_all()
+
+    async def load_model(self, model_id: str, progress: Optional[LoadProgress] = None) -> None:
+        """
+        Start the worker processes and load a model on every replica
+
+        Raises:
+            ValueError: If model_id is not recognized
+            RuntimeError: If no replica could load the model
+        """
+        if model_id not in AVAILABLE_MODELS:
+            raise ValueError(
+                f"Unknown model: {model_id}. "
+                f"Available: {list(AVAILABLE_MODELS.keys())}"
+            )
+        if self.current_model is not None:
+            await self.unload_model()
+
+        loop = asyncio.get_running_loop()
+        self._progress = (lambda stage: loop.call_soon_threadsafe(progress, stage)) if progress else None
+        self._load_errors = []
+        self.current_model = model_id
+        with self._lock:
+            for replica in self.replicas:
+                self._spawn(replica)
+        try:
+            await asyncio.to_thread(self._wait_loaded)
+        except Exception:
+            await self.unload_model()
+            raise
+
+        self.sampling_params = DEFAULT_SAMPLING
+        self.retry_sampling_params = RETRY_SAMPLING
+        self._stopping.clear()
+        self._supervisor = threading.Thread(target=self._supervise, name="replica-supervisor", daemon=True)
+        self._supervisor.start()
+        ready = sum(1 for r in self.replicas if r.state == "ready")
+        logger.info(f"✅ {model_id} ready on {ready}/{len(self.replicas)} {self.backend} replicas")
+
+    def _wait_loaded(self) -> None:
+        """Block until every replica loaded or failed"""
+        deadline = time.monotonic() + LOAD_TIMEOUT
+        with self._lock:
+            while any(r.state == "loading" for r in self.replicas):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("Model loading failed: replicas did not finish loading in time")
+                self._changed.wait(timeout=min(SUPERVISE_INTERVAL, remaining))
+                for replica in self.replicas:
+                    if replica.state == "loading" and not replica.process.is_alive():
+                        replica.state = "failed"
+                        self._load_errors.append(f"replica {replica.index} exited with code {replica.process.exitcode}")
+            if not any(r.state == "ready" for r in self.replicas):
+                raise RuntimeError(f"Model loading failed: {'; '.join(self._load_errors)}")
+
+    async def unload_model(self) -> None:
+        """Stop every worker process (which frees its device memory)"""
+        self._stopping.set()
+        if self._supervisor is not None:
+            await asyncio.to_thread(self._supervisor.join)
+            self._supervisor = None
+        await asyncio.to_thread(self._stop_all)
+        self.current_model = None
+        self.sampling_params = None
+        self.retry_sampling_params = None
+        self._fingerprint = None
+
+    def _stop_all(self) -> None:
+        """Stop every worker process and fail their pending calls"""
+        with self._lock:
+            for replica in self.replicas:
+                for events in replica.batches.values():
+                    events.put(("done", None, "Engine replicas stopped"))
+                replica.batches.clear()
+                replica.outstanding = 0
+                self._stop_process(replica)
+            self._changed.notify_all()
+
+    # Dispatch
+
+    def _dispatch(
+        self,
+        prompts: List[str],
+        modes: List[str],
+        indices: List[int],
+        events: "queue.Queue"
+    ) -> int:
+        """
+        Send prompts (by batch index) to the ready replica with the fewest outstanding prompts
+
+        The replica's events arrive on ``events`` as (sub-batch id, event).
+
+        Returns:
+            Sub-batch id
+        """
+        deadline = time.monotonic() + RESTART_WAIT
+        with self._lock:
+            while not any(r.state == "ready" for r in self.replicas):
+                if self.current_model is None:
+                    raise RuntimeError("No model loaded. Call load_model() first.")
+                if not any(r.state == "loading" for r in self.replicas):
+                    raise RuntimeError("No engine replica is available")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("No engine replica became ready in time")
+                self._changed.wait(timeout=remaining)
+
+            replica = min(
+                (r for r in self.replicas if r.state == "ready"),
+                key=lambda r: (r.outstanding, r.index)
+            )
+            batch_id = next(self._batch_ids)
+            replica.batches[batch_id] = _TaggingQueue(events, batch_id)
+            replica.outstanding += len(indices)
+            REPLICA_INFLIGHT.labels(replica=str(replica.index)).set(replica.outstanding)
+            replica.commands.put(("generate", batch_id, [prompts[i] for i in indices], [modes[i] for i in indices]))
+            return batch_id
+
+    def _forward_aborts(
+        self,
+        pending: Dict[int, List[int]],
+        finished: List[bool],
+        aborted: Aborted,
+        forwarded: Set[int]
+    ) -> None:
+        """Tell replicas about newly aborted prompts of their sub-batches"""
+        for batch_id, chunk in pending.items():
+            positions = [
+                position for position, i in enumerate(chunk)
+                if not finished[i] and i not in forwarded and aborted(i)
+            ]
+            if not positions:
+                continue
+            forwarded.update(chunk[position] for position in positions)
+            with self._lock:
+                for replica in self.replicas:
+                    if batch_id in replica.batches:
+                        replica.aborts.put((batch_id, positions))
+                        break
+
+    def generate_stream(
+        self,
+        prompts: List[str],
+        on_output: Callable[[int, Any], None],
+        sampling_params: Optional[List[Any]] = None,
+        aborted: Optional[Aborted] = None
+    ) -> None:
+        """
+        Run a batch on the least busy replica and report each output as it finishes
+
+        Prompts on a replica that crashes are re-sent to another replica up
+        to MAX_REDISPATCH times. Aborted prompts are passed on to the replica
+        every ABORT_POLL_INTERVAL and are never re-sent.
+        """
+        if not prompts:
+            return
+        modes = [
+            RETRY_SAMPLING if params == RETRY_SAMPLING else DEFAULT_SAMPLING
+            for params in (sampling_params or [None] * len(prompts))
+        ]
+        events: "queue.Queue" = queue.Queue()
+        finished = [False] * len(prompts)
+        attempts = [0] * len(prompts)
+        indices = list(range(len(prompts)))
+        pending = {self._dispatch(prompts, modes, indices, events): indices}
+        error = None
+        forwarded: Set[int] = set()  # Aborted prompts the replicas were told about
+        next_check = time.monotonic()
+
+        while pending:
+            if aborted is not None and time.monotonic() >= next_check:
+                self._forward_aborts(pending, finished, aborted, forwarded)
+                next_check = time.monotonic() + ABORT_POLL_INTERVAL
+            try:
+                batch_id, (kind, index, payload) = events.get(
+                    timeout=ABORT_POLL_INTERVAL if aborted is not None else None
+                )
+            except queue.Empty:
+                continue
+            chunk = pending.get(batch_id)
+            if chunk is None:
+                continue
+            if kind == "output":
+                batch_index = chunk[index]
+                finished[batch_index] = True
+                on_output(batch_index, payload)
+            elif kind == "done":
+                del pending[batch_id]
+                if payload is not None and error is None:
+                    error = payload
+            elif kind == "crashed":
+                del pending[batch_id]
+                unfinished = [i for i in chunk if not finished[i] and not (aborted is not None and aborted(i))]
+                for i in unfinished:
+                    attempts[i] += 1
+                if any(attempts[i] > MAX_REDISPATCH for i in unfinished):
+                    error = error or "Engine replica crashed repeatedly"
+                    continue
+                if unfinished:
+                    logger.warning(f"⚠️ Re-sending {len(unfinished)} prompts from a crashed replica")
+                    pending[self._dispatch(prompts, modes, unfinished, events)] = unfinished
+
+        if error is not None:
+            raise RuntimeError(f"Generation failed on an engine replica: {error}")
+
+    def generate_batch(self, prompts: List[str], sampling_params: Optional[List[Any]] = None) -> List[Any]:
+        """Generate a batch on one replica, returning outputs in order"""
+        outputs: List[Any] = [None] * len(prompts)
+
+        def collect(index: int, output: Any) -> None:
+            outputs[index] = output
+
+        self.generate_stream(prompts, collect, sampling_params)
+        return outputs
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Count tokens on the least busy live replica
+
+        A count whose replica dies before answering is re-sent to another
+        live replica up to MAX_REDISPATCH times.
+
+        Raises:
+            RuntimeError: If no replica is live, or none answers
+        """
+        if not texts:
+            return []
+        for _ in range(MAX_REDISPATCH + 1):
+            waiter: "queue.Queue" = queue.Queue()
+            with self._lock:
+                live = [
+                    r for r in self.replicas
+                    if r.state == "ready" and r.process is not None and r.process.is_alive()
+                ]
+                if not live:
+                    if self.current_model is None:
+                        raise RuntimeError("No model loaded. Call load_model() first.")
+                    raise RuntimeError("No engine replica is available to count tokens")
+                replica = min(live, key=lambda r: (r.outstanding, r.index))
+                generation = replica.generation
+                request_id = next(self._batch_ids)
+                self._token_waiters[request_id] = waiter
+                replica.token_requests.put((request_id, texts))
+            try:
+                answer = self._await_token_count(waiter, replica, generation)
+            finally:
+                self._token_waiters.pop(request_id, None)
+            if answer is None:
+                logger.warning(f"⚠️ Engine replica {replica.index} died during a token count; re-sending")
+                continue
+            counts, error = answer
+            if error is not None:
+                raise RuntimeError(error)
+            return counts
+        raise RuntimeError("Engine replicas died repeatedly while counting tokens")
+
+    def _await_token_count(
+        self,
+        waiter: "queue.Queue",
+        replica: _Replica,
+        generation: int
+    ) -> Optional[Tuple[Optional[List[int]], Optional[str]]]:
+        """
+        Wait for a replica's token count answer, checking that it stays alive
+
+        Returns:
+            (counts, error), or None if the replica died (or was replaced) first
+
+        Raises:
+            RuntimeError: If a live replica does not answer within RESTART_WAIT
+        """
+        deadline = time.monotonic() + RESTART_WAIT
+        while True:
+            try:
+                return waiter.get(timeout=SUPERVISE_INTERVAL)
+            except queue.Empty:
+                pass
+            with self._lock:
+                process = replica.process
+                gone = replica.generation != generation or process is None or not process.is_alive()
+            if gone:
+                # The reader may have routed the answer just before the process exited
+                try:
+                    return waiter.get_nowait()
+                except queue.Empty:
+                    return None
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Engine replica {replica.index} did not answer a token count")
+
+
+class _TaggingQueue:
+    """Puts events on a shared queue tagged with the sub-batch they belong to"""
+
+    __slots__ = ("target", "batch_id")
+
+    def __init__(self, target: "queue.Queue", batch_id: int):
+        self.target = target
+        self.batch_id = batch_id
+
+    def put(self, event) -> None:
+        self.target.put((self.batch_id, event))
+
+
+@atexit.register
+def _stop_workers() -> None:
+    """Do not leave worker processes behind when the server exits"""
+    for engine in list(_engines):
+        engine._stopping.set()
+        engine._stop_all()
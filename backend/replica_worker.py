@@ -0,0 +1,115 @@
+"""
+Engine replica worker process
+Entry point of the processes ReplicaEngine spawns. Kept free of import-time
+side effects (no config, metrics or server state) so a spawned worker only
+imports what it needs; the engine backend is imported once the process runs.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Set
+
+from engine_base import CompletionOutput, EngineOutput, InferenceEngine
+
+# Sampling parameters cross the process boundary as these markers
+DEFAULT_SAMPLING = "default"
+RETRY_SAMPLING = "retry"
+
+
+def _portable(engine: InferenceEngine, output: Any) -> EngineOutput:
+    """Backend output as a plain EngineOutput that pickles cheaply"""
+    _, cached_tokens = engine.prefix_cache_usage(output)
+    completion = output.outputs[0] if output.outputs else None
+    return EngineOutput(
+        request_id=str(output.request_id),
+        prompt="",  # The caller has the prompt; do not ship it back
+        prompt_token_ids=list(output.prompt_token_ids or []),
+        completion=CompletionOutput(
+            engine.extract_text(output),
+            list(completion.token_ids) if completion is not None else []
+        ),
+        num_cached_tokens=cached_tokens
+    )
+
+
+def _serve_token_counts(engine: InferenceEngine, requests, responses) -> None:
+    """Worker thread: answer count_tokens requests while batches generate"""
+    while True:
+        request_id, texts = requests.get()
+        try:
+            responses.put(("tokens", request_id, engine.count_tokens(texts), None))
+        except Exception as e:
+            responses.put(("tokens", request_id, None, str(e)))
+
+
+def _collect_aborts(aborts, aborted: Dict[int, Set[int]]) -> None:
+    """Worker thread: record aborted prompts (batch id -> positions) while batches generate"""
+    while True:
+        batch_id, positions = aborts.get()
+        aborted.setdefault(batch_id, set()).update(positions)
+
+
+def worker_main(
+    replica: int,
+    backend: str,
+    gpu_memory_share: float,
+    device: Optional[str],
+    commands,
+    token_requests,
+    aborts,
+    responses
+) -> None:
+    """Entry point of a replica process"""
+    if device is not None:
+        # Must be set before torch / vLLM initialize CUDA
+        os.environ["CUDA_VISIBLE_DEVICES"] = device
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - replica {replica} - %(name)s - %(levelname)s - %(message)s"
+    )
+    # Exit without waiting for the parent to drain buffered messages
+    responses.cancel_join_thread()
+    from llm_engine import create_engine
+    engine = create_engine(backend, gpu_memory_share, replicas=1)
+    threading.Thread(
+        target=_serve_token_counts, args=(engine, token_requests, responses), daemon=True
+    ).start()
+    aborted: Dict[int, Set[int]] = {}
+    threading.Thread(target=_collect_aborts, args=(aborts, aborted), daemon=True).start()
+    loop = asyncio.new_event_loop()
+
+    while True:
+        command = commands.get()
+        kind = command[0]
+        if kind == "load":
+            try:
+                loop.run_until_complete(
+                    engine.load_model(command[1], lambda stage: responses.put(("progress", stage)))
+                )
+                responses.put(("loaded", engine.sampling_fingerprint()))
+            except Exception as e:
+                responses.put(("load_failed", str(e)))
+        elif kind == "generate":
+            _, batch_id, prompts, modes = command
+            params = [engine.retry_sampling_params if mode == RETRY_SAMPLING else None for mode in modes]
+            batch_aborted = aborted.setdefault(batch_id, set())
+            delivered = 0
+
+            def on_output(index: int, output: Any) -> None:
+                nonlocal delivered
+                delivered += 1
+                responses.put(("output", batch_id, index, _portable(engine, output)))
+
+            try:
+                engine.generate_stream(prompts, on_output, params, batch_aborted.__contains__)
+                error = None
+            except Exception as e:
+                error = str(e)
+            aborted.pop(batch_id, None)
+            # Prompts without output, so the parent's outstanding count stays right
+            responses.put(("done", batch_id, error, len(prompts) - delivered))
+        elif kind == "stop":
+            loop.run_until_complete(engine.unload_model())
+            break
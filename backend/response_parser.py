@@ -0,0 +1,249 @@
+"""
+Fast-path LLM response parsing
+Validates and parses a model output in one pass with precompiled patterns.
+Results are identical to the original validate_llm_response/parse_llm_response
+pair (see benchmarks/bench_response_parser.py).
+"""
+
+import json
+import logging
+import operator
+import re
+from typing import Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json is used when orjson is not installed
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+# Validation patterns, checked in order against the stripped text
+_REPEATED_RE = re.compile(r'(.)\1{20,}')
+_INVALID_PATTERNS = [
+    (re.compile(r'^\s*$'), "Empty/whitespace only"),
+    (re.compile(r'^\*+$'), "Only asterisks"),
+    (re.compile(r'^[^\w\s]{10,}'), "Too many special characters"),
+    (_REPEATED_RE, "Repeated characters"),
+    (re.compile(r'^(Error|Failed|Unable|Invalid)'), "Error message output"),
+]
+_HAS_SCORE_RE = re.compile(r'(?:score|Score)[:\s]*[0-9.]+')
+_HAS_JSON_RE = re.compile(r'\{.*"score".*\}', re.DOTALL)
+
+# Parsing patterns
+_CODE_FENCE_RE = re.compile(r'```(?:json)?\s*')
+_JSON_OBJECT_RE = re.compile(r'\{[^{}]*"score"[^{}]*\}', re.DOTALL)
+_SCORE_RE = re.compile(r'(?:Score|score)[:\s]+([0-9.]+)', re.IGNORECASE)
+_REASON_RE = re.compile(
+    r'(?:Reason|reasoning)[:\s]+(.+?)(?:\n\n|Research Summary:|research_summary:|$)',
+    re.IGNORECASE | re.DOTALL
+)
+_SUMMARY_RE = re.compile(r'(?:Research Summary|research_summary)[:\s]+(.+?)(?:\n\n|$)', re.IGNORECASE | re.DOTALL)
+
+# Characters stripped from reasoning/summary text (JSON artifacts)
+_ARTIFACT_TABLE = str.maketrans('', '', '"{}[]')
+
+PARSE_ERROR_RESULT = {
+    "score": 0.0,
+    "reasoning": "Parse error occurred",
+    "researchSummary": "Failed to extract response"
+}
+
+
+def _loads(text: str):
+    """Decode JSON with orjson when available, falling back to the stdlib for edge cases"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass  # orjson is stricter (NaN, Infinity, ...); let json decide
+    return json.loads(text)
+
+
+def _normalize_score(score: float) -> float:
+    """Map 0-10 scores to 0-1 and clamp"""
+    if score > 1.0:
+        score = score / 10.0
+    return max(0.0, min(1.0, score))
+
+
+def _from_json(data: dict) -> dict:
+    """Build a result from a decoded JSON object"""
+    score = _normalize_score(float(data.get("score", 0.0)))
+
+    reasoning = str(data.get("reasoning", ""))
+    summary = str(data.get("research_summary", data.get("researchSummary", reasoning)))
+
+    reasoning = reasoning.translate(_ARTIFACT_TABLE).strip()
+    summary = summary.translate(_ARTIFACT_TABLE).strip()
+
+    return {
+        "score": score,
+        "reasoning": reasoning[:200] if reasoning else "No reasoning provided",
+        "researchSummary": summary[:200] if summary else reasoning[:200]
+    }
+
+
+def _parse(cleaned: str) -> Tuple[dict, bool]:
+    """
+    Parse cleaned output text
+
+    Returns:
+        (result, is_flat_json) - is_flat_json is True when the whole text was
+        one JSON object containing "score", which also proves it has a score
+    """
+    # Fast path: the whole output is a single flat JSON object. The JSON regex
+    # would match exactly this span, so decoding it directly is equivalent.
+    if (
+        cleaned.startswith('{') and cleaned.endswith('}')
+        and cleaned.count('{') == 1 and cleaned.count('}') == 1
+        and '"score"' in cleaned
+    ):
+        try:
+            return _from_json(_loads(cleaned)), True
+        except (json.JSONDecodeError, ValueError, KeyError):
+            return _parse_fields(cleaned), True
+
+    json_match = _JSON_OBJECT_RE.search(cleaned)
+    if json_match:
+        try:
+            return _from_json(_loads(json_match.group(0))), False
+        except (json.JSONDecodeError, ValueError, KeyError):
+            pass  # Fallback to regex
+
+    return _parse_fields(cleaned), False
+
+
+def _parse_fields(cleaned: str) -> dict:
+    """Regex fallback for 'Score: ... Reasoning: ...' style output"""
+    score = 0.0
+    reasoning = ""
+
+    score_match = _SCORE_RE.search(cleaned)
+    if score_match:
+        score = _normalize_score(float(score_match.group(1)))
+
+    reason_match = _REASON_RE.search(cleaned)
+    if reason_match:
+        reasoning = reason_match.group(1).strip()
+
+    summary_match = _SUMMARY_RE.search(cleaned)
+    research_summary = summary_match.group(1).strip() if summary_match else reasoning
+
+    # Clean up artifacts
+    reasoning = reasoning.translate(_ARTIFACT_TABLE).strip()
+    research_summary = research_summary.translate(_ARTIFACT_TABLE).strip()
+
+    reasoning = reasoning[:200] if reasoning else "No reasoning provided"
+    research_summary = research_summary[:200] if research_summary else reasoning
+
+    return {
+        "score": score,
+        "reasoning": reasoning,
+        "researchSummary": research_summary
+    }
+
+
+def _clean(text: str) -> str:
+    """Remove markdown code fences"""
+    if '```' in text:
+        text = _CODE_FENCE_RE.sub('', text)
+        # Removing fences can join stray backticks into a new fence
+        text = text.replace('```', '')
+    return text.strip()
+
+
+def parse_response(text: str) -> dict:
+    """
+    Parse LLM response to extract score and reasoning
+
+    Returns:
+        Dict with score, reasoning, researchSummary
+    """
+    try:
+        return _parse(_clean(text))[0]
+    except Exception as e:
+        logger.warning(f"❌ Parse error: {e} | Raw response: {text[:300]!r}")
+        return dict(PARSE_ERROR_RESULT)
+
+
+def _has_repeated_run(text: str) -> bool:
+    """
+    Same answer as _REPEATED_RE.search(text), usually without running it
+
+    A run of 21 equal characters covering [a, a+20] contains the positions
+    p, p+5, p+10, p+15 for the first multiple of 5 p >= a. Comparing every
+    5th character is a cheap necessary condition; the regex only runs when
+    four of them in a row are equal.
+    """
+    sampled = text[0::5]
+    if b'\x01\x01\x01' not in bytes(map(operator.eq, sampled, sampled[1:])):
+        return False
+    return _REPEATED_RE.search(text) is not None
+
+
+def _check_shape(stripped: str) -> Optional[str]:
+    """Length and pattern checks; returns an error message or None"""
+    if len(stripped) < 20:
+        return "Output too short"
+    for pattern, desc in _INVALID_PATTERNS:
+        found = _has_repeated_run(stripped) if pattern is _REPEATED_RE else pattern.search(stripped)
+        if found:
+            return f"Invalid pattern: {desc}"
+    return None
+
+
+def validate_response(text: str) -> Tuple[bool, Optional[str]]:
+    """
+    Validate LLM output quality
+
+    Returns:
+        (is_valid, error_message)
+    """
+    if not text or not isinstance(text, str):
+        return False, "Empty or invalid response"
+
+    stripped = text.strip()
+    error = _check_shape(stripped)
+    if error:
+        return False, error
+
+    if not (_HAS_SCORE_RE.search(stripped) or _HAS_JSON_RE.search(stripped)):
+        return False, "No score found in output"
+    return True, None
+
+
+def parse_and_validate(text: str) -> Tuple[bool, Optional[str], Optional[dict]]:
+    """
+    Validate and parse an output in one pass
+
+    Equivalent to validate_response followed by parse_response for valid
+    outputs. When the output is one flat JSON object the score checks are
+    answered by the parse itself instead of separate scans of the text.
+
+    Returns:
+        (is_valid, error_message, parsed) - parsed is None when invalid
+    """
+    if not text or not isinstance(text, str):
+        return False, "Empty or invalid response", None
+
+    stripped = text.strip()
+    error = _check_shape(stripped)
+    if error:
+        return False, error, None
+
+    try:
+        parsed, is_flat_json = _parse(_clean(text))
+    except Exception as e:
+        # Parse failures only matter for outputs that pass validation
+        if not (_HAS_SCORE_RE.search(stripped) or _HAS_JSON_RE.search(stripped)):
+            return False, "No score found in output", None
+        logger.warning(f"❌ Parse error: {e} | Raw response: {text[:300]!r}")
+        return True, None, dict(PARSE_ERROR_RESULT)
+
+    # Without code fences the cleaned text is the stripped text, so a flat JSON
+    # object containing "score" already satisfies the JSON score check
+    if not (is_flat_json and '```' not in text) and not (_HAS_SCORE_RE.search(stripped) or _HAS_JSON_RE.search(stripped)):
+        return False, "No score found in output", None
+    return True, None, parsed
@@ -0,0 +1,321 @@
+"""
+Evaluation result cache
+In-memory LRU tier backed by an on-disk SQLite tier that survives restarts.
+Disk writes go through one writer thread that commits everything queued
+since its last commit together, so storing results never waits on SQLite.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Writes between two evictions of expired and surplus disk entries
+PRUNE_EVERY_WRITES = 1000
+
+
+def make_cache_key(model_id: str, sampling_fingerprint: str, scoring_scheme: str, prompt: str) -> str:
+    """
+    Build a cache key for one evaluation
+
+    Args:
+        model_id: Model identifier (e.g., 'qwen-1.5b')
+        sampling_fingerprint: Stable description of the sampling parameters
+        scoring_scheme: 'original' or 'decision_tree'
+        prompt: Fully rendered prompt text
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    material = "\x1f".join((model_id or "", sampling_fingerprint, scoring_scheme, prompt_hash))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of parsed evaluation results
+
+    Lookups check the in-memory LRU first and fall back to SQLite; disk hits
+    are promoted into memory. Only successfully parsed results should be
+    stored, so invalid model outputs are always retried. Disk lookups block,
+    so callers on the event loop run get_many in a thread; put_many only
+    touches memory and queues the disk write.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str],
+        memory_size: int = 10000,
+        max_entries: int = 0,
+        ttl_seconds: float = 0.0
+    ):
+        """
+        Args:
+            db_path: SQLite file (None or "" = memory only)
+            memory_size: Entries kept in the LRU tier
+            max_entries: Entries kept on disk; the oldest are evicted (0 = no cap)
+            ttl_seconds: Age after which a result is no longer used (0 = never)
+        """
+        self.memory_size = max(0, memory_size)
+        self.db_path = db_path or None
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self._memory: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()  # Key -> (created_at, result)
+        self._lock = threading.Lock()  # Memory tier and counters
+        self._db_lock = threading.Lock()  # Reader connection
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes: "queue.Queue[Tuple[str, object]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evicted = 0
+
+        if self.db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                self._db = self._connect()
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS results_created_at ON results (created_at)")
+                self._db.commit()
+                logger.info(f"Result cache persisted to {self.db_path}")
+            except sqlite3.Error as e:
+                logger.error(f"❌ Could not open result cache database {self.db_path}: {e}")
+                self._db = None
+        if self._db is not None:
+            self._writer = threading.Thread(target=self._write_loop, name="result-cache-writer", daemon=True)
+            self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and created_at < now - self.ttl_seconds
+
+    def _remember(self, key: str, value: dict, created_at: float) -> None:
+        """Insert into the LRU tier, evicting the oldest entries (lock held)"""
+        if self.memory_size == 0:
+            return
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """
+        Look up several keys at once (blocking when the memory tier misses)
+
+        Returns:
+            Mapping of key to cached result for every key that was found
+        """
+        found: Dict[str, dict] = {}
+        now = time.time()
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None and self._expired(entry[0], now):
+                    del self._memory[key]
+                    entry = None
+                if entry is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = entry[1]
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+        if not missing:
+            return found
+        if self._db is None:
+            with self._lock:
+                self.misses += len(missing)
+            return found
+
+        unique = list(dict.fromkeys(missing))
+        oldest = now - self.ttl_seconds if self.ttl_seconds else 0.0
+        rows = []
+        with self._db_lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                try:
+                    rows += self._db.execute(
+                        f"SELECT key, value, created_at FROM results "
+                        f"WHERE key IN ({placeholders}) AND created_at >= ?",
+                        [*chunk, oldest]
+                    ).fetchall()
+                except sqlite3.Error as e:
+                    logger.warning(f"⚠️ Result cache read failed: {e}")
+        with self._lock:
+            for key, raw, created_at in rows:
+                value = json.loads(raw)
+                found[key] = value
+                self._remember(key, value, created_at)
+            for key in missing:
+                if key in found:
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def get(self, key: str) -> Optional[dict]:
+        """Look up a single key"""
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Iterable[Tuple[str, dict]]) -> None:
+        """Store several results; the disk write is queued for the writer thread"""
+        items = list(items)
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value, now)
+            self.writes += len(items)
+        if self._writer is not None:
+            self._writes.put(("put", [(key, json.dumps(value), now) for key, value in items]))
+
+    def put(self, key: str, value: dict) -> None:
+        """Store a single result"""
+        self.put_many([(key, value)])
+
+    def flush(self) -> None:
+        """Wait until every queued write is committed (blocking)"""
+        self._request("flush")
+
+    def clear(self) -> None:
+        """Drop every cached result from both tiers (blocking)"""
+        with self._lock:
+            self._memory.clear()
+        self._request("clear")
+
+    def close(self) -> None:
+        """Commit the queued writes and stop the writer thread (blocking)"""
+        if self._writer is not None and self._writer.is_alive():
+            self._request("stop")
+            self._writer.join()
+
+    def _request(self, operation: str) -> None:
+        """Queue an operation behind the pending writes and wait for the writer to do it"""
+        if self._writer is None or not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._writes.put((operation, done))
+        done.wait()
+
+    def _write_loop(self) -> None:
+        """Writer thread: commit queued results in batches, evict, clear on request"""
+        try:
+            db = self._connect()
+        except sqlite3.Error as e:
+            logger.error(f"❌ Result cache writer could not open {self.db_path}: {e}")
+            return
+        since_prune = PRUNE_EVERY_WRITES  # Prune once at startup
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows, waiters, stop = [], [], False
+            for operation, argument in batch:
+                if operation == "put":
+                    rows += argument
+                    continue
+                if operation == "clear":
+                    # Writes queued before the clear are dropped with it
+                    rows = []
+                    self._execute(db, "DELETE FROM results")
+                elif operation == "stop":
+                    stop = True
+                waiters.append(argument)
+
+            if rows:
+                self._execute(db, "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)", rows)
+                since_prune += len(rows)
+            if since_prune >= PRUNE_EVERY_WRITES and (self.max_entries or self.ttl_seconds):
+                self._prune(db)
+                since_prune = 0
+            for done in waiters:
+                done.set()
+            if stop:
+                db.close()
+                return
+
+    def _execute(self, db: sqlite3.Connection, statement: str, rows: Optional[List[Tuple]] = None) -> None:
+        """Run one write statement and commit it (writer thread)"""
+        try:
+            if rows is None:
+                db.execute(statement)
+            else:
+                db.executemany(statement, rows)
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Result cache write failed: {e}")
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        """Delete expired entries and the oldest ones beyond max_entries (writer thread)"""
+        try:
+            evicted = 0
+            if self.ttl_seconds:
+                evicted += db.execute(
+                    "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+            if self.max_entries:
+                surplus = db.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+                if surplus > 0:
+                    evicted += db.execute(
+                        "DELETE FROM results WHERE key IN "
+                        "(SELECT key FROM results ORDER BY created_at LIMIT ?)", (surplus,)
+                    ).rowcount
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Result cache eviction failed: {e}")
+            return
+        if evicted:
+            with self._lock:
+                self.evicted += evicted
+            logger.info(f"🧹 Evicted {evicted} result cache entries")
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and tier sizes (blocking)"""
+        disk_entries = None
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    disk_entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evicted": self.evicted,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.memory_size,
+                "disk_entries": disk_entries,
+                "disk_capacity": self.max_entries or None,
+                "ttl_seconds": self.ttl_seconds or None,
+                "db_path": self.db_path
+            }
@@ -0,0 +1,554 @@
+"""
+Cross-request micro-batching scheduler
+Merges prompts from concurrent HTTP requests into shared engine batches
+and runs generation off the event loop. Prompts wait in two priority lanes
+(interactive, bulk) and are served fairly across clients within each lane.
+Batch sizes are tuned per model, and a batch that fails on the engine is
+split and retried instead of failing every request in it.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from batch_tuner import BatchTuner, is_out_of_memory
+from config import (
+    BATCH_TUNER_ENABLED, CLIENT_WEIGHTS, MAX_NEW_TOKENS, SCHEDULER_BULK_MIN_SHARE, SCHEDULER_MAX_BATCH_SIZE,
+    SCHEDULER_MAX_WAIT_MS
+)
+from metrics import (
+    ABORTED_GENERATING, ABORTED_QUEUED, BATCH_SIZE, BATCH_SPLITS, ENGINE_BATCH_SECONDS, GENERATED_TOKENS,
+    PROMPTS_GENERATED
+)
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+LANES = (INTERACTIVE, BULK)
+
+# (lane, client) of the request being served, set by the server for each
+# request; prompts submitted from its tasks are queued under it
+request_lane: ContextVar[Tuple[str, str]] = ContextVar("request_lane", default=(INTERACTIVE, "local"))
+
+# Idle clients whose fair-share position is remembered
+_MAX_REMEMBERED_CLIENTS = 4096
+
+
+def client_weight(client: str) -> float:
+    """Fair-share weight of a client (CLIENT_WEIGHTS, default 1)"""
+    return CLIENT_WEIGHTS.get(client, 1.0)
+
+
+class _PendingPrompt:
+    """A single prompt waiting in the scheduler queue"""
+
+    __slots__ = ("prompt", "future", "request_id", "tokens", "sampling_params", "lane", "client")
+
+    def __init__(
+        self,
+        prompt: str,
+        future: asyncio.Future,
+        request_id: int,
+        tokens: int = 0,
+        sampling_params: Any = None,
+        lane: str = INTERACTIVE,
+        client: str = "local"
+    ):
+        self.prompt = prompt
+        self.future = future
+        self.request_id = request_id
+        # Prompt tokens plus the generation allowance (0 if unknown)
+        self.tokens = tokens
+        # Engine sampling parameters (None = engine default)
+        self.sampling_params = sampling_params
+        self.lane = lane
+        self.client = client
+
+
+class _Lane:
+    """
+    Prompts of one priority lane, served fairly across clients
+
+    Start-time fair queuing: each client has a virtual time that advances
+    by a prompt's tokens divided by the client's weight whenever one of its
+    prompts is served, and the queued client with the lowest virtual time
+    goes next. A client that was idle rejoins at the lane's current virtual
+    time, so it neither saves up credit nor jumps the queue.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, Deque[_PendingPrompt]] = {}
+        self._heap: List[Tuple[float, int, str]] = []  # (virtual time, tiebreak, client) of queued clients
+        self._times: Dict[str, float] = {}  # Virtual time of each client seen
+        self._clock = 0.0  # Virtual time of the last prompt served
+        self._order = itertools.count()
+        self.size = 0
+
+    def put(self, item: _PendingPrompt) -> None:
+        queue = self._queues.get(item.client)
+        if queue is None:
+            queue = self._queues[item.client] = deque()
+            start = max(self._times.get(item.client, 0.0), self._clock)
+            self._times[item.client] = start
+            heapq.heappush(self._heap, (start, next(self._order), item.client))
+        queue.append(item)
+        self.size += 1
+
+    def pop(self) -> _PendingPrompt:
+        start, _, client = heapq.heappop(self._heap)
+        queue = self._queues[client]
+        item = queue.popleft()
+        self.size -= 1
+        self._clock = start
+        finish = start + max(item.tokens, 1) / client_weight(client)
+        self._times[client] = finish
+        if queue:
+            heapq.heappush(self._heap, (finish, next(self._order), client))
+        else:
+            del self._queues[client]
+            if len(self._times) > _MAX_REMEMBERED_CLIENTS:
+                self._forget_idle()
+        return item
+
+    def _forget_idle(self) -> None:
+        """Drop idle clients that are no longer ahead of the lane's virtual time"""
+        for client, finish in list(self._times.items()):
+            if client not in self._queues and finish <= self._clock:
+                del self._times[client]
+
+    def drain(self) -> List[_PendingPrompt]:
+        """Remove and return every queued prompt"""
+        items = [item for queue in self._queues.values() for item in queue]
+        self._queues.clear()
+        self._heap.clear()
+        self.size = 0
+        return items
+
+    def clients(self) -> Dict[str, int]:
+        """Queued prompts per client"""
+        return {client: len(queue) for client, queue in self._queues.items()}
+
+
+class BatchScheduler:
+    """
+    Dynamic micro-batching scheduler
+
+    Callers submit their prompts to a shared queue. A single background worker
+    drains the queue into engine batches bounded by the batch size limit, the
+    loaded model's token budget (``engine.max_batch_tokens()``) and a
+    ``max_wait_ms`` collection window, runs the blocking engine call in a
+    dedicated thread, and resolves each caller's futures with its own outputs
+    as soon as the corresponding sequence finishes. Up to
+    ``engine.max_concurrent_batches()`` batches run at once, so engine
+    replicas each get a batch while the next one is collected.
+
+    Batches take interactive prompts first, but while bulk prompts wait they
+    keep ``bulk_min_share`` of each batch for them, so bulk scans slow down
+    under interactive load instead of stalling.
+
+    With a ``tuner`` the limit and token budget move within ``max_batch_size``
+    as the tuner learns what the model sustains; without one every batch may
+    hold ``max_batch_size`` prompts.
+    """
+
+    def __init__(
+        self,
+        engine,
+        max_batch_size: int = SCHEDULER_MAX_BATCH_SIZE,
+        max_wait_ms: float = SCHEDULER_MAX_WAIT_MS,
+        bulk_min_share: float = SCHEDULER_BULK_MIN_SHARE,
+        tuner: Optional[BatchTuner] = None
+    ):
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.bulk_min_share = min(1.0, max(0.0, bulk_min_share))
+        if tuner is None and BATCH_TUNER_ENABLED:
+            tuner = BatchTuner(engine, self.max_batch_size)
+        self.tuner = tuner
+        self._lanes: Dict[str, _Lane] = {lane: _Lane() for lane in LANES}
+        self._work: Optional[asyncio.Event] = None  # Set while prompts are queued
+        # Prompt that did not fit the previous batch's token budget
+        self._carry: Optional[_PendingPrompt] = None
+        self._worker: Optional[asyncio.Task] = None
+        # One engine thread per concurrent batch; created in start()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batches: set = set()  # Batch tasks in flight
+        self._request_ids = itertools.count(1)
+        self._throughput = 0.0  # Prompts/sec across concurrent batches (moving average)
+
+    def is_running(self) -> bool:
+        """Check if the background worker is running"""
+        return self._worker is not None and not self._worker.done()
+
+    def queue_depth(self) -> int:
+        """Number of prompts waiting for a batch slot"""
+        depth = sum(lane.size for lane in self._lanes.values())
+        return depth + (1 if self._carry is not None else 0)
+
+    def throughput(self) -> float:
+        """Recent prompts/sec (0 until a batch has finished)"""
+        return self._throughput
+
+    def batch_limit(self) -> int:
+        """Prompts the next batch may hold"""
+        if self.tuner is None:
+            return self.max_batch_size
+        return min(self.max_batch_size, self.tuner.batch_limit())
+
+    def interactive_slots(self, limit: int) -> int:
+        """Slots of a ``limit``-prompt batch interactive prompts may take while bulk prompts wait"""
+        return max(1, limit - math.ceil(limit * self.bulk_min_share))
+
+    def status(self) -> Dict:
+        """Queued prompts per lane and client, running batches, throughput and batch tuning"""
+        return {
+            "queued": {name: lane.size for name, lane in self._lanes.items()},
+            "clients": {name: lane.clients() for name, lane in self._lanes.items()},
+            "running_batches": len(self._batches),
+            "throughput": round(self._throughput, 2),
+            "batch_limit": self.batch_limit(),
+            "tuning": self.tuner.status() if self.tuner is not None else None
+        }
+
+    async def start(self) -> None:
+        """Start the background batching worker"""
+        if self.is_running():
+            return
+        concurrency = max(1, self.engine.max_concurrent_batches())
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="engine")
+        self._slots = asyncio.Semaphore(concurrency)
+        self._work = asyncio.Event()
+        if self.queue_depth():
+            self._work.set()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"Scheduler started (max_batch_size={self.max_batch_size}, "
+            f"max_wait={self.max_wait * 1000:.0f}ms, concurrent_batches={concurrency}, "
+            f"bulk_min_share={self.bulk_min_share:.0%}, tuning={'on' if self.tuner is not None else 'off'})"
+        )
+
+    async def stop(self) -> None:
+        """Stop the worker and fail any prompts still queued"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Batches already on the engine fail their callers; the engine call itself finishes in its thread
+        for task in list(self._batches):
+            task.cancel()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+        leftovers = [self._carry] if self._carry is not None else []
+        self._carry = None
+        for lane in self._lanes.values():
+            leftovers.extend(lane.drain())
+        for item in leftovers:
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("Scheduler stopped"))
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        logger.info("Scheduler stopped")
+
+    def submit(
+        self,
+        prompts: List[str],
+        token_counts: Optional[List[int]] = None,
+        sampling_params: Any = None
+    ) -> List[asyncio.Future]:
+        """
+        Queue prompts for generation, in the lane and under the client of ``request_lane``
+
+        Args:
+            prompts: List of prompt strings
+            token_counts: Prompt token counts, used to cap batches by total tokens
+            sampling_params: Engine sampling parameters for these prompts (None = default)
+
+        Returns:
+            One future per prompt, resolved with that prompt's engine output
+        """
+        if not self.is_running():
+            raise RuntimeError("Scheduler is not running")
+
+        loop = asyncio.get_running_loop()
+        request_id = next(self._request_ids)
+        lane_name, client = request_lane.get()
+        lane = self._lanes[lane_name]
+        futures = []
+        for i, prompt in enumerate(prompts):
+            future = loop.create_future()
+            tokens = token_counts[i] + MAX_NEW_TOKENS if token_counts is not None else 0
+            lane.put(_PendingPrompt(prompt, future, request_id, tokens, sampling_params, lane_name, client))
+            futures.append(future)
+        if futures:
+            self._work.set()
+        return futures
+
+    async def generate(
+        self,
+        prompts: List[str],
+        token_counts: Optional[List[int]] = None,
+        sampling_params: Any = None
+    ) -> List[Any]:
+        """
+        Generate outputs for prompts through the shared batch queue
+
+        Args:
+            prompts: List of prompt strings
+            token_counts: Prompt token counts, used to cap batches by total tokens
+            sampling_params: Engine sampling parameters for these prompts (None = default)
+
+        Returns:
+            Engine outputs in the same order as ``prompts``
+        """
+        futures = self.submit(prompts, token_counts, sampling_params)
+        try:
+            return await asyncio.gather(*futures)
+        except BaseException:
+            # Drop our prompts that have not been picked up yet
+            for future in futures:
+                future.cancel()
+            raise
+
+    async def generate_as_completed(
+        self,
+        prompts: List[str],
+        token_counts: Optional[List[int]] = None
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Generate outputs and yield each one as soon as its sequence finishes
+
+        Args:
+            prompts: List of prompt strings
+            token_counts: Prompt token counts, used to cap batches by total tokens
+
+        Yields:
+            (prompt index, engine output) in completion order
+        """
+        futures = self.submit(prompts, token_counts)
+        finished: asyncio.Queue = asyncio.Queue()
+        for index, future in enumerate(futures):
+            future.add_done_callback(lambda _, index=index: finished.put_nowait(index))
+
+        try:
+            for _ in range(len(futures)):
+                index = await finished.get()
+                yield index, futures[index].result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _take(self, interactive_taken: int, interactive_slots: int) -> Optional[_PendingPrompt]:
+        """
+        Next queued prompt for a batch holding ``interactive_taken`` interactive prompts
+
+        Interactive prompts go first until they fill ``interactive_slots``
+        while bulk prompts are waiting; the rest of the batch goes to bulk.
+        """
+        interactive, bulk = self._lanes[INTERACTIVE], self._lanes[BULK]
+        item = None
+        while item is None:
+            if interactive.size and (not bulk.size or interactive_taken < interactive_slots):
+                item = interactive.pop()
+            elif bulk.size:
+                item = bulk.pop()
+            else:
+                break
+            if item.future.done():
+                # Caller has gone away; it takes no batch slot
+                ABORTED_QUEUED.inc()
+                item = None
+        if not interactive.size and not bulk.size:
+            self._work.clear()
+        return item
+
+    async def _wait_for_work(self, timeout: Optional[float] = None) -> bool:
+        """Wait until a prompt is queued; False on timeout"""
+        try:
+            await asyncio.wait_for(self._work.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _collect_batch(self) -> Tuple[List[_PendingPrompt], bool]:
+        """
+        Wait for the first prompt, then fill the batch until full or the window closes
+
+        Returns:
+            (batch, whether it was cut off by the size or token limit)
+        """
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = None
+            while first is None:
+                await self._wait_for_work()
+                first = self._take(0, self.interactive_slots(self.batch_limit()))
+        batch = [first]
+        batch_tokens = first.tokens
+        interactive_taken = 1 if first.lane == INTERACTIVE else 0
+        limit = self.batch_limit()
+        interactive_slots = self.interactive_slots(limit)
+        max_tokens = self.engine.max_batch_tokens()
+        if self.tuner is not None:
+            max_tokens = self.tuner.token_limit(max_tokens)
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < limit:
+            # Take everything already queued without waiting
+            item = self._take(interactive_taken, interactive_slots)
+            if item is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not await self._wait_for_work(remaining):
+                    return batch, False
+                continue
+
+            if max_tokens and batch_tokens + item.tokens > max_tokens:
+                # Token budget is full; this prompt opens the next batch
+                self._carry = item
+                break
+            batch.append(item)
+            batch_tokens += item.tokens
+            if item.lane == INTERACTIVE:
+                interactive_taken += 1
+
+        return batch, True
+
+    async def _run(self) -> None:
+        """Background worker loop: collect a batch whenever an engine slot is free"""
+        while True:
+            await self._slots.acquire()
+            try:
+                batch, full = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            # Skip prompts whose callers have gone away
+            kept = [item for item in batch if not item.future.done()]
+            ABORTED_QUEUED.inc(len(batch) - len(kept))
+            batch = kept
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._run_batch(batch, full))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[_PendingPrompt], full: bool) -> None:
+        """Run one batch on the engine and resolve its callers' futures"""
+        # Group prompts with identical prefixes so the engine computes each
+        # shared prefix once and later sequences hit the prefix cache
+        batch.sort(key=lambda item: item.prompt)
+
+        request_count = len({item.request_id for item in batch})
+        batch_tokens = sum(item.tokens for item in batch)
+        bulk_count = sum(1 for item in batch if item.lane == BULK)
+        logger.info(
+            f"🧩 Scheduling batch of {len(batch)} prompts (~{batch_tokens} tokens) "
+            f"from {request_count} request(s), {bulk_count} bulk | {self.queue_depth()} still queued"
+        )
+
+        generated_tokens: List[int] = []
+        BATCH_SIZE.observe(len(batch))
+        batch_start = time.perf_counter()
+        failed = True
+        try:
+            failed = await self._generate(batch, generated_tokens)
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else RuntimeError("Scheduler stopped")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(error)
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self._slots.release()
+            ABORTED_GENERATING.inc(sum(1 for item in batch if item.future.cancelled()))
+            batch_seconds = time.perf_counter() - batch_start
+            if generated_tokens and batch_seconds > 0:
+                # Batches overlap, so one batch's rate times the slots estimates the total
+                rate = len(generated_tokens) / batch_seconds * self.engine.max_concurrent_batches()
+                self._throughput = rate if not self._throughput else 0.7 * self._throughput + 0.3 * rate
+            if self.tuner is not None and not failed:
+                self.tuner.observe(len(generated_tokens), batch_seconds, full, self.engine.memory_headroom())
+            ENGINE_BATCH_SECONDS.observe(batch_seconds)
+            PROMPTS_GENERATED.inc(len(generated_tokens))
+            GENERATED_TOKENS.inc(sum(generated_tokens))
+
+    async def _generate(self, batch: List[_PendingPrompt], generated_tokens: List[int]) -> bool:
+        """
+        Generate a batch on the engine, splitting it in half and retrying on failure
+
+        Prompts that already have their output are not retried. Only a
+        single failing prompt, or a batch whose model is gone, fails its
+        callers with the engine error.
+
+        Args:
+            batch: Prompts to generate
+            generated_tokens: Extended with the generated token count of every output
+
+        Returns:
+            True if the engine failed at least once (the batch was split)
+        """
+        loop = asyncio.get_running_loop()
+
+        def on_output(index: int, output: Any) -> None:
+            # Called from the engine thread as each sequence finishes
+            generated_tokens.append(self.engine.generated_tokens(output))
+            loop.call_soon_threadsafe(self._resolve, batch[index], output)
+
+        try:
+            await loop.run_in_executor(
+                self._executor,
+                self.engine.generate_stream,
+                [item.prompt for item in batch],
+                on_output,
+                [item.sampling_params for item in batch],
+                # A cancelled caller (disconnect, deadline, cancel) no longer needs its sequence
+                lambda index: batch[index].future.cancelled()
+            )
+            return False
+        except Exception as e:
+            # Outputs delivered before the failure were resolved before this
+            # point (same event loop queue), so they are not generated again
+            remaining = [item for item in batch if not item.future.done()]
+            if len(remaining) < 2 or not self.engine.is_loaded():
+                for item in remaining:
+                    item.future.set_exception(e)
+                return True
+            reason = "out_of_memory" if is_out_of_memory(e) else "error"
+            BATCH_SPLITS.labels(reason=reason).inc()
+            if self.tuner is not None:
+                self.tuner.record_failure(len(batch), sum(item.tokens for item in batch), e)
+            half = len(remaining) // 2
+            logger.warning(
+                f"⚠️ Batch of {len(batch)} prompts failed ({e}); "
+                f"retrying {len(remaining)} unfinished prompts as {half} + {len(remaining) - half}"
+            )
+            for part in (remaining[:half], remaining[half:]):
+                await self._generate(part, generated_tokens)
+            return True
+
+    @staticmethod
+    def _resolve(item: _PendingPrompt, output: Any) -> None:
+        """Hand a finished output to its caller"""
+        if not item.future.done():
+            item.future.set_result(output)
@@ -3,19 +3,52 @@ FastAPI server for vLLM backend
 Provides REST API for batch professor evaluation
 """
 
+import asyncio
+import json
+import threading
 import time
 import logging
-from fastapi import FastAPI, HTTPException
+import weakref
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, Callable, Dict, List, Literal, Optional, Tuple
 
 from models import (
     EvaluateRequest, EvaluateResponse, EvaluationResult,
-    LoadModelRequest, LoadModelResponse,
-    HealthResponse
+    EvaluationStreamResult, EvaluationStreamSummary,
+    EvaluationJobRequest, EvaluationJobResponse, EvaluationJobResult, EvaluationJobResults,
+    LoadModelRequest, LoadModelResponse, LoadJobResponse, UnloadModelRequest,
+    HealthResponse, ModelPoolResponse, Professor, PublicationsUpload, QueueResponse,
+    RetrieveRequest, RetrieveResponse, RetrievedProfessor
 )
-from llm_engine import llm_engine, AVAILABLE_MODELS
-from prompt_builder import build_evaluation_prompt, parse_llm_response, validate_llm_response
+from llm_engine import LLMEngine
+from model_catalog import AVAILABLE_MODELS
+from model_pool import ModelPool, PoolFullError, ResidentModel
+from model_runtime import EvaluationStats, ModelRuntime
+from evaluation_jobs import EvaluationJob, JobManager
+from admission import AdmissionController, Overloaded
+from batch_tuner import tuning_store
+from cancellation import ActiveRequests, RequestAborted
+from scheduler import BULK, INTERACTIVE, request_lane
+from professor_store import ProfessorStore
+from result_cache import ResultCache
+import wire_format
+from wire_format import BodyTooLarge, UnsupportedFormat
+from config import (
+    RESULT_CACHE_ENABLED, RESULT_CACHE_PATH, RESULT_CACHE_MEMORY_SIZE, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_S,
+    PRERANK_ENABLED, PRERANK_MIN_SCORE, PRERANK_TOP_K, VECTOR_INDEX_DIR,
+    CASCADE_BAND, CASCADE_GPU_SHARE, CASCADE_MODEL, MODEL_POOL_MEMORY_GB, MODEL_LOAD_WAIT_S,
+    JOB_DIR, JOB_BATCH_SIZE, JOB_CONCURRENCY, JOB_HISTORY,
+    PROFESSOR_DATA_DIR, PROFESSOR_PUBLICATIONS_PATH, INTERACTIVE_MAX_PROFESSORS, REQUEST_TIMEOUT_S,
+    MAX_REQUEST_BODY_BYTES
+)
+from prerank import prerank
+from vector_index import VectorIndex
+from metrics import PRERANK_SECONDS, PRERANK_SKIPPED, QUEUE_DEPTH, REQUEST_SECONDS, render_metrics
 
 # Configure logging
 logging.basicConfig(
@@ -28,7 +61,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="CSProfAlign vLLM Backend",
     description="GPU-accelerated batch inference for professor evaluation",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse if wire_format.orjson is not None else JSONResponse
 )
 
 # Enable CORS for frontend
@@ -43,19 +77,120 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Request-Id"],
 )
 
+# Parsed evaluation results, reused across requests and restarts
+result_cache = ResultCache(
+    RESULT_CACHE_PATH, RESULT_CACHE_MEMORY_SIZE, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_S
+) if RESULT_CACHE_ENABLED else None
+
+# Resident models, each with a scheduler that merges prompts across
+# concurrent requests (leaves room on the GPU for the cascade model)
+pool = ModelPool(
+    MODEL_POOL_MEMORY_GB, result_cache,
+    gpu_memory_share=1.0 - CASCADE_GPU_SHARE if CASCADE_MODEL else 1.0
+)
+
+# Larger model that re-scores uncertain professors (loaded on first use)
+cascade_runtime = (
+    ModelRuntime(LLMEngine(gpu_memory_share=CASCADE_GPU_SHARE), result_cache) if CASCADE_MODEL else None
+)
+_cascade_load_lock = asyncio.Lock()
+
+
+def queue_depth() -> int:
+    """Prompts waiting for a batch slot on any model"""
+    depth = pool.queue_depth()
+    if cascade_runtime is not None:
+        depth += cascade_runtime.scheduler.queue_depth()
+    return depth
+
+
+# Read at scrape time, so queueing itself stays uninstrumented
+QUEUE_DEPTH.set_function(queue_depth)
+
+
+def throughput() -> float:
+    """Recent prompts/sec on every model"""
+    rate = pool.throughput()
+    if cascade_runtime is not None:
+        rate += cascade_runtime.scheduler.throughput()
+    return rate
+
+
+# Bounds the prompts of admitted requests; the rest get 429 + Retry-After
+admission = AdmissionController()
+
+# Running evaluations by request id, aborted on deadline, disconnect or DELETE /evaluations/{id}
+active_requests = ActiveRequests()
+
+# Professors by id, so requests can name them instead of sending them
+professor_store = ProfessorStore(PROFESSOR_PUBLICATIONS_PATH)
+
+# Memory-mapped professor vectors for /retrieve (None until built)
+vector_index: Optional[VectorIndex] = None
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    """Start the background batching workers"""
+    await pool.start()
+    if cascade_runtime is not None:
+        await cascade_runtime.start()
+
+
+@app.on_event("startup")
+async def load_professor_store():
+    """Load the region files and uploaded publication lists"""
+    try:
+        await asyncio.to_thread(professor_store.load, PROFESSOR_DATA_DIR)
+    except Exception as e:
+        logger.error(f"❌ Could not load professors from {PROFESSOR_DATA_DIR}: {e}")
+
+
+@app.on_event("startup")
+async def start_jobs():
+    """Resume evaluation jobs that were unfinished at the last shutdown"""
+    await jobs.start()
+
+
+@app.on_event("startup")
+async def load_vector_index():
+    """Map the professor vector index if it has been built"""
+    global vector_index
+    try:
+        vector_index = await asyncio.to_thread(VectorIndex, VECTOR_INDEX_DIR)
+    except FileNotFoundError:
+        logger.info(f"No vector index at {VECTOR_INDEX_DIR}; /retrieve is disabled")
+    except Exception as e:
+        logger.error(f"❌ Could not load vector index from {VECTOR_INDEX_DIR}: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Stop the background batching workers"""
+    await jobs.stop()
+    await pool.stop()
+    if cascade_runtime is not None:
+        await cascade_runtime.stop()
+    if result_cache is not None:
+        # Commit the results still queued for the disk tier
+        await asyncio.to_thread(result_cache.close)
+
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
     return HealthResponse(
         status="healthy",
-        model_loaded=llm_engine.is_loaded(),
-        current_model=llm_engine.get_current_model()
+        model_loaded=pool.model_state(pool.request_model()) == "ready",
+        current_model=pool.request_model(),
+        model_state=pool.model_state(pool.request_model()),
+        resident_models=list(pool.models),
+        cascade_model=cascade_runtime.engine.get_current_model() if cascade_runtime is not None else None
     )
 
-
 @app.get("/models")
 async def get_models():
     """Get available models"""
@@ -63,7 +198,10 @@ async def get_models():
         "models": [
             {
                 "id": model_id,
-                **model_config
+                **model_config,
+                "resident": model_id in pool,
+                # Batch size and memory settings learned on this server (None if never tuned)
+                "batch_tuning": tuning_store.get(model_id) or None
             }
             for model_id, model_config in AVAILABLE_MODELS.items()
         ]
@@ -73,44 +211,66 @@ async def get_models():
 @app.post("/load_model", response_model=LoadModelResponse)
 async def load_model(request: LoadModelRequest):
     """
-    Load a model into memory
+    Load a model in the background and make it the default model once it is ready
     
-    First time will download from HuggingFace (may take 5-10 minutes)
-    Subsequent loads use cached model
+    Responds right away with a job to poll at /load_jobs/{job_id}; set
+    "wait" to respond once the model is ready. First time will download from
+    HuggingFace (may take 5-10 minutes). Subsequent loads use cached model.
+    Models loaded earlier stay resident while they fit the pool's memory
+    budget. Evaluation requests that name no model keep going to the
+    previous default meanwhile (and to it alone if the load fails); without
+    one they wait for this model.
     """
     try:
         logger.info(f"📥 Received request to load model: {request.model_id}")
         
-        await llm_engine.load_model(request.model_id)
+        job = pool.start_load(request.model_id, make_default=True)
+        if request.wait:
+            await pool.wait_ready(job)
         
+        if job.state == "ready":
+            return LoadModelResponse(
+                status="loaded",
+                model=request.model_id,
+                job_id=job.id,
+                state=job.state,
+                message=f"Model {request.model_id} loaded successfully"
+            )
         return LoadModelResponse(
-            status="loaded",
+            status="loading",
             model=request.model_id,
-            message=f"Model {request.model_id} loaded successfully"
+            job_id=job.id,
+            state=job.state,
+            message=f"Loading {request.model_id}; poll /load_jobs/{job.id} for progress"
         )
     
     except ValueError as e:
         logger.error(f"Invalid model ID: {e}")
         raise HTTPException(status_code=400, detail=str(e))
     
+    except PoolFullError as e:
+        logger.warning(f"⚠️ {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    
     except Exception as e:
         logger.error(f"Model loading failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
 
 
 @app.post("/unload_model")
-async def unload_model():
-    """Unload current model to free memory"""
+async def unload_model(request: Optional[UnloadModelRequest] = None):
+    """Unload one model, or every model (and the cascade model) to free memory"""
     try:
-        if not llm_engine.is_loaded():
+        model_id = request.model_id if request is not None else None
+        unloaded = await pool.unload(model_id)
+        if model_id is None and cascade_runtime is not None and cascade_runtime.engine.is_loaded():
+            await cascade_runtime.engine.unload_model()
+        if not unloaded:
             return {"status": "no_model_loaded", "message": "No model to unload"}
         
-        model_id = llm_engine.get_current_model()
-        await llm_engine.unload_model()
-        
         return {
             "status": "unloaded",
-            "message": f"Model {model_id} unloaded successfully"
+            "message": f"Model {', '.join(unloaded)} unloaded successfully"
         }
     
     except Exception as e:
@@ -118,81 +278,420 @@ async def unload_model():
         raise HTTPException(status_code=500, detail=f"Failed to unload model: {str(e)}")
 
 
-@app.post("/evaluate_batch", response_model=EvaluateResponse)
-async def evaluate_batch(request: EvaluateRequest):
+@app.get("/load_jobs", response_model=List[LoadJobResponse])
+async def list_load_jobs():
+    """Recent model loads, oldest first"""
+    return [LoadJobResponse(**job.to_dict()) for job in pool.jobs.values()]
+
+
+@app.get("/load_jobs/{job_id}", response_model=LoadJobResponse)
+async def get_load_job(job_id: str):
+    """Progress of a model load started by /load_model"""
+    job = pool.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown load job: {job_id}")
+    return LoadJobResponse(**job.to_dict())
+
+
+@app.get("/queue", response_model=QueueResponse)
+async def queue_status():
+    """Admitted prompts, rejections and each model's scheduler queue by lane and client"""
+    schedulers = pool.queue_status()
+    cascade_model = cascade_runtime.engine.get_current_model() if cascade_runtime is not None else None
+    if cascade_model:
+        schedulers.append({"model": cascade_model, **cascade_runtime.scheduler.status()})
+    return QueueResponse(admission=admission.status(), schedulers=schedulers)
+
+
+@app.get("/pool", response_model=ModelPoolResponse)
+async def pool_status():
+    """Resident models, memory use and recent load/evict events"""
+    return ModelPoolResponse(**pool.status())
+
+
+async def acquire_model(request: EvaluateRequest) -> ResidentModel:
     """
-    Evaluate a batch of professors (GPU-accelerated batch inference)
+    Reserve the request's model in the pool, waiting while it loads
+
+    Returns:
+        The pool entry to pass to pool.release() when the request is done
     
-    This is the core endpoint that processes multiple professors in parallel
-    using vLLM's efficient batch inference
+    Raises:
+        HTTPException: 400 if no model is loaded or the model is unknown,
+            503 if it does not fit the memory budget or is not ready within
+            MODEL_LOAD_WAIT_S, 500 if loading fails
     """
-    if not llm_engine.is_loaded():
+    model_id = request.model or pool.request_model()
+    if model_id is None:
         raise HTTPException(
             status_code=400,
             detail="No model loaded. Call /load_model first."
         )
+    try:
+        return await pool.acquire(model_id, MODEL_LOAD_WAIT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model {model_id} is still loading ({pool.model_state(model_id)})",
+            headers={"Retry-After": "30"}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Model loading failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
+
+
+def resolve_professors(request: EvaluateRequest) -> None:
+    """
+    Fill in a request's professors from the professor store when it names ids
+    
+    Raises:
+        HTTPException: 400 if the request sends both forms or an id is unknown
+    """
+    if request.professor_ids is None:
+        return
+    if request.professors:
+        raise HTTPException(status_code=400, detail="Send either professors or professor_ids, not both")
+    try:
+        professors = professor_store.professors(request.professor_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for i, professor_id in enumerate(request.professor_ids):
+        override = (request.overrides or {}).get(professor_id)
+        if override is not None:
+            update = {
+                name: getattr(override, name)
+                for name in override.model_fields_set if getattr(override, name) is not None
+            }
+            professors[i] = professors[i].model_copy(update=update)
+    request.professors = professors
+
+
+def admit_request(http_request: Request, request: EvaluateRequest) -> Tuple[str, str, int]:
+    """
+    Admit a request and queue its prompts in its lane, under its client
+    
+    Requests that ask for the bulk lane or name more than
+    INTERACTIVE_MAX_PROFESSORS professors are bulk; the client is the
+    X-Client-Id header, else the client address.
+    
+    Returns:
+        (lane, client, prompts) to hand back to admission.release()
+    
+    Raises:
+        HTTPException: 429 with Retry-After if admitting it would exceed a limit
+    """
+    prompts = len(request.professors)
+    lane = request.priority or (BULK if prompts > INTERACTIVE_MAX_PROFESSORS else INTERACTIVE)
+    client = http_request.headers.get("x-client-id") or (
+        http_request.client.host if http_request.client else "unknown"
+    )
+    try:
+        admission.admit(lane, client, prompts, throughput())
+    except Overloaded as e:
+        logger.warning(f"🚦 Rejected {prompts} {lane} prompts from {client}: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    request_lane.set((lane, client))
+    return lane, client, prompts
+
+
+def register_request(http_request: Request) -> str:
+    """
+    Register an evaluation under its X-Request-Id header (or a new id)
+    
+    Raises:
+        HTTPException: 409 if a request with that id is already running
+    """
+    try:
+        return active_requests.add(http_request.headers.get("x-request-id"))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+def finish_request(request_id: str, admitted: Tuple[str, str, int]) -> None:
+    """Release an evaluation's admission and forget its id"""
+    admission.release(*admitted)
+    active_requests.remove(request_id)
+
+
+def run_once(callback: Callable[[], None]) -> Callable[[], None]:
+    """Wrap a cleanup so that only its first call runs it"""
+    lock = threading.Lock()
+    pending = [callback]
+
+    def run() -> None:
+        with lock:
+            if not pending:
+                return
+            pending.pop()
+        callback()
+
+    return run
+
+
+def request_deadline(request: EvaluateRequest) -> Optional[float]:
+    """Event loop time by which the request must finish, or None"""
+    timeout = REQUEST_TIMEOUT_S if request.timeout is None else request.timeout
+    return asyncio.get_running_loop().time() + timeout if timeout > 0 else None
+
+
+def aborted_error(request_id: str, e: RequestAborted) -> HTTPException:
+    """Error for an evaluation stopped before it finished: 504 past its deadline, else 499"""
+    logger.info(f"🛑 Request {request_id} {e.reason}; its remaining prompts were dropped")
+    if e.reason == "deadline":
+        return HTTPException(status_code=504, detail=f"Request {request_id} exceeded its deadline")
+    return HTTPException(status_code=499, detail=f"Request {request_id} {e.reason}")
+
+
+def select_candidates(request: EvaluateRequest) -> List[int]:
+    """Indices of the professors to evaluate with the LLM (blocking, run in a thread)"""
+    enabled = PRERANK_ENABLED if request.prerank is None else request.prerank
+    if not enabled:
+        return list(range(len(request.professors)))
+    top_k = PRERANK_TOP_K if request.prerank_top_k is None else request.prerank_top_k
+    min_score = PRERANK_MIN_SCORE if request.prerank_min_score is None else request.prerank_min_score
+    selection = prerank(request.professors, request.research_direction, top_k or None, min_score)
+    PRERANK_SKIPPED.inc(len(selection.skipped))
+    return selection.kept
+
+
+def skipped_result(cascading: bool = False) -> EvaluationResult:
+    """Result for a professor that pre-ranking kept away from the LLM (not evaluated, no score)"""
+    return EvaluationResult(
+        score=None,
+        reasoning="Not evaluated: pre-ranking found too little overlap with the research direction",
+        researchSummary="Not evaluated by the model",
+        evaluated=False,
+        decided_by="prerank" if cascading else None
+    )
+
+
+def cascade_band(request: EvaluateRequest, model_id: Optional[str]) -> Optional[float]:
+    """
+    Uncertainty band around the threshold for a cascade request on model_id
+    
+    Returns:
+        Band half-width, or None if the request is not cascaded
+    
+    Raises:
+        HTTPException: If cascade mode is requested but no cascade model is configured
+    """
+    if request.cascade is False:
+        return None
+    if cascade_runtime is None:
+        if request.cascade:
+            raise HTTPException(status_code=400, detail="Cascade mode needs CASCADE_MODEL to be set on the server")
+        return None
+    if model_id == CASCADE_MODEL:
+        return None
+    return CASCADE_BAND if request.cascade_band is None else request.cascade_band
+
+
+def is_uncertain(result: EvaluationResult, is_valid: bool, threshold: float, band: float) -> bool:
+    """Whether a first-tier result is re-scored by the cascade model"""
+    return not is_valid or abs(result.score - threshold) <= band
+
+
+async def load_cascade_model() -> bool:
+    """Load the cascade model if it is not loaded yet; False if loading fails"""
+    async with _cascade_load_lock:
+        if cascade_runtime.engine.get_current_model() == CASCADE_MODEL:
+            return True
+        try:
+            logger.info(f"📥 Loading cascade model {CASCADE_MODEL}")
+            await cascade_runtime.engine.load_model(CASCADE_MODEL)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Cascade model {CASCADE_MODEL} could not be loaded, keeping first-tier scores: {e}")
+            return False
+
+
+def pick_cascade_result(
+    first: EvaluationResult,
+    first_valid: bool,
+    second: EvaluationResult,
+    second_valid: bool
+) -> Tuple[EvaluationResult, bool]:
+    """Prefer the cascade model's result unless it is invalid and the first tier's is not"""
+    if second_valid or not first_valid:
+        second.decided_by = CASCADE_MODEL
+        return second, second_valid
+    return first, first_valid
+
+
+async def evaluate_professors(
+    request: EvaluateRequest,
+    runtime: ModelRuntime,
+    professors: List[Professor],
+    band: Optional[float]
+) -> Tuple[List[EvaluationResult], List[bool], EvaluationStats, int]:
+    """
+    Evaluate professors on a model, re-scoring uncertain ones on the cascade model
+    
+    Returns:
+        (results, validity flags, first-tier stats, professors cascaded)
+    """
+    evaluated, valid, stats = await runtime.evaluate(request, professors)
+    if band is None:
+        return evaluated, valid, stats, 0
+    
+    model_name = runtime.engine.get_current_model()
+    for result in evaluated:
+        result.decided_by = model_name
+    uncertain = [
+        i for i, (result, is_valid) in enumerate(zip(evaluated, valid))
+        if is_uncertain(result, is_valid, request.threshold, band)
+    ]
+    if not uncertain or not await load_cascade_model():
+        return evaluated, valid, stats, 0
+    
+    logger.info(f"🪜 Cascading {len(uncertain)}/{len(evaluated)} professors to {CASCADE_MODEL}")
+    rescored, rescored_valid, _ = await cascade_runtime.evaluate(
+        request, [professors[i] for i in uncertain]
+    )
+    for i, result, is_valid in zip(uncertain, rescored, rescored_valid):
+        evaluated[i], valid[i] = pick_cascade_result(evaluated[i], valid[i], result, is_valid)
+    return evaluated, valid, stats, len(uncertain)
+
+
+async def read_evaluate_request(http_request: Request) -> EvaluateRequest:
+    """
+    EvaluateRequest from a JSON or msgpack body, optionally gzip/zstd-compressed
+    
+    Raises:
+        HTTPException: 413 for bodies over MAX_REQUEST_BODY_BYTES (also after
+            decompression), 415 for unsupported formats, 400 for undecodable bodies
+        RequestValidationError: If the body does not fit EvaluateRequest (422)
+    """
+    body = await http_request.body()
+    try:
+        return await asyncio.to_thread(
+            wire_format.parse_model, EvaluateRequest, body,
+            http_request.headers.get("content-type"), http_request.headers.get("content-encoding"),
+            MAX_REQUEST_BODY_BYTES
+        )
+    except BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedFormat as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post(
+    "/evaluate_batch",
+    response_model=EvaluateResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        media_type: {"schema": {"$ref": "#/components/schemas/EvaluateRequest"}}
+        for media_type in (wire_format.JSON, wire_format.MSGPACK)
+    }}}
+)
+async def evaluate_batch(http_request: Request, request: EvaluateRequest = Depends(read_evaluate_request)):
+    """
+    Evaluate a batch of professors (GPU-accelerated batch inference)
+    
+    This is the core endpoint that processes multiple professors in parallel
+    using vLLM's efficient batch inference. Prompts are queued on the shared
+    scheduler so concurrent requests fill the same engine batches. In cascade
+    mode, professors scored close to the threshold are re-scored by the
+    cascade model. Professors can be named by id (professor_ids) instead of
+    being sent in full.
+    
+    Bodies can be JSON or msgpack and gzip- or zstd-compressed; the response
+    follows the Accept and Accept-Encoding headers.
+    """
+    resolve_professors(request)
+    deadline = request_deadline(request)
+    band = cascade_band(request, request.model or pool.request_model())
+    request_id = register_request(http_request)
+    try:
+        admitted = admit_request(http_request, request)
+    except HTTPException:
+        active_requests.remove(request_id)
+        raise
+    try:
+        lease = await acquire_model(request)
+    except BaseException:
+        finish_request(request_id, admitted)
+        raise
+    runtime = lease.runtime
+    model_name = runtime.engine.get_current_model()
     
     try:
         start_time = time.time()
         
-        # Build prompts for all professors
-        logger.info(f"📊 Building prompts for {len(request.professors)} professors")
-        prompts = [
-            build_evaluation_prompt(prof, request.research_direction, use_strict_prompts=True, scoring_scheme=getattr(request, 'scoring_scheme', 'original'))
-            for prof in request.professors
-        ]
-        
-        # Batch inference (vLLM handles parallelization)
-        logger.info(f"🚀 Running batch inference ({len(prompts)} prompts)")
-        outputs = llm_engine.generate_batch(prompts)
+        # Only professors with lexical evidence of a match go to the LLM
+        with PRERANK_SECONDS.time():
+            kept = await asyncio.to_thread(select_candidates, request)
+        skipped_count = len(request.professors) - len(kept)
+        professors = [request.professors[i] for i in kept]
+        logger.info(
+            f"📊 Evaluating {len(kept)} professors ({skipped_count} skipped by pre-ranking)"
+        )
         
-        # Parse and validate results
-        logger.info(f"📝 Parsing {len(outputs)} outputs")
-        results = []
-        invalid_count = 0
+        # Cascade: professors near the threshold are re-scored on the larger model.
+        # A deadline, disconnect or cancel drops the remaining prompts.
+        evaluated, valid, stats, cascade_count = await active_requests.run(
+            request_id, evaluate_professors(request, runtime, professors, band),
+            deadline, http_request.is_disconnected
+        )
+        cascade_model = CASCADE_MODEL if cascade_count else None
         
-        for i, output in enumerate(outputs):
-            text = llm_engine.extract_text(output)
-            
-            # Validate output quality
-            is_valid, error_msg = validate_llm_response(text)
-            
-            if not is_valid:
-                invalid_count += 1
-                logger.warning(f"⚠️ Invalid output for professor {i}: {error_msg}")
-                logger.warning(f"   Raw output (first 200 chars): {text[:200]}")
-                
-                # Use fallback response for invalid output
-                parsed = {
-                    "score": 0.0,
-                    "reasoning": f"Invalid model output: {error_msg}",
-                    "researchSummary": "Unable to analyze due to invalid model response"
-                }
-            else:
-                # Parse valid output
-                parsed = parse_llm_response(text)
-            
-            results.append(EvaluationResult(**parsed))
-        
-        if invalid_count > 0:
-            logger.warning(f"⚠️ {invalid_count}/{len(outputs)} outputs were invalid and replaced with fallback")
+        # Put evaluated results back in request order around the skipped professors
+        results = evaluated
+        if skipped_count:
+            results = [skipped_result(band is not None) for _ in request.professors]
+            for i, result in zip(kept, evaluated):
+                results[i] = result
         
         processing_time = time.time() - start_time
+        REQUEST_SECONDS.labels(endpoint="evaluate_batch").observe(processing_time)
         
         # Log statistics
-        matched_count = sum(1 for r in results if r.score >= request.threshold)
-        avg_score = sum(r.score for r in results) / len(results) if results else 0
+        matched_count = sum(1 for r in evaluated if r.score >= request.threshold)
+        avg_score = sum(r.score for r in evaluated) / len(evaluated) if evaluated else 0
+        prefix_hit_rate = runtime.engine.prefix_cache_hit_rate(stats.outputs)
         
         logger.info(
             f"✅ Batch complete: {len(results)} professors in {processing_time:.2f}s "
-            f"| Matched: {matched_count} | Avg score: {avg_score:.2f}"
+            f"| Matched: {matched_count} | Avg score: {avg_score:.2f} "
+            f"| Cache hits: {stats.cache_hits} "
+            f"| Skipped: {skipped_count}"
+            + (f" | Coalesced: {stats.coalesced_count}" if stats.coalesced_count else "")
+            + (f" | Cascaded: {cascade_count}" if band is not None else "")
+            + (f" | Prefix cache hit rate: {prefix_hit_rate:.1%}" if prefix_hit_rate is not None else "")
         )
         
-        return EvaluateResponse(
+        response = EvaluateResponse(
             results=results,
             processing_time=processing_time,
-            model_name=llm_engine.get_current_model()
+            model_name=model_name,
+            cache_hits=stats.cache_hits,
+            coalesced_count=stats.coalesced_count,
+            prefix_cache_hit_rate=prefix_hit_rate,
+            trimmed_count=stats.trimmed_count,
+            retry_count=stats.retry_count,
+            repaired_count=stats.repaired_count,
+            prerank_skipped=skipped_count,
+            cascade_model=cascade_model,
+            cascade_count=cascade_count
         )
+        rendered = wire_format.render(
+            response.model_dump(),
+            http_request.headers.get("accept"), http_request.headers.get("accept-encoding")
+        )
+        rendered.headers["X-Request-Id"] = request_id
+        return rendered
+    
+    except RequestAborted as e:
+        raise aborted_error(request_id, e)
     
     except Exception as e:
         logger.error(f"❌ Evaluation failed: {e}", exc_info=True)
@@ -200,6 +699,403 @@ async def evaluate_batch(request: EvaluateRequest):
             status_code=500,
             detail=f"Evaluation failed: {str(e)}"
         )
+    
+    finally:
+        pool.release(lease)
+        finish_request(request_id, admitted)
+
+
+@app.post("/evaluate_stream")
+async def evaluate_stream(http_request: Request, request: EvaluateRequest):
+    """
+    Evaluate a batch of professors and stream results as they finish
+    
+    Responds with newline-delimited JSON. Each professor produces one
+    ``{"type": "result", "index": i, "result": {...}}`` frame as soon as its
+    sequence completes (in completion order, not request order), followed by
+    a final ``{"type": "summary", ...}`` frame with timing information. In
+    cascade mode, results near the threshold are sent once the cascade model
+    has re-scored them. A request cancelled or past its deadline ends with an
+    ``{"type": "error", ...}`` frame.
+    """
+    resolve_professors(request)
+    deadline = request_deadline(request)
+    band = cascade_band(request, request.model or pool.request_model())
+    request_id = register_request(http_request)
+    try:
+        admitted = admit_request(http_request, request)
+    except HTTPException:
+        active_requests.remove(request_id)
+        raise
+    
+    try:
+        start_time = time.time()
+        with PRERANK_SECONDS.time():
+            kept = await asyncio.to_thread(select_candidates, request)
+        kept_set = set(kept)
+        skipped = [i for i in range(len(request.professors)) if i not in kept_set]
+        professors = [request.professors[i] for i in kept]
+        logger.info(
+            f"📊 Evaluating {len(kept)} professors "
+            f"({len(skipped)} skipped by pre-ranking, streaming)"
+        )
+        lease = await acquire_model(request)
+    except BaseException:
+        finish_request(request_id, admitted)
+        raise
+    runtime = lease.runtime
+    model_name = runtime.engine.get_current_model()
+    stats = EvaluationStats()
+    cascade_count = 0
+    cascade_model = None
+    
+    def release_model_and_admission() -> None:
+        pool.release(lease)
+        finish_request(request_id, admitted)
+    
+    release = run_once(release_model_and_admission)
+    
+    async def final_results() -> AsyncIterator[Tuple[int, EvaluationResult, bool]]:
+        """(request index, result, is_valid) for every professor once its score is final"""
+        nonlocal cascade_count, cascade_model
+        
+        # Skipped professors go out immediately
+        for index in skipped:
+            yield index, skipped_result(band is not None), True
+        
+        held: Dict[int, Tuple[EvaluationResult, bool]] = {}
+        async for local_index, result, is_valid in runtime.evaluate_as_completed(request, professors, stats):
+            if band is not None:
+                result.decided_by = model_name
+                if is_uncertain(result, is_valid, request.threshold, band):
+                    # Held back for the cascade model
+                    held[local_index] = (result, is_valid)
+                    continue
+            yield kept[local_index], result, is_valid
+        
+        if held and await load_cascade_model():
+            logger.info(f"🪜 Cascading {len(held)}/{len(professors)} professors to {CASCADE_MODEL}")
+            held_indices = list(held)
+            cascade_count = len(held_indices)
+            cascade_model = CASCADE_MODEL
+            async for j, result, is_valid in cascade_runtime.evaluate_as_completed(
+                request, [professors[i] for i in held_indices], EvaluationStats()
+            ):
+                local_index = held_indices[j]
+                first, first_valid = held.pop(local_index)
+                result, is_valid = pick_cascade_result(first, first_valid, result, is_valid)
+                yield kept[local_index], result, is_valid
+        
+        # First-tier scores stand if the cascade model is unavailable
+        for local_index, (result, is_valid) in held.items():
+            yield kept[local_index], result, is_valid
+    
+    async def frames():
+        invalid_count = 0
+        first_result_time = None
+        # Streaming runs in another task, so the lane is set again here
+        request_lane.set(admitted[:2])
+        
+        try:
+            # Each result is awaited under the request's deadline and cancel;
+            # a client disconnect cancels the whole stream
+            results = final_results()
+            while True:
+                try:
+                    index, result, is_valid = await active_requests.run(request_id, results.__anext__(), deadline)
+                except StopAsyncIteration:
+                    break
+                if not is_valid:
+                    invalid_count += 1
+                if first_result_time is None:
+                    first_result_time = time.time() - start_time
+                yield EvaluationStreamResult(index=index, result=result).model_dump_json() + "\n"
+        
+        except RequestAborted as e:
+            error = aborted_error(request_id, e)
+            yield json.dumps({"type": "error", "status": error.status_code, "detail": error.detail}) + "\n"
+            return
+        
+        except Exception as e:
+            logger.error(f"❌ Streaming evaluation failed: {e}", exc_info=True)
+            yield json.dumps({"type": "error", "detail": f"Evaluation failed: {str(e)}"}) + "\n"
+            return
+        
+        finally:
+            # The summary below needs no model, so the pool may evict it now
+            release()
+        
+        processing_time = time.time() - start_time
+        REQUEST_SECONDS.labels(endpoint="evaluate_stream").observe(processing_time)
+        logger.info(
+            f"✅ Stream complete: {len(request.professors)} professors in {processing_time:.2f}s "
+            f"| First result after {first_result_time or 0:.2f}s"
+        )
+        
+        yield EvaluationStreamSummary(
+            count=len(request.professors),
+            invalid_count=invalid_count,
+            cache_hits=stats.cache_hits,
+            coalesced_count=stats.coalesced_count,
+            trimmed_count=stats.trimmed_count,
+            retry_count=stats.retry_count,
+            repaired_count=stats.repaired_count,
+            prerank_skipped=len(skipped),
+            cascade_model=cascade_model,
+            cascade_count=cascade_count,
+            processing_time=processing_time,
+            time_to_first_result=first_result_time,
+            prefix_cache_hit_rate=runtime.engine.prefix_cache_hit_rate(stats.outputs),
+            model_name=model_name
+        ).model_dump_json() + "\n"
+
+    # frames() only cleans up if it is iterated: the background task covers a
+    # stream that never started, the finalizer a response that was never sent
+    response = StreamingResponse(
+        frames(), media_type="application/x-ndjson", headers={"X-Request-Id": request_id},
+        background=BackgroundTask(release)
+    )
+    weakref.finalize(response, release)
+    return response
+
+
+def prescreen_job(request: EvaluateRequest) -> Dict[int, EvaluationResult]:
+    """Results of an evaluation job decided by pre-ranking alone (blocking, run in a thread)"""
+    kept = set(select_candidates(request))
+    cascading = cascade_band(request, request.model) is not None
+    return {
+        i: skipped_result(cascading)
+        for i in range(len(request.professors)) if i not in kept
+    }
+
+
+async def evaluate_job_batch(request: EvaluateRequest) -> List[EvaluationResult]:
+    """Evaluate one batch of an evaluation job on the job's model (bulk lane, not admission-controlled)"""
+    request_lane.set((BULK, "jobs"))
+    band = cascade_band(request, request.model)
+    lease = await pool.acquire(request.model, MODEL_LOAD_WAIT_S)
+    try:
+        results, _, _, _ = await evaluate_professors(request, lease.runtime, request.professors, band)
+        return results
+    finally:
+        pool.release(lease)
+
+
+# Region-scale evaluations that run on the server and resume after restarts
+jobs = JobManager(
+    JOB_DIR, professor_store, evaluate_job_batch, prescreen_job, JOB_BATCH_SIZE,
+    concurrency=JOB_CONCURRENCY, history=JOB_HISTORY
+)
+
+
+def get_job(job_id: str) -> EvaluationJob:
+    """Look up an evaluation job or fail with 404"""
+    job = jobs.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown evaluation job: {job_id}")
+    return job
+
+
+@app.post("/jobs", response_model=EvaluationJobResponse)
+async def create_job(request: EvaluationJobRequest):
+    """
+    Evaluate every professor of some regions that passes the filters
+    
+    The server reads the region files, evaluates the selection in batches
+    on the request's model (the default model if none is named) and
+    checkpoints every batch, so the job keeps running without the client
+    and resumes after a restart. Poll /jobs/{job_id} or stream
+    /jobs/{job_id}/events, then page through /jobs/{job_id}/results.
+    """
+    model_id = request.model or pool.request_model()
+    if model_id is None:
+        raise HTTPException(status_code=400, detail="No model loaded. Call /load_model first.")
+    if model_id not in AVAILABLE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model: {model_id}")
+    cascade_band(request, model_id)  # Rejects cascade mode without a cascade model
+    
+    try:
+        job = await jobs.submit(request, model_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return EvaluationJobResponse(**job.to_dict())
+
+
+@app.get("/jobs", response_model=List[EvaluationJobResponse])
+async def list_jobs():
+    """Evaluation jobs, oldest first"""
+    return [EvaluationJobResponse(**job.to_dict()) for job in jobs.jobs.values()]
+
+
+@app.get("/jobs/{job_id}", response_model=EvaluationJobResponse)
+async def get_job_status(job_id: str):
+    """Progress of an evaluation job"""
+    return EvaluationJobResponse(**get_job(job_id).to_dict())
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Stream an evaluation job's progress
+    
+    Responds with newline-delimited JSON: the job's status now and after
+    every checkpointed batch, ending with its final state.
+    """
+    job = get_job(job_id)
+    
+    async def frames():
+        async for status in jobs.watch(job):
+            yield EvaluationJobResponse(**status).model_dump_json() + "\n"
+    
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+
+@app.get("/jobs/{job_id}/results", response_model=EvaluationJobResults)
+async def get_job_results(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    order: Literal["score", "index"] = "score",
+    min_score: Optional[float] = None
+):
+    """
+    One page of an evaluation job's results, available while it runs
+    
+    Results are ordered best score first (or in selection order with
+    order=index); min_score keeps only results scoring at least that.
+    """
+    job = get_job(job_id)
+    total, records = jobs.page(job, offset, limit, order, min_score)
+    return EvaluationJobResults(
+        job_id=job.id,
+        state=job.state,
+        total=total,
+        offset=offset,
+        limit=limit,
+        results=[EvaluationJobResult(**record) for record in records]
+    )
+
+
+@app.post("/jobs/{job_id}/resume", response_model=EvaluationJobResponse)
+async def resume_job(job_id: str):
+    """Queue a failed or cancelled job again; finished professors are kept"""
+    job = get_job(job_id)
+    if job.state not in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.state}")
+    await jobs.resume(job)
+    return EvaluationJobResponse(**job.to_dict())
+
+
+@app.delete("/jobs/{job_id}", response_model=EvaluationJobResponse)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; its results so far are kept"""
+    job = get_job(job_id)
+    await jobs.cancel(job)
+    return EvaluationJobResponse(**job.to_dict())
+
+
+@app.get("/evaluations")
+async def list_evaluations():
+    """Ids of the running /evaluate_batch and /evaluate_stream requests"""
+    return {"running": active_requests.ids()}
+
+
+@app.delete("/evaluations/{request_id}")
+async def cancel_evaluation(request_id: str):
+    """
+    Cancel a running evaluation by its X-Request-Id
+    
+    Its queued prompts are dropped and its sequences on the engine aborted;
+    the request itself ends with 499 (or an error frame when streaming).
+    """
+    try:
+        active_requests.cancel(request_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    logger.info(f"🛑 Cancelling request {request_id}")
+    return {"request_id": request_id, "status": "cancelling"}
+
+
+@app.get("/professors/{professor_id}", response_model=Professor)
+async def get_professor(professor_id: str):
+    """A stored professor with its uploaded publication list"""
+    try:
+        return professor_store.professor(professor_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.post("/professors/publications")
+async def upload_publications(request: PublicationsUpload):
+    """
+    Keep professors' publication lists in the professor store
+    
+    Requests that name these professors by id get the lists in their
+    prompts. The lists are persisted and survive restarts; a later upload
+    for the same professor replaces the earlier one.
+    """
+    try:
+        stored = await asyncio.to_thread(professor_store.set_publications, request.publications)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "stored", "stored": stored, **professor_store.stats()}
+
+
+@app.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve(request: RetrieveRequest):
+    """
+    Professors nearest to a research direction in the vector index
+    
+    Scores every indexed professor (or those in the requested regions) by
+    cosine similarity without reading the region files, so the result can
+    seed /evaluate_batch with a short candidate list.
+    """
+    if vector_index is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Vector index not built. Run scripts/build-vector-index.py and restart."
+        )
+    
+    start_time = time.perf_counter()
+    try:
+        hits = await asyncio.to_thread(
+            vector_index.search, [request.research_direction], request.top_n, request.regions
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query_time = time.perf_counter() - start_time
+    REQUEST_SECONDS.labels(endpoint="retrieve").observe(query_time)
+    
+    return RetrieveResponse(
+        results=[RetrievedProfessor(**hit) for hit in hits[0]],
+        query_time_ms=query_time * 1000,
+        index_size=len(vector_index),
+        encoder=vector_index.encoder.spec
+    )
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+    """Result cache hit/miss counters"""
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(result_cache.stats)}
+
+
+@app.post("/clear_cache")
+async def clear_cache():
+    """Drop all cached evaluation results"""
+    if result_cache is None:
+        return {"status": "disabled", "message": "Result cache is disabled"}
+    await asyncio.to_thread(result_cache.clear)
+    return {"status": "cleared", "message": "Result cache cleared"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (latency histograms, throughput, queue depth)"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, headers={"Content-Type": content_type})
 
 
 @app.get("/")
@@ -208,14 +1104,25 @@ async def root():
     return {
         "message": "CSProfAlign vLLM Backend",
         "status": "running",
-        "model_loaded": llm_engine.is_loaded(),
-        "current_model": llm_engine.get_current_model(),
+        "model_loaded": pool.model_state(pool.request_model()) == "ready",
+        "current_model": pool.request_model(),
         "endpoints": {
             "health": "/health",
             "models": "/models",
             "load_model": "/load_model (POST)",
             "unload_model": "/unload_model (POST)",
-            "evaluate_batch": "/evaluate_batch (POST)"
+            "load_jobs": "/load_jobs/{job_id}",
+            "pool": "/pool",
+            "queue": "/queue",
+            "evaluate_batch": "/evaluate_batch (POST)",
+            "evaluate_stream": "/evaluate_stream (POST, NDJSON)",
+            "evaluations": "/evaluations, /evaluations/{request_id} (DELETE)",
+            "jobs": "/jobs (POST), /jobs/{job_id}, /jobs/{job_id}/results",
+            "professors": "/professors/{professor_id}, /professors/publications (POST)",
+            "retrieve": "/retrieve (POST)",
+            "cache_stats": "/cache_stats",
+            "clear_cache": "/clear_cache (POST)",
+            "metrics": "/metrics"
         }
     }
 
@@ -0,0 +1,91 @@
+"""
+Single-flight coalescing of identical in-flight evaluations
+While a prompt is queued or generating, requests with the same prompt (same
+result cache key: model, sampling, scoring scheme and prompt hash) attach to
+its pending result instead of submitting another sequence. The result cache
+covers the same prompt once it has finished.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from models import EvaluationResult
+
+
+class InFlightResults:
+    """
+    Pending results by cache key, for one event loop
+
+    Each pending result is a future resolving to (result, is_valid). It is
+    cancelled if the request generating it fails or is cancelled.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0  # Prompts served from another request's sequence
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def claim(
+        self,
+        keys: List[str],
+        indices: List[int]
+    ) -> Tuple[Dict[int, asyncio.Future], Dict[int, asyncio.Future]]:
+        """
+        Split prompts into those the caller generates and those already pending
+
+        A key pending in another request, or repeated within this one, makes
+        the prompt a follower of that result. Every other prompt becomes the
+        caller's: it must settle() or release() each of them.
+
+        Returns:
+            (owned, followed) - index -> pending result for each group
+        """
+        owned: Dict[int, asyncio.Future] = {}
+        followed: Dict[int, asyncio.Future] = {}
+        if not self.enabled:
+            return {i: None for i in indices}, followed
+        loop = asyncio.get_running_loop()
+        for i in indices:
+            future = self._pending.get(keys[i])
+            if future is None:
+                future = self._pending[keys[i]] = loop.create_future()
+                owned[i] = future
+            else:
+                followed[i] = future
+        return owned, followed
+
+    def settle(self, key: str, future: asyncio.Future, result: EvaluationResult, is_valid: bool) -> None:
+        """Hand an owned prompt's final result to its followers"""
+        if future is None:
+            return
+        if self._pending.get(key) is future:
+            del self._pending[key]
+        if not future.done():
+            # A copy: the owner may still change its own result (cascade labels)
+            future.set_result((result.model_copy(), is_valid))
+
+    def release(self, key: str, future: asyncio.Future) -> None:
+        """Give up an owned prompt without a result; its followers generate it themselves"""
+        if future is None:
+            return
+        if self._pending.get(key) is future:
+            del self._pending[key]
+        if not future.done():
+            future.cancel()
+
+    async def wait(self, future: asyncio.Future) -> Optional[Tuple[EvaluationResult, bool]]:
+        """
+        Result of a followed prompt, copied so the caller may change it
+
+        Returns:
+            (result, is_valid), or None if the request generating it gave up
+        """
+        await asyncio.wait([future])
+        if future.cancelled():
+            return None
+        result, is_valid = future.result()
+        self.coalesced += 1
+        return result.model_copy(), is_valid
@@ -0,0 +1,172 @@
+"""
+Deterministic stand-in inference engine
+Mimics LLMEngine without vLLM or a GPU so the full server stack can run on
+CPU-only machines (load tests, CI). Select it with INFERENCE_ENGINE=stub.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import logging
+import time
+from typing import Callable, List, Optional
+
+from config import MAX_NEW_TOKENS, STUB_INVALID_RATE, STUB_LOAD_SECONDS, STUB_MEMORY_TOKENS, STUB_SECONDS_PER_TOKEN
+from engine_base import Aborted, CompletionOutput, EngineOutput, InferenceEngine, LoadProgress, sleep_unless_aborted
+from model_catalog import AVAILABLE_MODELS
+
+logger = logging.getLogger(__name__)
+
+_WORDS = [
+    "strong", "overlap", "with", "the", "research", "direction", "recent", "work",
+    "on", "learning", "systems", "theory", "publications", "in", "top", "venues",
+    "limited", "related", "focus", "applications"
+]
+
+# Sampling "parameters" only need to be distinguishable (cache keys, repair)
+_DEFAULT_SAMPLING = {"engine": "stub", "mode": "default"}
+_RETRY_SAMPLING = {"engine": "stub", "mode": "retry"}
+
+
+def approx_tokens(text: str) -> int:
+    """Rough BPE token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _digest(prompt: str) -> int:
+    """Stable 64-bit hash of a prompt"""
+    return int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+
+
+def stub_text(prompt: str, strict: bool = False, invalid_rate: float = 0.0) -> str:
+    """
+    Deterministic model output for a prompt
+
+    Args:
+        prompt: Rendered prompt
+        strict: Always return well-formed JSON (as guided decoding would)
+        invalid_rate: Fraction of prompts that get a degenerate output
+    """
+    digest = _digest(prompt)
+    if not strict and (digest % 10000) / 10000 < invalid_rate:
+        return "*" * 40
+    score = (digest >> 16) % 101 / 100
+    length = 8 + (digest >> 24) % 40
+    reasoning = " ".join(_WORDS[(digest >> (i % 48)) % len(_WORDS)] for i in range(length))
+    return (
+        f'{{"score": {score:.2f}, "reasoning": "{reasoning.capitalize()}.", '
+        f'"research_summary": "Works on {_WORDS[(digest >> 32) % len(_WORDS)]} topics."}}'
+    )
+
+
+class StubEngine(InferenceEngine):
+    """
+    Inference engine with deterministic outputs
+
+    Outputs depend only on the prompt, so repeated runs give identical
+    results. Generation simulates batched decoding: every sequence advances
+    one token per step of ``seconds_per_token``, so a batch takes as long as
+    its longest output regardless of how many prompts it holds. Batches
+    larger than ``memory_tokens`` fail as if the device ran out of memory.
+    """
+
+    def __init__(
+        self,
+        seconds_per_token: float = STUB_SECONDS_PER_TOKEN,
+        invalid_rate: float = STUB_INVALID_RATE,
+        memory_tokens: int = STUB_MEMORY_TOKENS
+    ):
+        super().__init__()
+        self.seconds_per_token = max(0.0, seconds_per_token)
+        self.invalid_rate = invalid_rate
+        self.memory_tokens = max(0, memory_tokens)
+        self._request_counter = itertools.count()
+
+    def is_loaded(self) -> bool:
+        """Check if model is loaded"""
+        return self.current_model is not None
+
+    async def load_model(self, model_id: str, progress: Optional[LoadProgress] = None) -> None:
+        """
+        Pretend to load a model from the catalog (taking STUB_LOAD_SECONDS)
+
+        Raises:
+            ValueError: If model_id is not recognized
+        """
+        if model_id not in AVAILABLE_MODELS:
+            raise ValueError(
+                f"Unknown model: {model_id}. "
+                f"Available: {list(AVAILABLE_MODELS.keys())}"
+            )
+        for stage in ("downloading", "initializing"):
+            if progress is not None:
+                progress(stage)
+            await asyncio.sleep(STUB_LOAD_SECONDS / 2)
+        self.current_model = model_id
+        self.sampling_params = _DEFAULT_SAMPLING
+        self.retry_sampling_params = _RETRY_SAMPLING
+        logger.info(f"✅ Stub model loaded: {model_id} ({self.seconds_per_token * 1000:.1f}ms/token)")
+
+    async def unload_model(self) -> None:
+        """Forget the loaded model"""
+        self.current_model = None
+        self.sampling_params = None
+        self.retry_sampling_params = None
+        await asyncio.sleep(0)
+
+    def _outputs(self, prompts: List[str], sampling_params: Optional[List]) -> List[EngineOutput]:
+        """Build the outputs for a batch without simulating any latency"""
+        if self.current_model is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        outputs = []
+        for i, prompt in enumerate(prompts):
+            strict = sampling_params is not None and sampling_params[i] is _RETRY_SAMPLING
+            text = stub_text(prompt, strict=strict, invalid_rate=self.invalid_rate)
+            outputs.append(EngineOutput(
+                f"stub-{next(self._request_counter)}",
+                prompt,
+                list(range(approx_tokens(prompt))),
+                CompletionOutput(text, list(range(min(approx_tokens(text), MAX_NEW_TOKENS))))
+            ))
+        if self.memory_tokens:
+            batch_tokens = sum(len(o.prompt_token_ids) + self.generated_tokens(o) for o in outputs)
+            if batch_tokens > self.memory_tokens:
+                raise RuntimeError(
+                    f"CUDA out of memory (stub): batch of {batch_tokens} tokens exceeds {self.memory_tokens}"
+                )
+        return outputs
+
+    def generate_batch(self, prompts: List[str], sampling_params: Optional[List] = None) -> List[EngineOutput]:
+        """Generate outputs for a batch, sleeping for the simulated decode time"""
+        outputs = self._outputs(prompts, sampling_params)
+        if outputs and self.seconds_per_token:
+            time.sleep(max(self.generated_tokens(o) for o in outputs) * self.seconds_per_token)
+        return outputs
+
+    def generate_stream(
+        self,
+        prompts: List[str],
+        on_output: Callable[[int, EngineOutput], None],
+        sampling_params: Optional[List] = None,
+        aborted: Optional[Aborted] = None
+    ) -> None:
+        """Report outputs shortest-first, each after its simulated decode time; stop once all are aborted"""
+        outputs = self._outputs(prompts, sampling_params)
+        order = sorted(range(len(outputs)), key=lambda i: self.generated_tokens(outputs[i]))
+        elapsed_tokens = 0
+        for position, index in enumerate(order):
+            if aborted is not None and aborted(index):
+                continue
+            tokens = self.generated_tokens(outputs[index])
+            if tokens > elapsed_tokens and self.seconds_per_token:
+                seconds = (tokens - elapsed_tokens) * self.seconds_per_token
+                if sleep_unless_aborted(seconds, order[position:], aborted):
+                    return
+            elapsed_tokens = max(elapsed_tokens, tokens)
+            on_output(index, outputs[index])
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Approximate token counts"""
+        if self.current_model is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        return [approx_tokens(text) for text in texts]
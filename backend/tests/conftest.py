@@ -0,0 +1,95 @@
+"""
+Shared test setup
+The backend is a flat set of modules run from backend/, so tests import them
+by name the same way.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# benchmarks/ holds the frozen legacy implementations the equivalence tests compare against
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "benchmarks")]
+
+# config.py reads the environment on import: run the server on the stub
+# engine and keep every cache and checkpoint out of the source tree
+_state_dir = tempfile.mkdtemp(prefix="csprofalign-tests-")
+for name, value in {
+    "INFERENCE_ENGINE": "stub",
+    "STUB_SECONDS_PER_TOKEN": "0",
+    "RESULT_CACHE_PATH": "",
+    "PROFESSOR_PUBLICATIONS_PATH": "",
+    "BATCH_TUNING_PATH": "",
+    "JOB_DIR": os.path.join(_state_dir, "jobs"),
+    "VECTOR_INDEX_DIR": os.path.join(_state_dir, "vector-index"),
+}.items():
+    os.environ.setdefault(name, value)
+
+TEST_MODEL = "qwen-0.5b"  # Catalog model the stub engine "loads"
+
+
+def write_region(data_dir, region, professors):
+    """Write a professors-<region>.json file like load-local-data.py does"""
+    with open(os.path.join(data_dir, f"professors-{region}.json"), "w", encoding="utf-8") as f:
+        json.dump({"region": region, "count": len(professors), "professors": professors}, f)
+
+
+def run_with_runtime(scenario, invalid_rate=0.0):
+    """Run ``scenario(runtime)`` on a started ModelRuntime of TEST_MODEL, outside the server"""
+    from llm_engine import LLMEngine
+    from model_runtime import ModelRuntime
+
+    async def main():
+        runtime = ModelRuntime(LLMEngine())
+        await runtime.engine.load_model(TEST_MODEL)
+        runtime.engine.engine.invalid_rate = invalid_rate
+        await runtime.start()
+        try:
+            return await scenario(runtime)
+        finally:
+            await runtime.stop()
+            await runtime.engine.unload_model()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def region_dir(tmp_path):
+    """Data directory with two small regions"""
+    write_region(tmp_path, "europe", [
+        {
+            "name": "Ada Example", "affiliation": "ETH Zurich", "homepage": "", "scholarid": "NOSCHOLARPAGE",
+            "publications": {"iclr": {"2024": 0.64, "2019": 1.0}, "icml": {"2023": 2.0}},
+            "areas": ["iclr", "icml"], "total_papers_recent": 3
+        },
+        {
+            "name": "Bo Sample", "affiliation": "University of Oxford", "homepage": "", "scholarid": "NOSCHOLARPAGE",
+            "publications": {"sigmod": {"2022": 1.5}},
+            "areas": ["sigmod"], "total_papers_recent": 2
+        }
+    ])
+    write_region(tmp_path, "canada", [
+        {
+            "name": "Cy Test", "affiliation": "University of Toronto", "homepage": "", "scholarid": "abc",
+            "publications": {"cvpr": {"2021": 1.0}},
+            "areas": ["cvpr"], "total_papers_recent": 1
+        }
+    ])
+    return str(tmp_path)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client of the server, started once with the default model loaded"""
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as test_client:
+        test_client.post("/load_model", json={"model_id": TEST_MODEL, "wait": True})
+        yield test_client
@@ -0,0 +1,68 @@
+import pytest
+
+from admission import DEFAULT_RETRY_AFTER, AdmissionController, Overloaded
+from scheduler import BULK, INTERACTIVE
+
+PROFESSORS = [
+    {"name": f"Admitted Person {i}", "affiliation": "U", "publicationList": [
+        {"title": f"Queueing paper {i}", "year": 2024, "venue": "osdi"}
+    ]} for i in range(3)
+]
+
+
+def make_controller(**overrides):
+    settings = {"max_prompts": 10, "bulk_share": 0.5, "client_share": 0.6, "weights": {}}
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+
+def test_limits_apply_per_server_lane_and_client():
+    admission = make_controller()
+    admission.admit(INTERACTIVE, "a", 6)
+    with pytest.raises(Overloaded, match="client a"):
+        admission.admit(INTERACTIVE, "a", 1)
+    admission.admit(BULK, "b", 4)
+    with pytest.raises(Overloaded, match="server"):
+        admission.admit(INTERACTIVE, "c", 1)
+    assert admission.rejected == {INTERACTIVE: 2, BULK: 0}
+
+    admission.release(INTERACTIVE, "a", 6)
+    with pytest.raises(Overloaded, match="bulk lane"):
+        admission.admit(BULK, "c", 2)
+    admission.admit(INTERACTIVE, "c", 2)
+    assert admission.status()["clients"] == {"b": 4, "c": 2}
+
+
+def test_oversized_request_runs_on_an_idle_server():
+    admission = make_controller()
+    admission.admit(BULK, "a", 50)
+    assert admission.admitted == 50
+    admission.release(BULK, "a", 50)
+    assert admission.status()["admitted"] == 0 and admission.status()["clients"] == {}
+
+
+def test_retry_after_follows_throughput():
+    assert AdmissionController.retry_after(10, 0.0) == DEFAULT_RETRY_AFTER
+    assert AdmissionController.retry_after(10, 4.0) == 3
+    assert AdmissionController.retry_after(1, 100.0) == 1
+    assert AdmissionController.retry_after(10_000, 1.0) == 60
+
+
+def test_overloaded_request_gets_429_with_retry_after(client, monkeypatch):
+    import server
+
+    admission = make_controller(max_prompts=4)
+    monkeypatch.setattr(server, "admission", admission)
+    admission.admit(INTERACTIVE, "someone-else", 3)
+    body = {"research_direction": "queueing", "professors": PROFESSORS}
+
+    response = client.post("/evaluate_batch", json=body, headers={"X-Client-Id": "tester"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "server" in response.json()["detail"]
+    assert server.active_requests.ids() == []
+
+    admission.release(INTERACTIVE, "someone-else", 3)
+    response = client.post("/evaluate_batch", json=body, headers={"X-Client-Id": "tester"})
+    assert response.status_code == 200
+    assert admission.admitted == 0
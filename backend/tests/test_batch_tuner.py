@@ -0,0 +1,47 @@
+import batch_tuner
+from batch_tuner import BatchTuner, TuningStore
+
+
+class FakeEngine:
+    def get_current_model(self):
+        return "qwen-0.5b"
+
+
+def make_tuner(monkeypatch, token_cap=1000):
+    monkeypatch.setattr(batch_tuner, "BATCH_TUNER_WINDOW", 1)
+    store = TuningStore(None)
+    store.update("qwen-0.5b", batch_size=4, max_batch_tokens=token_cap)
+    return BatchTuner(FakeEngine(), max_batch_size=64, store=store)
+
+
+def test_growth_that_does_not_pay_off_restores_the_token_cap(monkeypatch):
+    tuner = make_tuner(monkeypatch)
+    for _ in range(5):
+        tuner.observe(prompts=4, seconds=1.0, full=True)  # Best size measured, probe grows
+        assert tuner.batch_limit() == 6
+        assert tuner.token_limit(None) == 1500
+        tuner.observe(prompts=6, seconds=1.5, full=True)  # Same rate: back to the best size
+        assert tuner.batch_limit() == 4
+        assert tuner.token_limit(None) == 1000
+        tuner._state.settled = False  # Probe again right away
+
+
+def test_growth_that_pays_off_keeps_the_grown_cap(monkeypatch):
+    tuner = make_tuner(monkeypatch)
+    tuner.observe(prompts=4, seconds=1.0, full=True)
+    tuner.observe(prompts=6, seconds=1.0, full=True)
+    assert tuner.status()["best_batch_size"] == 6
+    assert tuner.token_limit(None) >= 1500
+
+
+def test_out_of_memory_after_growth_returns_to_the_last_good_settings(monkeypatch):
+    tuner = make_tuner(monkeypatch)
+    tuner.observe(prompts=4, seconds=1.0, full=True)
+    tuner.record_failure(prompts=6, tokens=1400, error=RuntimeError("CUDA out of memory"))
+    assert tuner.batch_limit() == 4
+    assert tuner.token_limit(None) == 1000
+    tuner.record_failure(prompts=4, tokens=900, error=RuntimeError("CUDA out of memory"))
+    assert tuner.batch_limit() == 2
+    assert tuner.token_limit(None) == 450
+    tuner.record_failure(prompts=2, tokens=400, error=ValueError("bad prompt"))
+    assert tuner.batch_limit() == 2
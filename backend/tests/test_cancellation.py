@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cancellation import ActiveRequests, RequestAborted
+from conftest import TEST_MODEL
+
+
+def run_step(step_seconds, deadline_seconds=None, disconnected=False, cancel_after=None):
+    async def scenario():
+        requests = ActiveRequests()
+        request_id = requests.add("r1")
+        loop = asyncio.get_running_loop()
+        if cancel_after is not None:
+            loop.call_later(cancel_after, requests.cancel, request_id)
+
+        async def is_disconnected():
+            return disconnected
+
+        try:
+            return await requests.run(
+                request_id,
+                asyncio.sleep(step_seconds, "done"),
+                loop.time() + deadline_seconds if deadline_seconds is not None else None,
+                is_disconnected
+            )
+        except RequestAborted as e:
+            return e.reason
+
+    return asyncio.run(scenario())
+
+
+def test_step_runs_to_completion():
+    assert run_step(0.01, deadline_seconds=5) == "done"
+
+
+@pytest.mark.parametrize("settings, reason", [
+    ({"deadline_seconds": 0.05}, "deadline"),
+    ({"disconnected": True}, "disconnected"),
+    ({"cancel_after": 0.05}, "cancelled"),
+])
+def test_step_is_aborted(settings, reason):
+    start = time.monotonic()
+    assert run_step(5, **settings) == reason
+    assert time.monotonic() - start < 2
+
+
+def test_request_ids_are_unique_while_running():
+    requests = ActiveRequests()
+    requests.add("r1")
+    with pytest.raises(ValueError):
+        requests.add("r1")
+    requests.remove("r1")
+    requests.add("r1")
+    with pytest.raises(ValueError):
+        requests.cancel("other")
+
+
+def slow_request(name, **fields):
+    return {
+        "research_direction": "deadlines",
+        "professors": [{"name": f"{name} {i}", "affiliation": "U", "publicationList": [
+            {"title": f"Paper {name} {i}", "year": 2024, "venue": "nsdi"}
+        ]} for i in range(4)],
+        **fields
+    }
+
+
+def assert_released():
+    import server
+
+    assert server.pool.models[TEST_MODEL].in_use == 0
+    assert server.admission.admitted == 0
+    assert server.active_requests.ids() == []
+
+
+@pytest.fixture
+def slow_engine(client, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server.pool.models[TEST_MODEL].runtime.engine.engine, "seconds_per_token", 0.05)
+
+
+def test_request_past_its_deadline_gets_504(client, slow_engine):
+    start = time.monotonic()
+    response = client.post("/evaluate_batch", json=slow_request("Deadline Person", timeout=0.2))
+    assert response.status_code == 504
+    assert time.monotonic() - start < 1.5
+    assert_released()
+
+
+def test_delete_cancels_a_running_request(client, slow_engine):
+    import server
+
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(client.post(
+        "/evaluate_batch", json=slow_request("Cancelled Person"), headers={"X-Request-Id": "cancel-me"}
+    )))
+    thread.start()
+    while "cancel-me" not in server.active_requests.ids():
+        time.sleep(0.01)
+    assert client.delete("/evaluations/cancel-me").json()["status"] == "cancelling"
+    thread.join(5)
+    assert responses[0].status_code == 499
+    assert client.delete("/evaluations/cancel-me").status_code == 404
+    assert_released()
@@ -0,0 +1,62 @@
+import pytest
+
+from models import EvaluationResult
+
+CASCADE_MODEL = "qwen-1.5b"
+PROFESSORS = [
+    {"name": f"Cascade Person {i}", "affiliation": "U", "publicationList": [
+        {"title": f"Two-tier scoring {i}", "year": 2024, "venue": "kdd"}
+    ]} for i in range(3)
+]
+
+
+def result(score):
+    return EvaluationResult(score=score, reasoning="r", researchSummary="s")
+
+
+@pytest.fixture
+def cascade(client, monkeypatch):
+    """Server with a cascade model configured (loaded on first use, unloaded afterwards)"""
+    import server
+    from llm_engine import LLMEngine
+    from model_runtime import ModelRuntime
+
+    runtime = ModelRuntime(LLMEngine())
+    client.portal.call(runtime.start)
+    monkeypatch.setattr(server, "cascade_runtime", runtime)
+    monkeypatch.setattr(server, "CASCADE_MODEL", CASCADE_MODEL)
+    yield runtime
+    client.portal.call(runtime.stop)
+    client.portal.call(runtime.engine.unload_model)
+
+
+def test_uncertain_professors_are_rescored_by_the_cascade_model(client, cascade):
+    body = {"research_direction": "cascades", "professors": PROFESSORS, "cascade_band": 1.0}
+    response = client.post("/evaluate_batch", json=body)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["cascade_model"] == CASCADE_MODEL and data["cascade_count"] == 3
+    assert {r["decided_by"] for r in data["results"]} == {CASCADE_MODEL}
+
+    response = client.post("/evaluate_batch", json={**body, "cascade": False})
+    assert response.json()["cascade_count"] == 0
+
+
+def test_cascade_request_without_a_cascade_model_gets_400(client):
+    response = client.post("/evaluate_batch", json={
+        "research_direction": "cascades", "professors": PROFESSORS, "cascade": True
+    })
+    assert response.status_code == 400
+    assert "CASCADE_MODEL" in response.json()["detail"]
+
+
+def test_uncertainty_band_and_result_choice():
+    import server
+
+    assert server.is_uncertain(result(0.55), True, 0.5, 0.1)
+    assert not server.is_uncertain(result(0.9), True, 0.5, 0.1)
+    assert server.is_uncertain(result(0.9), False, 0.5, 0.1)
+
+    first, second = result(0.4), result(0.0)
+    assert server.pick_cascade_result(first, True, second, False) == (first, True)
+    assert server.pick_cascade_result(first, False, second, True) == (second, True)
@@ -0,0 +1,87 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import llm_engine
+from conftest import TEST_MODEL
+from cpu_engine import CPUEngine, CPUSamplingParams
+from llm_engine import LLMEngine, backend_for, create_engine
+from replay_engine import ReplayEngine
+from stub_engine import StubEngine
+
+
+def test_backend_comes_from_the_catalog_unless_overridden(monkeypatch):
+    monkeypatch.setattr(llm_engine, "INFERENCE_ENGINE", "auto")
+    assert backend_for("qwen-0.5b-cpu") == "cpu"
+    assert backend_for(TEST_MODEL) == "vllm"
+    monkeypatch.setattr(llm_engine, "INFERENCE_ENGINE", "stub")
+    assert backend_for("qwen-0.5b-cpu") == "stub"
+
+    with pytest.raises(ValueError, match="Unknown inference backend"):
+        create_engine("tpu")
+
+
+def test_router_switches_backends_and_rejects_calls_without_a_model(monkeypatch, tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    capture.write_text("")
+    monkeypatch.setattr(
+        llm_engine, "create_engine",
+        lambda backend, share: ReplayEngine(str(capture)) if backend == "replay" else StubEngine(seconds_per_token=0.0)
+    )
+
+    async def scenario():
+        engine = LLMEngine()
+        with pytest.raises(RuntimeError, match="No model loaded"):
+            engine.generate_batch(["prompt"])
+        with pytest.raises(ValueError, match="Unknown model"):
+            await engine.load_model("no-such-model")
+
+        await engine.load_model(TEST_MODEL)
+        first = engine.engine
+        monkeypatch.setattr(llm_engine, "INFERENCE_ENGINE", "replay")
+        await engine.load_model(TEST_MODEL)
+        texts = [engine.extract_text(o) for o in engine.generate_batch(["prompt"])]
+        await engine.unload_model()
+        return first, engine, texts
+
+    first, engine, texts = asyncio.run(scenario())
+    assert isinstance(first, StubEngine) and not first.is_loaded()
+    assert isinstance(engine.engine, ReplayEngine) and engine.backend == "replay"
+    assert len(texts) == 1 and not engine.is_loaded()
+
+
+def test_cpu_micro_batches_group_by_sampling_and_sort_by_length():
+    engine = CPUEngine(workers=1, micro_batch_size=2)
+    engine.tokenizer = lambda texts, **kwargs: list(texts)
+    default, strict = CPUSamplingParams(temperature=0.7), CPUSamplingParams(temperature=0.0)
+    prompts = ["ccc", "a", "bb", "dddd", "e"]
+    chunks = engine._plan_chunks(prompts, [default, default, default, strict, strict])
+    assert [(indices, p) for indices, _, p in chunks] == [
+        ([1, 2], default), ([0], default), ([4, 3], strict)
+    ]
+    assert chunks[0][1] == ["a", "bb"]
+
+
+class ListTokenizer:
+    """Token id i decodes to VOCAB[i]; 0 is end of sequence and 1 is padding"""
+
+    VOCAB = ["<eos>", "<pad>", '{"score": 0.5', "}", " trailing"]
+    eos_token_id = 0
+    pad_token_id = 1
+
+    def decode(self, token_ids, skip_special_tokens=True):
+        return "".join(self.VOCAB[i] for i in token_ids if i > 1)
+
+
+def test_cpu_outputs_end_at_eos_or_padding_and_stop_strings():
+    engine = CPUEngine(workers=1)
+    engine.tokenizer = ListTokenizer()
+    encoded = {"input_ids": np.array([[1, 7, 8], [6, 7, 8]]), "attention_mask": np.array([[0, 1, 1], [1, 1, 1]])}
+    # Row 0 stopped at "}" and was padded while row 1 kept generating
+    generated = np.array([[2, 3, 1, 1], [2, 3, 4, 0]])
+    strict = CPUSamplingParams(temperature=0.0, stop=("}",))
+    first, second = engine._decode_chunk(["p0", "p1"], [0, 1], encoded, strict, generated)
+    assert first.outputs[0].text == '{"score": 0.5}' and engine.generated_tokens(first) == 2
+    assert second.outputs[0].text == '{"score": 0.5}' and engine.generated_tokens(second) == 3
+    assert first.prompt_token_ids == [7, 8]
@@ -0,0 +1,87 @@
+import asyncio
+
+from conftest import write_region
+from evaluation_jobs import JobManager
+from models import EvaluationJobRequest, EvaluationResult
+from professor_data import load_region
+from professor_store import ProfessorStore
+from prompt_builder import build_evaluation_prompt
+
+
+class RecordingEvaluator:
+    """Batch evaluator that keeps the prompts it would have sent"""
+
+    def __init__(self):
+        self.prompts = {}
+
+    async def __call__(self, request):
+        for professor in request.professors:
+            self.prompts[professor.name] = build_evaluation_prompt(professor, request.research_direction)
+        return [EvaluationResult(score=0.9, reasoning="", researchSummary="") for _ in request.professors]
+
+
+async def run_job(manager, spec):
+    await manager.start()
+    try:
+        job = await manager.submit(spec, "stub")
+        while not job.done:
+            await job.changed.wait()
+        return job
+    finally:
+        await manager.stop()
+
+
+def make_manager(tmp_path, store, evaluate):
+    return JobManager(str(tmp_path / "jobs"), store, evaluate, lambda request: {}, batch_size=2)
+
+
+def test_job_prompt_lists_region_file_venues(region_dir, tmp_path):
+    store = ProfessorStore()
+    store.load(region_dir)
+    evaluate = RecordingEvaluator()
+    job = asyncio.run(run_job(
+        make_manager(tmp_path, store, evaluate),
+        EvaluationJobRequest(research_direction="machine learning", regions=["europe"])
+    ))
+
+    assert job.state == "completed" and len(job.results) == 2
+    prompt = evaluate.prompts["Ada Example"]
+    assert "Publication data not available" not in prompt
+    assert "Publication in ICLR 2024 (iclr, 2024)" in prompt
+    assert "Publication in ICML 2023 (icml, 2023)" in prompt
+
+
+def test_resumed_job_skips_professors_dropped_from_the_data(region_dir, tmp_path):
+    store = ProfessorStore()
+    store.load(region_dir)
+    spec = EvaluationJobRequest(research_direction="machine learning", regions=["europe"])
+
+    async def submit_only():
+        manager = make_manager(tmp_path, store, RecordingEvaluator())
+        manager._queue = asyncio.Queue()  # Not started, so the job stays queued on disk
+        return await manager.submit(spec, "stub")
+
+    submitted = asyncio.run(submit_only())
+
+    # Region file refreshed before the restart: Ada left, a new professor came first
+    write_region(region_dir, "europe", [{"name": "New Hire", "affiliation": "EPFL", "areas": []}]
+                 + load_region("europe", region_dir)[1:])
+    refreshed = ProfessorStore()
+    refreshed.load(region_dir)
+    evaluate = RecordingEvaluator()
+    manager = make_manager(tmp_path, refreshed, evaluate)
+
+    async def resume():
+        await manager.start()
+        try:
+            job = manager.jobs[submitted.id]
+            while not job.done:
+                await job.changed.wait()
+            return job
+        finally:
+            await manager.stop()
+
+    job = asyncio.run(resume())
+    assert job.state == "completed" and job.missing == 1
+    assert list(evaluate.prompts) == ["Bo Sample"]
+    assert [record["name"] for record in job.results.values()] == ["Bo Sample"]
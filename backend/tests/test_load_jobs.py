@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import stub_engine
+from model_pool import ModelPool
+from model_runtime import ModelRuntime
+
+
+def test_load_job_moves_through_its_states(monkeypatch):
+    monkeypatch.setattr(stub_engine, "STUB_LOAD_SECONDS", 0.1)
+
+    async def scenario():
+        pool = ModelPool(memory_budget_gb=32)
+        job = pool.start_load("qwen-0.5b")
+        again = pool.start_load("qwen-0.5b")
+        state_while_loading = pool.model_state("qwen-0.5b")
+        entry = await pool.acquire("qwen-0.5b", timeout=5)  # Waits for the job
+        pool.release(entry)
+        resident_job = pool.start_load("qwen-0.5b")
+        await pool.unload()
+        return job, again, state_while_loading, resident_job
+
+    job, again, state_while_loading, resident_job = asyncio.run(scenario())
+    assert again is job
+    assert state_while_loading in ("queued", "downloading")
+    assert job.state == "ready" and job.error is None
+    assert {"queued", "downloading", "initializing", "warming"} <= set(job.stage_seconds)
+    assert resident_job is not job and resident_job.state == "ready"
+
+
+def test_failed_warmup_fails_the_job_and_its_waiters(monkeypatch):
+    async def broken_warm_up(self, count):
+        raise RuntimeError("kernel compilation failed")
+
+    monkeypatch.setattr(ModelRuntime, "warm_up", broken_warm_up)
+
+    async def scenario():
+        pool = ModelPool(memory_budget_gb=32)
+        job = pool.start_load("qwen-0.5b")
+        with pytest.raises(RuntimeError, match="Warmup failed"):
+            await pool.acquire("qwen-0.5b", timeout=5)
+        return job, pool.model_state("qwen-0.5b"), list(pool.models)
+
+    job, state, resident = asyncio.run(scenario())
+    assert job.state == "failed" and "kernel compilation failed" in job.error
+    assert state == "failed"
+    assert resident == []
+
+
+def test_unknown_model_is_rejected():
+    async def scenario():
+        with pytest.raises(ValueError, match="Unknown model"):
+            ModelPool(memory_budget_gb=32).start_load("no-such-model")
+
+    asyncio.run(scenario())
+
+
+def test_load_endpoints(client):
+    response = client.post("/load_model", json={"model_id": "qwen-0.5b"})
+    assert response.status_code == 200 and response.json()["status"] == "loaded"
+    job_id = response.json()["job_id"]
+    assert client.get(f"/load_jobs/{job_id}").json()["state"] == "ready"
+    assert job_id in [job["job_id"] for job in client.get("/load_jobs").json()]
+    assert client.get("/load_jobs/nope").status_code == 404
+    assert client.post("/load_model", json={"model_id": "no-such-model"}).status_code == 400
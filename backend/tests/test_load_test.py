@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from conftest import TEST_MODEL
+from load_test import build_requests, percentile, run_load
+from response_parser import parse_and_validate
+from stub_engine import StubEngine, stub_text
+
+
+def test_stub_outputs_are_deterministic_and_parseable():
+    prompts = [f"Evaluate professor {i}" for i in range(20)]
+    assert [stub_text(p) for p in prompts] == [stub_text(p) for p in prompts]
+    assert all(parse_and_validate(stub_text(p))[0] for p in prompts)
+    assert not any(parse_and_validate(stub_text(p, invalid_rate=1.0))[0] for p in prompts)
+    assert all(parse_and_validate(stub_text(p, strict=True, invalid_rate=1.0))[0] for p in prompts)
+
+
+def test_stub_batch_over_its_memory_fails_like_an_oom():
+    async def scenario():
+        engine = StubEngine(seconds_per_token=0.0, memory_tokens=200)
+        await engine.load_model(TEST_MODEL)
+        assert len(engine.generate_batch(["short"])) == 1
+        with pytest.raises(RuntimeError, match="out of memory"):
+            engine.generate_batch(["a much longer prompt " * 10] * 4)
+
+    asyncio.run(scenario())
+
+
+def test_requests_wrap_around_the_dataset_and_percentiles_use_nearest_rank():
+    professors = [{"name": f"P{i}"} for i in range(3)]
+    requests = build_requests(professors, 2, 2, "systems", "original")
+    assert [[p["name"] for p in r["professors"]] for r in requests] == [["P0", "P1"], ["P2", "P0"]]
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 99) == 4.0
+    assert percentile([], 50) is None
+
+
+def test_report_counts_results_and_errors():
+    def handler(request):
+        payload = json.loads(request.content)
+        if payload["research_direction"] == "rejected":
+            return httpx.Response(429, json={"detail": "busy"})
+        return httpx.Response(200, json={"results": [
+            {"reasoning": "Invalid model output"}, {"reasoning": "fine"}
+        ], "prerank_skipped": 1})
+
+    async def scenario():
+        requests = build_requests([{"name": "P"}], 3, 2, "systems", "original")
+        requests.append({**requests[0], "research_direction": "rejected"})
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test") as client:
+            return await run_load(client, requests, 2, 5)
+
+    report = asyncio.run(scenario())
+    assert report["requests"] == 4 and report["failed_requests"] == 1
+    assert report["errors"] == {"HTTP 429": 1} and report["error_rate"] == 0.25
+    assert report["professors_evaluated"] == 6 and report["invalid_outputs"] == 3
+    assert report["prerank_skipped"] == 3
+    assert report["latency_s"]["p50"] is not None
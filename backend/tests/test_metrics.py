@@ -0,0 +1,35 @@
+from conftest import TEST_MODEL
+from metrics import REGISTRY
+
+PROFESSORS = [
+    {"name": f"Measured Person {i}", "affiliation": "U", "publicationList": [
+        {"title": f"Observability paper {i}", "year": 2024, "venue": "nsdi"}
+    ]} for i in range(2)
+]
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_evaluation_updates_request_stage_and_output_metrics(client):
+    before = {
+        "requests": sample("csprof_request_duration_seconds_count", endpoint="evaluate_batch"),
+        "generation": sample("csprof_stage_duration_seconds_count", stage="generation"),
+        "outputs": sample("csprof_outputs_total", model=TEST_MODEL, status="valid"),
+        "prompts": sample("csprof_prompts_generated_total"),
+    }
+    response = client.post("/evaluate_batch", json={"research_direction": "metrics", "professors": PROFESSORS})
+    assert response.status_code == 200
+    assert sample("csprof_request_duration_seconds_count", endpoint="evaluate_batch") == before["requests"] + 1
+    assert sample("csprof_stage_duration_seconds_count", stage="generation") == before["generation"] + 1
+    assert sample("csprof_outputs_total", model=TEST_MODEL, status="valid") == before["outputs"] + 2
+    assert sample("csprof_prompts_generated_total") == before["prompts"] + 2
+
+
+def test_metrics_endpoint_serves_the_prometheus_text_format(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE csprof_request_duration_seconds histogram" in response.text
+    assert "csprof_engine_batch_size_bucket" in response.text
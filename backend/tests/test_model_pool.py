@@ -0,0 +1,95 @@
+import asyncio
+
+import stub_engine
+from model_pool import ModelPool, PoolFullError
+
+
+def test_release_after_reload_leaves_the_new_entry_alone():
+    async def scenario():
+        pool = ModelPool(memory_budget_gb=32)
+        held = await pool.acquire("qwen-0.5b")
+        await pool.unload("qwen-0.5b")
+        reloaded = await pool.acquire("qwen-0.5b")
+        pool.release(held)
+        counts = [reloaded.in_use]
+        pool.release(reloaded)
+        pool.release(reloaded)
+        counts.append(reloaded.in_use)
+        await pool.unload()
+        return held is not reloaded, counts
+
+    different, counts = asyncio.run(scenario())
+    assert different
+    assert counts == [1, 0]
+
+
+def test_slow_load_does_not_block_other_loads(monkeypatch):
+    monkeypatch.setattr(stub_engine, "STUB_LOAD_SECONDS", 1.0)
+
+    async def scenario():
+        pool = ModelPool(memory_budget_gb=32)
+        slow = asyncio.create_task(pool.load("qwen-7b"))
+        await asyncio.sleep(0.1)
+        monkeypatch.setattr(stub_engine, "STUB_LOAD_SECONDS", 0.0)
+        await asyncio.wait_for(pool.load("qwen-0.5b"), 0.5)
+        unloaded = await asyncio.wait_for(pool.unload("qwen-0.5b"), 0.5)
+        still_loading = not slow.done()
+        await slow
+        resident = list(pool.models)
+        await pool.unload()
+        return unloaded, still_loading, resident
+
+    unloaded, still_loading, resident = asyncio.run(scenario())
+    assert unloaded == ["qwen-0.5b"]
+    assert still_loading
+    assert resident == ["qwen-7b"]
+
+
+def test_loading_model_memory_is_reserved(monkeypatch):
+    monkeypatch.setattr(stub_engine, "STUB_LOAD_SECONDS", 0.4)
+
+    async def scenario():
+        pool = ModelPool(memory_budget_gb=20)
+        first = asyncio.create_task(pool.load("qwen-7b"))
+        await asyncio.sleep(0.05)
+        try:
+            await pool.load("qwen-1.5b")
+            error = None
+        except Exception as e:
+            error = e
+        await first
+        await pool.unload()
+        return error
+
+    error = asyncio.run(scenario())
+    assert isinstance(error, PoolFullError)
+
+
+def test_default_model_changes_only_when_its_load_succeeds(monkeypatch):
+    from model_runtime import ModelRuntime
+
+    warm_up = ModelRuntime.warm_up
+
+    async def warm_up_failing_for_7b(self, count):
+        if self.engine.get_current_model() == "qwen-7b":
+            raise RuntimeError("kernel compilation failed")
+        await warm_up(self, count)
+
+    monkeypatch.setattr(ModelRuntime, "warm_up", warm_up_failing_for_7b)
+
+    async def scenario():
+        pool = ModelPool(memory_budget_gb=32)
+        job = pool.start_load("qwen-0.5b", make_default=True)
+        while_first_loads = (pool.default_model, pool.request_model())
+        await pool.wait_ready(job)
+        job = pool.start_load("qwen-7b", make_default=True)
+        while_second_loads = pool.request_model()
+        await job.finished.wait()
+        after_failure = (pool.default_model, pool.model_state("qwen-7b"))
+        await pool.unload()
+        return while_first_loads, while_second_loads, after_failure
+
+    while_first_loads, while_second_loads, after_failure = asyncio.run(scenario())
+    assert while_first_loads == (None, "qwen-0.5b")
+    assert while_second_loads == "qwen-0.5b"
+    assert after_failure == ("qwen-0.5b", "failed")
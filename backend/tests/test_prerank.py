@@ -0,0 +1,53 @@
+import json
+
+from evaluation_jobs import EvaluationJob, JobManager
+from models import EvaluationJobRequest, Professor
+from prerank import prerank
+
+MATCH = {"name": "Graph Person", "affiliation": "ETH Zurich", "publicationList": [
+    {"title": "Scalable graph neural networks", "year": 2023, "venue": "icml"}
+]}
+UNRELATED = {"name": "Other Person", "affiliation": "EPFL", "publicationList": [
+    {"title": "Wireless sensor scheduling", "year": 2022, "venue": "sensys"}
+]}
+REQUEST = {"research_direction": "graph neural networks", "professors": [UNRELATED, MATCH]}
+
+
+def test_prerank_skips_professors_without_overlap():
+    selection = prerank([Professor(**UNRELATED), Professor(**MATCH)], "graph neural networks", None, 0.0)
+    assert selection.kept == [1] and selection.skipped == [0]
+
+
+def test_prerank_is_off_by_default(client):
+    body = client.post("/evaluate_batch", json=REQUEST).json()
+    assert body["prerank_skipped"] == 0
+    assert all(result["evaluated"] and result["score"] is not None for result in body["results"])
+
+
+def test_skipped_professors_are_not_evaluated(client):
+    body = client.post("/evaluate_batch", json={**REQUEST, "prerank": True}).json()
+    assert body["prerank_skipped"] == 1
+    skipped, scored = body["results"]
+    assert skipped["evaluated"] is False and skipped["score"] is None
+    assert scored["evaluated"] is True and scored["score"] is not None
+
+
+def test_streamed_skipped_professors_are_not_evaluated(client):
+    response = client.post("/evaluate_stream", json={**REQUEST, "prerank": True})
+    frames = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    results = {frame["index"]: frame["result"] for frame in frames if frame["type"] == "result"}
+    assert results[0]["evaluated"] is False and results[0]["score"] is None
+    assert results[1]["score"] is not None
+
+
+def test_job_lists_unevaluated_professors_last(tmp_path):
+    job = EvaluationJob("j", EvaluationJobRequest(research_direction="x", regions=["europe"]), "m", [], str(tmp_path))
+    job.add_results([
+        {"index": 0, "result": {"score": None, "evaluated": False}},
+        {"index": 1, "result": {"score": 0.3}},
+        {"index": 2, "result": {"score": 0.9}},
+    ])
+    manager = JobManager(str(tmp_path), None, None, None, 1)
+    assert job.matched == 1
+    assert [record["index"] for record in manager.page(job, 0, 10)[1]] == [2, 1, 0]
+    assert manager.page(job, 0, 10, min_score=0.0)[0] == 2
@@ -0,0 +1,72 @@
+import pytest
+
+from conftest import write_region
+from professor_data import load_region, professor_id, publication_records
+from professor_store import ProfessorStore
+
+
+def test_publication_records_expand_counts_newest_first():
+    records = publication_records({"iclr": {"2019": 1.0, "2024": 0.64}, "icml": {"2023": 2.0}})
+    assert [record["year"] for record in records] == [2024, 2023, 2023, 2019]
+    assert records[0] == {"title": "Publication in ICLR 2024", "year": 2024, "venue": "iclr"}
+
+
+def test_professor_has_placeholder_publications_from_counts(region_dir):
+    store = ProfessorStore()
+    store.load(region_dir)
+    ada = load_region("europe", region_dir)[0]
+    professor = store.professor(professor_id("europe", ada))
+    assert professor.name == "Ada Example"
+    assert [(p.venue, p.year) for p in professor.publicationList] == [
+        ("iclr", 2024), ("icml", 2023), ("icml", 2023), ("iclr", 2019)
+    ]
+
+
+def test_uploaded_publications_replace_placeholders(region_dir):
+    from models import Publication
+
+    store = ProfessorStore()
+    store.load(region_dir)
+    ada = professor_id("europe", load_region("europe", region_dir)[0])
+    store.set_publications({ada: [Publication(title="Real paper", year=2024, venue="NeurIPS")]})
+    assert [p.title for p in store.professor(ada).publicationList] == ["Real paper"]
+
+
+def test_ids_survive_reordered_region_files(region_dir):
+    before = ProfessorStore()
+    before.load(region_dir)
+    entries = load_region("europe", region_dir)
+    write_region(region_dir, "europe", [{"name": "New Hire", "affiliation": "EPFL", "areas": []}] + entries[::-1])
+    after = ProfessorStore()
+    after.load(region_dir)
+
+    for professor_id_ in before.ids:
+        assert professor_id_ in after
+        assert after.professor(professor_id_).name == before.professor(professor_id_).name
+
+
+def test_duplicate_entries_are_skipped(region_dir):
+    entries = load_region("canada", region_dir)
+    write_region(region_dir, "canada", entries + entries)
+    store = ProfessorStore()
+    store.load(region_dir)
+    assert len(store) == 3
+
+
+def test_select_filters(region_dir):
+    store = ProfessorStore()
+    store.load(region_dir)
+    names = lambda ids: [store.professor(i).name for i in ids]  # noqa: E731
+
+    assert names(store.select(["europe", "canada"])) == ["Ada Example", "Bo Sample", "Cy Test"]
+    assert names(store.select(["europe"], venues=["iclr"])) == ["Ada Example"]
+    assert names(store.select(["europe"], venues=["iclr"], year_start=2020, min_papers=1.0)) == []
+    assert names(store.select(["europe"], year_start=2023)) == ["Ada Example"]
+    assert names(store.select(["europe"], affiliation="oxford")) == ["Bo Sample"]
+
+
+def test_select_unknown_region(region_dir):
+    store = ProfessorStore()
+    store.load(region_dir)
+    with pytest.raises(ValueError, match="Unknown region: mars"):
+        store.select(["mars"])
@@ -0,0 +1,62 @@
+import os
+import time
+
+import pytest
+
+import prompt_builder
+
+from common import synthetic_professors
+from legacy import legacy_build_evaluation_prompt
+from prompt_builder import CompiledTemplate, PromptTemplateRegistry, build_evaluation_prompt, build_evaluation_prompts
+
+DIRECTION = "efficient inference for large language models"
+
+
+@pytest.mark.parametrize("strict", [True, False])
+@pytest.mark.parametrize("scheme", ["original", "decision_tree"])
+def test_default_layout_matches_the_original_prompts(strict, scheme):
+    for professor in synthetic_professors(5):
+        expected = legacy_build_evaluation_prompt(professor, DIRECTION, strict, scheme)
+        assert build_evaluation_prompt(professor, DIRECTION, strict, scheme) == expected
+        assert build_evaluation_prompt(professor, DIRECTION, strict, scheme, "standard") == expected
+
+
+def test_prefix_layout_shares_everything_before_the_professor():
+    professors = synthetic_professors(3)
+    prompts = build_evaluation_prompts(professors, DIRECTION, layout="prefix")
+    shared = os.path.commonprefix(prompts)
+    assert DIRECTION in shared
+    assert not any(professor.name in shared for professor in professors)
+    assert all(professor.name in prompt for professor, prompt in zip(professors, prompts))
+
+
+def test_unknown_layout():
+    with pytest.raises(ValueError, match="Unknown prompt layout"):
+        build_evaluation_prompts(synthetic_professors(1), DIRECTION, layout="sideways")
+
+
+def test_compiled_template_renders_like_chained_replace():
+    source = "Hi {{name}}, {{ name }} works on {{topic}} ({{unknown}})."
+    values = {"name": "Ada", "topic": "engines"}
+    expected = source
+    for key, value in values.items():
+        expected = expected.replace("{{" + key + "}}", value).replace("{{ " + key + " }}", value)
+    assert CompiledTemplate(source).render(values) == expected == "Hi Ada, Ada works on engines ({{unknown}})."
+
+
+def test_registry_compiles_once_and_reloads_changed_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_builder, "_MTIME_CHECK_INTERVAL", 0.0)
+    path = tmp_path / "user.txt"
+    path.write_text("first {{x}}")
+    registry = PromptTemplateRegistry(str(tmp_path))
+    template = registry.get("user.txt")
+    assert registry.get("user.txt") is template and template.render({"x": "1"}) == "first 1"
+
+    path.write_text("second {{x}}")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert registry.get("user.txt").render({"x": "2"}) == "second 2"
+
+
+def test_missing_prompt_file_falls_back(tmp_path):
+    template = PromptTemplateRegistry(str(tmp_path)).get("basic-user-prompt.txt")
+    assert template.source == prompt_builder.get_fallback_prompt("basic-user-prompt.txt")
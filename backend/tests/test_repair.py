@@ -0,0 +1,41 @@
+import model_runtime
+from conftest import run_with_runtime
+from models import EvaluateRequest, Professor, Publication
+
+REQUEST = EvaluateRequest(research_direction="repairing invalid outputs", professors=[])
+PROFESSORS = [
+    Professor(name=f"Repair Person {i}", affiliation="U", publicationList=[
+        Publication(title=f"Robust decoding {i}", year=2023, venue="acl")
+    ]) for i in range(3)
+]
+
+
+def test_invalid_outputs_are_regenerated_with_retry_sampling():
+    async def scenario(runtime):
+        return await runtime.evaluate(REQUEST, PROFESSORS)
+
+    results, valid, stats = run_with_runtime(scenario, invalid_rate=1.0)
+    assert valid == [True, True, True]
+    assert stats.retry_count == 3 and stats.repaired_count == 3 and stats.invalid_count == 0
+    assert not any(result.reasoning.startswith("Invalid model output") for result in results)
+
+
+def test_valid_outputs_are_not_regenerated():
+    async def scenario(runtime):
+        return await runtime.evaluate(REQUEST, PROFESSORS)
+
+    _, valid, stats = run_with_runtime(scenario)
+    assert valid == [True, True, True]
+    assert stats.retry_count == 0
+
+
+def test_outputs_still_invalid_after_repair_fall_back_to_zero(monkeypatch):
+    monkeypatch.setattr(model_runtime, "MAX_REPAIR_ATTEMPTS", 0)
+
+    async def scenario(runtime):
+        return await runtime.evaluate(REQUEST, PROFESSORS[:1])
+
+    results, valid, stats = run_with_runtime(scenario, invalid_rate=1.0)
+    assert valid == [False]
+    assert results[0].score == 0.0 and results[0].reasoning.startswith("Invalid model output")
+    assert stats.invalid_count == 1 and stats.retry_count == 0
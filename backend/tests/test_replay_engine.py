@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import TEST_MODEL
+from replay_engine import OutputRecorder, ReplayEngine, prompt_hash
+from stub_engine import StubEngine
+
+PROMPTS = ["Score professor A for databases", "Score professor B for compilers"]
+
+
+def replay(path, prompts, missing="stub", sampling=None):
+    async def scenario():
+        engine = ReplayEngine(str(path), timing="none", missing=missing)
+        await engine.load_model(TEST_MODEL)
+        try:
+            params = None if sampling is None else [getattr(engine, sampling)] * len(prompts)
+            return [engine.extract_text(o) for o in engine.generate_batch(prompts, params)], engine.stats()
+        finally:
+            await engine.unload_model()
+
+    return asyncio.run(scenario())
+
+
+def test_recorded_outputs_are_replayed(tmp_path):
+    path = tmp_path / "capture.jsonl"
+
+    async def record():
+        engine = StubEngine(seconds_per_token=0.0)
+        await engine.load_model(TEST_MODEL)
+        recorder = OutputRecorder(str(path))
+        delivered = []
+        engine.generate_stream(
+            PROMPTS, recorder.wrap(engine, PROMPTS, None, lambda i, o: delivered.append(engine.extract_text(o)))
+        )
+        recorder.close()
+        return sorted(delivered)
+
+    recorded = asyncio.run(record())
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {r["prompt_sha256"] for r in records} == {prompt_hash(p) for p in PROMPTS}
+    assert all(r["model"] == TEST_MODEL and r["batch_size"] == 2 and not r["retry"] for r in records)
+    assert all(p not in path.read_text() for p in PROMPTS)
+
+    texts, stats = replay(path, PROMPTS)
+    assert sorted(texts) == recorded
+    assert stats == {"recorded_outputs": 2, "hits": 2, "misses": 0, "token_count_misses": 0}
+
+
+def test_captures_from_the_loaded_model_win(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    digest = prompt_hash(PROMPTS[0])
+    lines = [
+        {"v": 1, "model": TEST_MODEL, "prompt_sha256": digest, "retry": False, "text": "mine"},
+        {"v": 1, "model": "other", "prompt_sha256": digest, "retry": False, "text": "theirs"},
+        {"v": 1, "model": TEST_MODEL, "prompt_sha256": digest, "retry": True, "text": "mine, strict"},
+    ]
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+    assert replay(path, PROMPTS[:1])[0] == ["mine"]
+    assert replay(path, PROMPTS[:1], sampling="retry_sampling_params")[0] == ["mine, strict"]
+
+
+def test_missing_prompts_fall_back_or_fail(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    path.write_text("")
+    texts, stats = replay(path, PROMPTS)
+    assert len(texts) == 2 and stats["misses"] == 2
+
+    with pytest.raises(RuntimeError, match="No recorded output"):
+        replay(path, PROMPTS, missing="error")
+
+
+def test_unreadable_capture_and_bad_timing_are_rejected(tmp_path):
+    with pytest.raises(RuntimeError, match="could not read"):
+        replay(tmp_path / "absent.jsonl", PROMPTS)
+    with pytest.raises(ValueError, match="Unknown replay timing"):
+        ReplayEngine(str(tmp_path / "absent.jsonl"), timing="sometimes")
+
+
+def test_recorded_token_counts_are_replayed(tmp_path, monkeypatch):
+    import llm_engine
+
+    path = tmp_path / "capture.jsonl"
+    recorder = OutputRecorder(str(path))
+    monkeypatch.setattr(llm_engine, "_recorder", recorder)
+    monkeypatch.setattr(llm_engine, "create_engine", lambda backend, share: StubEngine(seconds_per_token=0.0))
+
+    async def record():
+        engine = llm_engine.LLMEngine()
+        await engine.load_model(TEST_MODEL)
+        engine.count_tokens(PROMPTS)
+        engine.count_tokens(PROMPTS[:1])  # Recorded once per model and text
+        recorder.close()
+
+    asyncio.run(record())
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["type"] for r in records] == ["tokens", "tokens"]
+    # Pretend the real tokenizer disagreed with the approximation
+    path.write_text("".join(json.dumps({**r, "tokens": r["tokens"] + 100}) + "\n" for r in records))
+
+    async def replay_counts():
+        engine = ReplayEngine(str(path), timing="none")
+        await engine.load_model(TEST_MODEL)
+        counts = engine.count_tokens(PROMPTS + ["never counted"])
+        return counts, engine.stats()["token_count_misses"]
+
+    counts, token_count_misses = asyncio.run(replay_counts())
+    assert counts[:2] == [r["tokens"] + 100 for r in records]
+    assert token_count_misses == 1
+
+
+def test_pool_reports_replay_coverage(client, monkeypatch, tmp_path):
+    import server
+    from load_test import replay_coverage
+
+    engine = server.pool.models[TEST_MODEL].runtime.engine
+    replay_engine = ReplayEngine(str(tmp_path / "capture.jsonl"), timing="none")
+    replay_engine.current_model = TEST_MODEL
+    replay_engine.misses = 3
+    monkeypatch.setattr(engine, "engine", replay_engine)
+    coverage = replay_coverage(client.get("/pool").json())
+    assert coverage == {TEST_MODEL: {"recorded_outputs": 0, "hits": 0, "misses": 3, "token_count_misses": 0}}
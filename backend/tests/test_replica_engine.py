@@ -0,0 +1,48 @@
+import asyncio
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import BACKEND_DIR, TEST_MODEL
+from replica_engine import ReplicaEngine
+
+
+def test_worker_module_imports_no_server_state():
+    code = "import sys, replica_worker; print(sorted({'config', 'metrics', 'server'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_token_count_skips_a_dead_replica():
+    engine = ReplicaEngine("stub", replicas=2)
+    asyncio.run(engine.load_model(TEST_MODEL))
+    try:
+        expected = engine.count_tokens(["a few words to count"])
+        victim = engine.replicas[0].process
+        victim.kill()
+        victim.join()
+        start = time.monotonic()
+        counts = engine.count_tokens(["a few words to count"])
+        assert counts == expected
+        assert time.monotonic() - start < 5
+    finally:
+        asyncio.run(engine.unload_model())
+
+
+def test_token_count_fails_fast_without_a_live_replica():
+    engine = ReplicaEngine("stub", replicas=2)
+    asyncio.run(engine.load_model(TEST_MODEL))
+    try:
+        engine._stopping.set()  # Keep the supervisor from restarting them
+        engine._supervisor.join()
+        for replica in engine.replicas:
+            replica.process.kill()
+            replica.process.join()
+        start = time.monotonic()
+        with pytest.raises(RuntimeError):
+            engine.count_tokens(["text"])
+        assert time.monotonic() - start < 5
+    finally:
+        asyncio.run(engine.unload_model())
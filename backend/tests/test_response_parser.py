@@ -0,0 +1,27 @@
+import pytest
+
+from bench_response_parser import DEFAULT_CORPUS, legacy_evaluate, load_corpus
+from legacy import legacy_parse_llm_response, legacy_validate_llm_response
+from response_parser import parse_and_validate, parse_response, validate_response
+
+CORPUS = load_corpus(DEFAULT_CORPUS)
+EDGE_CASES = [
+    "",
+    "   ",
+    "Score: 1.7\nReasoning: Over the top.\nResearch Summary: Scores above one.",
+    '{"score": 85, "reasoning": "Percent scale", "research_summary": "Systems"}',
+    '```json\n{"score": 0.4, "reasoning": "Fenced"\n```',
+    "Score: 0.5\nReasoning: " + "the same words " * 60,
+]
+
+
+@pytest.mark.parametrize("text", [entry["text"] for entry in CORPUS] + EDGE_CASES)
+def test_single_pass_parser_matches_the_original(text):
+    assert parse_and_validate(text) == legacy_evaluate(text)
+    assert validate_response(text) == legacy_validate_llm_response(text)
+    assert parse_response(text) == legacy_parse_llm_response(text)
+
+
+def test_corpus_covers_valid_and_invalid_outputs():
+    verdicts = {parse_and_validate(entry["text"])[0] for entry in CORPUS}
+    assert verdicts == {True, False}
@@ -0,0 +1,92 @@
+import time
+
+import result_cache
+from result_cache import ResultCache, make_cache_key
+
+RESULT = {"score": 0.7, "reasoning": "r", "researchSummary": "s"}
+
+
+def test_miss_then_memory_hit():
+    cache = ResultCache(None, memory_size=10)
+    assert cache.get("a") is None
+    cache.put("a", RESULT)
+    assert cache.get("a") == RESULT
+    stats = cache.stats()
+    assert (stats["misses"], stats["memory_hits"], stats["writes"]) == (1, 1, 1)
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(path, memory_size=10)
+    for i in range(50):
+        cache.put(f"k{i}", {**RESULT, "score": i / 100})
+    cache.close()
+
+    reopened = ResultCache(path, memory_size=10)
+    found = reopened.get_many(["k3", "k49", "nope"])
+    assert found == {"k3": {**RESULT, "score": 0.03}, "k49": {**RESULT, "score": 0.49}}
+    stats = reopened.stats()
+    assert (stats["disk_hits"], stats["misses"], stats["disk_entries"]) == (2, 1, 50)
+    # Disk hits are promoted to memory
+    reopened.get("k3")
+    assert reopened.stats()["memory_hits"] == 1
+    reopened.close()
+
+
+def test_disk_tier_keeps_the_newest_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "PRUNE_EVERY_WRITES", 1)
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), memory_size=0, max_entries=5)
+    for i in range(12):
+        cache.put(f"k{i}", RESULT)
+        cache.flush()
+        time.sleep(0.002)
+    assert cache.stats()["disk_entries"] == 5
+    assert set(cache.get_many([f"k{i}" for i in range(12)])) == {f"k{i}" for i in range(7, 12)}
+    cache.close()
+
+
+def test_expired_results_are_not_used(tmp_path, monkeypatch):
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(path, memory_size=10, ttl_seconds=60)
+    cache.put("a", RESULT)
+    cache.flush()
+    assert cache.get("a") == RESULT
+
+    later = time.time() + 120
+    monkeypatch.setattr(result_cache.time, "time", lambda: later)
+    assert cache.get("a") is None  # Memory tier
+    cache.close()
+    assert ResultCache(path, memory_size=10, ttl_seconds=60).get("a") is None  # Disk tier
+
+
+def test_clear_drops_both_tiers(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), memory_size=10)
+    cache.put_many([("a", RESULT), ("b", RESULT)])
+    cache.clear()
+    assert cache.get_many(["a", "b"]) == {}
+    assert cache.stats()["disk_entries"] == 0
+    cache.close()
+
+
+def test_keys_cover_model_sampling_scheme_and_prompt():
+    key = make_cache_key("m", "t=0", "original", "prompt")
+    assert key == make_cache_key("m", "t=0", "original", "prompt")
+    assert len({
+        key,
+        make_cache_key("other", "t=0", "original", "prompt"),
+        make_cache_key("m", "t=1", "original", "prompt"),
+        make_cache_key("m", "t=0", "decision_tree", "prompt"),
+        make_cache_key("m", "t=0", "original", "prompt2"),
+    }) == 5
+
+
+def test_repeated_request_is_served_from_the_cache(client):
+    request = {"research_direction": "cache test direction", "professors": [
+        {"name": f"Cache Person {i}", "affiliation": "U", "publicationList": [
+            {"title": f"Paper {i}", "year": 2023, "venue": "icml"}
+        ]} for i in range(3)
+    ]}
+    first = client.post("/evaluate_batch", json=request).json()
+    second = client.post("/evaluate_batch", json=request).json()
+    assert first["cache_hits"] == 0 and second["cache_hits"] == 3
+    assert second["results"] == first["results"]
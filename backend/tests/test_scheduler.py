@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from config import MAX_NEW_TOKENS
+from scheduler import BULK, INTERACTIVE, BatchScheduler, _Lane, _PendingPrompt, request_lane
+
+
+class FakeEngine:
+    """Echoes prompts in upper case; fails any batch holding a prompt with "bad" in it"""
+
+    def __init__(self, max_batch_tokens=0):
+        self.batches = []
+        self._max_batch_tokens = max_batch_tokens
+
+    def generate_stream(self, prompts, on_output, sampling_params=None, aborted=None):
+        self.batches.append(list(prompts))
+        if any("bad" in prompt for prompt in prompts):
+            raise RuntimeError("engine error")
+        for index, prompt in enumerate(prompts):
+            on_output(index, prompt.upper())
+
+    def max_concurrent_batches(self):
+        return 1
+
+    def max_batch_tokens(self):
+        return self._max_batch_tokens
+
+    def generated_tokens(self, output):
+        return 1
+
+    def is_loaded(self):
+        return True
+
+    def memory_headroom(self):
+        return None
+
+    def get_current_model(self):
+        return "fake"
+
+
+def run_with_scheduler(engine, scenario, **settings):
+    async def main():
+        scheduler = BatchScheduler(engine, tuner=None, **{"max_wait_ms": 20, **settings})
+        await scheduler.start()
+        try:
+            return await scenario(scheduler)
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_batch():
+    engine = FakeEngine()
+
+    async def scenario(scheduler):
+        return await asyncio.gather(
+            scheduler.generate(["a1", "a2"]),
+            scheduler.generate(["b1"]),
+            scheduler.generate(["c1", "c2", "c3"])
+        )
+
+    results = run_with_scheduler(engine, scenario)
+    assert results == [["A1", "A2"], ["B1"], ["C1", "C2", "C3"]]
+    assert len(engine.batches) == 1 and len(engine.batches[0]) == 6
+
+
+def test_batch_size_limit_splits_the_queue():
+    engine = FakeEngine()
+
+    async def scenario(scheduler):
+        return await scheduler.generate([f"p{i}" for i in range(5)])
+
+    assert run_with_scheduler(engine, scenario, max_batch_size=2) == ["P0", "P1", "P2", "P3", "P4"]
+    assert [len(batch) for batch in engine.batches] == [2, 2, 1]
+
+
+def test_token_budget_caps_each_batch():
+    engine = FakeEngine(max_batch_tokens=3 * (100 + MAX_NEW_TOKENS))
+
+    async def scenario(scheduler):
+        return await scheduler.generate([f"p{i}" for i in range(7)], token_counts=[100] * 7)
+
+    assert run_with_scheduler(engine, scenario) == [f"P{i}" for i in range(7)]
+    assert [len(batch) for batch in engine.batches] == [3, 3, 1]
+
+
+def test_failing_prompt_only_fails_its_own_caller():
+    engine = FakeEngine()
+
+    async def scenario(scheduler):
+        return await asyncio.gather(
+            scheduler.generate(["good1", "good2"]),
+            scheduler.generate(["bad"]),
+            return_exceptions=True
+        )
+
+    good, bad = run_with_scheduler(engine, scenario)
+    assert good == ["GOOD1", "GOOD2"]
+    assert isinstance(bad, RuntimeError) and str(bad) == "engine error"
+
+
+def test_submit_requires_a_running_scheduler():
+    async def scenario():
+        with pytest.raises(RuntimeError, match="not running"):
+            BatchScheduler(FakeEngine(), tuner=None).submit(["p"])
+
+    asyncio.run(scenario())
+
+
+def pending(client, tokens=10, lane=INTERACTIVE):
+    return _PendingPrompt(client, None, 0, tokens, None, lane, client)
+
+
+def test_lane_serves_clients_fairly():
+    lane = _Lane()
+    for _ in range(4):
+        lane.put(pending("heavy"))
+    lane.put(pending("light"))
+    lane.put(pending("light"))
+    order = [lane.pop().client for _ in range(6)]
+    assert order == ["heavy", "light", "heavy", "light", "heavy", "heavy"]
+
+
+def test_bulk_prompts_keep_a_share_of_each_batch():
+    engine = FakeEngine()
+
+    async def scenario(scheduler):
+        bulk = asyncio.create_task(run_in_lane(scheduler, BULK, [f"bulk{i}" for i in range(4)]))
+        interactive = asyncio.create_task(run_in_lane(scheduler, INTERACTIVE, [f"inter{i}" for i in range(8)]))
+        return await asyncio.gather(bulk, interactive)
+
+    run_with_scheduler(engine, scenario, max_batch_size=4, bulk_min_share=0.25)
+    assert all(any(prompt.startswith("bulk") for prompt in batch) for batch in engine.batches[:3])
+
+
+async def run_in_lane(scheduler, lane, prompts):
+    request_lane.set((lane, lane))
+    return await scheduler.generate(prompts)
@@ -0,0 +1,50 @@
+import asyncio
+
+from conftest import run_with_runtime
+from models import EvaluateRequest, EvaluationResult, Professor, Publication
+from single_flight import InFlightResults
+
+REQUEST = EvaluateRequest(research_direction="coalescing identical prompts", professors=[])
+PROFESSORS = [
+    Professor(name=f"Shared Person {i}", affiliation="U", publicationList=[
+        Publication(title=f"Deduplicated serving {i}", year=2024, venue="osdi")
+    ]) for i in range(3)
+]
+
+
+def test_identical_concurrent_requests_share_sequences():
+    async def scenario(runtime):
+        runtime.engine.engine.seconds_per_token = 0.002  # Keep the first request in flight
+        return await asyncio.gather(runtime.evaluate(REQUEST, PROFESSORS), runtime.evaluate(REQUEST, PROFESSORS))
+
+    (first, _, first_stats), (second, _, second_stats) = run_with_runtime(scenario)
+    assert [r.score for r in first] == [r.score for r in second]
+    assert first_stats.coalesced_count + second_stats.coalesced_count == 3
+    assert len(first_stats.outputs) + len(second_stats.outputs) == 3
+
+
+def test_followers_generate_themselves_when_the_owner_gives_up():
+    async def scenario():
+        in_flight = InFlightResults()
+        owned, _ = in_flight.claim(["a", "b"], [0, 1])
+        _, followed = in_flight.claim(["a", "b"], [0, 1])
+        in_flight.settle("a", owned[0], EvaluationResult(score=0.5, reasoning="r", researchSummary="s"), True)
+        in_flight.release("b", owned[1])
+        settled = [await in_flight.wait(followed[0]), await in_flight.wait(followed[1])]
+        reclaimed, _ = in_flight.claim(["a", "b"], [0, 1])
+        return settled, sorted(reclaimed), len(in_flight)
+
+    (done, given_up), reclaimed, pending = asyncio.run(scenario())
+    assert done[0].score == 0.5 and done[1] is True
+    assert given_up is None
+    assert reclaimed == [0, 1] and pending == 2
+
+
+def test_disabled_coalescing_owns_every_prompt():
+    async def scenario():
+        in_flight = InFlightResults(enabled=False)
+        in_flight.claim(["a"], [0])
+        return in_flight.claim(["a"], [0])
+
+    owned, followed = asyncio.run(scenario())
+    assert list(owned) == [0] and followed == {}
@@ -0,0 +1,48 @@
+import gc
+import json
+
+from starlette.requests import Request
+
+from conftest import TEST_MODEL
+from models import EvaluateRequest
+
+PROFESSORS = [
+    {"name": f"Stream Person {i}", "affiliation": "U", "publicationList": [
+        {"title": f"Streaming paper {i}", "year": 2024, "venue": "icml"}
+    ]} for i in range(4)
+]
+
+
+def assert_released():
+    import server
+
+    assert server.pool.models[TEST_MODEL].in_use == 0
+    assert server.admission.admitted == 0
+    assert server.active_requests.ids() == []
+
+
+def test_stream_sends_every_result_then_a_summary(client):
+    response = client.post("/evaluate_stream", json={"research_direction": "streams", "professors": PROFESSORS})
+    frames = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+    assert sorted(frame["index"] for frame in frames[:-1]) == [0, 1, 2, 3]
+    assert frames[-1]["type"] == "summary" and frames[-1]["count"] == 4
+    assert_released()
+
+
+def test_stream_that_is_never_sent_releases_model_and_admission(client):
+    import server
+
+    async def open_stream():
+        scope = {
+            "type": "http", "method": "POST", "path": "/evaluate_stream", "query_string": b"",
+            "headers": [], "client": ("127.0.0.1", 1234)
+        }
+        request = EvaluateRequest(research_direction="streams", professors=PROFESSORS)
+        response = await server.evaluate_stream(Request(scope), request)
+        held = (server.pool.models[TEST_MODEL].in_use, server.admission.admitted, len(server.active_requests.ids()))
+        del response
+        gc.collect()
+        return held
+
+    assert client.portal.call(open_stream) == (1, len(PROFESSORS), 1)
+    assert_released()
@@ -0,0 +1,82 @@
+from models import Professor, Publication
+from prompt_builder import format_publications
+from token_planner import TokenBudgetPlanner
+
+
+class WordCounter:
+    """Counts one token per whitespace-separated word"""
+
+    def count_tokens(self, texts):
+        return [len(text.split()) for text in texts]
+
+
+def build(professors, omitted=None):
+    omitted = omitted or [0] * len(professors)
+    return [
+        f"Evaluate {professor.name} on:\n{format_publications(professor, count)}"
+        for professor, count in zip(professors, omitted)
+    ]
+
+
+def professor(name, papers):
+    return Professor(name=name, affiliation="U", publicationList=[
+        Publication(title=f"Paper number {i} about systems", year=2024 - i % 4, venue="osdi") for i in range(papers)
+    ])
+
+
+def make_planner(margin=0):
+    # 40 tokens per prompt (less the margin); a publication line is 7 words
+    return TokenBudgetPlanner(WordCounter(), max_model_len=50, max_new_tokens=10, margin=margin)
+
+
+def test_prompts_within_budget_are_kept_as_built():
+    professors = [professor("Short", 2)]
+    plan = make_planner().plan(professors, build)
+    assert plan.prompts == build(professors)
+    assert plan.trimmed == [] and plan.overflow == []
+
+
+def test_long_publication_list_keeps_the_first_papers_that_fit():
+    professors = [professor("Short", 1), professor("Long", 12)]
+    plan = make_planner().plan(professors, build)
+    assert plan.trimmed == [1] and plan.overflow == []
+    assert plan.token_counts[1] <= 40
+    assert plan.token_counts == WordCounter().count_tokens(plan.prompts)
+    assert "Paper number 0 " in plan.prompts[1] and "Paper number 11 " not in plan.prompts[1]
+    assert plan.token_counts[1] + 7 > 40  # One more paper would not have fit
+    assert "more recent publications omitted to fit the context" in plan.prompts[1]
+
+
+def test_newest_publication_is_kept_within_the_margin():
+    # 22 words of name leave no room for a paper and the marker within the
+    # 30-token budget, but the newest paper still fits the 40-token limit
+    professors = [professor("Name " * 20, 3)]
+    plan = make_planner(margin=10).plan(professors, build)
+    assert plan.trimmed == [0] and plan.overflow == []
+    assert "Paper number 0 " in plan.prompts[0] and "Paper number 1 " not in plan.prompts[0]
+    assert "2 more recent publications omitted" in plan.prompts[0]
+    assert "Publication data not available" not in plan.prompts[0]
+
+
+def test_prompt_too_long_without_publications_overflows():
+    professors = [professor("Name " * 45, 3), professor("Short", 1)]
+    plan = make_planner().plan(professors, build)
+    assert plan.overflow == [0]
+    assert plan.trimmed == []
+
+
+def test_prompt_without_room_for_any_paper_says_they_were_omitted():
+    professors = [professor("Name " * 24, 3)]
+    plan = make_planner(margin=5).plan(professors, build)
+    assert plan.trimmed == [0] and plan.overflow == []
+    assert "Paper number" not in plan.prompts[0]
+    assert "3 recent publications omitted to fit the context" in plan.prompts[0]
+
+
+def test_batch_size_is_deprecated_but_still_accepted(client):
+    schema = client.get("/openapi.json").json()["components"]["schemas"]["EvaluateRequest"]
+    assert schema["properties"]["batch_size"]["deprecated"] is True
+    response = client.post("/evaluate_batch", json={
+        "research_direction": "budgets", "batch_size": 1, "professors": [professor("Old Client", 1).model_dump()]
+    })
+    assert response.status_code == 200 and len(response.json()["results"]) == 1
@@ -0,0 +1,67 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import vector_index
+from text_encoder import create_encoder
+from vector_index import METADATA_FILE, VectorIndex, save_index
+
+TEXTS = [
+    "machine learning neurips icml",
+    "databases sigmod vldb query optimization",
+    "computer vision cvpr image segmentation",
+    "operating systems osdi sosp kernels",
+    "machine learning systems mlsys serving",
+]
+
+
+def build(directory, texts=TEXTS):
+    encoder = create_encoder("hashing:64")
+    encoder.fit(texts)
+    professors = [
+        {"id": f"{'europe' if i < 3 else 'canada'}:{i}", "name": f"P{i}", "affiliation": "U",
+         "region": "europe" if i < 3 else "canada"}
+        for i in range(len(texts))
+    ]
+    save_index(str(directory), encoder.encode(texts), professors, {"europe": (0, 3), "canada": (3, len(texts))}, encoder)
+    return VectorIndex(str(directory))
+
+
+def test_blocked_search_matches_brute_force(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "BLOCK_ROWS", 2)
+    index = build(tmp_path)
+    queries = np.random.default_rng(0).normal(size=(3, index.matrix.shape[1])).astype(np.float32)
+    expected = np.argsort(-(queries @ np.asarray(index.matrix).T), axis=1, kind="stable")[:, :3]
+    hits = index.search_vectors(queries, 3)
+    assert [[row for row, _ in query_hits] for query_hits in hits] == expected.tolist()
+
+
+def test_search_ranks_the_matching_professor_first(tmp_path):
+    index = build(tmp_path)
+    hits = index.search(["query optimization for databases"], 2)[0]
+    assert hits[0]["name"] == "P1" and hits[0]["score"] >= hits[1]["score"]
+    assert {hit["region"] for hit in index.search(["machine learning"], 5, ["canada"])[0]} == {"canada"}
+    assert index.search(["anything"], 0) == [[]]
+
+
+def test_unknown_region_and_mismatched_files_are_rejected(tmp_path):
+    index = build(tmp_path)
+    with pytest.raises(ValueError, match="Unknown regions"):
+        index.search(["x"], 1, ["mars"])
+
+    path = os.path.join(tmp_path, METADATA_FILE)
+    with open(path, encoding="utf-8") as f:
+        metadata = json.load(f)
+    metadata["count"] += 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    with pytest.raises(ValueError, match="rebuild the index"):
+        VectorIndex(str(tmp_path))
+
+
+def test_retrieve_without_an_index_gets_503(client):
+    response = client.post("/retrieve", json={"research_direction": "databases"})
+    assert response.status_code == 503
+    assert "build-vector-index" in response.json()["detail"]
@@ -0,0 +1,78 @@
+import gzip
+import json
+
+import pytest
+
+import wire_format
+from models import EvaluateRequest
+from wire_format import BodyTooLarge, UnsupportedFormat, decompress, parse_model
+
+REQUEST = {
+    "research_direction": "graph learning",
+    "professors": [{"name": "Ada Example", "affiliation": "ETH Zurich", "publicationList": [
+        {"title": "Graph paper", "year": 2023, "venue": "iclr"}
+    ]}]
+}
+
+
+def test_formats_parse_to_the_same_request():
+    expected = EvaluateRequest(**REQUEST)
+    body = json.dumps(REQUEST).encode()
+    assert parse_model(EvaluateRequest, body) == expected
+    assert parse_model(EvaluateRequest, gzip.compress(body), "application/json", "gzip") == expected
+    if wire_format.msgpack is not None:
+        packed = wire_format.msgpack.packb(REQUEST)
+        assert parse_model(EvaluateRequest, packed, "application/msgpack") == expected
+    if wire_format.zstandard is not None:
+        compressed = wire_format.zstandard.ZstdCompressor().compress(body)
+        assert parse_model(EvaluateRequest, compressed, "application/json", "zstd") == expected
+
+
+def test_gzip_members_are_concatenated():
+    assert decompress(gzip.compress(b"ab") + gzip.compress(b"cd"), "gzip", 100) == b"abcd"
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_decompression_stops_at_the_size_limit(encoding):
+    if encoding == "zstd" and wire_format.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    raw = b"\0" * (8 << 20)
+    body = gzip.compress(raw) if encoding == "gzip" else wire_format.zstandard.ZstdCompressor().compress(raw)
+    assert len(body) < 1 << 20
+    assert decompress(body, encoding, len(raw)) == raw
+    with pytest.raises(BodyTooLarge):
+        decompress(body, encoding, len(raw) - 1)
+
+
+def test_raw_body_over_the_limit():
+    with pytest.raises(BodyTooLarge):
+        decompress(b"x" * 11, None, 10)
+
+
+def test_invalid_bodies():
+    with pytest.raises(ValueError, match="gzip"):
+        decompress(b"abc", "gzip")
+    with pytest.raises(ValueError, match="truncated"):
+        decompress(gzip.compress(b"abcdef" * 100)[:-12], "gzip")
+    with pytest.raises(UnsupportedFormat):
+        decompress(b"abc", "br")
+    with pytest.raises(UnsupportedFormat):
+        parse_model(EvaluateRequest, b"x", "text/plain")
+
+
+def test_endpoint_status_codes(client, monkeypatch):
+    import server
+
+    body = json.dumps(REQUEST).encode()
+    assert client.post("/evaluate_batch", content=body).status_code == 200
+    assert client.post("/evaluate_batch", content=b"x", headers={"content-type": "text/plain"}).status_code == 415
+    assert client.post("/evaluate_batch", content=b"abc", headers={"content-encoding": "br"}).status_code == 415
+    assert client.post("/evaluate_batch", content=b"{bad", headers={"content-type": "application/json"}).status_code == 400
+    assert client.post("/evaluate_batch", content=b"abc", headers={"content-encoding": "gzip"}).status_code == 400
+    assert client.post("/evaluate_batch", json={"professors": [{"name": 1}]}).status_code == 422
+
+    monkeypatch.setattr(server, "MAX_REQUEST_BODY_BYTES", 1 << 20)
+    bomb = gzip.compress(b" " * (4 << 20))
+    response = client.post("/evaluate_batch", content=bomb, headers={"content-encoding": "gzip"})
+    assert response.status_code == 413
+    assert client.post("/evaluate_batch", content=gzip.compress(body), headers={"content-encoding": "gzip"}).status_code == 200
@@ -0,0 +1,176 @@
+"""
+Local text encoders
+Turn professor profiles and research directions into L2-normalized dense
+vectors for the vector index. Encoders are named by a spec string such as
+"hashing:512" or "sentence-transformers:all-MiniLM-L6-v2", which the index
+stores so queries are always encoded the same way as the professors.
+"""
+
+import math
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from prerank import tokenize
+
+ENCODERS = ("hashing", "sentence-transformers")
+DEFAULT_ENCODER = "hashing:512"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length in place (all-zero rows stay zero)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+@lru_cache(maxsize=65536)
+def _term_hash(term: str) -> int:
+    """Stable 32-bit hash of a term (hash() is salted per process)"""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+class TextEncoder(ABC):
+    """Maps texts to L2-normalized float32 vectors of a fixed dimension"""
+
+    @property
+    @abstractmethod
+    def spec(self) -> str:
+        """Spec string that recreates this encoder with create_encoder()"""
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """Vector dimension"""
+
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode a batch of texts
+
+        Returns:
+            float32 array of shape (len(texts), dim) with unit-length rows
+        """
+
+    def fit(self, texts: List[str]) -> None:
+        """Learn corpus statistics before encoding the corpus (optional)"""
+
+    def state(self) -> Dict:
+        """Fitted state saved next to the index (JSON-serializable)"""
+        return {}
+
+    def load_state(self, state: Dict) -> None:
+        """Restore state saved by state()"""
+
+
+class HashingEncoder(TextEncoder):
+    """
+    Signed feature hashing of lexical terms
+
+    Uses the pre-ranking tokenizer (stemming, abbreviations, stopwords) with
+    sublinear term frequency. fit() learns an IDF weight per hash bucket so
+    terms shared by most professors ("computer", "system") count for less.
+    Needs no model and is deterministic across processes.
+    """
+
+    def __init__(self, dim: int = 512):
+        self._dim = dim
+        self.idf = np.ones(dim, dtype=np.float32)
+
+    @property
+    def spec(self) -> str:
+        return f"hashing:{self._dim}"
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def _term_vectors(self, texts: List[str]) -> np.ndarray:
+        """Unweighted hashed term frequencies"""
+        vectors = np.zeros((len(texts), self._dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, tf in Counter(tokenize(text)).items():
+                h = _term_hash(term)
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self._dim] += sign * (1.0 + math.log(tf))
+        return vectors
+
+    def fit(self, texts: List[str]) -> None:
+        """Learn per-bucket IDF weights from the corpus"""
+        df = np.count_nonzero(self._term_vectors(texts), axis=0)
+        self.idf = np.log((1 + len(texts)) / (1 + df)).astype(np.float32) + 1.0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """IDF-weighted hashed term vectors, unit length"""
+        return _normalize(self._term_vectors(texts) * self.idf)
+
+    def state(self) -> Dict:
+        """IDF weights"""
+        return {"idf": [round(float(w), 6) for w in self.idf]}
+
+    def load_state(self, state: Dict) -> None:
+        """Restore IDF weights saved by state()"""
+        if "idf" in state:
+            idf = np.asarray(state["idf"], dtype=np.float32)
+            if idf.shape != (self._dim,):
+                raise ValueError(f"IDF has {idf.shape[0]} weights, expected {self._dim}")
+            self.idf = idf
+
+
+class SentenceTransformerEncoder(TextEncoder):
+    """Local sentence-transformers model (optional dependency)"""
+
+    def __init__(self, model_name: str, batch_size: int = 64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError(
+                "The sentence-transformers encoder needs `pip install sentence-transformers`"
+            )
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    @property
+    def spec(self) -> str:
+        return f"sentence-transformers:{self.model_name}"
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Sentence embeddings, unit length"""
+        vectors = self.model.encode(
+            texts, batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return vectors.astype(np.float32, copy=False)
+
+
+def create_encoder(spec: str = DEFAULT_ENCODER, state: Optional[Dict] = None) -> TextEncoder:
+    """
+    Instantiate an encoder from its spec string
+
+    Args:
+        spec: "<encoder>[:<argument>]", e.g. "hashing:1024"
+        state: Fitted state saved with the index
+
+    Raises:
+        ValueError: If the encoder is unknown or its argument is invalid
+    """
+    name, _, argument = spec.partition(":")
+    if name == "hashing":
+        encoder = HashingEncoder(int(argument) if argument else 512)
+    elif name == "sentence-transformers":
+        if not argument:
+            raise ValueError("sentence-transformers encoder needs a model, e.g. sentence-transformers:all-MiniLM-L6-v2")
+        encoder = SentenceTransformerEncoder(argument)
+    else:
+        raise ValueError(f"Unknown encoder: {name}. Available: {list(ENCODERS)}")
+    if state:
+        encoder.load_state(state)
+    return encoder
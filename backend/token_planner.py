@@ -0,0 +1,128 @@
+"""
+Token-budget-aware prompt planning
+Measures prompts with the model tokenizer and trims publication lists so
+every prompt fits the context window
+"""
+
+import logging
+from typing import Callable, List, NamedTuple, Optional
+
+from config import MAX_MODEL_LEN, MAX_NEW_TOKENS, PROMPT_TOKEN_MARGIN
+from models import Professor
+from prompt_builder import format_publication, recent_publications
+
+logger = logging.getLogger(__name__)
+
+
+class PromptPlan(NamedTuple):
+    """Prompts ready for generation"""
+    prompts: List[str]
+    token_counts: List[int]
+    trimmed: List[int]   # indices whose publication list was shortened
+    overflow: List[int]  # indices that do not fit even without publications
+
+
+class TokenBudgetPlanner:
+    """
+    Fits prompts into a per-prompt token budget
+
+    The budget is the context window minus the generation allowance and a
+    small safety margin. Prompts over budget keep their most recent
+    publications (in prompt order) and drop the rest, so a long publication
+    list shortens the prompt instead of failing the whole engine batch. The
+    prompt says how many publications were left out, and the newest one is
+    kept whenever it fits within the margin.
+    """
+
+    def __init__(
+        self,
+        engine,
+        max_model_len: int = MAX_MODEL_LEN,
+        max_new_tokens: int = MAX_NEW_TOKENS,
+        margin: int = PROMPT_TOKEN_MARGIN
+    ):
+        self.engine = engine
+        self.prompt_budget = max_model_len - max_new_tokens - margin
+        # Longest prompt the engine accepts at all
+        self.hard_limit = max_model_len - max_new_tokens
+
+    def fits(self, token_count: int) -> bool:
+        """Check if a prompt of token_count tokens can be generated without overflowing"""
+        return token_count <= self.hard_limit
+
+    def plan(
+        self,
+        professors: List[Professor],
+        build: Callable[[List[Professor], Optional[List[int]]], List[str]]
+    ) -> PromptPlan:
+        """
+        Build and measure prompts, trimming publications where needed
+
+        Args:
+            professors: Professor data
+            build: Renders prompts for a list of professors; called as
+                build(professors) and, for trimmed professors, as
+                build(professors, omitted) with the number of recent
+                publications left out of each
+
+        Returns:
+            PromptPlan with one prompt and token count per professor
+        """
+        prompts = build(professors)
+        token_counts = self.engine.count_tokens(prompts)
+        over = [i for i, count in enumerate(token_counts) if count > self.prompt_budget]
+        if not over:
+            return PromptPlan(prompts, token_counts, [], [])
+
+        # Estimate how many publication lines each long prompt must drop
+        keep = {}
+        papers = {i: recent_publications(professors[i]) for i in over}
+        line_tokens = self.engine.count_tokens(
+            [format_publication(p) + "\n" for i in over for p in papers[i]]
+        )
+        offset = 0
+        for i in over:
+            costs = line_tokens[offset:offset + len(papers[i])]
+            offset += len(papers[i])
+            excess = token_counts[i] - self.prompt_budget
+            kept = len(costs)
+            while kept > 0 and excess > 0:
+                kept -= 1
+                excess -= costs[kept]
+            # The newest publication goes last; see below
+            keep[i] = max(kept, min(1, len(costs)))
+
+        # Rebuild and re-measure; tokenization is not exactly additive, so
+        # keep dropping one line at a time until each prompt fits
+        overflow = []
+        pending = list(over)
+        while pending:
+            trimmed_professors = [
+                professors[i].model_copy(update={"publicationList": papers[i][:keep[i]]})
+                for i in pending
+            ]
+            rebuilt = build(trimmed_professors, [len(papers[i]) - keep[i] for i in pending])
+            counts = self.engine.count_tokens(rebuilt)
+
+            still_over = []
+            for i, prompt, count in zip(pending, rebuilt, counts):
+                prompts[i] = prompt
+                token_counts[i] = count
+                if count <= self.prompt_budget:
+                    continue
+                if keep[i] == 1 and self.fits(count):
+                    # Better to eat into the margin than to show no publications at all
+                    continue
+                if keep[i] == 0:
+                    overflow.append(i)
+                else:
+                    keep[i] -= 1
+                    still_over.append(i)
+            pending = still_over
+
+        trimmed = [i for i in over if i not in overflow]
+        logger.info(
+            f"✂️ Trimmed publications for {len(trimmed)} prompts to fit "
+            f"{self.prompt_budget} tokens ({len(overflow)} still too long)"
+        )
+        return PromptPlan(prompts, token_counts, trimmed, sorted(overflow))
@@ -0,0 +1,166 @@
+"""
+Memory-mapped professor vector index
+scripts/build-vector-index.py writes one L2-normalized row per professor to
+professors.npy and the id map plus encoder to professors.json. The server
+memory-maps the matrix, so the index costs page cache instead of resident
+heap and is shared by every worker process on the host.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from text_encoder import TextEncoder, create_encoder
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+MATRIX_FILE = "professors.npy"
+METADATA_FILE = "professors.json"
+
+# Rows scored per matmul; bounds the temporary score buffer on large indexes
+BLOCK_ROWS = 65536
+
+
+def save_index(
+    directory: str,
+    matrix: np.ndarray,
+    professors: List[Dict],
+    regions: Dict[str, Tuple[int, int]],
+    encoder: TextEncoder
+) -> None:
+    """
+    Write an index atomically (a server mapping the old files keeps working)
+
+    Args:
+        directory: Output directory
+        matrix: float32 (professors x dim) matrix with unit-length rows
+        professors: One id map entry per row ({"id", "name", "affiliation", "region"})
+        regions: Region -> [start, end) row range
+        encoder: Encoder that produced the rows
+    """
+    os.makedirs(directory, exist_ok=True)
+    metadata = {
+        "version": INDEX_VERSION,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "encoder": encoder.spec,
+        "encoder_state": encoder.state(),
+        "dim": int(matrix.shape[1]),
+        "count": int(matrix.shape[0]),
+        "regions": {region: [int(start), int(end)] for region, (start, end) in regions.items()},
+        "professors": professors
+    }
+    matrix_path = os.path.join(directory, MATRIX_FILE)
+    metadata_path = os.path.join(directory, METADATA_FILE)
+    with open(matrix_path + ".tmp", "wb") as f:
+        np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+    with open(metadata_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+    os.replace(matrix_path + ".tmp", matrix_path)
+    os.replace(metadata_path + ".tmp", metadata_path)
+
+
+class VectorIndex:
+    """Nearest-professor search over a memory-mapped index"""
+
+    def __init__(self, directory: str):
+        """
+        Map an index written by save_index()
+
+        Raises:
+            FileNotFoundError: If the index has not been built
+            ValueError: If the matrix and id map disagree
+        """
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version: {metadata.get('version')}")
+
+        self.matrix = np.load(os.path.join(directory, MATRIX_FILE), mmap_mode="r")
+        if self.matrix.shape != (metadata["count"], metadata["dim"]):
+            raise ValueError(
+                f"Matrix shape {self.matrix.shape} does not match the id map "
+                f"({metadata['count']} x {metadata['dim']}); rebuild the index"
+            )
+        self.directory = directory
+        self.built_at = metadata.get("built_at")
+        self.professors: List[Dict] = metadata["professors"]
+        self.regions: Dict[str, Tuple[int, int]] = {
+            region: (start, end) for region, (start, end) in metadata["regions"].items()
+        }
+        self.encoder = create_encoder(metadata["encoder"], metadata.get("encoder_state"))
+        logger.info(
+            f"✅ Vector index mapped: {len(self.professors)} professors x {metadata['dim']} "
+            f"({metadata['encoder']}, built {self.built_at})"
+        )
+
+    def __len__(self) -> int:
+        return len(self.professors)
+
+    def _ranges(self, regions: Optional[List[str]]) -> List[Tuple[int, int]]:
+        """Row ranges to scan"""
+        if not regions:
+            return [(0, len(self.professors))]
+        unknown = [r for r in regions if r not in self.regions]
+        if unknown:
+            raise ValueError(f"Unknown regions: {unknown}. Available: {sorted(self.regions)}")
+        return sorted(self.regions[r] for r in set(regions))
+
+    def search_vectors(
+        self,
+        queries: np.ndarray,
+        top_n: int,
+        regions: Optional[List[str]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-N rows by dot product for a batch of query vectors
+
+        The matrix is scanned in blocks of BLOCK_ROWS with one matmul per
+        block for all queries; each block's candidates are merged into a
+        running top-N with argpartition.
+
+        Returns:
+            Per query, (row, score) pairs sorted best first
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start, end in self._ranges(regions):
+            for block_start in range(start, end, BLOCK_ROWS):
+                block_end = min(block_start + BLOCK_ROWS, end)
+                scores = queries @ self.matrix[block_start:block_end].T
+                rows = np.broadcast_to(np.arange(block_start, block_end), scores.shape)
+                best_rows = np.concatenate((best_rows, rows), axis=1)
+                best_scores = np.concatenate((best_scores, scores), axis=1)
+                if best_scores.shape[1] > top_n:
+                    keep = np.argpartition(-best_scores, top_n - 1, axis=1)[:, :top_n]
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return [
+            list(zip(rows.tolist(), scores.tolist()))
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+    def search(self, texts: List[str], top_n: int, regions: Optional[List[str]] = None) -> List[List[Dict]]:
+        """
+        Professors nearest to each text
+
+        Returns:
+            Per text, id map entries with a "score" (cosine similarity), best first
+        """
+        if top_n <= 0:
+            return [[] for _ in texts]
+        hits = self.search_vectors(self.encoder.encode(texts), top_n, regions)
+        return [
+            [{**self.professors[row], "score": round(score, 6)} for row, score in query_hits]
+            for query_hits in hits
+        ]
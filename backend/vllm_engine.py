@@ -0,0 +1,383 @@
+"""
+vLLM inference backend
+Handles model lifecycle, batch processing, and error handling on GPU
+"""
+
+import asyncio
+import gc
+import itertools
+import time
+from typing import Callable, List, Dict, Optional
+from vllm import LLM, SamplingParams
+from vllm.outputs import RequestOutput
+import logging
+
+try:
+    # Structured (JSON-schema constrained) decoding, vLLM >= 0.6.3
+    from vllm.sampling_params import GuidedDecodingParams
+except ImportError:
+    GuidedDecodingParams = None
+
+from batch_tuner import is_out_of_memory, tuning_store
+from config import (
+    ENABLE_PREFIX_CACHING, GPU_MEMORY_MAX_UTILIZATION, GPU_MEMORY_RESERVE_GB, MAX_MODEL_LEN, MAX_NEW_TOKENS,
+    MODEL_LOAD_OOM_RETRIES
+)
+from engine_base import EVALUATION_JSON_SCHEMA, Aborted, InferenceEngine, LoadProgress, download_model
+from model_catalog import AVAILABLE_MODELS
+
+logger = logging.getLogger(__name__)
+
+# Hugging Face cache inside the container
+HF_DOWNLOAD_DIR = "/root/.cache/huggingface"
+
+# Factor applied to the GPU memory utilization after a load runs out of memory
+OOM_BACKOFF = 0.85
+
+
+def _release_gpu_memory() -> None:
+    """Return the memory of a dropped LLM to the device (blocking)"""
+    # Parallel state is left alone: other resident models still use it
+    gc.collect()
+    import torch
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+class VLLMEngine(InferenceEngine):
+    """vLLM inference engine wrapper"""
+    
+    def __init__(self, gpu_memory_share: float = 1.0):
+        super().__init__()
+        self.llm: Optional[LLM] = None
+        # Fraction of the usual GPU memory budget this engine may claim, so
+        # several engines (e.g. cascade tiers) can share one GPU
+        self.gpu_memory_share = gpu_memory_share
+        self._request_counter = itertools.count()
+        self._headroom: Optional[float] = None  # Lowest free KV cache fraction of the last batch
+    
+    def is_loaded(self) -> bool:
+        """Check if model is loaded"""
+        return self.llm is not None
+    
+    async def load_model(self, model_id: str, progress: Optional[LoadProgress] = None) -> None:
+        """
+        Load a model into memory
+        
+        Downloading and engine construction run in worker threads, so the
+        event loop keeps serving requests during a multi-minute load.
+        
+        Args:
+            model_id: Model identifier (e.g., 'qwen-0.5b')
+            progress: Told when the load moves to another stage
+        
+        Raises:
+            ValueError: If model_id is not recognized
+            RuntimeError: If model loading fails
+        """
+        if model_id not in AVAILABLE_MODELS:
+            raise ValueError(
+                f"Unknown model: {model_id}. "
+                f"Available: {list(AVAILABLE_MODELS.keys())}"
+            )
+        
+        # Unload existing model if any
+        if self.llm is not None:
+            logger.info(f"Unloading current model: {self.current_model}")
+            await self.unload_model()
+        
+        model_config = AVAILABLE_MODELS[model_id]
+        model_path = model_config["model_path"]
+        
+        logger.info(f"Loading model: {model_path}")
+        
+        try:
+            if progress is not None:
+                progress("downloading")
+            await asyncio.to_thread(download_model, model_path, HF_DOWNLOAD_DIR)
+            if progress is not None:
+                progress("initializing")
+            self.llm = await asyncio.to_thread(self._create_llm, model_id, model_path)
+            
+            self.current_model = model_id
+            
+            # Set sampling parameters based on model size
+            # Larger models benefit from lower temperature for more focused outputs
+            temperature = 0.1 if "7b" in model_id or "14b" in model_id else 0.2
+            self.sampling_params = SamplingParams(
+                temperature=temperature,
+                top_p=0.8,
+                max_tokens=MAX_NEW_TOKENS,
+                repetition_penalty=1.1
+            )
+            self.retry_sampling_params = self._build_retry_sampling_params()
+            
+            logger.info(f"✅ Model loaded successfully: {model_id} (temp={temperature})")
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to load model {model_id}: {e}")
+            self.llm = None
+            self.current_model = None
+            raise RuntimeError(f"Model loading failed: {str(e)}")
+    
+    def _create_llm(self, model_id: str, model_path: str) -> LLM:
+        """
+        Blocking part of load_model: size the GPU share and build the engine
+
+        A load that runs out of memory is retried with OOM_BACKOFF times the
+        utilization; the backoff that worked is remembered for the model's
+        next load, so it does not run out of memory again first.
+        """
+        saved_backoff = tuning_store.get(model_id).get("gpu_memory_backoff", 1.0)
+        backoff = saved_backoff
+        for attempt in range(MODEL_LOAD_OOM_RETRIES + 1):
+            gpu_util = self._gpu_memory_utilization() * backoff
+            try:
+                llm = self._build_llm(model_id, model_path, gpu_util)
+            except Exception as e:
+                if attempt == MODEL_LOAD_OOM_RETRIES or not is_out_of_memory(e):
+                    raise
+                logger.warning(
+                    f"⚠️ Out of memory loading {model_id} at {gpu_util:.0%} GPU utilization; "
+                    f"retrying at {gpu_util * OOM_BACKOFF:.0%}"
+                )
+                _release_gpu_memory()
+                backoff *= OOM_BACKOFF
+                continue
+            if backoff != saved_backoff:
+                tuning_store.update(model_id, gpu_memory_backoff=round(backoff, 4))
+            return llm
+
+    def _gpu_memory_utilization(self) -> float:
+        """
+        Fraction of the device vLLM may claim for this engine
+
+        Sized from the memory free right now (other processes and resident
+        models included) minus GPU_MEMORY_RESERVE_GB for CUDA overhead, and
+        capped at this engine's share of GPU_MEMORY_MAX_UTILIZATION.
+        """
+        import torch
+        budget = GPU_MEMORY_MAX_UTILIZATION * self.gpu_memory_share
+        if not torch.cuda.is_available():
+            return budget  # Default for CPU fallback
+        free_bytes, total_bytes = torch.cuda.mem_get_info()
+        reserve_bytes = GPU_MEMORY_RESERVE_GB * 1024**3
+        gpu_util = min(budget, (free_bytes - reserve_bytes) / total_bytes)
+        logger.info(
+            f"GPU: Total {total_bytes / 1024**3:.1f}GB, Free {free_bytes / 1024**3:.1f}GB, "
+            f"Using {gpu_util * 100:.0f}% utilization"
+        )
+        if gpu_util <= 0.05:
+            logger.warning(f"⚠️ Only {free_bytes / 1024**3:.1f}GB of GPU memory free; loading anyway")
+            gpu_util = 0.05
+        return gpu_util
+
+    def _build_llm(self, model_id: str, model_path: str, gpu_util: float) -> LLM:
+        """Construct the vLLM engine with the given GPU memory utilization"""
+        # Enable INT8 quantization for large models (7B+)
+        use_quantization = "7b" in model_id or "14b" in model_id
+        
+        if use_quantization:
+            logger.info(f"Enabling INT8 quantization for {model_id}")
+            return LLM(
+                model=model_path,
+                quantization="bitsandbytes",
+                load_format="bitsandbytes",
+                gpu_memory_utilization=gpu_util,
+                max_model_len=MAX_MODEL_LEN,
+                enable_prefix_caching=ENABLE_PREFIX_CACHING,
+                trust_remote_code=True,
+                download_dir=HF_DOWNLOAD_DIR
+            )
+        else:
+            return LLM(
+                model=model_path,
+                gpu_memory_utilization=gpu_util,
+                max_model_len=MAX_MODEL_LEN,
+                enable_prefix_caching=ENABLE_PREFIX_CACHING,
+                trust_remote_code=True,
+                download_dir=HF_DOWNLOAD_DIR
+            )
+    
+    def _build_retry_sampling_params(self) -> SamplingParams:
+        """
+        Greedy, JSON-only sampling for re-generating invalid outputs
+        
+        Uses JSON-schema guided decoding when this vLLM version supports it;
+        otherwise generation stops at the first closing brace.
+        """
+        params = dict(
+            temperature=0.0,
+            max_tokens=MAX_NEW_TOKENS,
+            repetition_penalty=1.1,
+            stop=["}"],
+            include_stop_str_in_output=True
+        )
+        if GuidedDecodingParams is not None:
+            try:
+                return SamplingParams(guided_decoding=GuidedDecodingParams(json=EVALUATION_JSON_SCHEMA), **params)
+            except TypeError:
+                pass
+        return SamplingParams(**params)
+    
+    async def unload_model(self) -> None:
+        """Unload current model and free memory"""
+        if self.llm is not None:
+            logger.info(f"Unloading model: {self.current_model}")
+            # vLLM has no explicit unload: drop every reference, then collect
+            # so the weights and KV cache are freed before the next load
+            self.llm = None
+            self.current_model = None
+            self.sampling_params = None
+            self.retry_sampling_params = None
+            await asyncio.to_thread(_release_gpu_memory)
+            logger.info("✅ Model unloaded")
+    
+    def generate_batch(
+        self,
+        prompts: List[str],
+        sampling_params: Optional[List[Optional[SamplingParams]]] = None
+    ) -> List[RequestOutput]:
+        """
+        Generate responses for a batch of prompts
+        
+        Args:
+            prompts: List of prompt strings
+            sampling_params: Per-prompt sampling parameters (None entries use the default)
+        
+        Returns:
+            List of vLLM outputs
+        
+        Raises:
+            RuntimeError: If model is not loaded
+        """
+        if self.llm is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        
+        logger.info(f"Generating for batch of {len(prompts)} prompts")
+        start_time = time.time()
+        
+        try:
+            outputs = self.llm.generate(prompts, self._resolve_sampling(prompts, sampling_params))
+            
+            elapsed = time.time() - start_time
+            rate = len(prompts) / elapsed
+            hit_rate = self.prefix_cache_hit_rate(outputs)
+            logger.info(
+                f"✅ Batch complete: {len(prompts)} prompts in {elapsed:.2f}s "
+                f"({rate:.2f} prompts/sec"
+                + (f", prefix cache hit rate {hit_rate:.1%})" if hit_rate is not None else ")")
+            )
+            
+            return outputs
+        
+        except Exception as e:
+            logger.error(f"❌ Batch generation failed: {e}")
+            raise RuntimeError(f"Generation failed: {str(e)}")
+    
+    def generate_stream(
+        self,
+        prompts: List[str],
+        on_output: Callable[[int, RequestOutput], None],
+        sampling_params: Optional[List[Optional[SamplingParams]]] = None,
+        aborted: Optional[Aborted] = None
+    ) -> None:
+        """
+        Generate responses and report each one as soon as its sequence finishes
+
+        Drives the underlying vLLM engine step by step instead of waiting for
+        the whole batch, so short outputs are delivered before long ones.
+        Aborted sequences are removed from the engine between steps, which
+        frees their KV cache and decode slots for the rest of the batch.
+
+        Args:
+            prompts: List of prompt strings
+            on_output: Called with (prompt index, output) for every finished sequence
+            sampling_params: Per-prompt sampling parameters (None entries use the default)
+            aborted: Polled between engine steps; sequences it returns True for are aborted
+
+        Raises:
+            RuntimeError: If model is not loaded or generation fails
+        """
+        if self.llm is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        
+        logger.info(f"Streaming generation for batch of {len(prompts)} prompts")
+        start_time = time.time()
+        
+        engine = self.llm.llm_engine
+        pending: Dict[str, int] = {}
+        finished: List[RequestOutput] = []
+        
+        try:
+            params = self._resolve_sampling(prompts, sampling_params)
+            for i, prompt in enumerate(prompts):
+                request_id = f"csprof-{next(self._request_counter)}"
+                engine.add_request(request_id, prompt, params[i])
+                pending[request_id] = i
+            
+            aborted_count = 0
+            self._headroom = self._kv_cache_free_fraction()
+            while pending and engine.has_unfinished_requests():
+                if aborted is not None:
+                    dropped = [request_id for request_id, index in pending.items() if aborted(index)]
+                    if dropped:
+                        engine.abort_request(dropped)
+                        for request_id in dropped:
+                            del pending[request_id]
+                        aborted_count += len(dropped)
+                        continue
+                for output in engine.step():
+                    if output.finished and output.request_id in pending:
+                        finished.append(output)
+                        on_output(pending.pop(output.request_id), output)
+                free = self._kv_cache_free_fraction() if self._headroom is not None else None
+                if free is not None:
+                    self._headroom = min(self._headroom, free)
+            
+            if pending:
+                raise RuntimeError(f"{len(pending)} sequences finished without output")
+            
+            elapsed = time.time() - start_time
+            rate = len(prompts) / elapsed if elapsed > 0 else 0.0
+            hit_rate = self.prefix_cache_hit_rate(finished)
+            logger.info(
+                f"✅ Stream complete: {len(prompts)} prompts in {elapsed:.2f}s "
+                f"({rate:.2f} prompts/sec"
+                + (f", {aborted_count} aborted" if aborted_count else "")
+                + (f", prefix cache hit rate {hit_rate:.1%})" if hit_rate is not None else ")")
+            )
+        
+        except Exception as e:
+            for request_id in pending:
+                engine.abort_request(request_id)
+            logger.error(f"❌ Streaming generation failed: {e}")
+            raise RuntimeError(f"Generation failed: {str(e)}")
+    
+    def _kv_cache_free_fraction(self) -> Optional[float]:
+        """Free fraction of the KV cache blocks, or None if this vLLM version does not expose them"""
+        engine = self.llm.llm_engine
+        try:
+            schedulers = engine.scheduler if isinstance(engine.scheduler, list) else [engine.scheduler]
+            total = engine.cache_config.num_gpu_blocks
+            free = min(scheduler.block_manager.get_num_free_gpu_blocks() for scheduler in schedulers)
+        except (AttributeError, TypeError, ValueError):
+            return None
+        return free / total if total else None
+
+    def memory_headroom(self) -> Optional[float]:
+        """Lowest free fraction of the KV cache during the last batch (None = unknown)"""
+        return self._headroom
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Count tokens for each text with the loaded model's tokenizer
+        
+        Raises:
+            RuntimeError: If model is not loaded
+        """
+        if self.llm is None:
+            raise RuntimeError("No model loaded. Call load_model() first.")
+        if not texts:
+            return []
+        encoded = self.llm.get_tokenizer()(texts, add_special_tokens=False)
+        return [len(ids) for ids in encoded["input_ids"]]
@@ -0,0 +1,230 @@
+"""
+Wire formats for the batch endpoints
+Request bodies can be JSON or msgpack (Content-Type), optionally gzip- or
+zstd-compressed (Content-Encoding); responses follow Accept and
+Accept-Encoding. Compressed bodies are inflated a chunk at a time and
+rejected once they grow past the body size limit, so a small compression
+bomb cannot exhaust memory.
+"""
+
+import gzip
+import io
+import json
+import zlib
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json is used when orjson is not installed
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: msgpack bodies are rejected (415) without it
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd bodies are rejected (415) without it
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+# Decompressed bytes produced per step
+INFLATE_CHUNK_BYTES = 1 << 20
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class UnsupportedFormat(ValueError):
+    """Content type or encoding the server cannot decode"""
+
+
+class BodyTooLarge(ValueError):
+    """Body larger than the size limit, before or after decompression"""
+
+
+def _media_type(content_type: Optional[str]) -> str:
+    return (content_type or JSON).split(";")[0].strip().lower()
+
+
+def _too_large(max_size: int) -> BodyTooLarge:
+    return BodyTooLarge(f"Request body exceeds {max_size} bytes")
+
+
+def _inflate_gzip(body: bytes, max_size: int) -> bytes:
+    """Decompress every gzip member of a body, stopping past max_size bytes"""
+    output = bytearray()
+    data = body
+    while data:
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while not inflater.eof:
+            step = min(max_size + 1 - len(output), INFLATE_CHUNK_BYTES) if max_size else INFLATE_CHUNK_BYTES
+            chunk = inflater.decompress(data, step)
+            output += chunk
+            if max_size and len(output) > max_size:
+                raise _too_large(max_size)
+            data = inflater.unconsumed_tail
+            if not data and len(chunk) < step:
+                break  # Input used up and no output pending
+        if not inflater.eof:
+            raise ValueError("Invalid gzip body: truncated")
+        data = inflater.unused_data
+    return bytes(output)
+
+
+def _inflate_zstd(body: bytes, max_size: int) -> bytes:
+    """Decompress every zstd frame of a body, stopping past max_size bytes"""
+    output = bytearray()
+    reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body), read_across_frames=True)
+    while True:
+        chunk = reader.read(INFLATE_CHUNK_BYTES)
+        if not chunk:
+            return bytes(output)
+        output += chunk
+        if max_size and len(output) > max_size:
+            raise _too_large(max_size)
+
+
+def decompress(body: bytes, content_encoding: Optional[str], max_size: int = 0) -> bytes:
+    """
+    Undo a Content-Encoding
+
+    Args:
+        max_size: Largest body accepted, compressed or not (0 = no limit)
+
+    Raises:
+        BodyTooLarge: If the body or its decompressed form exceeds max_size
+        UnsupportedFormat: If the encoding is unknown or its library is missing
+        ValueError: If the body is not valid for its encoding
+    """
+    if max_size and len(body) > max_size:
+        raise _too_large(max_size)
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        try:
+            return _inflate_gzip(body, max_size)
+        except zlib.error as e:
+            raise ValueError(f"Invalid gzip body: {e}")
+    if encoding == "zstd":
+        if zstandard is None:
+            raise UnsupportedFormat("zstd bodies need the zstandard package")
+        try:
+            return _inflate_zstd(body, max_size)
+        except zstandard.ZstdError as e:
+            raise ValueError(f"Invalid zstd body: {e}")
+    raise UnsupportedFormat(f"Unsupported Content-Encoding: {content_encoding}")
+
+
+def decode(body: bytes, content_type: Optional[str]) -> Any:
+    """
+    Decode a JSON or msgpack body
+
+    Raises:
+        UnsupportedFormat: If the content type is unknown or msgpack is missing
+        ValueError: If the body does not decode
+    """
+    media_type = _media_type(content_type)
+    if media_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise UnsupportedFormat("msgpack bodies need the msgpack package")
+        try:
+            return msgpack.unpackb(body)
+        except (msgpack.UnpackException, ValueError) as e:
+            raise ValueError(f"Invalid msgpack body: {e}")
+    if media_type == JSON or media_type.endswith("+json"):
+        try:
+            return orjson.loads(body) if orjson is not None else json.loads(body)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON body: {e}")
+    raise UnsupportedFormat(f"Unsupported Content-Type: {content_type}")
+
+
+def parse_model(
+    model: Type[Model],
+    body: bytes,
+    content_type: Optional[str] = None,
+    content_encoding: Optional[str] = None,
+    max_size: int = 0
+) -> Model:
+    """
+    Decompress, decode and validate a request body (blocking)
+
+    Args:
+        max_size: Largest body accepted, compressed or not (0 = no limit)
+
+    Raises:
+        BodyTooLarge: If the body or its decompressed form exceeds max_size
+        UnsupportedFormat: If the content type or encoding is not supported
+        pydantic.ValidationError: If the decoded body does not fit the model
+        ValueError: If the body does not decompress or decode
+    """
+    return model.model_validate(decode(decompress(body, content_encoding, max_size), content_type))
+
+
+def _accepted(header: Optional[str]) -> Dict[str, float]:
+    """Media types or encodings of an Accept-style header, by quality"""
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def _response_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """zstd or gzip if the client accepts it (zstd preferred), else None"""
+    accepted = _accepted(accept_encoding)
+    if zstandard is not None and accepted.get("zstd", 0) > 0:
+        return "zstd"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def encode(data: Any, accept: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    Encode a response as msgpack if the client asks for it, else JSON
+
+    Returns:
+        (body, media type)
+    """
+    accepted = _accepted(accept)
+    if msgpack is not None and any(accepted.get(name, 0) > 0 for name in MSGPACK_TYPES):
+        return msgpack.packb(data), MSGPACK
+    if orjson is not None:
+        return orjson.dumps(data), JSON
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), JSON
+
+
+def render(data: Any, accept: Optional[str] = None, accept_encoding: Optional[str] = None) -> Response:
+    """Response for JSON-compatible data in the format and encoding the client accepts"""
+    body, media_type = encode(data, accept)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    encoding = _response_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding == "zstd":
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=5)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Build the professor vector index
+Encodes every professor in public/data/professors-*.json into a dense vector
+and writes professors.npy plus an id map for the backend's /retrieve endpoint.
+Run it after load-local-data.py whenever the region files change.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Reuse the backend's encoders and venue -> area table
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+from prerank import VENUE_AREAS  # noqa: E402
+from professor_data import professor_id  # noqa: E402
+from text_encoder import DEFAULT_ENCODER, create_encoder  # noqa: E402
+from vector_index import save_index  # noqa: E402
+
+# Paths
+DATA_DIR = Path('public/data')
+# Mounted into the backend container as /app/cache
+OUTPUT_DIR = Path('cache/vector-index')
+
+
+def profile_text(professor):
+    """
+    Describe a professor by venue and research area
+
+    Venues are ordered by paper count and repeated 1 + log(1 + papers) times,
+    so an encoder weighs a professor's main venues above occasional ones.
+    """
+    totals = {
+        venue: sum(years.values())
+        for venue, years in (professor.get('publications') or {}).items()
+    }
+    for venue in professor.get('areas') or []:
+        totals.setdefault(venue, 0.0)
+
+    parts = []
+    for venue, count in sorted(totals.items(), key=lambda item: -item[1]):
+        phrase = f"{VENUE_AREAS.get(venue, '')} {venue}".strip()
+        parts.extend([phrase] * (1 + int(round(math.log1p(count)))))
+    return '. '.join(parts)
+
+
+def load_regions(data_dir):
+    """Read every region file in name order"""
+    regions = {}
+    for path in sorted(data_dir.glob('professors-*.json')):
+        region = path.stem[len('professors-'):]
+        with open(path, encoding='utf-8') as f:
+            regions[region] = json.load(f)['professors']
+        print(f"✓ Loaded {path.name}: {len(regions[region])} professors")
+    return regions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-dir', type=Path, default=DATA_DIR, help='Directory with professors-*.json')
+    parser.add_argument('--output', type=Path, default=OUTPUT_DIR, help='Index directory')
+    parser.add_argument('--encoder', default=DEFAULT_ENCODER,
+                        help='Encoder spec, e.g. hashing:1024 or sentence-transformers:all-MiniLM-L6-v2')
+    parser.add_argument('--batch-size', type=int, default=1024, help='Professors encoded per call')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("  CSProfAlign - Build Professor Vector Index")
+    print("=" * 70)
+
+    regions = load_regions(args.data_dir)
+    if not regions:
+        print(f"ERROR: No professors-*.json files in {args.data_dir}")
+        sys.exit(1)
+
+    # Rows are grouped by region so /retrieve can scan a region as one slice
+    professors = []
+    texts = []
+    ranges = {}
+    for region, entries in regions.items():
+        start = len(professors)
+        for entry in entries:
+            professors.append({
+                'id': professor_id(region, entry),
+                'name': entry['name'],
+                'affiliation': entry.get('affiliation', ''),
+                'region': region
+            })
+            texts.append(profile_text(entry))
+        ranges[region] = (start, len(professors))
+
+    start_time = time.time()
+    encoder = create_encoder(args.encoder)
+    encoder.fit(texts)
+    matrix = np.zeros((len(texts), encoder.dim), dtype=np.float32)
+    for start in range(0, len(texts), args.batch_size):
+        matrix[start:start + args.batch_size] = encoder.encode(texts[start:start + args.batch_size])
+    print(f"\n✓ Encoded {len(texts)} professors with {encoder.spec} in {time.time() - start_time:.1f}s")
+
+    save_index(str(args.output), matrix, professors, ranges, encoder)
+    size = matrix.nbytes / (1024 * 1024)
+    print(f"✓ Saved {args.output}: {matrix.shape[0]} x {matrix.shape[1]} ({size:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
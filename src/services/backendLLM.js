@@ -5,6 +5,37 @@
 
 import backendConfig from '@/config/backend.js'
 
+// Approximate progress shown for each server-side load state
+const LOAD_PROGRESS = { queued: 0, downloading: 10, initializing: 50, warming: 90 }
+const LOAD_POLL_INTERVAL_MS = 1000
+// Retries of an evaluation rejected as overloaded (429), waiting Retry-After each time
+const OVERLOAD_RETRIES = 5
+const OVERLOAD_DEFAULT_WAIT_S = 5
+
+/**
+ * POST JSON, retrying while the backend answers 429 (admission control)
+ * Aborting the signal closes the connection, which makes the backend drop
+ * the request's remaining prompts.
+ */
+async function postEvaluation(url, payload, signal) {
+  const body = JSON.stringify(payload)
+  for (let attempt = 0; ; attempt++) {
+    const res = await fetch(url, {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body,
+      signal
+    })
+    if (res.status !== 429 || attempt >= OVERLOAD_RETRIES) {
+      return res
+    }
+    const waitS = Number(res.headers.get('Retry-After')) || OVERLOAD_DEFAULT_WAIT_S
+    console.warn(`⏳ Backend busy, retrying in ${waitS}s`)
+    await new Promise(resolve => setTimeout(resolve, waitS * 1000))
+    signal?.throwIfAborted()
+  }
+}
+
 class BackendLLMService {
   constructor() {
     this.baseURL = backendConfig.baseURL
@@ -58,8 +89,10 @@ class BackendLLMService {
 
   /**
    * Load a model
+   * Loading runs in the background on the server; this polls the load job
+   * until the model is ready
    * @param {string} modelId - Model identifier (e.g., 'qwen-0.5b')
-   * @param {function} onProgress - Progress callback (not implemented for now)
+   * @param {function} onProgress - Progress callback ({ progress, status })
    */
   async loadModel(modelId, onProgress) {
     try {
@@ -81,7 +114,24 @@ class BackendLLMService {
         throw new Error(error.detail || `Failed to load model: ${res.statusText}`)
       }
       
-      const data = await res.json()
+      let job = await res.json()
+      
+      // Poll the load job until the model is ready
+      while (job.state !== 'ready') {
+        if (job.state === 'failed') {
+          throw new Error(job.error || `Failed to load model ${modelId}`)
+        }
+        if (onProgress) {
+          onProgress({ progress: LOAD_PROGRESS[job.state] || 0, status: job.state })
+        }
+        await new Promise(resolve => setTimeout(resolve, LOAD_POLL_INTERVAL_MS))
+        
+        const jobRes = await fetch(`${this.baseURL}/load_jobs/${job.job_id}`)
+        if (!jobRes.ok) {
+          throw new Error(`Failed to check model loading: ${jobRes.statusText}`)
+        }
+        job = await jobRes.json()
+      }
       
       // Update state
       this.currentModel = modelId
@@ -93,7 +143,7 @@ class BackendLLMService {
       }
       
       console.log(`✅ Model loaded: ${modelId}`)
-      return data
+      return job
     } catch (error) {
       console.error('Model loading failed:', error)
       this.isReady = false
@@ -131,8 +181,9 @@ class BackendLLMService {
    * @param {Array} professors - Array of professor objects
    * @param {string} researchDirection - Research direction description
    * @param {number} threshold - Match threshold (0-1)
+   * @param {AbortSignal} signal - Optional signal that cancels the evaluation on the backend
    */
-  async evaluateBatch(professors, researchDirection, threshold = 0.6) {
+  async evaluateBatch(professors, researchDirection, threshold = 0.6, signal = undefined) {
     if (!this.isReady) {
       throw new Error('Model not loaded. Call loadModel() first.')
     }
@@ -140,21 +191,16 @@ class BackendLLMService {
     try {
       console.log(`Evaluating batch of ${professors.length} professors`)
       
-      const res = await fetch(`${this.baseURL}/evaluate_batch`, {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({
-          professors: professors.map(p => ({
-            name: p.name,
-            affiliation: p.affiliation,
-            areas: p.areas || [],
-            publicationList: p.publicationList || []
-          })),
-          research_direction: researchDirection,
-          batch_size: professors.length,
-          threshold: threshold
-        })
-      })
+      const res = await postEvaluation(`${this.baseURL}/evaluate_batch`, {
+        professors: professors.map(p => ({
+          name: p.name,
+          affiliation: p.affiliation,
+          areas: p.areas || [],
+          publicationList: p.publicationList || []
+        })),
+        research_direction: researchDirection,
+        threshold: threshold
+      }, signal)
       
       if (!res.ok) {
         const error = await res.json()
@@ -174,6 +220,72 @@ class BackendLLMService {
     }
   }
 
+  /**
+   * Evaluate a batch of professors, receiving each result as soon as it finishes
+   * @param {Array} professors - Array of professor objects
+   * @param {string} researchDirection - Research direction description
+   * @param {number} threshold - Match threshold (0-1)
+   * @param {function} onResult - Called with (index, result) for every finished professor
+   * @param {AbortSignal} signal - Optional signal that cancels the evaluation on the backend
+   * @returns {Object} Summary frame (count, invalid_count, processing_time, ...)
+   */
+  async evaluateBatchStream(professors, researchDirection, threshold = 0.6, onResult, signal = undefined) {
+    if (!this.isReady) {
+      throw new Error('Model not loaded. Call loadModel() first.')
+    }
+    
+    const res = await postEvaluation(`${this.baseURL}/evaluate_stream`, {
+      professors: professors.map(p => ({
+        name: p.name,
+        affiliation: p.affiliation,
+        areas: p.areas || [],
+        publicationList: p.publicationList || []
+      })),
+      research_direction: researchDirection,
+      threshold: threshold
+    }, signal)
+    
+    if (!res.ok) {
+      const error = await res.json()
+      throw new Error(error.detail || `Evaluation failed: ${res.statusText}`)
+    }
+    
+    // Read newline-delimited JSON frames as they arrive
+    const reader = res.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let summary = null
+    
+    const handleFrame = (line) => {
+      if (!line.trim()) return
+      const frame = JSON.parse(line)
+      if (frame.type === 'result') {
+        if (onResult) onResult(frame.index, frame.result)
+      } else if (frame.type === 'summary') {
+        summary = frame
+      } else if (frame.type === 'error') {
+        throw new Error(frame.detail)
+      }
+    }
+    
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      
+      const lines = buffer.split('\n')
+      buffer = lines.pop()
+      lines.forEach(handleFrame)
+    }
+    handleFrame(buffer)
+    
+    console.log(
+      `✅ Stream evaluated: ${summary?.count ?? 0} professors in ${summary?.processing_time?.toFixed(2) ?? '?'}s`
+    )
+    
+    return summary
+  }
+
   /**
    * Get model info
    */
@@ -165,7 +165,7 @@ export const useAppStore = defineStore('app', () => {
     if (llmFilteredProfessors.value.length > 0) {
       // Show LLM filtered results
       const filtered = llmFilteredProfessors.value.filter(prof => 
-        prof.matchScore >= threshold.value
+        prof.matchScore != null && prof.matchScore >= threshold.value
       )
       return filtered.sort((a, b) => b.matchScore - a.matchScore)
     }
@@ -229,7 +229,8 @@ export const useAppStore = defineStore('app', () => {
       throw new Error('Please provide an API key or switch to local model')
     }
     
-    // Create new AbortController for this processing session
+    // Cancel a previous search still running, then create a new AbortController for this session
+    abortController.value?.abort()
     abortController.value = new AbortController()
     
     isProcessing.value = true
@@ -294,40 +295,42 @@ export const useAppStore = defineStore('app', () => {
               })
             )
             
-            // Call backend API for batch evaluation
-            const response = await backendLLM.evaluateBatch(
+            // Stream the batch from the backend so each professor shows up as
+            // soon as its evaluation finishes (score is null when the backend's
+            // pre-ranking kept a professor away from the model)
+            let matchedInBatch = 0
+            await backendLLM.evaluateBatchStream(
               enrichedBatch,
               researchDirection.value,
-              threshold.value
+              threshold.value,
+              (idx, result) => {
+                const professor = {
+                  ...enrichedBatch[idx],
+                  matchScore: result.score,
+                  matchReasoning: result.reasoning,
+                  researchSummary: result.researchSummary
+                }
+                // Kept as they arrive, so a batch that fails midway keeps its finished results
+                results.push(professor)
+                
+                // Update progress and display matches in real-time
+                processedSoFar += 1
+                processedCount.value = processedSoFar
+                if (professor.matchScore != null && professor.matchScore >= threshold.value) {
+                  matchedInBatch += 1
+                  llmFilteredProfessors.value.push(professor)
+                }
+              },
+              abortController.value?.signal
             )
             
-            // Map results back to professor objects
-            const batchResults = response.results.map((result, idx) => ({
-              ...enrichedBatch[idx],
-              matchScore: result.score,
-              matchReasoning: result.reasoning,
-              researchSummary: result.researchSummary
-            }))
-            
-            results.push(...batchResults)
-            
-            // Update progress
-            processedSoFar += batchResults.length
-            processedCount.value = processedSoFar
-            
-            // Filter and add matched professors to display in real-time
-            const matchedInBatch = batchResults.filter(p => p.matchScore >= threshold.value)
-            if (matchedInBatch.length > 0) {
-              llmFilteredProfessors.value.push(...matchedInBatch)
-            }
-            
             const elapsed = (Date.now() - startTime) / 1000
             const rate = (processedSoFar / elapsed).toFixed(2)
             const batchTime = ((Date.now() - batchStartTime) / 1000).toFixed(2)
             
-            console.log(`✅ Backend batch ${batchIndex + 1}/${batches.length} done in ${batchTime}s (${rate} profs/sec) - Matched: ${matchedInBatch.length}`)
+            console.log(`✅ Backend batch ${batchIndex + 1}/${batches.length} done in ${batchTime}s (${rate} profs/sec) - Matched: ${matchedInBatch}`)
             logService.log('progress', 'success', `Backend batch ${batchIndex + 1}/${batches.length} completed in ${batchTime}s (${rate} profs/sec)`)
-            logService.log('results', 'success', `Matched: +${matchedInBatch.length} professors (Total: ${llmFilteredProfessors.value.length})`)
+            logService.log('results', 'success', `Matched: +${matchedInBatch} professors (Total: ${llmFilteredProfessors.value.length})`)
             
             // Check for abort
             if (abortController.value?.signal?.aborted) {
@@ -335,6 +338,10 @@ export const useAppStore = defineStore('app', () => {
             }
             
           } catch (error) {
+            if (error.name === 'AbortError') {
+              // Search cancelled or replaced; the backend drops the rest of the batch
+              break
+            }
             console.error(`❌ Error processing batch ${batchIndex + 1}:`, error)
             // Continue with next batch
           }
@@ -388,19 +395,19 @@ export const useAppStore = defineStore('app', () => {
       }
       
       // Final update: ensure all results are captured (in case callback missed any)
-      llmFilteredProfessors.value = results.filter(p => p.matchScore >= threshold.value)
+      llmFilteredProfessors.value = results.filter(p => p.matchScore != null && p.matchScore >= threshold.value)
       
       // Debug: Show score distribution
       const scoreDistribution = {}
       results.forEach(prof => {
-        const scoreRange = Math.floor(prof.matchScore * 10) / 10
+        const scoreRange = prof.matchScore == null ? 'not evaluated' : Math.floor(prof.matchScore * 10) / 10
         scoreDistribution[scoreRange] = (scoreDistribution[scoreRange] || 0) + 1
       })
       
       console.log(`✅ Processed ${results.length} professors`)
       console.log(`📊 Score distribution:`, scoreDistribution)
       
-      const passedFilter = results.filter(prof => prof.matchScore >= threshold.value)
+      const passedFilter = results.filter(prof => prof.matchScore != null && prof.matchScore >= threshold.value)
       console.log(`🎯 Professors passing threshold (${threshold.value}): ${passedFilter.length}/${results.length}`)
       
       if (passedFilter.length < 10 && passedFilter.length > 0) {